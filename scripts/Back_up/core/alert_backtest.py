@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: alert_backtest.py
+"""
+Backtest des seuils d'alerte sur l'historique (store monitor_store, ancien tableau JSON
+system_monitor_log.json ou archive NDJSON).
+
+Les règles et leur logique de transition sont celles de run_alerts_once()
+(alert_engine.Rule.step); l'horloge est virtuelle (horodatage de chaque échantillon).
+
+1. extraction, une seule fois: chaque entrée → verdict par règle (1 = en défaut,
+   0 = sain, -1 = donnée absente) + horodatage, dans des array compacts. Les segments du
+   store / tranches du fichier NDJSON sont décodés en parallèle (le JSON domine le coût).
+2. balayage: produit cartésien des valeurs --sweep par règle; chaque combinaison rejoue
+   les seuls verdicts (pas de JSON) dans un pool de processus.
+
+Par combinaison: alertes, fins d'alerte, time-to-detect (premier échec de l'épisode →
+alerte; p50 / max), flaps (nouvelle alerte moins de BACKTEST_FLAP_SEC après une fin),
+épisodes d'échecs absorbés sans alerte (et le plus long, du premier au dernier échec),
+part du temps en alerte.
+Les échantillons sans horodatage ou non croissants sont ignorés, comme en direct.
+
+USAGE
+  python3 alert_backtest.py                                   # réglages actuels, store
+  python3 alert_backtest.py --from system_monitor_log.json \\
+      --sweep plex_local.fails=2,3,4 --sweep plex_local.window=3,5,8 --sweep plex_local.clear=1,2,3
+  python3 alert_backtest.py --since 2025-01-01 --rule plex_external --json
+
+Environment:
+  BACKTEST_WORKERS (cpu_count), BACKTEST_FLAP_SEC (1800), seuils: voir alert_engine.py
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from array import array
+
+import alert_engine
+
+WORKERS = int(os.environ.get("BACKTEST_WORKERS", "0")) or multiprocessing.cpu_count()
+FLAP_SEC = int(os.environ.get("BACKTEST_FLAP_SEC", "1800"))
+SLICE_BYTES = 32 * 1024 * 1024
+
+
+# =========================
+# Extraction (JSON → verdicts)
+# =========================
+def _extract_lines(lines, since=None, until=None):
+    rules = alert_engine.default_rules()
+    ts = array("d")
+    verdicts = {r.name: array("b") for r in rules}
+    tests = [(r.test, verdicts[r.name]) for r in rules]
+    for raw in lines:
+        if isinstance(raw, dict):
+            entry = raw
+        else:
+            if not raw.strip():
+                continue
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+        stamp = entry.get("timestamp") or ""
+        if (since and stamp < since) or (until and stamp > until):
+            continue
+        now = alert_engine.entry_time(entry)
+        if now is None:
+            continue
+        ts.append(now)
+        for test, out in tests:
+            v = test(entry)
+            out.append(-1 if v is None else 1 if v else 0)
+    return ts, verdicts
+
+
+def _extract_task(task):
+    kind, path, start, end, since, until = task
+    if kind == "gz":
+        with gzip.open(path, "rb") as f:
+            return _extract_lines(f, since, until)
+    with open(path, "rb") as f:
+        f.seek(start)
+        return _extract_lines(f.read(end - start).split(b"\n"), since, until)
+
+
+def _file_slices(path, n):
+    """Tranches [début, fin) alignées sur les fins de ligne."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, n):
+            f.seek(size * i // n)
+            f.readline()
+            pos = min(f.tell(), size)
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i + 1] > bounds[i]]
+
+
+def extract(path=None, since=None, until=None, workers=WORKERS):
+    """(ts, {règle: verdicts}, octets lus) pour le store (path=None), un NDJSON ou un tableau JSON."""
+    if path:
+        with open(path, "rb") as f:
+            head = f.read(64).lstrip()[:1]
+        size = os.path.getsize(path)
+        if head == b"[":
+            with open(path, "r", encoding="utf-8") as f:
+                ts, verdicts = _extract_lines(json.load(f), since, until)
+            return ts, verdicts, size
+        n = max(1, min(workers * 2, size // SLICE_BYTES + 1))
+        tasks = [("plain", path, a, b, since, until) for a, b in _file_slices(path, n)]
+    else:
+        import monitor_store
+        store = monitor_store.get_store()
+        tasks, size = [], 0
+        for seg in store.load_index()["segments"]:
+            if (since and seg["last_ts"] and seg["last_ts"] < since) or (until and seg["first_ts"] and seg["first_ts"] > until):
+                continue
+            seg_path = os.path.join(str(store.root), seg["name"])
+            try:
+                seg_size = os.path.getsize(seg_path)
+            except OSError:
+                continue
+            size += seg_size
+            tasks.append(("gz" if seg["compacted"] else "plain", seg_path, 0, seg_size, since, until))
+    parts = _map(_extract_task, tasks, workers)
+    ts = array("d")
+    verdicts = {}
+    for part_ts, part_verdicts in parts:   # ordre des tâches = ordre chronologique
+        ts.extend(part_ts)
+        for name, values in part_verdicts.items():
+            verdicts.setdefault(name, array("b")).extend(values)
+    return ts, verdicts, size
+
+
+def _map(fn, tasks, workers, initializer=None, initargs=()):
+    if workers <= 1 or len(tasks) <= 1:
+        if initializer:
+            initializer(*initargs)
+        return [fn(t) for t in tasks]
+    with multiprocessing.Pool(min(workers, len(tasks)), initializer=initializer, initargs=initargs) as pool:
+        return pool.map(fn, tasks, chunksize=1)
+
+
+# =========================
+# Simulation (verdicts → métriques)
+# =========================
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(math.ceil(q * len(values))) - 1)]
+
+
+def simulate(rule, ts, verdicts, flap_sec=FLAP_SEC) -> dict:
+    node = dict(alert_engine.NODE_DEFAULTS)
+    ring = alert_engine.Ring(rule.window)
+    step = rule.step
+    fires = clears = flaps = suppressed = samples = bad_samples = 0
+    ttd = []
+    longest_suppressed = alert_sec = 0.0
+    episode = last_bad = fired_at = cleared_at = None
+    last = first = seen = None
+    for now, v in zip(ts, verdicts):
+        if seen is not None and now <= seen:
+            continue   # comme AlertEngine.feed: échantillon déjà évalué ou hors ordre
+        seen = now
+        if v < 0:
+            continue
+        if first is None:
+            first = now
+        last = now
+        samples += 1
+        bad = v == 1
+        if bad:
+            bad_samples += 1
+            last_bad = now
+            if episode is None and node["status"] != "offline":
+                episode = now
+        kind = step(node, ring, bad, now)
+        if kind == "fire":
+            fires += 1
+            ttd.append(now - episode)
+            episode = None
+            if cleared_at is not None and now - cleared_at < flap_sec:
+                flaps += 1
+            fired_at = now
+        elif kind == "clear":
+            clears += 1
+            alert_sec += now - fired_at
+            cleared_at = now
+        elif not bad and episode is not None and node["success_streak"] >= rule.clear:
+            # épisode d'échecs terminé sans alerte (absorbé par l'anti-flap)
+            suppressed += 1
+            longest_suppressed = max(longest_suppressed, last_bad - episode)
+            episode = None
+    if node["status"] == "offline" and fired_at is not None:
+        alert_sec += last - fired_at
+    span = (last - first) if samples > 1 else 0
+    return {"samples": samples, "bad_samples": bad_samples, "alerts": fires, "recoveries": clears, "flaps": flaps,
+            "ttd_p50_sec": _percentile(ttd, 0.5), "ttd_max_sec": max(ttd) if ttd else None,
+            "suppressed_episodes": suppressed, "longest_suppressed_sec": longest_suppressed,
+            "alert_time_pct": round(100 * alert_sec / span, 2) if span else 0.0}
+
+
+_DATA = {}
+
+
+def _init_worker(ts, verdicts, flap_sec):
+    _DATA.update(ts=ts, verdicts=verdicts, flap_sec=flap_sec)
+
+
+def _simulate_task(task):
+    name, params = task
+    rule = next(r for r in alert_engine.default_rules({name: params}) if r.name == name)
+    result = simulate(rule, _DATA["ts"], _DATA["verdicts"][name], _DATA["flap_sec"])
+    result.update(rule=name, params={p: getattr(rule, p) for p in alert_engine.PARAMS})
+    return result
+
+
+def parse_sweep(items):
+    """["plex_local.fails=2,3,4", ...] → {"plex_local": {"fails": [2, 3, 4]}}."""
+    out = {}
+    for item in items or []:
+        key, _, values = item.partition("=")
+        rule, _, param = key.partition(".")
+        try:
+            parsed = [int(v) for v in values.split(",") if v]
+        except ValueError:
+            parsed = []
+        if param not in alert_engine.PARAMS or not parsed:
+            raise ValueError(f"invalid sweep {item!r} (expected rule.{'|'.join(alert_engine.PARAMS)}=N[,N...])")
+        out.setdefault(rule, {})[param] = parsed
+    return out
+
+
+def combinations(sweep, rules):
+    """Tâches (règle, params): produit cartésien par règle; réglage actuel ({}) pour les règles sans sweep."""
+    tasks = []
+    for name in rules:
+        grid = sweep.get(name, {})
+        keys = sorted(grid)
+        for values in itertools.product(*(grid[k] for k in keys)):
+            tasks.append((name, dict(zip(keys, values))))
+    return tasks
+
+
+def backtest(ts, verdicts, tasks, workers=WORKERS, flap_sec=FLAP_SEC):
+    return _map(_simulate_task, tasks, workers, _init_worker, (ts, verdicts, flap_sec))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Backtest alert thresholds over historical samples")
+    ap.add_argument("--from", dest="path", default="", help="system_monitor_log.json or NDJSON archive (default: monitor store)")
+    ap.add_argument("--since", default="")
+    ap.add_argument("--until", default="")
+    ap.add_argument("--rule", nargs="+", default=[], help="rules to report (default: swept rules, else all)")
+    ap.add_argument("--sweep", action="append", default=[], help="rule.param=v1,v2,... (fails, window, clear, for_sec)")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--flap-sec", type=int, default=FLAP_SEC)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    sweep = parse_sweep(args.sweep)
+    known = [r.name for r in alert_engine.default_rules()]
+    rules = args.rule or [n for n in known if n in sweep] or known
+    unknown = [n for n in list(rules) + list(sweep) if n not in known]
+    if unknown:
+        ap.error(f"unknown rule(s): {', '.join(unknown)} (known: {', '.join(known)})")
+
+    t0 = time.perf_counter()
+    ts, verdicts, size = extract(args.path or None, args.since or None, args.until or None, args.workers)
+    t1 = time.perf_counter()
+    tasks = combinations(sweep, rules)
+    results = backtest(ts, verdicts, tasks, args.workers, args.flap_sec)
+    t2 = time.perf_counter()
+    perf = {"samples": len(ts), "mb": round(size / 1e6, 1), "extract_sec": round(t1 - t0, 2),
+            "combinations": len(tasks), "simulate_sec": round(t2 - t1, 2), "workers": args.workers}
+
+    if args.json:
+        print(json.dumps({"performance": perf, "results": results}, indent=2))
+        return 0
+    fmt = lambda v: "-" if v is None else f"{v / 60:.1f}m"
+    print(f"{'rule':<15} {'params':<38} {'alerts':>6} {'recov':>6} {'flaps':>5} {'ttd50':>7} {'ttdmax':>7} "
+          f"{'absorbed':>8} {'longest':>7} {'alert%':>6}")
+    for r in sorted(results, key=lambda r: (r["rule"], r["flaps"], r["alerts"], r["ttd_p50_sec"] or 0)):
+        params = " ".join(f"{k}={v}" for k, v in r["params"].items())
+        print(f"{r['rule']:<15} {params:<38} {r['alerts']:>6} {r['recoveries']:>6} {r['flaps']:>5} "
+              f"{fmt(r['ttd_p50_sec']):>7} {fmt(r['ttd_max_sec']):>7} {r['suppressed_episodes']:>8} "
+              f"{fmt(r['longest_suppressed_sec']):>7} {r['alert_time_pct']:>6}")
+    print(f"[INFO] {perf['samples']} samples ({perf['mb']} MB) extracted in {perf['extract_sec']}s; "
+          f"{perf['combinations']} combinations simulated in {perf['simulate_sec']}s with {perf['workers']} workers")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
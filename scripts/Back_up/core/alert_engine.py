@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: alert_engine.py
+"""
+Moteur d'alertes anti-flap déclaratif, évalué sur une fenêtre glissante d'échantillons.
+
+Remplace les check_plex_local / check_plex_external / check_deluge de monitor_repair.py
+(une entrée + compteurs de série) par des règles:
+  Rule("plex_local", test, fails=3, window=5, clear=2)      → ≥3 échecs sur les 5 derniers
+  Rule("deluge_stalled", test, for_sec=600, clear=2)        → condition vraie depuis 10 min
+test(entry) renvoie True (en défaut), False (sain) ou None (donnée absente: échantillon ignoré).
+
+- chaque règle garde un anneau de `window` booléens + le nombre d'échecs qu'il contient:
+  une transition coûte O(1) par échantillon (sortie du plus ancien, entrée du nouveau)
+- la durée (for_sec) se mesure sur les horodatages des entrées, pas sur l'horloge:
+  un rejeu de l'historique donne les mêmes transitions qu'en direct
+- déclenchement: passage à "offline" (message), fin: `clear` succès consécutifs
+  (message de fin seulement si l'alerte avait été émise); l'anneau est vidé à chaque
+  transition: seuls les échantillons postérieurs comptent (pas de nouvelle alerte sur un
+  seul échec juste après une fin d'alerte)
+- état par règle dans alert_state.json, au format historique {"status", "failure_streak",
+  "success_streak"} + "window" (anneau sérialisé "01101") et "bad_since"; une entrée déjà
+  évaluée (timestamp <= dernier vu) est ignorée
+- seuils par règle via ALERT_<RÈGLE>_FAILS / _WINDOW / _CLEAR / _FOR_SEC (les anciennes
+  variables LOCAL_FAILS_FOR_ALERT etc. restent les valeurs par défaut), ou overrides
+  {"plex_local": {"fails": 2}} pour le rejeu
+
+Rejeu (harnais): python3 alert_engine.py replay [--since ISO] [--until ISO] [--from legacy.json]
+                 [--set plex_local.fails=2 ...] [--json]
+Balayage de seuils en parallèle (mêmes Rule.step): alert_backtest.py
+
+Environment:
+  LOCAL_FAILS_FOR_ALERT (3), LOCAL_SUCCESSES_TO_CLEAR (2), EXTERNAL_FAILS_FOR_ALERT (3),
+  EXTERNAL_SUCCESSES_TO_CLEAR (2), ALERT_WINDOW (5), DELUGE_STALLED_FOR_SEC (600),
+  JACKETT_SLOW_CYCLES_FOR_ALERT (3), JACKETT_OK_CYCLES_TO_CLEAR (2),
+  ALERT_<RÈGLE>_FAILS / _WINDOW / _CLEAR / _FOR_SEC, ALERT_WARMUP_SEC (3600)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime
+
+LOCAL_FAILS_FOR_ALERT = int(os.getenv("LOCAL_FAILS_FOR_ALERT", "3"))
+LOCAL_SUCCESSES_TO_CLEAR = int(os.getenv("LOCAL_SUCCESSES_TO_CLEAR", "2"))
+EXTERNAL_FAILS_FOR_ALERT = int(os.getenv("EXTERNAL_FAILS_FOR_ALERT", "3"))
+EXTERNAL_SUCCESSES_TO_CLEAR = int(os.getenv("EXTERNAL_SUCCESSES_TO_CLEAR", "2"))
+ALERT_WINDOW = int(os.getenv("ALERT_WINDOW", "5"))
+DELUGE_STALLED_FOR_SEC = int(os.getenv("DELUGE_STALLED_FOR_SEC", "600"))
+JACKETT_SLOW_CYCLES_FOR_ALERT = int(os.getenv("JACKETT_SLOW_CYCLES_FOR_ALERT", "3"))
+JACKETT_OK_CYCLES_TO_CLEAR = int(os.getenv("JACKETT_OK_CYCLES_TO_CLEAR", "2"))
+WARMUP_SEC = int(os.getenv("ALERT_WARMUP_SEC", "3600"))
+
+PARAMS = ("fails", "window", "clear", "for_sec")
+NODE_DEFAULTS = (("status", "unknown"), ("failure_streak", 0), ("success_streak", 0), ("bad_since", None))
+
+
+def entry_time(entry) -> float | None:
+    ts = entry.get("timestamp") if isinstance(entry, dict) else None
+    if not ts:
+        return None
+    try:
+        return datetime.fromisoformat(str(ts).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+# =========================
+# Anneau (fenêtre glissante, compte d'échecs maintenu)
+# =========================
+class Ring:
+    __slots__ = ("bits", "bad")
+
+    def __init__(self, size, bits=""):
+        self.bits = deque((c == "1" for c in bits[-size:]), maxlen=max(1, size))
+        self.bad = sum(self.bits)
+
+    def reset(self):
+        self.bits.clear()
+        self.bad = 0
+
+    def push(self, bad):
+        if len(self.bits) == self.bits.maxlen:
+            self.bad -= self.bits[0]
+        self.bits.append(bad)
+        self.bad += bad
+
+    def dumps(self):
+        return "".join("1" if b else "0" for b in self.bits)
+
+
+# =========================
+# Règles
+# =========================
+class Rule:
+    def __init__(self, name, test, fails=1, window=None, clear=1, for_sec=0,
+                 message=None, clear_message=None, notify=True, mirror=None):
+        self.name = name
+        self.test = test
+        self.fails = fails
+        self.window = window or fails
+        self.clear = clear
+        self.for_sec = for_sec
+        self.message = message or (lambda entry, node: f"[ALERT - initial] {name}")
+        self.clear_message = clear_message or (lambda entry, node: f"[ALERT - END] {name}")
+        self.notify = notify
+        self.mirror = mirror   # (clé d'état, valeur en défaut, valeur saine) pour les lecteurs historiques
+
+    def configured(self, overrides=None):
+        """Copie avec les seuils ALERT_<NOM>_* puis overrides[nom] appliqués."""
+        params = {p: getattr(self, p) for p in PARAMS}
+        prefix = f"ALERT_{self.name.upper()}_"
+        for p in PARAMS:
+            raw = os.environ.get(prefix + p.upper())
+            if raw:
+                params[p] = int(raw)
+        params.update((overrides or {}).get(self.name, {}))
+        params["window"] = max(params["window"], params["fails"])
+        return Rule(self.name, self.test, message=self.message, clear_message=self.clear_message,
+                    notify=self.notify, mirror=self.mirror, **params)
+
+    def tripped(self, ring, node, now):
+        if self.for_sec:
+            return node.get("bad_since") is not None and now is not None and now - node["bad_since"] >= self.for_sec
+        return ring.bad >= self.fails
+
+    def step(self, node, ring, bad, now):
+        """Une transition (horloge = horodatage de l'échantillon): "fire", "clear" ou None."""
+        ring.push(bad)
+        prev = node["status"]
+        if bad:
+            node["failure_streak"] += 1
+            node["success_streak"] = 0
+            if node["bad_since"] is None:
+                node["bad_since"] = now
+            if prev != "offline" and self.tripped(ring, node, now):
+                node["status"] = "offline"
+                ring.reset()
+                return "fire"
+        else:
+            node["success_streak"] += 1
+            node["failure_streak"] = 0
+            node["bad_since"] = None
+            if prev != "online" and node["success_streak"] >= self.clear:
+                node["status"] = "online"
+                ring.reset()
+                if prev == "offline":
+                    return "clear"
+        return None
+
+
+def _plex(entry):
+    return entry.get("plex") if isinstance(entry.get("plex"), dict) else None
+
+
+def _plex_local_down(entry):
+    plex = _plex(entry)
+    if plex is None:
+        return None
+    return not (bool(plex.get("local_access", False)) or bool(plex.get("connected", False)))
+
+
+def _plex_external_down(entry):
+    plex = _plex(entry)
+    if plex is None:
+        return None
+    return str(plex.get("external_access", "")).lower() != "yes"
+
+
+def _plex_external_message(entry, node):
+    plex = _plex(entry) or {}
+    access, detail = str(plex.get("external_access", "")).lower(), str(plex.get("external_detail", ""))
+    if "via_ip_ok" in detail:
+        return "[ALERT - initial] External DNS resolution appears broken (fallback IP works)."
+    if access == "error":
+        return f"[ALERT] Plex external check error: {detail}"
+    return "[ALERT - initial] Plex appears offline from outside (after repeated failures)."
+
+
+def _deluge(entry):
+    return entry.get("deluge") if isinstance(entry.get("deluge"), dict) else None
+
+
+def _deluge_stalled(entry):
+    deluge = _deluge(entry)
+    if deluge is None:
+        return None
+    state = (deluge.get("activity") or {}).get("state")
+    if state is None:
+        # échantillons antérieurs au modèle d'activité (deluge_telemetry.classify)
+        return deluge.get("num_downloading", 0) > 0 and not deluge.get("download_rate_kbps", 0.0)
+    if state == "unknown":
+        return None
+    return state in ("stalled", "broken-network")
+
+
+def _deluge_stalled_message(entry, node):
+    deluge = _deluge(entry) or {}
+    activity = deluge.get("activity") or {}
+    minutes = int((entry_time(entry) or 0) - (node.get("bad_since") or 0)) // 60
+    if activity.get("state") == "broken-network":
+        return f"[ALERT - initial] Deluge network looks broken for {minutes} min: {activity.get('reason', '')}."
+    reason = activity.get("reason") or f"{deluge.get('num_downloading', 0)} torrent(s) downloading at 0 B/s"
+    return f"[ALERT - initial] Deluge stalled for {minutes} min: {reason}."
+
+
+def _jackett_slow(entry):
+    jackett = entry.get("jackett")
+    if not isinstance(jackett, dict) or "slow" not in jackett:
+        return None
+    return bool(jackett.get("slow"))
+
+
+def _jackett_message(entry, node):
+    jackett = entry.get("jackett") or {}
+    stats = jackett.get("indexers", {}) or {}
+    detail = ", ".join(f"{name} (p95 {(stats.get(name) or {}).get('p95_ms')} ms)" for name in sorted(jackett.get("slow") or []))
+    return f"[ALERT - initial] Slow Jackett indexers over the last {jackett.get('window_sec', 0) // 60} min: {detail}"
+
+
+def default_rules(overrides=None):
+    rules = [
+        Rule("plex_external", _plex_external_down, EXTERNAL_FAILS_FOR_ALERT, ALERT_WINDOW, EXTERNAL_SUCCESSES_TO_CLEAR,
+             message=_plex_external_message,
+             clear_message=lambda e, n: "[ALERT - END] Plex is online from outside.",
+             mirror=("plex_external_status", "offline", "online")),
+        Rule("plex_local", _plex_local_down, LOCAL_FAILS_FOR_ALERT, ALERT_WINDOW, LOCAL_SUCCESSES_TO_CLEAR,
+             message=lambda e, n: "[ALERT - initial] Plex local access lost (after repeated failures).",
+             clear_message=lambda e, n: "[ALERT - END] Plex local access restored."),
+        # idle (rien à télécharger) n'est pas une panne: seuls stalled / broken-network durables
+        # passent deluge_status à "inactive" et déclenchent --deluge-verify
+        Rule("deluge_stalled", _deluge_stalled, for_sec=DELUGE_STALLED_FOR_SEC, clear=2,
+             message=_deluge_stalled_message,
+             clear_message=lambda e, n: "[ALERT - END] Deluge is active again.",
+             mirror=("deluge_status", "inactive", "active")),
+        Rule("jackett_slow", _jackett_slow, JACKETT_SLOW_CYCLES_FOR_ALERT, JACKETT_SLOW_CYCLES_FOR_ALERT,
+             JACKETT_OK_CYCLES_TO_CLEAR, message=_jackett_message,
+             clear_message=lambda e, n: "[ALERT - END] Jackett indexers are responsive again."),
+    ]
+    return [r.configured(overrides) for r in rules]
+
+
+# =========================
+# Moteur
+# =========================
+class AlertEngine:
+    def __init__(self, rules=None, state=None):
+        self.rules = rules if rules is not None else default_rules()
+        self.state = state if state is not None else {}
+        self.meta = self.state.setdefault("engine", {"last_ts": None, "samples": 0})
+        self._rings = {}
+        names = {r.name for r in self.rules}
+        for key in [k for k, v in self.state.items() if isinstance(v, dict) and "window" in v and k not in names]:
+            del self.state[key]   # règle retirée (ex. deluge_idle)
+        for rule in self.rules:
+            node = self.state.get(rule.name)
+            if not isinstance(node, dict):
+                node = self.state[rule.name] = {}
+            for key, default in NODE_DEFAULTS:
+                node.setdefault(key, default)
+            self._rings[rule.name] = Ring(rule.window, node.get("window", ""))
+
+    def feed(self, entry, notify=True) -> list:
+        """Évalue une entrée; retourne les transitions [{"rule", "kind", "ts", "message", "notify"}]."""
+        now = entry_time(entry)
+        last = self.meta.get("last_ts")
+        if now is not None and last is not None and now <= last:
+            return []
+        if now is not None:
+            self.meta["last_ts"] = now
+        self.meta["samples"] = self.meta.get("samples", 0) + 1
+        events = []
+        for rule in self.rules:
+            bad = rule.test(entry)
+            if bad is None:
+                continue
+            node = self.state[rule.name]
+            kind = rule.step(node, self._rings[rule.name], bool(bad), now)
+            if kind:
+                message = (rule.message if kind == "fire" else rule.clear_message)(entry, node)
+                events.append({"rule": rule.name, "kind": kind, "ts": entry.get("timestamp"),
+                               "message": message, "notify": notify and rule.notify})
+            if rule.mirror:
+                key, down, up = rule.mirror
+                if node["status"] in ("offline", "online"):
+                    self.state[key] = down if node["status"] == "offline" else up
+        return events
+
+    def sync(self) -> dict:
+        """Sérialise les anneaux dans l'état (à l'enregistrement seulement); retourne l'état."""
+        for rule in self.rules:
+            self.state[rule.name]["window"] = self._rings[rule.name].dumps()
+        return self.state
+
+
+def warm_up(engine, entries) -> int:
+    """Rejoue des entrées passées sans notifier (état initial absent ou perdu)."""
+    n = 0
+    for entry in entries:
+        engine.feed(entry, notify=False)
+        n += 1
+    return n
+
+
+# =========================
+# Rejeu de l'historique (harnais)
+# =========================
+def replay(entries, overrides=None, rules=None):
+    """Nouvel état, toutes les entrées dans l'ordre; retourne (événements, statistiques)."""
+    engine = AlertEngine(rules if rules is not None else default_rules(overrides), {})
+    events = []
+    t0 = time.perf_counter()
+    n = 0
+    for entry in entries:
+        n += 1
+        events.extend(engine.feed(entry))
+    elapsed = time.perf_counter() - t0
+    by_rule = {}
+    for ev in events:
+        by_rule.setdefault(ev["rule"], {"fire": 0, "clear": 0})[ev["kind"]] += 1
+    stats = {"samples": n, "events": len(events), "by_rule": by_rule, "seconds": round(elapsed, 3),
+             "samples_per_sec": round(n / elapsed) if elapsed else None,
+             "final": {r.name: engine.state[r.name]["status"] for r in engine.rules}}
+    return events, stats
+
+
+def load_entries(path=None, since=None, until=None):
+    """Entrées du store (monitor_store) ou d'un ancien tableau JSON / fichier NDJSON."""
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            head = f.read(1)
+            f.seek(0)
+            if head == "[":
+                data = json.load(f)
+            else:
+                data = (json.loads(ln) for ln in f if ln.strip())
+            for entry in data:
+                ts = entry.get("timestamp") or ""
+                if (not since or ts >= since) and (not until or ts <= until):
+                    yield entry
+        return
+    import monitor_store
+    yield from monitor_store.get_store().iter_entries(since, until)
+
+
+def parse_overrides(items):
+    """["plex_local.fails=2", ...] → {"plex_local": {"fails": 2}}."""
+    out = {}
+    for item in items or []:
+        key, _, value = item.partition("=")
+        rule, _, param = key.partition(".")
+        if param not in PARAMS or not value.isdigit():
+            raise ValueError(f"invalid override {item!r} (expected rule.{'|'.join(PARAMS)}=N)")
+        out.setdefault(rule, {})[param] = int(value)
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Alert engine replay harness")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("replay", help="feed historical samples through the rules")
+    rp.add_argument("--from", dest="path", default="", help="legacy JSON array or NDJSON file (default: monitor store)")
+    rp.add_argument("--since", default="")
+    rp.add_argument("--until", default="")
+    rp.add_argument("--set", action="append", default=[], help="rule.param=N (fails, window, clear, for_sec)")
+    rp.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    events, stats = replay(load_entries(args.path or None, args.since or None, args.until or None),
+                           parse_overrides(args.set))
+    if args.json:
+        print(json.dumps({"events": events, "stats": stats}, indent=2, ensure_ascii=False))
+        return 0
+    for ev in events:
+        print(f"{ev['ts']}  {ev['rule']:<15} {ev['kind']:<5} {ev['message']}")
+    print(f"[INFO] {stats['samples']} samples, {stats['events']} transitions in {stats['seconds']}s "
+          f"({stats['samples_per_sec']} samples/s); final: {stats['final']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: alert_engine_test.py
+"""
+Tests de alert_engine.py: transitions de Rule.step sur des séquences d'échecs (F) et de
+succès (S), avec les seuils par défaut (fails=3, window=5, clear=2), et rejeu par
+AlertEngine (anneau sérialisé dans l'état puis relu).
+
+USAGE
+  python3 alert_engine_test.py        (ou python3 -m pytest alert_engine_test.py)
+"""
+
+import unittest
+from datetime import datetime, timedelta
+
+import alert_engine
+
+
+def _run(rule, sequence):
+    """Transitions ("fire", "clear" ou None) pour une suite "FFSSF…"."""
+    node = dict(alert_engine.NODE_DEFAULTS)
+    ring = alert_engine.Ring(rule.window)
+    return [rule.step(node, ring, c == "F", float(i * 60)) for i, c in enumerate(sequence)]
+
+
+class RuleStepTest(unittest.TestCase):
+    def setUp(self):
+        self.rule = alert_engine.Rule("plex_local", None, fails=3, window=5, clear=2)
+
+    def test_fires_on_fails_within_window(self):
+        self.assertEqual(_run(self.rule, "FSFSF"), [None, None, None, None, "fire"])
+
+    def test_short_recovery_does_not_flap(self):
+        # F F F S S F: alerte, fin, puis un seul échec ne doit pas relancer l'alerte
+        self.assertEqual(_run(self.rule, "FFFSSF"), [None, None, "fire", None, "clear", None])
+
+    def test_refires_on_fresh_failures_after_clear(self):
+        self.assertEqual(_run(self.rule, "FFFSSFFF"), [None, None, "fire", None, "clear", None, None, "fire"])
+
+    def test_failures_before_first_online_do_not_count_after_it(self):
+        # S S: passage "unknown" → "online", l'échec précédent est oublié
+        self.assertEqual(_run(self.rule, "FFSSFF"), [None] * 6)
+
+    def test_for_sec_rule(self):
+        rule = alert_engine.Rule("deluge_stalled", None, for_sec=600, clear=2)
+        self.assertEqual(_run(rule, "FFFFFFFFFFFSSF"),
+                         [None] * 10 + ["fire", None, "clear", None])
+
+
+class EngineTest(unittest.TestCase):
+    def _entries(self, sequence, start=0):
+        t0 = datetime(2026, 1, 1)
+        return [{"timestamp": (t0 + timedelta(minutes=start + i)).isoformat(),
+                 "plex": {"local_access": c == "S", "connected": False}}
+                for i, c in enumerate(sequence)]
+
+    def test_ring_reset_survives_state_reload(self):
+        rules = [r for r in alert_engine.default_rules() if r.name == "plex_local"]
+        engine = alert_engine.AlertEngine(rules, {})
+        kinds = [ev["kind"] for e in self._entries("FFFSS") for ev in engine.feed(e)]
+        self.assertEqual(kinds, ["fire", "clear"])
+        state = engine.sync()
+        self.assertEqual(state["plex_local"]["window"], "")
+        # nouveau processus (mode subprocess): l'anneau vide est relu depuis l'état
+        engine = alert_engine.AlertEngine(rules, state)
+        self.assertEqual([ev for e in self._entries("F", start=5) for ev in engine.feed(e)], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: bench_tail_reader.py
+"""
+Benchmark du lecteur "dernière entrée" (monitor_store.TailReader).
+
+Génère des logs NDJSON de 1 Mo à 2 Go (échantillons au format de run_quick_check)
+et mesure, pour chaque taille:
+  - cold   : nouveau TailReader (seek depuis la fin, aucun cache)
+  - warm   : même TailReader, fichier inchangé (cache inode/taille)
+  - append : une ligne ajoutée entre deux lectures (lecture des seuls octets ajoutés)
+  - full   : ancienne méthode (lecture complète + splitlines), seulement jusqu'à --full-max-mb
+
+La latence cold/warm/append doit rester plate quelle que soit la taille du fichier.
+
+USAGE
+  python3 bench_tail_reader.py
+  python3 bench_tail_reader.py --sizes-mb 1,64,2048 --rounds 200 --dir /mnt/data/bench
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import monitor_store
+
+
+def _sample(i: int, ts: datetime) -> dict:
+    return {
+        "docker_services": {"plex-server": True, "vpn": True, "deluge": True},
+        "network": {"vpn_ip": ["203.0.113.7", "10.2.0.2"], "deluge_ip": ["203.0.113.7", "10.2.0.2"],
+                    "internet_access": True, "speedtest": {"download_mbps": 0.0, "upload_mbps": 0.0}},
+        "plex": {"connected": True, "active_sessions": i % 4, "unique_clients": i % 3,
+                 "transcoding_sessions": i % 2, "cpu_usage": 3.2, "ram_usage": 4.1,
+                 "transcode_folder_found": True, "local_access": True, "local_detail": "HEAD_200",
+                 "external_access": "yes", "external_detail": "HEAD_200"},
+        "system": {"cpu_total": 12.5, "ram_total": 41.0, "cpu_temp_c": 48.0,
+                   "internet_io": {"sent_mb": 1234.5 + i, "received_mb": 5678.9 + i},
+                   "disk_io": {"read_mb": 42.0, "write_mb": 24.0}},
+        "deluge": {"num_downloading": 2, "num_seeding": 40, "download_rate_kbps": 512.0,
+                   "upload_rate_kbps": 128.0, "num_peers": 31},
+        "storage": {"/": {"total_gb": 468, "used_pct": 37}},
+        "performance": {"runtime_seconds": 4.2},
+        "timestamp": ts.isoformat(),
+    }
+
+
+def build_log(path: str, size_bytes: int) -> int:
+    """Écrit un NDJSON d'au moins size_bytes octets en répétant un bloc de ~1 Mo."""
+    start = datetime(2024, 1, 1)
+    lines = []
+    block_len = 0
+    i = 0
+    while block_len < (1 << 20):
+        ln = json.dumps(_sample(i, start + timedelta(minutes=i)), separators=(",", ":")) + "\n"
+        lines.append(ln.encode("utf-8"))
+        block_len += len(lines[-1])
+        i += 1
+    block = b"".join(lines)
+    written = 0
+    with open(path, "wb") as f:
+        while written < size_bytes:
+            f.write(block)
+            written += len(block)
+    return written
+
+
+def _timeit(fn, rounds: int):
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def _full_scan(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        txt = f.read().strip()
+    last = None
+    for ln in txt.splitlines():
+        if ln.strip():
+            last = ln
+    return json.loads(last) if last else None
+
+
+def bench_size(path: str, size_mb: int, rounds: int, full_max_mb: int) -> dict:
+    actual = build_log(path, size_mb << 20)
+    res = {"size_mb": round(actual / (1 << 20), 1)}
+
+    def cold():
+        line = monitor_store.TailReader(path).last_line()
+        assert line and json.loads(line)["timestamp"]
+    res["cold"] = _timeit(cold, rounds)
+
+    reader = monitor_store.TailReader(path)
+    reader.last_line()
+    res["warm"] = _timeit(reader.last_line, rounds)
+
+    extra = (json.dumps(_sample(0, datetime.now()), separators=(",", ":")) + "\n").encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+    try:
+        def append_then_read():
+            os.write(fd, extra)
+            assert reader.last_line() == extra.strip()
+        res["append"] = _timeit(append_then_read, rounds)
+    finally:
+        os.close(fd)
+
+    if size_mb <= full_max_mb:
+        res["full"] = _timeit(lambda: _full_scan(path), max(1, min(rounds, 5)))
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark monitor_store.TailReader (1 MB → 2 GB)")
+    parser.add_argument("--sizes-mb", default="1,16,256,2048", help="Comma-separated file sizes in MB")
+    parser.add_argument("--rounds", type=int, default=200, help="Iterations per measurement")
+    parser.add_argument("--full-max-mb", type=int, default=256, help="Largest size for the full-read baseline")
+    parser.add_argument("--dir", default=None, help="Working directory (default: temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep generated files")
+    args = parser.parse_args()
+
+    workdir = args.dir or tempfile.mkdtemp(prefix="bench_tail_")
+    os.makedirs(workdir, exist_ok=True)
+    sizes = [int(s) for s in args.sizes_mb.split(",") if s.strip()]
+    print(f"[INFO] workdir={workdir} sizes={sizes} MB rounds={args.rounds}")
+    print(f"{'size':>9} | {'cold p50/p99 (µs)':>20} | {'warm p50/p99 (µs)':>20} | {'append p50/p99 (µs)':>20} | {'full p50 (ms)':>13}")
+    try:
+        for size_mb in sizes:
+            path = os.path.join(workdir, f"log_{size_mb}MB.ndjson")
+            r = bench_size(path, size_mb, args.rounds, args.full_max_mb)
+            full = f"{r['full'][0] / 1000:.1f}" if "full" in r else "-"
+            print(f"{r['size_mb']:>7}MB | {r['cold'][0]:>9.1f}/{r['cold'][1]:<10.1f} | "
+                  f"{r['warm'][0]:>9.1f}/{r['warm'][1]:<10.1f} | {r['append'][0]:>9.1f}/{r['append'][1]:<10.1f} | {full:>13}",
+                  flush=True)
+            if not args.keep:
+                os.remove(path)
+    finally:
+        if not args.keep and not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
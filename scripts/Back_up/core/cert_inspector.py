@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: cert_inspector.py
+"""
+Inspection des certificats TLS en Python pur (lecteur DER/X.509 minimal, module ssl).
+
+Remplace les trois stratégies à base de sous-processus du check CERT_EXPIRY
+(openssl dans le conteneur, cat + openssl hôte, pipeline `openssl s_client`):
+- chain_from_file(): fullchain.pem lu sur le bind mount de l'hôte, re-parsé
+  seulement si (mtime, taille) change
+- chain_from_pem(): PEM récupéré ailleurs (ex: bundle nginx), cache par empreinte sha256
+- chain_from_server(): certificat présenté au handshake TLS (feuille seulement:
+  Python 3.11 n'expose pas la chaîne envoyée par le serveur)
+- evaluate(): toute la chaîne — jours restants (feuille et plus proche échéance de la
+  chaîne), nom couvert par les SAN (jokers compris), émetteur de chaque maillon = sujet
+  du suivant, certificats pas encore valides ou expirés
+Les certificats déjà vus (même empreinte) ne sont jamais re-parsés; le cache est
+persisté dans CERT_CACHE_FILE (utile pour les scripts lancés en subprocess).
+
+Environment:
+  CERT_CACHE_FILE (/mnt/data/cert_cache.json),
+  LE_HOST_PATH (dossiers "live" de Let's Encrypt côté hôte, séparés par des virgules;
+  défaut: /etc/letsencrypt/live puis config/nginx/letsencrypt/live du dépôt)
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import socket
+import ssl
+import threading
+from datetime import datetime, timezone
+
+CACHE_FILE = os.environ.get("CERT_CACHE_FILE", "/mnt/data/cert_cache.json")
+_REPO_LIVE = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                          "..", "..", "..", "config", "nginx", "letsencrypt", "live"))
+LE_HOST_PATHS = [p.strip() for p in os.environ.get("LE_HOST_PATH", f"/etc/letsencrypt/live,{_REPO_LIVE}").split(",")
+                 if p.strip()]
+
+_PEM_RE = re.compile(r"-----BEGIN CERTIFICATE-----(.+?)-----END CERTIFICATE-----", re.S)
+_NAME_OIDS = {"2.5.4.3": "CN", "2.5.4.6": "C", "2.5.4.7": "L", "2.5.4.8": "ST", "2.5.4.10": "O", "2.5.4.11": "OU"}
+_OID_SAN = "2.5.29.17"
+_OID_BASIC_CONSTRAINTS = "2.5.29.19"
+
+
+class CertError(Exception):
+    pass
+
+
+# =========================
+# Lecteur DER (juste ce qu'il faut pour un certificat X.509)
+# =========================
+def _tlv(buf, off):
+    """(tag, début de la valeur, fin de la valeur)"""
+    if off + 2 > len(buf):
+        raise CertError("truncated DER")
+    tag, length = buf[off], buf[off + 1]
+    off += 2
+    if length & 0x80:
+        n = length & 0x7F
+        length = int.from_bytes(buf[off:off + n], "big")
+        off += n
+    if off + length > len(buf):
+        raise CertError("truncated DER")
+    return tag, off, off + length
+
+
+def _children(buf, start, end):
+    out = []
+    while start < end:
+        tag, vstart, vend = _tlv(buf, start)
+        out.append((tag, vstart, vend))
+        start = vend
+    return out
+
+
+def _oid(raw: bytes) -> str:
+    parts = [raw[0] // 40, raw[0] % 40]
+    value = 0
+    for b in raw[1:]:
+        value = (value << 7) | (b & 0x7F)
+        if not b & 0x80:
+            parts.append(value)
+            value = 0
+    return ".".join(map(str, parts))
+
+
+def _string(tag, raw: bytes) -> str:
+    if tag == 0x1E:  # BMPString
+        return raw.decode("utf-16-be", "replace")
+    return raw.decode("utf-8", "replace")
+
+
+def _name(buf, start, end) -> dict:
+    name = {}
+    for _, sstart, send in _children(buf, start, end):          # SET
+        for _, astart, aend in _children(buf, sstart, send):    # SEQUENCE {oid, valeur}
+            (otag, ostart, oend), (vtag, vstart, vend) = _children(buf, astart, aend)[:2]
+            key = _NAME_OIDS.get(_oid(buf[ostart:oend]))
+            if key:
+                name[key] = _string(vtag, buf[vstart:vend])
+    return name
+
+
+def _time(tag, raw: bytes) -> datetime:
+    text = raw.decode("ascii").rstrip("Z")
+    if tag == 0x17:  # UTCTime AAMMJJ...
+        year = int(text[:2])
+        text = f"{1900 + year if year >= 50 else 2000 + year}{text[2:]}"
+    return datetime.strptime(text[:14], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+
+
+def parse_der(der: bytes) -> dict:
+    """Certificat DER → dict sérialisable (sujet, émetteur, validité, SAN, empreinte, CA)."""
+    _, cstart, cend = _tlv(der, 0)
+    _, tstart, tend = _children(der, cstart, cend)[0]
+    fields = _children(der, tstart, tend)
+    if fields and fields[0][0] == 0xA0:  # [0] version
+        fields = fields[1:]
+    serial, _, issuer, validity, subject = fields[:5]
+    not_before, not_after = _children(der, validity[1], validity[2])[:2]
+    cert = {
+        "subject": _name(der, subject[1], subject[2]),
+        "issuer": _name(der, issuer[1], issuer[2]),
+        "not_before": _time(not_before[0], der[not_before[1]:not_before[2]]).isoformat(),
+        "not_after": _time(not_after[0], der[not_after[1]:not_after[2]]).isoformat(),
+        "serial": der[serial[1]:serial[2]].hex(),
+        "san": [],
+        "is_ca": False,
+        "self_signed": der[subject[1]:subject[2]] == der[issuer[1]:issuer[2]],
+        "sha256": hashlib.sha256(der).hexdigest(),
+    }
+    for tag, estart, eend in fields[5:]:
+        if tag != 0xA3:  # [3] extensions
+            continue
+        _, lstart, lend = _children(der, estart, eend)[0]
+        for _, xstart, xend in _children(der, lstart, lend):
+            parts = _children(der, xstart, xend)
+            oid = _oid(der[parts[0][1]:parts[0][2]])
+            _, vstart, vend = parts[-1]  # OCTET STRING (le booléen "critical" est optionnel)
+            if oid == _OID_SAN:
+                _, sstart, send = _tlv(der, vstart)
+                for gtag, gstart, gend in _children(der, sstart, send):
+                    if gtag == 0x82:    # dNSName
+                        cert["san"].append(der[gstart:gend].decode("ascii", "replace"))
+                    elif gtag == 0x87:  # iPAddress
+                        raw = der[gstart:gend]
+                        cert["san"].append(socket.inet_ntop(socket.AF_INET if len(raw) == 4 else socket.AF_INET6, raw))
+            elif oid == _OID_BASIC_CONSTRAINTS:
+                _, bstart, bend = _tlv(der, vstart)
+                for btag, bvstart, _ in _children(der, bstart, bend):
+                    if btag == 0x01:
+                        cert["is_ca"] = der[bvstart] != 0
+    return cert
+
+
+def pem_to_ders(text: str):
+    return [base64.b64decode("".join(block.split())) for block in _PEM_RE.findall(text or "")]
+
+
+# =========================
+# Évaluation d'une chaîne
+# =========================
+def hostname_matches(hostname: str, names) -> bool:
+    host = hostname.lower().rstrip(".")
+    for name in names:
+        name = name.lower().rstrip(".")
+        if name == host:
+            return True
+        if name.startswith("*.") and "." in host and host.split(".", 1)[1] == name[2:]:
+            return True
+    return False
+
+
+def evaluate(chain, hostname=None, now=None) -> dict:
+    """
+    Retour: {"days_left", "not_after", "chain_days_left", "issuer", "san", "chain_len", "problems"}
+    days_left: feuille; chain_days_left: plus proche échéance de toute la chaîne.
+    """
+    if not chain:
+        raise CertError("empty certificate chain")
+    now = now or datetime.now(timezone.utc)
+    leaf = chain[0]
+    problems = []
+    days = []
+    for i, cert in enumerate(chain):
+        label = "leaf" if i == 0 else f"chain[{i}] ({cert['subject'].get('CN', '?')})"
+        nb, na = datetime.fromisoformat(cert["not_before"]), datetime.fromisoformat(cert["not_after"])
+        days.append(int((na - now).total_seconds() // 86400))
+        if now < nb:
+            problems.append(f"{label} not valid before {nb:%Y-%m-%d}")
+        if i > 0 and days[-1] < 0:
+            problems.append(f"{label} expired on {na:%Y-%m-%d}")
+        if i + 1 < len(chain) and cert["issuer"] != chain[i + 1]["subject"]:
+            problems.append(f"{label} issued by '{cert['issuer'].get('CN', '?')}' but next certificate is "
+                            f"'{chain[i + 1]['subject'].get('CN', '?')}'")
+    if hostname:
+        names = leaf["san"] or [leaf["subject"].get("CN", "")]
+        if not hostname_matches(hostname, names):
+            problems.append(f"{hostname} not covered by certificate names {names}")
+    return {
+        "days_left": days[0],
+        "not_after": leaf["not_after"],
+        "chain_days_left": min(days),
+        "issuer": leaf["issuer"].get("CN") or leaf["issuer"].get("O", ""),
+        "san": leaf["san"],
+        "chain_len": len(chain),
+        "problems": problems,
+    }
+
+
+# =========================
+# Inspecteur avec cache
+# =========================
+class CertInspector:
+    def __init__(self, cache_file=CACHE_FILE):
+        self.cache_file = cache_file
+        self._files = {}     # chemin -> [mtime_ns, taille, [sha256 du DER, ...]]
+        self._certs = {}     # sha256 du DER -> certificat parsé
+        self._lock = threading.Lock()
+        self.stats = {"parsed": 0, "cache_hits": 0, "handshakes": 0}
+        self._load()
+
+    def _load(self):
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, "r") as f:
+                data = json.load(f)
+            self._files = data.get("files", {})
+            self._certs = data.get("certs", {})
+        except Exception:
+            pass
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        tmp = self.cache_file + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"files": self._files, "certs": self._certs}, f)
+            os.replace(tmp, self.cache_file)
+        except OSError:
+            pass
+
+    def _parse(self, ders):
+        chain, changed = [], False
+        with self._lock:
+            for der in ders:
+                fp = hashlib.sha256(der).hexdigest()
+                cert = self._certs.get(fp)
+                if cert is None:
+                    cert = self._certs[fp] = parse_der(der)
+                    self.stats["parsed"] += 1
+                    changed = True
+                else:
+                    self.stats["cache_hits"] += 1
+                chain.append(cert)
+            if changed:
+                self._save()
+        return chain
+
+    def chain_from_file(self, path):
+        """fullchain.pem sur disque; rien n'est relu tant que (mtime, taille) ne change pas."""
+        st = os.stat(path)
+        with self._lock:
+            hit = self._files.get(path)
+            if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size and all(fp in self._certs for fp in hit[2]):
+                self.stats["cache_hits"] += len(hit[2])
+                return [self._certs[fp] for fp in hit[2]]
+        with open(path, "r") as f:
+            chain = self._parse(pem_to_ders(f.read()))
+        if not chain:
+            raise CertError(f"no certificate in {path}")
+        with self._lock:
+            self._files[path] = [st.st_mtime_ns, st.st_size, [c["sha256"] for c in chain]]
+            self._save()
+        return chain
+
+    def chain_from_pem(self, text):
+        chain = self._parse(pem_to_ders(text))
+        if not chain:
+            raise CertError("no certificate in PEM data")
+        return chain
+
+    def chain_from_server(self, host, port=443, server_name=None, ip=None, timeout=5):
+        """Certificat présenté au handshake (sans vérification: on veut le lire même expiré)."""
+        ctx = ssl.create_default_context()
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+        self.stats["handshakes"] += 1
+        with socket.create_connection((ip or host, port), timeout=timeout) as sock:
+            with ctx.wrap_socket(sock, server_hostname=server_name or host) as tls:
+                der = tls.getpeercert(binary_form=True)
+        if not der:
+            raise CertError(f"no certificate presented by {host}:{port}")
+        return self._parse([der])
+
+
+_inspector = None
+_inspector_lock = threading.Lock()
+
+
+def get_inspector() -> CertInspector:
+    global _inspector
+    with _inspector_lock:
+        if _inspector is None:
+            _inspector = CertInspector()
+        return _inspector
+
+
+def find_host_chain(domain, filename="fullchain.pem") -> str:
+    """Chemin hôte de live/<domaine>/fullchain.pem (bind mount Let's Encrypt), "" si absent."""
+    for base in LE_HOST_PATHS:
+        path = os.path.join(base, domain, filename)
+        if os.path.isfile(path):
+            return path
+    return ""
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: cgroup_sampler.py
+"""
+Échantillonneur de ressources par conteneur, lu directement dans cgroup v2.
+
+Remplace `docker stats --no-stream` (≈2 s bloquantes, plex-server seulement):
+- cpu.stat (usage_usec, nr_throttled, throttled_usec), memory.current, memory.max,
+  memory.stat (inactive_file) et io.stat (rbytes/wbytes) pour chaque conteneur
+- CPU% calculé sur le delta entre deux cycles (100 % = un cœur, comme `docker stats`)
+- échantillon précédent gardé en mémoire (mode daemon) et dans CGROUP_STATE_FILE
+  pour que le mode subprocess ait aussi un delta
+- quelques lectures de fichiers par conteneur: collecte sub-milliseconde
+
+Chemins essayés sous CGROUP_ROOT pour un conteneur <id>:
+  system.slice/docker-<id>.scope (driver systemd), docker/<id> (driver cgroupfs)
+Dans le conteneur de monitoring, monter le cgroupfs de l'hôte (ex: /sys/fs/cgroup:/host/cgroup:ro).
+
+Environment:
+  CGROUP_ROOT (/sys/fs/cgroup), CGROUP_STATE_FILE (/mnt/data/cgroup_sampler_state.json)
+"""
+
+import json
+import os
+import time
+
+CGROUP_ROOT = os.environ.get("CGROUP_ROOT", "/sys/fs/cgroup")
+STATE_FILE = os.environ.get("CGROUP_STATE_FILE", "/mnt/data/cgroup_sampler_state.json")
+PATH_PATTERNS = ("system.slice/docker-{id}.scope", "docker/{id}", "docker.slice/docker-{id}.scope")
+
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _kv(text):
+    out = {}
+    for line in (text or "").splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            out[parts[0]] = int(parts[1])
+    return out
+
+
+def _io_totals(text):
+    rbytes = wbytes = 0
+    for line in (text or "").splitlines():
+        for field in line.split()[1:]:
+            k, _, v = field.partition("=")
+            if k == "rbytes":
+                rbytes += int(v)
+            elif k == "wbytes":
+                wbytes += int(v)
+    return rbytes, wbytes
+
+
+def _host_mem_total():
+    for line in (_read("/proc/meminfo") or "").splitlines():
+        if line.startswith("MemTotal:"):
+            return int(line.split()[1]) * 1024
+    return 0
+
+
+class CgroupSampler:
+    def __init__(self, root=CGROUP_ROOT, state_file=STATE_FILE):
+        self.root = root
+        self.state_file = state_file
+        self._paths = {}
+        self._prev = None
+        self._mem_total = None
+
+    def cgroup_path(self, cid):
+        path = self._paths.get(cid)
+        if path and os.path.isdir(path):
+            return path
+        for pattern in PATH_PATTERNS:
+            path = os.path.join(self.root, pattern.format(id=cid))
+            if os.path.isfile(os.path.join(path, "cpu.stat")):
+                self._paths[cid] = path
+                return path
+        return None
+
+    def _raw(self, path):
+        cpu = _kv(_read(os.path.join(path, "cpu.stat")))
+        mem_current = (_read(os.path.join(path, "memory.current")) or "0").strip()
+        mem_max = (_read(os.path.join(path, "memory.max")) or "max").strip()
+        inactive = _kv(_read(os.path.join(path, "memory.stat"))).get("inactive_file", 0)
+        rbytes, wbytes = _io_totals(_read(os.path.join(path, "io.stat")))
+        return {
+            "usage_usec": cpu.get("usage_usec", 0),
+            "nr_throttled": cpu.get("nr_throttled", 0),
+            "throttled_usec": cpu.get("throttled_usec", 0),
+            "mem": int(mem_current) - inactive if mem_current.isdigit() else 0,
+            "mem_max": int(mem_max) if mem_max.isdigit() else 0,
+            "rbytes": rbytes,
+            "wbytes": wbytes,
+        }
+
+    def _load_prev(self):
+        if self._prev is None:
+            self._prev = {}
+            if self.state_file:
+                try:
+                    with open(self.state_file, "r") as f:
+                        self._prev = json.load(f)
+                except Exception:
+                    pass
+        return self._prev
+
+    def _save(self, current):
+        self._prev = current
+        if not self.state_file:
+            return
+        tmp = self.state_file + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(current, f)
+            os.replace(tmp, self.state_file)
+        except OSError:
+            pass
+
+    def sample(self, containers) -> dict:
+        """
+        containers: {nom: id}. Retour {nom: métriques}; conteneurs sans cgroup trouvé absents.
+        cpu_percent/throttled_pct/io_*_bps valent None au premier échantillon (pas de delta).
+        """
+        now = time.time()
+        prev = self._load_prev()
+        current, out = {}, {}
+        for name, cid in containers.items():
+            path = self.cgroup_path(cid)
+            if path is None:
+                continue
+            raw = self._raw(path)
+            raw["t"], raw["id"] = now, cid
+            current[name] = raw
+            if raw["mem_max"]:
+                limit = raw["mem_max"]
+            else:
+                if self._mem_total is None:
+                    self._mem_total = _host_mem_total()
+                limit = self._mem_total
+            m = {
+                "cpu_percent": None,
+                "mem_mb": round(raw["mem"] / (1024**2), 1),
+                "mem_percent": round(raw["mem"] / limit * 100, 2) if limit else None,
+                "io_read_mb": round(raw["rbytes"] / (1024**2), 2),
+                "io_write_mb": round(raw["wbytes"] / (1024**2), 2),
+                "io_read_bps": None,
+                "io_write_bps": None,
+                "throttled_pct": None,
+                "nr_throttled": 0,
+            }
+            p = prev.get(name)
+            # même conteneur (un redémarrage remet les compteurs à zéro) et horloge qui avance
+            if p and p.get("id") == cid and now > p.get("t", now) and raw["usage_usec"] >= p.get("usage_usec", 0):
+                wall_usec = (now - p["t"]) * 1e6
+                m["cpu_percent"] = round((raw["usage_usec"] - p["usage_usec"]) / wall_usec * 100, 2)
+                m["throttled_pct"] = round((raw["throttled_usec"] - p.get("throttled_usec", 0)) / wall_usec * 100, 2)
+                m["nr_throttled"] = raw["nr_throttled"] - p.get("nr_throttled", 0)
+                m["io_read_bps"] = round(max(0, raw["rbytes"] - p.get("rbytes", 0)) / (now - p["t"]))
+                m["io_write_bps"] = round(max(0, raw["wbytes"] - p.get("wbytes", 0)) / (now - p["t"]))
+            out[name] = m
+        self._save(current)
+        return out
+
+
+_sampler = None
+
+
+def get_sampler() -> CgroupSampler:
+    global _sampler
+    if _sampler is None:
+        _sampler = CgroupSampler()
+    return _sampler
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: cgroup_sampler_test.py
+"""
+Tests de cgroup_sampler.py sur une fausse arborescence cgroup v2 (répertoire temporaire
+avec cpu.stat, memory.*, io.stat): pas besoin de Docker ni de /sys/fs/cgroup.
+
+Couvre: les trois PATH_PATTERNS (systemd, cgroupfs, docker.slice), premier échantillon
+sans delta, CPU%/throttling/débits io sur le delta, reprise du delta par un autre
+processus via CGROUP_STATE_FILE, remise à zéro après redémarrage du conteneur,
+memory.max = "max" (limite = mémoire de l'hôte).
+
+USAGE
+  python3 cgroup_sampler_test.py        (ou python3 -m pytest cgroup_sampler_test.py)
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import cgroup_sampler
+
+MB = 1024 ** 2
+
+
+class FakeCgroupTree:
+    def __init__(self, root):
+        self.root = root
+
+    def write(self, pattern, cid, usage_usec, mem=100 * MB, mem_max=str(400 * MB), inactive=0,
+              rbytes=0, wbytes=0, nr_throttled=0, throttled_usec=0):
+        path = os.path.join(self.root, pattern.format(id=cid))
+        os.makedirs(path, exist_ok=True)
+        files = {
+            "cpu.stat": f"usage_usec {usage_usec}\nuser_usec {usage_usec}\nsystem_usec 0\n"
+                        f"nr_periods 10\nnr_throttled {nr_throttled}\nthrottled_usec {throttled_usec}\n",
+            "memory.current": f"{mem}\n",
+            "memory.max": f"{mem_max}\n",
+            "memory.stat": f"anon {mem}\ninactive_file {inactive}\nactive_file 0\n",
+            # deux périphériques: les octets s'additionnent
+            "io.stat": f"8:0 rbytes={rbytes // 2} wbytes={wbytes // 2} rios=1 wios=1 dbytes=0 dios=0\n"
+                       f"8:16 rbytes={rbytes - rbytes // 2} wbytes={wbytes - wbytes // 2} rios=1 wios=1\n",
+        }
+        for name, text in files.items():
+            with open(os.path.join(path, name), "w") as f:
+                f.write(text)
+        return path
+
+
+class CgroupSamplerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "cgroup")
+        self.state = os.path.join(self.tmp.name, "state.json")
+        self.tree = FakeCgroupTree(self.root)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _sample(self, sampler, containers, at):
+        with mock.patch.object(cgroup_sampler.time, "time", return_value=at):
+            return sampler.sample(containers)
+
+    def test_path_patterns(self):
+        sampler = cgroup_sampler.CgroupSampler(self.root, state_file=None)
+        for n, pattern in enumerate(cgroup_sampler.PATH_PATTERNS):
+            cid = f"c{n}" * 8
+            expected = self.tree.write(pattern, cid, usage_usec=0)
+            self.assertEqual(sampler.cgroup_path(cid), expected)
+        self.assertIsNone(sampler.cgroup_path("absent"))
+
+    def test_first_sample_has_no_delta(self):
+        self.tree.write("system.slice/docker-{id}.scope", "abc", usage_usec=5_000_000,
+                        mem=300 * MB, inactive=100 * MB, rbytes=4 * MB, wbytes=2 * MB)
+        sampler = cgroup_sampler.CgroupSampler(self.root, self.state)
+        out = self._sample(sampler, {"plex": "abc", "gone": "zzz"}, 1000.0)
+        self.assertEqual(list(out), ["plex"])
+        m = out["plex"]
+        self.assertIsNone(m["cpu_percent"])
+        self.assertIsNone(m["io_read_bps"])
+        self.assertEqual(m["mem_mb"], 200.0)          # memory.current - inactive_file
+        self.assertEqual(m["mem_percent"], 50.0)      # / memory.max (400 MB)
+        self.assertEqual((m["io_read_mb"], m["io_write_mb"]), (4.0, 2.0))
+
+    def test_delta_between_cycles(self):
+        self.tree.write("docker/{id}", "abc", usage_usec=1_000_000, rbytes=0, wbytes=0)
+        sampler = cgroup_sampler.CgroupSampler(self.root, self.state)
+        self._sample(sampler, {"plex": "abc"}, 1000.0)
+        # 1.5 s CPU en 2 s = 75 % (100 % = un cœur), 0.2 s throttlé = 10 %
+        self.tree.write("docker/{id}", "abc", usage_usec=2_500_000, rbytes=2 * MB, wbytes=MB,
+                        nr_throttled=4, throttled_usec=200_000)
+        m = self._sample(sampler, {"plex": "abc"}, 1002.0)["plex"]
+        self.assertEqual(m["cpu_percent"], 75.0)
+        self.assertEqual(m["throttled_pct"], 10.0)
+        self.assertEqual(m["nr_throttled"], 4)
+        self.assertEqual(m["io_read_bps"], MB)
+        self.assertEqual(m["io_write_bps"], MB // 2)
+
+    def test_delta_survives_process_restart(self):
+        self.tree.write("docker/{id}", "abc", usage_usec=0)
+        self._sample(cgroup_sampler.CgroupSampler(self.root, self.state), {"plex": "abc"}, 1000.0)
+        self.assertTrue(os.path.isfile(self.state))
+        # mode subprocess: nouvel échantillonneur, même fichier d'état
+        self.tree.write("docker/{id}", "abc", usage_usec=1_000_000)
+        m = self._sample(cgroup_sampler.CgroupSampler(self.root, self.state), {"plex": "abc"}, 1004.0)["plex"]
+        self.assertEqual(m["cpu_percent"], 25.0)
+
+    def test_container_restart_resets_delta(self):
+        self.tree.write("docker/{id}", "old", usage_usec=9_000_000)
+        sampler = cgroup_sampler.CgroupSampler(self.root, self.state)
+        self._sample(sampler, {"plex": "old"}, 1000.0)
+        self.tree.write("docker/{id}", "new", usage_usec=100)
+        self.assertIsNone(self._sample(sampler, {"plex": "new"}, 1002.0)["plex"]["cpu_percent"])
+        # compteur qui recule sur le même id: pas de CPU% négatif
+        self.tree.write("docker/{id}", "new", usage_usec=50)
+        self.assertIsNone(self._sample(sampler, {"plex": "new"}, 1004.0)["plex"]["cpu_percent"])
+
+    def test_unlimited_memory_uses_host_total(self):
+        self.tree.write("docker/{id}", "abc", usage_usec=0, mem=512 * MB, mem_max="max")
+        sampler = cgroup_sampler.CgroupSampler(self.root, state_file=None)
+        with mock.patch.object(cgroup_sampler, "_host_mem_total", return_value=2048 * MB):
+            m = self._sample(sampler, {"plex": "abc"}, 1000.0)["plex"]
+        self.assertEqual(m["mem_percent"], 25.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: deluge_rpc.py
+"""
+Session RPC Deluge partagée et persistante.
+
+Remplace les DelugeRPCClient ouverts (TLS + login) à chaque appel dans
+run_quick_check.py, monitor_repair.py et Health_monit.py:
+- connexion paresseuse (au premier appel), conservée entre les cycles (mode daemon)
+- TCP keepalive sur le socket
+- reconnexion + re-login automatiques si le daemon a redémarré (1 nouvel essai par appel)
+- backoff exponentiel entre tentatives de connexion (échec rapide pendant le backoff)
+- latences de connexion/appel et compteurs exposés par stats()
+
+Environment:
+  DELUGE_HOST (localhost), DELUGE_PORT (58846), DELUGE_USER (localclient), DELUGE_PASSWORD
+  DELUGE_RPC_TIMEOUT (10 s), DELUGE_BACKOFF_MIN (1 s), DELUGE_BACKOFF_MAX (60 s)
+"""
+
+import os
+import socket
+import threading
+import time
+
+DELUGE_HOST = os.environ.get("DELUGE_HOST", "localhost")
+DELUGE_PORT = int(os.environ.get("DELUGE_PORT", "58846"))
+DELUGE_USER = os.environ.get("DELUGE_USER", "localclient")
+DELUGE_PASSWORD = os.environ.get("DELUGE_PASSWORD", "e0db9d7d51b2c62b7987031174607aa822f94bc9")
+RPC_TIMEOUT = float(os.environ.get("DELUGE_RPC_TIMEOUT", "10"))
+BACKOFF_MIN = float(os.environ.get("DELUGE_BACKOFF_MIN", "1"))
+BACKOFF_MAX = float(os.environ.get("DELUGE_BACKOFF_MAX", "60"))
+
+
+class DelugeUnavailable(Exception):
+    """Connexion impossible (ou backoff en cours)."""
+
+
+def _is_remote_error(exc) -> bool:
+    # Erreur levée par le daemon (méthode inconnue, argument invalide...): la connexion est saine
+    try:
+        from deluge_client.client import RemoteException  # type: ignore
+    except Exception:
+        return False
+    return isinstance(exc, RemoteException) and "NotAuthorized" not in type(exc).__name__
+
+
+def _enable_keepalive(client):
+    sock = getattr(client, "_socket", None)
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for opt, val in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3)):
+            if hasattr(socket, opt):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opt), val)
+    except OSError:
+        pass
+
+
+class DelugeSession:
+    def __init__(self, host=DELUGE_HOST, port=DELUGE_PORT, username=DELUGE_USER,
+                 password=DELUGE_PASSWORD, timeout=RPC_TIMEOUT):
+        self.host, self.port = host, int(port)
+        self.username, self.password = username, password
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.RLock()
+        self._backoff = 0.0
+        self._next_attempt = 0.0
+        self._stats = {
+            "connected": False, "connects": 0, "connect_failures": 0, "reconnects": 0,
+            "calls": 0, "call_errors": 0, "last_connect_ms": None, "last_call_ms": None,
+            "avg_call_ms": None, "last_error": "",
+        }
+
+    # ---------- connexion ----------
+    def _connect(self):
+        now = time.monotonic()
+        if now < self._next_attempt:
+            raise DelugeUnavailable(f"backoff ({self._next_attempt - now:.1f}s left): {self._stats['last_error']}")
+        from deluge_client import DelugeRPCClient  # type: ignore
+        t0 = time.perf_counter()
+        client = DelugeRPCClient(self.host, self.port, self.username, self.password, False)
+        try:
+            client.connect()
+        except Exception as e:
+            self._stats["connect_failures"] += 1
+            self._stats["last_error"] = f"connect: {e}"
+            self._backoff = min(BACKOFF_MAX, self._backoff * 2 if self._backoff else BACKOFF_MIN)
+            self._next_attempt = time.monotonic() + self._backoff
+            raise DelugeUnavailable(str(e)) from e
+        _enable_keepalive(client)
+        sock = getattr(client, "_socket", None)
+        if sock is not None and self.timeout:
+            try:
+                sock.settimeout(self.timeout)
+            except OSError:
+                pass
+        self._client = client
+        self._backoff, self._next_attempt = 0.0, 0.0
+        if self._stats["connects"]:
+            self._stats["reconnects"] += 1
+        self._stats["connects"] += 1
+        self._stats["connected"] = True
+        self._stats["last_connect_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        return client
+
+    def _drop(self):
+        client, self._client = self._client, None
+        self._stats["connected"] = False
+        if client is not None:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+    # ---------- appels ----------
+    def call(self, method, *args, **kwargs):
+        """Appel RPC; reconnecte et réessaie une fois si la connexion est tombée."""
+        with self._lock:
+            for attempt in (1, 2):
+                client = self._client or self._connect()
+                t0 = time.perf_counter()
+                try:
+                    result = client.call(method, *args, **kwargs)
+                except Exception as e:
+                    self._stats["call_errors"] += 1
+                    self._stats["last_error"] = f"{method}: {e}"
+                    if _is_remote_error(e) or attempt == 2:
+                        raise
+                    self._drop()
+                    continue
+                ms = (time.perf_counter() - t0) * 1000
+                st = self._stats
+                st["calls"] += 1
+                st["last_call_ms"] = round(ms, 2)
+                st["avg_call_ms"] = round(ms if st["avg_call_ms"] is None else 0.8 * st["avg_call_ms"] + 0.2 * ms, 2)
+                return result
+
+    def ping(self) -> bool:
+        try:
+            self.call("daemon.info")
+            return True
+        except Exception:
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, backoff_sec=round(self._backoff, 1))
+
+
+# =========================
+# Sessions partagées (une par host/port/user)
+# =========================
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(host=DELUGE_HOST, port=DELUGE_PORT, username=DELUGE_USER, password=None) -> DelugeSession:
+    key = (host, int(port), username)
+    with _sessions_lock:
+        sess = _sessions.get(key)
+        if sess is None:
+            sess = _sessions[key] = DelugeSession(host, port, username, password or DELUGE_PASSWORD)
+        elif password and password != sess.password:
+            sess.close()
+            sess.password = password
+        return sess
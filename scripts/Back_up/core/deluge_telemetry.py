@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: deluge_telemetry.py
+"""
+Télémétrie par torrent Deluge, en polling delta.
+
+- core.get_torrents_status(..., diff=True): le daemon ne renvoie que les torrents/champs
+  modifiés depuis l'appel précédent de la même session RPC (deluge_rpc.py).
+- Table mémoire compacte (TorrentRecord, __slots__) fusionnée avec ces deltas.
+- Agrégats tenus incrémentalement (coût ∝ changements, pas ∝ nombre de torrents):
+  compteurs par état, torrents bloqués (Downloading à 0 o/s depuis STALL_AFTER_SEC),
+  top-N des téléchargements les plus lents, octets transférés par tracker, erreurs tracker.
+- Resynchronisation complète (diff=False) toutes les RESYNC_SEC pour purger les torrents supprimés.
+- classify(): modèle d'activité du daemon (idle / healthy / stalled / broken-network) à partir
+  des états, de la file d'attente, des pairs et des annonces tracker — un débit nul sans rien
+  à télécharger est "idle", pas une panne.
+
+En mode daemon (monitor_loop.py) la table persiste entre cycles; en mode subprocess
+chaque exécution repart d'une synchronisation complète.
+
+Environment:
+  DELUGE_STALL_AFTER_SEC (600), DELUGE_TOP_N (5), DELUGE_RESYNC_SEC (3600),
+  DELUGE_BROKEN_TRACKER_RATIO (0.5)
+"""
+
+import heapq
+import os
+import time
+
+STALL_AFTER_SEC = int(os.environ.get("DELUGE_STALL_AFTER_SEC", "600"))
+TOP_N = int(os.environ.get("DELUGE_TOP_N", "5"))
+RESYNC_SEC = int(os.environ.get("DELUGE_RESYNC_SEC", "3600"))
+BROKEN_TRACKER_RATIO = float(os.environ.get("DELUGE_BROKEN_TRACKER_RATIO", "0.5"))
+ACTIVE_STATES = ("Downloading", "Seeding")
+
+# champ Deluge -> attribut TorrentRecord
+FIELDS = {
+    "name": "name",
+    "state": "state",
+    "download_payload_rate": "down_rate",
+    "upload_payload_rate": "up_rate",
+    "eta": "eta",
+    "ratio": "ratio",
+    "progress": "progress",
+    "tracker_host": "tracker",
+    "tracker_status": "tracker_status",
+    "num_peers": "peers",
+    "num_seeds": "seeds",
+    "total_payload_download": "downloaded",
+    "total_payload_upload": "uploaded",
+}
+KEYS = list(FIELDS)
+
+
+def _s(x):
+    return x.decode("utf-8", "ignore") if isinstance(x, (bytes, bytearray)) else x
+
+
+class TorrentRecord:
+    __slots__ = ("name", "state", "down_rate", "up_rate", "eta", "ratio", "progress", "tracker",
+                 "tracker_status", "peers", "seeds", "downloaded", "uploaded", "zero_since")
+
+    def __init__(self):
+        self.name = self.state = self.tracker = self.tracker_status = ""
+        self.down_rate = self.up_rate = self.ratio = self.progress = 0.0
+        self.eta = self.peers = self.seeds = self.downloaded = self.uploaded = 0
+        self.zero_since = None
+
+
+class TorrentTelemetry:
+    def __init__(self, session, stall_after_sec=STALL_AFTER_SEC, top_n=TOP_N, resync_sec=RESYNC_SEC):
+        self.session = session
+        self.stall_after_sec = stall_after_sec
+        self.top_n = top_n
+        self.resync_sec = resync_sec
+        self.table = {}
+        self.state_counts = {}
+        self.downloading = set()      # ids en état Downloading
+        self.active = set()           # ids Downloading ou Seeding (annoncent au tracker)
+        self.queued_downloads = set() # ids Queued pas encore complets
+        self.zero_rate = set()        # ids Downloading à 0 o/s (candidats "stalled")
+        self.tracker_errors = set()
+        self._last_resync = 0.0
+        self._last_reconnects = None
+
+    # ---------- index incrémentaux ----------
+    def _unindex(self, tid, rec):
+        if rec.state:
+            self.state_counts[rec.state] = self.state_counts.get(rec.state, 1) - 1
+        self.downloading.discard(tid)
+        self.active.discard(tid)
+        self.queued_downloads.discard(tid)
+        self.zero_rate.discard(tid)
+        self.tracker_errors.discard(tid)
+
+    def _index(self, tid, rec, now):
+        if rec.state:
+            self.state_counts[rec.state] = self.state_counts.get(rec.state, 0) + 1
+        if rec.state == "Downloading":
+            self.downloading.add(tid)
+            if rec.down_rate <= 0:
+                if rec.zero_since is None:
+                    rec.zero_since = now
+                self.zero_rate.add(tid)
+            else:
+                rec.zero_since = None
+        else:
+            rec.zero_since = None
+        if rec.state in ACTIVE_STATES:
+            self.active.add(tid)
+        elif rec.state == "Queued" and float(rec.progress) < 100:
+            self.queued_downloads.add(tid)
+        if "error" in rec.tracker_status.lower():
+            self.tracker_errors.add(tid)
+
+    def _merge(self, tid, changes, now, moved):
+        rec = self.table.get(tid)
+        if rec is None:
+            rec = self.table[tid] = TorrentRecord()
+            prev_bytes = None
+        else:
+            self._unindex(tid, rec)
+            prev_bytes = rec.downloaded + rec.uploaded
+        for key, value in changes.items():
+            attr = FIELDS.get(_s(key))
+            if attr:
+                setattr(rec, attr, _s(value))
+        if prev_bytes is not None:
+            delta = rec.downloaded + rec.uploaded - prev_bytes
+            if delta > 0:
+                moved[rec.tracker or "unknown"] = moved.get(rec.tracker or "unknown", 0) + delta
+        self._index(tid, rec, now)
+
+    # ---------- polling ----------
+    def poll(self) -> dict:
+        now = time.monotonic()
+        stats = self.session.stats()
+        # nouvelle session RPC côté daemon → son cache diff est vide: resync complète
+        reconnected = self._last_reconnects is not None and stats.get("reconnects") != self._last_reconnects
+        full = not self.table or reconnected or (now - self._last_resync) >= self.resync_sec
+        t0 = time.perf_counter()
+        if full:
+            status = self.session.call("core.get_torrents_status", {}, KEYS)
+        else:
+            status = self.session.call("core.get_torrents_status", {}, KEYS, True)
+        rpc_ms = (time.perf_counter() - t0) * 1000
+        self._last_reconnects = self.session.stats().get("reconnects")
+
+        moved = {}
+        changed = 0
+        if full:
+            seen = {_s(tid) for tid in status}
+            for tid in [t for t in self.table if t not in seen]:
+                self._unindex(tid, self.table.pop(tid))
+            self._last_resync = now
+        for tid, changes in status.items():
+            if changes:
+                self._merge(_s(tid), changes, now, moved)
+                changed += 1
+        return self.aggregates(now, moved, changed, full, rpc_ms)
+
+    def aggregates(self, now=None, moved=None, changed=0, full=False, rpc_ms=0.0) -> dict:
+        now = time.monotonic() if now is None else now
+        stalled = [tid for tid in self.zero_rate
+                   if self.table[tid].zero_since is not None and now - self.table[tid].zero_since >= self.stall_after_sec]
+        slowest = heapq.nsmallest(self.top_n, self.downloading, key=lambda tid: self.table[tid].down_rate)
+        return {
+            "torrents": len(self.table),
+            "states": {k: v for k, v in self.state_counts.items() if v > 0},
+            "stalled": len(stalled),
+            "slowest": [
+                {
+                    "name": self.table[tid].name,
+                    "rate_kbps": round(self.table[tid].down_rate / 1024, 2),
+                    "eta": self.table[tid].eta,
+                    "progress": round(float(self.table[tid].progress), 1),
+                    "peers": self.table[tid].peers,
+                }
+                for tid in slowest
+            ],
+            "tracker_bytes": moved or {},
+            "tracker_errors": len(self.tracker_errors),
+            "downloading": len(self.downloading),
+            "moving": len(self.downloading) - len(self.zero_rate),
+            "queued_downloads": len(self.queued_downloads),
+            "active": len(self.active),
+            "active_tracker_errors": len(self.tracker_errors & self.active),
+            "download_peers": sum(self.table[tid].peers + self.table[tid].seeds for tid in self.downloading),
+            "poll": {"full": full, "changed": changed, "rpc_ms": round(rpc_ms, 2)},
+        }
+
+
+def classify(telemetry, download_kbps=0.0, num_peers=None) -> dict:
+    """
+    Activité du daemon à partir des agrégats de poll() (+ débit / pairs de get_session_status):
+      idle           rien à télécharger, ou seulement des torrents en file (limite de
+                     téléchargements actifs de Deluge atteinte: attente normale)
+      healthy        des téléchargements progressent
+      stalled        des téléchargements actifs ne progressent pas, avec ou sans sources
+                     (un torrent sans pair ni seed bloque aussi la file)
+      broken-network aucun pair et la majorité des annonces tracker des torrents actifs en erreur
+    La durée (stalled depuis N minutes) est jugée par la règle d'alerte, sur plusieurs échantillons.
+    """
+    downloading = telemetry.get("downloading", 0)
+    queued = telemetry.get("queued_downloads", 0)
+    active = telemetry.get("active", 0)
+    tracker_errors = telemetry.get("active_tracker_errors", 0)
+    peers = telemetry.get("download_peers", 0) if num_peers is None else num_peers
+    out = {"downloading": downloading, "moving": telemetry.get("moving", 0), "queued_downloads": queued,
+           "active": active, "active_tracker_errors": tracker_errors, "peers": peers}
+    if active and not peers and tracker_errors >= max(1, BROKEN_TRACKER_RATIO * active):
+        return dict(out, state="broken-network",
+                    reason=f"no peers, {tracker_errors}/{active} active torrents failing to announce")
+    if not downloading:
+        if queued:
+            return dict(out, state="idle", reason=f"{queued} download(s) queued by the active limit")
+        return dict(out, state="idle", reason="nothing to download")
+    if out["moving"] or download_kbps > 0:
+        return dict(out, state="healthy", reason=f"{out['moving']}/{downloading} downloads moving")
+    if not telemetry.get("download_peers", 0):
+        return dict(out, state="stalled", reason=f"{downloading} download(s) with no peers or seeds")
+    return dict(out, state="stalled", reason=f"{downloading} download(s) with known sources at 0 B/s")
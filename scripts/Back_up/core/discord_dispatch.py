@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: discord_dispatch.py
+"""
+Envoi Discord asynchrone: file d'attente + thread d'expédition, pour ne jamais bloquer
+les sondes ni la réparation sur un POST webhook.
+
+- send(msg) ajoute le message à la file et rend la main immédiatement (aucune E/S)
+- le thread "discord-dispatch" attend DISCORD_COALESCE_SEC après le premier message d'une
+  rafale puis regroupe les messages en un seul POST (séparés par "\\n", 2000 caractères
+  max, limite Discord); un message trop long est découpé sur un saut de ligne
+- en-têtes de bucket Discord respectés: X-RateLimit-Remaining = 0 → attente de
+  X-RateLimit-Reset-After avant le POST suivant; 429 → attente de Retry-After (ou
+  retry_after du corps JSON) puis nouvel essai, sans perte
+- erreur réseau / 5xx → backoff exponentiel (1 s, 2 s, 4 s … DISCORD_BACKOFF_MAX);
+  autre 4xx (webhook invalide, corps refusé) → lot abandonné avec un [WARN]
+- persistance: tant que des messages sont en attente, la file est recopiée dans
+  <DISCORD_QUEUE_FILE>.<pid> (écriture atomique, fichier supprimé une fois vide);
+  au démarrage, les fichiers laissés par un processus mort (ou par une incarnation
+  précédente du même pid, cas du pid 1 en conteneur) sont repris et réexpédiés.
+  Un message livré avec plus de DELAY_STAMP_SEC de retard est préfixé de son heure d'origine.
+- à la sortie (atexit), la file est vidée pendant DISCORD_FLUSH_TIMEOUT secondes au plus;
+  le reste attend le prochain démarrage sur disque
+
+USAGE
+  python3 discord_dispatch.py "message" ["message" ...]
+
+Environment:
+  DISCORD_WEBHOOK, DISCORD_QUEUE_FILE (/mnt/data/discord_queue.json), DISCORD_COALESCE_SEC (2),
+  DISCORD_QUEUE_MAX (500), DISCORD_BACKOFF_MAX (300 s), DISCORD_FLUSH_TIMEOUT (5 s, sous le délai de docker stop)
+"""
+
+import atexit
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+QUEUE_FILE = os.environ.get("DISCORD_QUEUE_FILE", "/mnt/data/discord_queue.json")
+COALESCE_SEC = float(os.environ.get("DISCORD_COALESCE_SEC", "2"))
+QUEUE_MAX = int(os.environ.get("DISCORD_QUEUE_MAX", "500"))
+BACKOFF_MAX = float(os.environ.get("DISCORD_BACKOFF_MAX", "300"))
+FLUSH_TIMEOUT = float(os.environ.get("DISCORD_FLUSH_TIMEOUT", "5"))
+MAX_CHARS = 2000
+HTTP_TIMEOUT = 8
+DELAY_STAMP_SEC = 60
+
+
+def webhook_url() -> str:
+    # lu à chaque envoi: discord_notify / monitor_repair chargent le .env après l'import
+    return os.environ.get("DISCORD_WEBHOOK", "").strip()
+
+
+def pack(texts, limit=MAX_CHARS):
+    """(contenu du POST, nombre de textes consommés, reste du premier texte s'il a dû être coupé)."""
+    first = texts[0]
+    if len(first) > limit:
+        cut = first.rfind("\n", 0, limit)
+        cut = cut if cut > 0 else limit
+        return first[:cut], 0, first[cut:].lstrip("\n")
+    content, n = first, 1
+    for text in texts[1:]:
+        if len(content) + 1 + len(text) > limit:
+            break
+        content += "\n" + text
+        n += 1
+    return content, n, None
+
+
+def _pid_alive(pid) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class Dispatcher(threading.Thread):
+    def __init__(self, queue_file=QUEUE_FILE, coalesce_sec=COALESCE_SEC, queue_max=QUEUE_MAX):
+        super().__init__(name="discord-dispatch", daemon=True)
+        self.queue_file = queue_file
+        self.own_file = f"{queue_file}.{os.getpid()}" if queue_file else ""
+        self.coalesce_sec = coalesce_sec
+        self.queue_max = queue_max
+        self._cond = threading.Condition()
+        self._pending = []                 # [{"content", "ts"}], plus ancien d'abord
+        self._dirty = False
+        self._not_before = 0.0             # monotonic: bucket épuisé, 429 ou backoff
+        self._failures = 0
+        self._closing = False
+        self._deadline = None
+        self.posts = 0
+        self.delivered = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.dropped = 0
+        self.recovered = 0
+        self.last_error = ""
+        self._recover()
+
+    # ---------- file ----------
+    def send(self, msg) -> bool:
+        """Met le message en file; False (rien n'est gardé) si aucun webhook n'est configuré."""
+        msg = str(msg or "").strip()
+        if not msg or not webhook_url():
+            return False
+        with self._cond:
+            self._pending.append({"content": msg, "ts": time.time()})
+            if len(self._pending) > self.queue_max:
+                overflow = len(self._pending) - self.queue_max
+                del self._pending[:overflow]
+                self.dropped += overflow
+            self._dirty = True
+            self._cond.notify()
+            if self.ident is None and not self._closing:
+                self.start()
+        return True
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"pending": len(self._pending), "posts": self.posts, "delivered": self.delivered,
+                    "retries": self.retries, "rate_limited": self.rate_limited, "dropped": self.dropped,
+                    "recovered": self.recovered, "backoff_sec": round(max(0.0, self._not_before - time.monotonic()), 1),
+                    "last_error": self.last_error}
+
+    # ---------- persistance ----------
+    def _recover(self):
+        """Reprend les files laissées par des processus terminés (lecture puis suppression = prise exclusive)."""
+        if not self.queue_file:
+            return
+        for path in sorted(glob.glob(glob.escape(self.queue_file) + ".*")) + [self.queue_file]:
+            suffix = path[len(self.queue_file) + 1:]
+            if path != self.queue_file:
+                if not suffix.isdigit():
+                    continue
+                if int(suffix) != os.getpid() and _pid_alive(int(suffix)):
+                    continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    items = json.load(f)
+                os.remove(path)          # un autre processus l'a pris entre-temps → FileNotFoundError
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError) as e:
+                print(f"[WARN] discord queue {path} unreadable: {e}")
+                continue
+            items = [{"content": str(i["content"]), "ts": float(i.get("ts") or time.time())}
+                     for i in items if isinstance(i, dict) and i.get("content")]
+            self._pending.extend(items)
+            self.recovered += len(items)
+        if self._pending:
+            self._pending.sort(key=lambda i: i["ts"])
+            del self._pending[:max(0, len(self._pending) - self.queue_max)]
+            self._dirty = True
+
+    def _persist(self, items):
+        if not self.own_file:
+            return
+        try:
+            if not items:
+                if os.path.exists(self.own_file):
+                    os.remove(self.own_file)
+                return
+            tmp = f"{self.own_file}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(items, f, ensure_ascii=False)
+            os.replace(tmp, self.own_file)
+        except OSError as e:
+            print(f"[WARN] discord queue not persisted: {e}")
+
+    def _sync_disk(self):
+        with self._cond:
+            if not self._dirty:
+                return
+            self._dirty = False
+            items = list(self._pending)
+        self._persist(items)
+
+    # ---------- HTTP ----------
+    def _post(self, content):
+        """(statut, en-têtes, corps); statut None = erreur réseau."""
+        data = json.dumps({"content": content}).encode("utf-8")
+        req = urllib.request.Request(webhook_url(), data=data, method="POST",
+                                     headers={"Content-Type": "application/json",
+                                              "User-Agent": "rober-monitor (discord_dispatch)"})
+        try:
+            with urllib.request.urlopen(req, timeout=HTTP_TIMEOUT) as resp:
+                return resp.status, resp.headers, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+        except (OSError, ValueError) as e:
+            self.last_error = str(e)
+            return None, None, b""
+
+    @staticmethod
+    def _retry_after(headers, body):
+        try:
+            return float(json.loads(body or b"{}").get("retry_after"))
+        except (TypeError, ValueError, AttributeError):
+            pass
+        try:
+            return float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return 1.0
+
+    def _bucket(self, headers):
+        """Bucket épuisé → pas de POST avant Reset-After."""
+        if headers is None:
+            return
+        try:
+            remaining = int(headers.get("X-RateLimit-Remaining"))
+            reset_after = float(headers.get("X-RateLimit-Reset-After"))
+        except (TypeError, ValueError):
+            return
+        if remaining <= 0:
+            self._not_before = max(self._not_before, time.monotonic() + reset_after)
+
+    # ---------- expédition ----------
+    def _render(self, item):
+        delay = time.time() - (item.get("ts") or time.time())
+        if delay > DELAY_STAMP_SEC:
+            return f"`{time.strftime('%d/%m %H:%M:%S', time.localtime(item['ts']))}` {item['content']}"
+        return item["content"]
+
+    def _drop(self, items):
+        # par identité: la file a pu être rognée (QUEUE_MAX) pendant le POST
+        sent = {id(i) for i in items}
+        self._pending[:] = [i for i in self._pending if id(i) not in sent]
+
+    def _deliver_one(self):
+        with self._cond:
+            batch = self._pending[:50]
+            texts = [self._render(i) for i in batch]
+        content, n, rest = pack(texts)
+        status, headers, body = self._post(content)
+        self._bucket(headers)
+        with self._cond:
+            if status is not None and 200 <= status < 300:
+                self.posts += 1
+                self._failures = 0
+                if rest is not None:
+                    batch[0]["content"] = rest
+                else:
+                    self.delivered += n
+                    self._drop(batch[:n])
+                self._dirty = True
+            elif status == 429:
+                self.rate_limited += 1
+                wait = self._retry_after(headers, body)
+                self._not_before = max(self._not_before, time.monotonic() + wait)
+                self.last_error = f"429 rate limited ({wait:.2f}s)"
+            elif status is None or status >= 500:
+                self.retries += 1
+                self._failures += 1
+                wait = min(BACKOFF_MAX, 2 ** (self._failures - 1))
+                self._not_before = max(self._not_before, time.monotonic() + wait)
+                if status is not None:
+                    self.last_error = f"HTTP {status}"
+            else:
+                dropped = max(n, 1)
+                self._drop(batch[:dropped])
+                self.dropped += dropped
+                self._dirty = True
+                self.last_error = f"HTTP {status}"
+                print(f"[WARN] Discord webhook refused {dropped} message(s): HTTP {status} "
+                      f"{(body or b'')[:200].decode('utf-8', 'replace')}")
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending:
+                    break
+                oldest = self._pending[0]["ts"]
+            self._sync_disk()
+            with self._cond:
+                # fenêtre de regroupement comptée depuis le premier message de la rafale
+                while not self._closing:
+                    left = max(oldest + self.coalesce_sec - time.time(), self._not_before - time.monotonic())
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+                if self._closing:
+                    wait = self._not_before - time.monotonic()
+                    if time.monotonic() + max(wait, 0) >= self._deadline:
+                        break
+                    if wait > 0:
+                        self._cond.wait(wait)
+                        continue
+            self._deliver_one()
+            self._sync_disk()
+        self._sync_disk()
+
+    def close(self, timeout=FLUSH_TIMEOUT):
+        """Vide la file pendant `timeout` secondes au plus; le reste reste sur disque pour le prochain démarrage."""
+        with self._cond:
+            if self._closing:
+                return
+            self._closing = True
+            self._deadline = time.monotonic() + timeout
+            self._cond.notify_all()
+        if self.is_alive():
+            self.join(timeout + HTTP_TIMEOUT)
+        with self._cond:
+            items = list(self._pending)
+        self._persist(items)
+        if items:
+            print(f"[WARN] {len(items)} Discord message(s) kept in {self.own_file} for the next start.")
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> Dispatcher:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = Dispatcher()
+            atexit.register(_dispatcher.close)
+            if _dispatcher.pending() and webhook_url():
+                _dispatcher.start()   # file reprise d'un processus précédent
+        return _dispatcher
+
+
+def send(msg) -> bool:
+    return get_dispatcher().send(msg)
+
+
+def dispatcher_stats() -> dict:
+    return get_dispatcher().stats() if _dispatcher is not None else {}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not webhook_url():
+        print("[WARN] DISCORD_WEBHOOK not set.")
+        return 1
+    for msg in argv:
+        send(msg)
+    get_dispatcher().close()
+    return 0 if not get_dispatcher().pending() else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: discord_dispatch_test.py
+"""
+Tests de discord_dispatch.py contre un faux webhook Discord (ThreadingHTTPServer sur
+127.0.0.1): bucket de 2 POST par seconde annoncé par les en-têtes X-RateLimit-*,
+429 avec retry_after, 5xx et 4xx à la demande. Aucun message ne part vers Discord.
+
+Couvre: regroupement d'une rafale en un POST, découpe des messages > 2000 caractères,
+respect du bucket, 429 et 5xx réessayés sans perte, 4xx abandonné, reprise de la file
+d'un processus mort, file gardée sur disque quand le webhook est injoignable à la sortie.
+
+USAGE
+  python3 discord_dispatch_test.py        (ou python3 -m pytest discord_dispatch_test.py)
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import discord_dispatch
+
+BUCKET_SIZE = 2
+BUCKET_RESET_SEC = 1.0
+
+
+class FakeWebhook(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, headers=None, body=b""):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        srv = self.server
+        content = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["content"]
+        now = time.monotonic()
+        with srv.lock:
+            if srv.script:
+                status = srv.script.pop(0)
+                srv.log.append((status, now, content))
+                if status == 429:
+                    body = json.dumps({"message": "You are being rate limited.", "retry_after": 0.3}).encode()
+                    self._reply(429, {"Content-Type": "application/json", "Retry-After": "1"}, body)
+                else:
+                    self._reply(status, body=b'{"message": "scripted"}')
+                return
+            if now >= srv.reset_at:
+                srv.remaining, srv.reset_at = BUCKET_SIZE, now + BUCKET_RESET_SEC
+            if srv.remaining <= 0 or len(content) > discord_dispatch.MAX_CHARS:
+                srv.log.append((429 if srv.remaining <= 0 else 400, now, content))
+                self._reply(429 if srv.remaining <= 0 else 400)
+                return
+            srv.remaining -= 1
+            srv.log.append((204, now, content))
+            self._reply(204, {"X-RateLimit-Limit": str(BUCKET_SIZE), "X-RateLimit-Remaining": str(srv.remaining),
+                              "X-RateLimit-Reset-After": f"{srv.reset_at - now:.3f}"})
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+class DispatcherTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeWebhook)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/api/webhooks/1/token"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        srv = self.server
+        srv.log, srv.script = [], []
+        srv.remaining, srv.reset_at = BUCKET_SIZE, 0.0
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue_file = os.path.join(self.tmp.name, "discord_queue.json")
+        env = mock.patch.dict(os.environ, {"DISCORD_WEBHOOK": self.url})
+        env.start()
+        self.addCleanup(env.stop)
+        self.dispatchers = []
+
+    def tearDown(self):
+        for d in self.dispatchers:
+            d.close(timeout=0.5)
+        self.tmp.cleanup()
+
+    def _dispatcher(self, coalesce_sec=0.1):
+        d = discord_dispatch.Dispatcher(self.queue_file, coalesce_sec=coalesce_sec, queue_max=100)
+        self.dispatchers.append(d)
+        return d
+
+    def _delivered(self):
+        return [content for status, _, content in self.server.log if status == 204]
+
+    def test_burst_coalesced_into_one_post(self):
+        d = self._dispatcher()
+        for n in range(3):
+            self.assertTrue(d.send(f"check {n} failed"))
+        self.assertTrue(_wait_for(lambda: d.stats()["delivered"] == 3))
+        self.assertEqual(self._delivered(), ["check 0 failed\ncheck 1 failed\ncheck 2 failed"])
+        self.assertEqual(d.stats()["posts"], 1)
+
+    def test_long_message_split_on_newline(self):
+        d = self._dispatcher()
+        lines = [f"line {n:03d} " + "x" * 90 for n in range(40)]
+        d.send("\n".join(lines))
+        self.assertTrue(_wait_for(lambda: d.stats()["delivered"] == 1))
+        posts = self._delivered()
+        self.assertGreater(len(posts), 1)
+        self.assertTrue(all(len(p) <= discord_dispatch.MAX_CHARS for p in posts))
+        self.assertEqual("\n".join(posts).splitlines(), lines)
+
+    def test_bucket_headers_respected(self):
+        d = self._dispatcher(coalesce_sec=0)
+        big = "y" * 1500      # un message par POST
+        for _ in range(4):
+            d.send(big)
+        self.assertTrue(_wait_for(lambda: d.stats()["delivered"] == 4))
+        statuses = [s for s, _, _ in self.server.log]
+        self.assertEqual(statuses, [204] * 4)     # jamais de 429: le bucket a été attendu
+        times = [t for _, t, _ in self.server.log]
+        self.assertGreaterEqual(times[2] - times[0], BUCKET_RESET_SEC * 0.9)
+
+    def test_429_retried_without_loss(self):
+        self.server.script = [429]
+        d = self._dispatcher()
+        d.send("plex down")
+        self.assertTrue(_wait_for(lambda: d.stats()["delivered"] == 1))
+        st = d.stats()
+        self.assertEqual((st["rate_limited"], st["dropped"]), (1, 0))
+        self.assertEqual(self._delivered(), ["plex down"])
+        (_, t429, _), (_, t204, _) = self.server.log
+        self.assertGreaterEqual(t204 - t429, 0.25)   # retry_after du corps (0.3 s), pas Retry-After (1 s)
+
+    def test_server_error_backs_off_then_delivers(self):
+        self.server.script = [502]
+        d = self._dispatcher()
+        d.send("vpn down")
+        self.assertTrue(_wait_for(lambda: d.stats()["delivered"] == 1))
+        self.assertEqual((d.stats()["retries"], d.stats()["last_error"]), (1, "HTTP 502"))
+
+    def test_client_error_drops_batch(self):
+        self.server.script = [400]
+        d = self._dispatcher()
+        with mock.patch("builtins.print") as out:
+            d.send("refused")
+            self.assertTrue(_wait_for(lambda: d.stats()["dropped"] == 1))
+        self.assertIn("refused 1 message(s): HTTP 400", out.call_args[0][0])
+        self.assertEqual(d.pending(), 0)
+
+    def test_queue_of_dead_process_recovered(self):
+        dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                              capture_output=True, text=True).stdout.strip()
+        left = f"{self.queue_file}.{dead}"
+        with open(left, "w") as f:
+            json.dump([{"content": "left behind", "ts": time.time() - 600}], f)
+        d = self._dispatcher()
+        self.assertFalse(os.path.exists(left))
+        self.assertEqual((d.pending(), d.stats()["recovered"]), (1, 1))
+        d.start()
+        self.assertTrue(_wait_for(lambda: d.stats()["delivered"] == 1))
+        # livré avec plus de DELAY_STAMP_SEC de retard: préfixé de son heure d'origine
+        self.assertTrue(self._delivered()[0].startswith("`"))
+        self.assertTrue(self._delivered()[0].endswith("left behind"))
+
+    def test_unreachable_webhook_keeps_queue_on_disk(self):
+        os.environ["DISCORD_WEBHOOK"] = "http://127.0.0.1:9/unreachable"
+        d = self._dispatcher()
+        d.send("deluge down")
+        self.assertTrue(_wait_for(lambda: d.stats()["retries"] >= 1))
+        with mock.patch("builtins.print"):
+            d.close(timeout=0.2)
+        with open(d.own_file) as f:
+            self.assertEqual([i["content"] for i in json.load(f)], ["deluge down"])
+
+    def test_no_webhook(self):
+        os.environ["DISCORD_WEBHOOK"] = ""
+        d = self._dispatcher()
+        self.assertFalse(d.send("nowhere"))
+        self.assertEqual(d.pending(), 0)
+
+
+class PackTest(unittest.TestCase):
+    def test_pack_stops_at_limit(self):
+        self.assertEqual(discord_dispatch.pack(["a", "b", "c"], limit=3), ("a\nb", 2, None))
+
+    def test_pack_splits_oversized_first_text(self):
+        self.assertEqual(discord_dispatch.pack(["aaaa\nbbbb", "c"], limit=6), ("aaaa", 0, "bbbb"))
+        self.assertEqual(discord_dispatch.pack(["abcdefgh"], limit=5), ("abcde", 0, "fgh"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: dns_client.py
+"""
+Client DNS A/AAAA en pur Python (asyncio), sans dépendance à `dig`.
+
+- requête envoyée à tous les résolveurs en même temps (UDP, repli TCP si réponse tronquée):
+  le check DNS_MATCH prend un RTT au lieu de 3 × 1,5 s en séquentiel
+- cache des réponses par (résolveur, nom, type) respectant le TTL des enregistrements
+  (réponses vides/NXDOMAIN: DNS_NEGATIVE_TTL_SEC)
+- statistiques RTT par résolveur (dernier, moyenne mobile, erreurs)
+- resolve_a_multi(): même signature/retour que l'ancienne fonction basée sur dig
+  (answers_set, logs), avec repli sur le résolveur système
+
+Environment:
+  DNS_RESOLVERS (1.1.1.1,8.8.8.8,9.9.9.9; "hôte:port" accepté), DNS_TIMEOUT_SEC (1.5),
+  DNS_NEGATIVE_TTL_SEC (30), DNS_GRACE_MS (250: délai laissé aux autres résolveurs après la
+  première réponse valide; un résolveur muet ne coûte donc pas le timeout complet)
+"""
+
+import asyncio
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+RESOLVERS = [r.strip() for r in os.environ.get("DNS_RESOLVERS", "1.1.1.1,8.8.8.8,9.9.9.9").split(",") if r.strip()]
+TIMEOUT_SEC = float(os.environ.get("DNS_TIMEOUT_SEC", "1.5"))
+NEGATIVE_TTL_SEC = int(os.environ.get("DNS_NEGATIVE_TTL_SEC", "30"))
+GRACE_MS = int(os.environ.get("DNS_GRACE_MS", "250"))
+QTYPES = {"A": 1, "AAAA": 28}
+RCODES = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP", 5: "REFUSED"}
+
+
+class DNSError(Exception):
+    pass
+
+
+def _server_addr(server: str, default_port: int):
+    """"1.1.1.1", "127.0.0.1:5353", "[2606:4700::1111]:53" ou IPv6 nue → (hôte, port)."""
+    if server.startswith("["):
+        host, _, port = server[1:].partition("]")
+        return host, int(port.lstrip(":") or default_port)
+    if server.count(":") == 1:
+        host, port = server.split(":")
+        return host, int(port)
+    return server, default_port
+
+
+# =========================
+# Format des messages (RFC 1035)
+# =========================
+def build_query(qid: int, name: str, qtype: int) -> bytes:
+    header = struct.pack(">HHHHHH", qid, 0x0100, 1, 0, 0, 0)  # RD=1
+    labels = [l for l in name.rstrip(".").split(".") if l]
+    qname = b"".join(bytes([len(e)]) + e for e in (l.encode("idna") for l in labels)) + b"\0"
+    return header + qname + struct.pack(">HH", qtype, 1)
+
+
+def _skip_name(buf: bytes, off: int) -> int:
+    while True:
+        if off >= len(buf):
+            raise DNSError("truncated name")
+        length = buf[off]
+        if length == 0:
+            return off + 1
+        if length & 0xC0 == 0xC0:
+            return off + 2
+        off += length + 1
+
+
+def parse_response(buf: bytes, qid: int, qtype: int):
+    """Retour: (rcode, tronquée, [(ip, ttl), ...])."""
+    if len(buf) < 12:
+        raise DNSError("short response")
+    rid, flags, qdcount, ancount, _, _ = struct.unpack(">HHHHHH", buf[:12])
+    if rid != qid:
+        raise DNSError("id mismatch")
+    off = 12
+    for _ in range(qdcount):
+        off = _skip_name(buf, off) + 4
+    records = []
+    for _ in range(ancount):
+        off = _skip_name(buf, off)
+        if off + 10 > len(buf):
+            raise DNSError("truncated record")
+        rtype, _, ttl, rdlen = struct.unpack(">HHIH", buf[off:off + 10])
+        rdata = buf[off + 10:off + 10 + rdlen]
+        off += 10 + rdlen
+        if rtype == qtype == 1 and rdlen == 4:
+            records.append((socket.inet_ntoa(rdata), ttl))
+        elif rtype == qtype == 28 and rdlen == 16:
+            records.append((socket.inet_ntop(socket.AF_INET6, rdata), ttl))
+    return flags & 0x000F, bool(flags & 0x0200), records
+
+
+class _UDPQuery(asyncio.DatagramProtocol):
+    def __init__(self, qid, future):
+        self.qid = qid
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if len(data) >= 2 and struct.unpack(">H", data[:2])[0] == self.qid and not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+# =========================
+# Client
+# =========================
+class DNSClient:
+    def __init__(self, resolvers=None, timeout=TIMEOUT_SEC, negative_ttl=NEGATIVE_TTL_SEC, port=53,
+                 grace_ms=GRACE_MS):
+        self.resolvers = list(resolvers or RESOLVERS)
+        self.timeout = timeout
+        self.grace = grace_ms / 1000.0
+        self.negative_ttl = negative_ttl
+        self.port = port
+        self._cache = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _stat(self, server) -> dict:
+        return self._stats.setdefault(server, {"queries": 0, "errors": 0, "tcp": 0, "last_ms": None,
+                                               "avg_ms": None, "last_error": ""})
+
+    def _record(self, server, rtt_ms=None, error=None):
+        with self._lock:
+            st = self._stat(server)
+            st["queries"] += 1
+            if error:
+                st["errors"] += 1
+                st["last_error"] = error
+            else:
+                st["last_ms"] = round(rtt_ms, 2)
+                st["avg_ms"] = round(rtt_ms if st["avg_ms"] is None else 0.8 * st["avg_ms"] + 0.2 * rtt_ms, 2)
+
+    async def _udp(self, server, query, qid, timeout, tries):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(lambda: _UDPQuery(qid, future),
+                                                           remote_addr=_server_addr(server, self.port))
+        try:
+            per_try = timeout / max(1, tries)
+            for _ in range(max(1, tries)):
+                transport.sendto(query)
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), per_try)
+                except asyncio.TimeoutError:
+                    continue
+            raise asyncio.TimeoutError()
+        finally:
+            transport.close()
+
+    async def _tcp(self, server, query, timeout):
+        async def exchange():
+            reader, writer = await asyncio.open_connection(*_server_addr(server, self.port))
+            try:
+                writer.write(struct.pack(">H", len(query)) + query)
+                await writer.drain()
+                size = struct.unpack(">H", await reader.readexactly(2))[0]
+                return await reader.readexactly(size)
+            finally:
+                writer.close()
+        return await asyncio.wait_for(exchange(), timeout)
+
+    async def query(self, server, name, rtype="A", timeout=None, tries=1) -> dict:
+        """Une requête vers un résolveur. Retour: {"ips", "ttl", "rtt_ms", "rcode", "cached", "error"}."""
+        qtype = QTYPES[rtype]
+        key = (server, name.lower().rstrip("."), qtype)
+        now = time.monotonic()
+        with self._lock:
+            hit = self._cache.get(key)
+        if hit and hit[0] > now:
+            return dict(hit[1], cached=True)
+        timeout = timeout or self.timeout
+        qid = random.getrandbits(16)
+        query = build_query(qid, name, qtype)
+        t0 = time.perf_counter()
+        try:
+            raw = await self._udp(server, query, qid, timeout, tries)
+            rcode, truncated, records = parse_response(raw, qid, qtype)
+            if truncated:
+                with self._lock:
+                    self._stat(server)["tcp"] += 1
+                raw = await self._tcp(server, query, max(0.1, timeout - (time.perf_counter() - t0)))
+                rcode, _, records = parse_response(raw, qid, qtype)
+        except (asyncio.TimeoutError, OSError, DNSError, asyncio.IncompleteReadError) as e:
+            error = "timeout" if isinstance(e, asyncio.TimeoutError) else str(e) or type(e).__name__
+            self._record(server, error=error)
+            return {"ips": [], "ttl": 0, "rtt_ms": None, "rcode": None, "cached": False, "error": error}
+        rtt_ms = (time.perf_counter() - t0) * 1000
+        self._record(server, rtt_ms)
+        ips = sorted({ip for ip, _ in records})
+        ttl = min((t for _, t in records), default=0) if ips else self.negative_ttl
+        result = {"ips": ips, "ttl": ttl, "rtt_ms": round(rtt_ms, 2), "rcode": RCODES.get(rcode, str(rcode)),
+                  "cached": False, "error": None if rcode in (0, 3) else RCODES.get(rcode, str(rcode))}
+        if result["error"] is None and ttl > 0:
+            with self._lock:
+                self._cache[key] = (now + ttl, result)
+        return result
+
+    async def resolve_all(self, name, rtype="A", resolvers=None, timeout=None, tries=1) -> dict:
+        servers = list(resolvers or self.resolvers)
+        tasks = {asyncio.ensure_future(self.query(s, name, rtype, timeout, tries)): s for s in servers}
+        results, pending = {}, set(tasks)
+        deadline = None
+        while pending:
+            wait_for = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                res = results[tasks[task]] = task.result()
+                if deadline is None and res["ips"]:
+                    deadline = time.monotonic() + self.grace
+        for task in pending:
+            task.cancel()
+            results[tasks[task]] = {"ips": [], "ttl": 0, "rtt_ms": None, "rcode": None, "cached": False,
+                                    "error": "late"}
+        return {s: results[s] for s in servers}
+
+    def resolve(self, name, rtype="A", resolvers=None, timeout=None, tries=1) -> dict:
+        """Version synchrone de resolve_all() (appelants en thread, sans boucle asyncio)."""
+        return asyncio.run(self.resolve_all(name, rtype, resolvers, timeout, tries))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {server: dict(st) for server, st in self._stats.items()}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> DNSClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = DNSClient()
+        return _client
+
+
+def resolve_a_multi(domain: str, resolvers=None, timeout=TIMEOUT_SEC, tries=1):
+    """
+    A-records IPv4 via plusieurs résolveurs publics interrogés en parallèle (+ repli système).
+    Retourne (answers_set, details_log)
+    """
+    answers, logs = set(), []
+    for server, res in get_client().resolve(domain, "A", resolvers, timeout, tries).items():
+        if res["error"]:
+            logs.append(f"[DNS] @{server} -> error: {res['error']}")
+        else:
+            rtt = "cache" if res["cached"] else f"{res['rtt_ms']} ms"
+            logs.append(f"[DNS] @{server} -> {res['ips'] if res['ips'] else '∅'} ({rtt})")
+        answers.update(res["ips"])
+    if not answers:
+        try:
+            ai = socket.getaddrinfo(domain, 0, family=socket.AF_INET, type=socket.SOCK_STREAM)
+            ips = sorted({t[4][0] for t in ai})
+            logs.append(f"[DNS] system -> {ips if ips else '∅'}")
+            answers.update(ips)
+        except Exception as e:
+            logs.append(f"[DNS] system -> error: {e}")
+    return answers, logs
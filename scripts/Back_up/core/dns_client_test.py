@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: dns_client_test.py
+"""
+Tests de dns_client.py contre de faux serveurs DNS locaux (UDP + TCP sur le même port
+de 127.0.0.1, réponses construites à la main au format RFC 1035): pas d'accès réseau.
+
+Zone du faux serveur:
+  ok.test    A 192.0.2.10 + 192.0.2.11 (TTL 60 / 30, noms compressés)
+  v6.test    AAAA 2001:db8::1
+  big.test   réponse UDP tronquée (TC), réponse complète en TCP
+  nx.test    NXDOMAIN
+  fail.test  SERVFAIL
+  mute.test  pas de réponse
+
+USAGE
+  python3 dns_client_test.py        (ou python3 -m pytest dns_client_test.py)
+"""
+
+import socket
+import socketserver
+import struct
+import threading
+import time
+import unittest
+from unittest import mock
+
+import dns_client
+
+ZONE = {
+    ("ok.test", 1): [("192.0.2.10", 60), ("192.0.2.11", 30)],
+    ("v6.test", 28): [("2001:db8::1", 120)],
+    ("big.test", 1): [(f"192.0.2.{i}", 300) for i in range(1, 21)],
+}
+
+
+def _question(data):
+    off, labels = 12, []
+    while data[off]:
+        labels.append(data[off + 1:off + 1 + data[off]].decode())
+        off += data[off] + 1
+    qtype = struct.unpack(">H", data[off + 1:off + 3])[0]
+    return ".".join(labels).lower(), qtype, data[12:off + 5]
+
+
+def _answer(data, tcp=False):
+    """Réponse du faux serveur; None = rester muet."""
+    qid = struct.unpack(">H", data[:2])[0]
+    name, qtype, question = _question(data)
+    if name == "mute.test":
+        return None
+    rcode = {"nx.test": 3, "fail.test": 2}.get(name, 0)
+    records = ZONE.get((name, qtype), [])
+    flags = 0x8180 | rcode
+    if name == "big.test" and not tcp:
+        flags |= 0x0200
+        records = records[:1]
+    rr = b""
+    for ip, ttl in records:
+        rdata = socket.inet_pton(socket.AF_INET6 if qtype == 28 else socket.AF_INET, ip)
+        # 0xC00C: pointeur de compression vers le nom de la question
+        rr += struct.pack(">HHHIH", 0xC00C, qtype, 1, ttl, len(rdata)) + rdata
+    return struct.pack(">HHHHHH", qid, flags, 1, len(records), 0, 0) + question + rr
+
+
+class _UDPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        self.server.owner.queries.append(("udp", _question(data)[0]))
+        reply = None if self.server.owner.mute else _answer(data)
+        if reply is not None:
+            sock.sendto(reply, self.client_address)
+
+
+class _TCPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        size = struct.unpack(">H", self.request.recv(2))[0]
+        data = self.request.recv(size)
+        self.server.owner.queries.append(("tcp", _question(data)[0]))
+        reply = _answer(data, tcp=True)
+        if reply is not None:
+            self.request.sendall(struct.pack(">H", len(reply)) + reply)
+
+
+class FakeDNSServer:
+    def __init__(self):
+        self.queries = []
+        self.mute = False
+        for _ in range(20):
+            udp = socketserver.ThreadingUDPServer(("127.0.0.1", 0), _UDPHandler)
+            try:
+                tcp = socketserver.ThreadingTCPServer(("127.0.0.1", udp.server_address[1]), _TCPHandler)
+            except OSError:
+                udp.server_close()
+                continue
+            break
+        else:
+            raise RuntimeError("no free port for UDP+TCP")
+        self.servers = (udp, tcp)
+        for srv in self.servers:
+            srv.owner = self
+            srv.daemon_threads = True
+            threading.Thread(target=srv.serve_forever, daemon=True).start()
+        self.address = f"127.0.0.1:{udp.server_address[1]}"
+
+    def close(self):
+        for srv in self.servers:
+            srv.shutdown()
+            srv.server_close()
+
+
+class DNSClientTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dns = FakeDNSServer()
+        cls.other = FakeDNSServer()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dns.close()
+        cls.other.close()
+
+    def setUp(self):
+        for srv in (self.dns, self.other):
+            srv.queries.clear()
+            srv.mute = False
+        self.client = dns_client.DNSClient([self.dns.address], timeout=1.0, negative_ttl=30, grace_ms=100)
+
+    def _one(self, name, rtype="A"):
+        return self.client.resolve(name, rtype)[self.dns.address]
+
+    def test_a_records_and_ttl(self):
+        res = self._one("ok.test")
+        self.assertEqual(res["ips"], ["192.0.2.10", "192.0.2.11"])
+        self.assertEqual((res["ttl"], res["rcode"], res["error"], res["cached"]), (30, "NOERROR", None, False))
+
+    def test_aaaa(self):
+        self.assertEqual(self._one("v6.test", "AAAA")["ips"], ["2001:db8::1"])
+
+    def test_cache_respects_ttl(self):
+        self._one("ok.test")
+        self.assertTrue(self._one("OK.test.")["cached"])
+        self.assertEqual(len(self.dns.queries), 1)
+        with mock.patch.object(dns_client.time, "monotonic", return_value=time.monotonic() + 31):
+            self.assertFalse(self._one("ok.test")["cached"])
+        self.assertEqual(len(self.dns.queries), 2)
+
+    def test_truncated_udp_falls_back_to_tcp(self):
+        res = self._one("big.test")
+        self.assertEqual(len(res["ips"]), 20)
+        self.assertEqual([q[0] for q in self.dns.queries], ["udp", "tcp"])
+        self.assertEqual(self.client.stats()[self.dns.address]["tcp"], 1)
+
+    def test_nxdomain_is_negative_cached(self):
+        res = self._one("nx.test")
+        self.assertEqual((res["ips"], res["rcode"], res["error"], res["ttl"]), ([], "NXDOMAIN", None, 30))
+        self.assertTrue(self._one("nx.test")["cached"])
+
+    def test_servfail_is_error_not_cached(self):
+        self.assertEqual(self._one("fail.test")["error"], "SERVFAIL")
+        self.assertFalse(self._one("fail.test")["cached"])
+
+    def test_timeout_recorded(self):
+        res = self.client.resolve("mute.test", timeout=0.3)[self.dns.address]
+        self.assertEqual(res["error"], "timeout")
+        st = self.client.stats()[self.dns.address]
+        self.assertEqual((st["queries"], st["errors"], st["last_error"]), (1, 1, "timeout"))
+
+    def test_mute_resolver_only_costs_grace(self):
+        # second serveur muet: on ne l'attend que DNS_GRACE_MS après la première réponse valide
+        self.other.mute = True
+        client = dns_client.DNSClient([self.dns.address, self.other.address], timeout=2.0, grace_ms=100)
+        t0 = time.monotonic()
+        out = client.resolve("ok.test")
+        self.assertLess(time.monotonic() - t0, 1.0)
+        self.assertEqual(out[self.dns.address]["ips"], ["192.0.2.10", "192.0.2.11"])
+        self.assertEqual(out[self.other.address]["error"], "late")
+        self.assertEqual(list(out), [self.dns.address, self.other.address])
+
+    def test_resolve_a_multi(self):
+        with mock.patch.object(dns_client, "_client", self.client):
+            answers, logs = dns_client.resolve_a_multi("ok.test")
+        self.assertEqual(answers, {"192.0.2.10", "192.0.2.11"})
+        self.assertTrue(logs[0].startswith(f"[DNS] @{self.dns.address} -> ['192.0.2.10', '192.0.2.11']"))
+
+    def test_resolve_a_multi_system_fallback(self):
+        with mock.patch.object(dns_client, "_client", self.client), \
+                mock.patch.object(dns_client.socket, "getaddrinfo",
+                                  return_value=[(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("192.0.2.99", 0))]):
+            answers, logs = dns_client.resolve_a_multi("nx.test")
+        self.assertEqual(answers, {"192.0.2.99"})
+        self.assertEqual(logs[-1], "[DNS] system -> ['192.0.2.99']")
+
+
+class MessageTest(unittest.TestCase):
+    def test_parse_rejects_foreign_id(self):
+        query = dns_client.build_query(42, "ok.test", 1)
+        with self.assertRaises(dns_client.DNSError):
+            dns_client.parse_response(_answer(query), 43, 1)
+
+    def test_server_addr(self):
+        self.assertEqual(dns_client._server_addr("1.1.1.1", 53), ("1.1.1.1", 53))
+        self.assertEqual(dns_client._server_addr("127.0.0.1:5353", 53), ("127.0.0.1", 5353))
+        self.assertEqual(dns_client._server_addr("[2606:4700::1111]:5300", 53), ("2606:4700::1111", 5300))
+        self.assertEqual(dns_client._server_addr("2606:4700::1111", 53), ("2606:4700::1111", 53))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: docker_api.py
+"""
+Client Docker Engine API (HTTP sur /var/run/docker.sock), sans binaire `docker`.
+
+Remplace les fork du CLI (docker inspect / exec / stats / ps / restart):
+- pool de connexions keep-alive sur le socket Unix (réutilisées entre sondes et cycles)
+- un seul GET /containers/json par cycle: le résultat est mis en cache jusqu'à
+  new_cycle() (appelé au début de chaque collecte) ou DOCKER_CACHE_TTL_SEC
+- exec: POST /containers/{id}/exec + /exec/{id}/start (flux démultiplexé stdout/stderr)
+  puis GET /exec/{id}/json pour le code retour
+- stats: GET /containers/{id}/stats?stream=false, CPU%/MEM% calculés comme `docker stats`
+
+Environment:
+  DOCKER_SOCKET (/var/run/docker.sock), DOCKER_API_TIMEOUT (10 s),
+  DOCKER_POOL_SIZE (4), DOCKER_CACHE_TTL_SEC (5 s)
+"""
+
+import http.client
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from urllib.parse import quote, urlencode
+
+DOCKER_SOCKET = os.environ.get("DOCKER_SOCKET", "/var/run/docker.sock")
+API_TIMEOUT = float(os.environ.get("DOCKER_API_TIMEOUT", "10"))
+POOL_SIZE = int(os.environ.get("DOCKER_POOL_SIZE", "4"))
+CACHE_TTL_SEC = float(os.environ.get("DOCKER_CACHE_TTL_SEC", "5"))
+
+
+class DockerAPIError(Exception):
+    """Réponse HTTP en erreur ou socket Docker injoignable."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=API_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+def _demux(raw: bytes):
+    """Flux multiplexé Docker: [type(1) 0 0 0 taille(4, BE)] + payload."""
+    out, err = [], []
+    i, n = 0, len(raw)
+    while i + 8 <= n:
+        stream, size = raw[i], struct.unpack(">I", raw[i + 4:i + 8])[0]
+        chunk = raw[i + 8:i + 8 + size]
+        (err if stream == 2 else out).append(chunk)
+        i += 8 + size
+    if i < n and not out and not err:
+        # TTY ou flux non multiplexé
+        out.append(raw)
+    return b"".join(out), b"".join(err)
+
+
+class DockerClient:
+    def __init__(self, socket_path=DOCKER_SOCKET, pool_size=POOL_SIZE, timeout=API_TIMEOUT,
+                 cache_ttl=CACHE_TTL_SEC):
+        self.socket_path = socket_path
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self._idle = []
+        self._pool_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._containers = None
+        self._containers_at = 0.0
+        self._stats = {"requests": 0, "connects": 0, "errors": 0, "container_list_calls": 0,
+                       "last_request_ms": None}
+
+    # ---------- transport ----------
+    def _acquire(self):
+        with self._pool_lock:
+            if self._idle:
+                return self._idle.pop(), True
+        self._stats["connects"] += 1
+        return UnixHTTPConnection(self.socket_path, self.timeout), False
+
+    def _release(self, conn):
+        with self._pool_lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._pool_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def request(self, method, path, params=None, body=None, timeout=None):
+        """Requête JSON sur une connexion du pool. Retour: (status, données décodées ou None)."""
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Host": "docker"}
+        if payload is not None:
+            headers["Content-Type"] = "application/json"
+        for attempt in (1, 2):
+            conn, reused = self._acquire()
+            t0 = time.perf_counter()
+            try:
+                conn.timeout = timeout or self.timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(conn.timeout)
+                conn.request(method, path, body=payload, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                # connexion keep-alive fermée côté daemon: un nouvel essai sur une connexion neuve
+                if reused and attempt == 1:
+                    continue
+                self._stats["errors"] += 1
+                raise DockerAPIError(f"{method} {path}: {e}") from e
+            self._stats["requests"] += 1
+            self._stats["last_request_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            data = None
+            if raw:
+                try:
+                    data = json.loads(raw)
+                except ValueError:
+                    data = raw.decode("utf-8", "replace")
+            if resp.status >= 400:
+                self._stats["errors"] += 1
+                msg = data.get("message") if isinstance(data, dict) else data
+                raise DockerAPIError(f"{method} {path}: HTTP {resp.status} {msg}", resp.status)
+            return resp.status, data
+
+    # ---------- conteneurs (cache par cycle) ----------
+    def new_cycle(self):
+        """Invalide le cache /containers/json (début de collecte)."""
+        with self._cache_lock:
+            self._containers = None
+
+    def containers(self) -> dict:
+        """{nom: résumé /containers/json}; un seul appel par cycle, même avec des sondes concurrentes."""
+        with self._cache_lock:
+            if self._containers is None or (time.monotonic() - self._containers_at) > self.cache_ttl:
+                _, data = self.request("GET", "/containers/json", {"all": "1"})
+                table = {}
+                for c in data or []:
+                    for name in c.get("Names") or []:
+                        table[name.lstrip("/")] = c
+                self._containers = table
+                self._containers_at = time.monotonic()
+                self._stats["container_list_calls"] += 1
+            return self._containers
+
+    def is_running(self, name) -> bool:
+        c = self.containers().get(name)
+        return bool(c) and c.get("State") == "running"
+
+    def running_names(self) -> list:
+        return sorted(n for n, c in self.containers().items() if c.get("State") == "running")
+
+    def _container_id(self, name):
+        c = self.containers().get(name)
+        return c["Id"] if c else name
+
+    # ---------- exec ----------
+    def exec(self, container, cmd, timeout=None):
+        """Équivalent de `docker exec container cmd...`. Retour: (rc, stdout, stderr) en texte."""
+        _, created = self.request("POST", f"/containers/{quote(self._container_id(container), safe='')}/exec",
+                                  body={"Cmd": list(cmd), "AttachStdout": True, "AttachStderr": True, "Tty": False})
+        exec_id = created["Id"]
+        # /exec/{id}/start détourne la connexion (flux brut jusqu'à la fin du process): connexion dédiée
+        conn = UnixHTTPConnection(self.socket_path, timeout or self.timeout)
+        try:
+            conn.request("POST", f"/exec/{exec_id}/start", body=json.dumps({"Detach": False, "Tty": False}),
+                         headers={"Host": "docker", "Content-Type": "application/json"})
+            resp = conn.getresponse()
+            raw = resp.read()
+        except (OSError, http.client.HTTPException) as e:
+            self._stats["errors"] += 1
+            raise DockerAPIError(f"exec {container} {cmd[:1]}: {e}") from e
+        finally:
+            conn.close()
+        if resp.status >= 400:
+            self._stats["errors"] += 1
+            raise DockerAPIError(f"exec {container}: HTTP {resp.status} {raw[:200]!r}", resp.status)
+        out, err = _demux(raw)
+        _, info = self.request("GET", f"/exec/{exec_id}/json")
+        rc = info.get("ExitCode") if isinstance(info, dict) else None
+        return (rc if rc is not None else -1,
+                out.decode("utf-8", "replace").strip(), err.decode("utf-8", "replace").strip())
+
+    # ---------- stats / actions ----------
+    def stats(self, container) -> dict:
+        """CPU% et MEM% (mêmes formules que `docker stats --no-stream`)."""
+        _, s = self.request("GET", f"/containers/{quote(container, safe='')}/stats", {"stream": "false"},
+                            timeout=max(self.timeout, 5))
+        cpu, pre = s.get("cpu_stats") or {}, s.get("precpu_stats") or {}
+        cpu_delta = (cpu.get("cpu_usage", {}).get("total_usage", 0)
+                     - pre.get("cpu_usage", {}).get("total_usage", 0))
+        sys_delta = cpu.get("system_cpu_usage", 0) - pre.get("system_cpu_usage", 0)
+        online = cpu.get("online_cpus") or len(cpu.get("cpu_usage", {}).get("percpu_usage") or []) or 1
+        cpu_pct = (cpu_delta / sys_delta) * online * 100.0 if cpu_delta > 0 and sys_delta > 0 else 0.0
+        mem = s.get("memory_stats") or {}
+        mstats = mem.get("stats") or {}
+        used = mem.get("usage", 0) - mstats.get("inactive_file", mstats.get("total_inactive_file", 0))
+        limit = mem.get("limit", 0)
+        mem_pct = used / limit * 100.0 if limit else 0.0
+        return {"cpu_percent": round(cpu_pct, 2), "mem_percent": round(mem_pct, 2),
+                "mem_used_bytes": used, "mem_limit_bytes": limit}
+
+    def restart(self, container, timeout=10):
+        self.request("POST", f"/containers/{quote(container, safe='')}/restart", {"t": str(int(timeout))},
+                     timeout=self.timeout + timeout)
+        self.new_cycle()
+
+    def api_stats(self) -> dict:
+        with self._pool_lock:
+            return dict(self._stats, idle_connections=len(self._idle))
+
+
+# =========================
+# Client partagé
+# =========================
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(socket_path=DOCKER_SOCKET) -> DockerClient:
+    global _client
+    with _client_lock:
+        if _client is None or _client.socket_path != socket_path:
+            _client = DockerClient(socket_path)
+        return _client
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: docker_api_test.py
+"""
+Tests de docker_api.py contre un faux daemon Docker sur un socket Unix temporaire
+(BaseHTTPRequestHandler en HTTP/1.1 keep-alive): pas besoin de /var/run/docker.sock.
+
+Couvre: cache /containers/json par cycle, réutilisation des connexions du pool,
+nouvel essai quand le daemon a fermé une connexion keep-alive, exec (flux démultiplexé
++ code retour), calcul CPU%/MEM% de stats(), erreurs HTTP → DockerAPIError.
+
+USAGE
+  python3 docker_api_test.py        (ou python3 -m pytest docker_api_test.py)
+"""
+
+import json
+import os
+import socketserver
+import struct
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+import docker_api
+
+CONTAINERS = [
+    {"Id": "aaa111", "Names": ["/plex"], "State": "running"},
+    {"Id": "bbb222", "Names": ["/deluge"], "State": "exited"},
+]
+STATS = {
+    "cpu_stats": {"cpu_usage": {"total_usage": 400}, "system_cpu_usage": 2000, "online_cpus": 2},
+    "precpu_stats": {"cpu_usage": {"total_usage": 200}, "system_cpu_usage": 1000},
+    "memory_stats": {"usage": 600, "limit": 1000, "stats": {"inactive_file": 100}},
+}
+
+
+def _frame(stream, data):
+    return bytes([stream, 0, 0, 0]) + struct.pack(">I", len(data)) + data
+
+
+class FakeDocker(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        return "docker.sock"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=None, raw=None, close=False):
+        payload = raw if raw is not None else (json.dumps(body).encode() if body is not None else b"")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if close:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        srv = self.server
+        srv.calls.append(("GET", self.path))
+        if self.path.startswith("/containers/json"):
+            self._reply(200, CONTAINERS)
+        elif self.path.startswith("/containers/plex/stats"):
+            self._reply(200, STATS)
+        elif self.path.startswith("/exec/ex1/json"):
+            self._reply(200, {"ExitCode": 3})
+        else:
+            self._reply(404, {"message": "No such container"})
+        if srv.drop_after_reply:
+            # daemon qui ferme la connexion keep-alive sans prévenir
+            srv.drop_after_reply = False
+            self.close_connection = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"null")
+        self.server.calls.append(("POST", self.path, body))
+        if self.path == "/containers/aaa111/exec":
+            self._reply(201, {"Id": "ex1"})
+        elif self.path == "/exec/ex1/start":
+            raw = _frame(1, b"hello\n") + _frame(2, b"oops\n") + _frame(1, b"world\n")
+            self._reply(200, raw=raw, close=True)
+        elif self.path.startswith("/containers/plex/restart"):
+            self._reply(204)
+        else:
+            self._reply(404, {"message": "not found"})
+
+
+class FakeDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        super().__init__(path, FakeDocker)
+        self.calls = []
+        self.drop_after_reply = False
+
+
+class DockerClientTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sock = os.path.join(self.tmp.name, "docker.sock")
+        self.daemon = FakeDaemon(self.sock)
+        threading.Thread(target=self.daemon.serve_forever, daemon=True).start()
+        self.client = docker_api.DockerClient(self.sock, pool_size=2, timeout=5, cache_ttl=60)
+
+    def tearDown(self):
+        self.client.close()
+        self.daemon.shutdown()
+        self.daemon.server_close()
+        self.tmp.cleanup()
+
+    def _list_calls(self):
+        return [c for c in self.daemon.calls if c[1].startswith("/containers/json")]
+
+    def test_container_list_cached_until_new_cycle(self):
+        self.assertTrue(self.client.is_running("plex"))
+        self.assertFalse(self.client.is_running("deluge"))
+        self.assertFalse(self.client.is_running("absent"))
+        self.assertEqual(self.client.running_names(), ["plex"])
+        self.assertEqual(len(self._list_calls()), 1)
+        self.client.new_cycle()
+        self.client.containers()
+        self.assertEqual(len(self._list_calls()), 2)
+        self.assertEqual(self.client.api_stats()["container_list_calls"], 2)
+
+    def test_keepalive_connection_reused(self):
+        for _ in range(5):
+            self.client.request("GET", "/containers/json")
+        st = self.client.api_stats()
+        self.assertEqual(st["requests"], 5)
+        self.assertEqual(st["connects"], 1)
+        self.assertEqual(st["idle_connections"], 1)
+
+    def test_retry_on_connection_closed_by_daemon(self):
+        self.daemon.drop_after_reply = True
+        self.client.request("GET", "/containers/json")
+        status, data = self.client.request("GET", "/containers/json")
+        self.assertEqual(status, 200)
+        self.assertEqual(data[0]["Id"], "aaa111")
+        self.assertEqual(self.client.api_stats()["errors"], 0)
+
+    def test_exec_demux_and_exit_code(self):
+        rc, out, err = self.client.exec("plex", ["echo", "hello"])
+        self.assertEqual((rc, out, err), (3, "hello\nworld", "oops"))
+        posted = [c for c in self.daemon.calls if c[0] == "POST" and c[1].endswith("/exec")]
+        self.assertEqual(posted[0][2]["Cmd"], ["echo", "hello"])
+
+    def test_stats_matches_docker_cli(self):
+        st = self.client.stats("plex")
+        # (400-200)/(2000-1000) * 2 CPU * 100; (600-100)/1000
+        self.assertEqual(st["cpu_percent"], 40.0)
+        self.assertEqual(st["mem_percent"], 50.0)
+        self.assertEqual(st["mem_used_bytes"], 500)
+
+    def test_http_error_raises(self):
+        with self.assertRaises(docker_api.DockerAPIError) as ctx:
+            self.client.request("GET", "/containers/nope/json")
+        self.assertEqual(ctx.exception.status, 404)
+        self.assertIn("No such container", str(ctx.exception))
+        self.assertEqual(self.client.api_stats()["errors"], 1)
+
+    def test_restart_invalidates_cache(self):
+        self.client.containers()
+        self.client.restart("plex", timeout=1)
+        self.client.containers()
+        self.assertEqual(len(self._list_calls()), 2)
+
+    def test_unreachable_socket(self):
+        client = docker_api.DockerClient(os.path.join(self.tmp.name, "missing.sock"), timeout=1)
+        with self.assertRaises(docker_api.DockerAPIError):
+            client.request("GET", "/containers/json")
+
+
+class DemuxTest(unittest.TestCase):
+    def test_raw_tty_stream_passthrough(self):
+        self.assertEqual(docker_api._demux(b"plain"), (b"plain", b""))
+
+
+if __name__ == "__main__":
+    unittest.main()
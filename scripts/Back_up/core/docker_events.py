@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: docker_events.py
+"""
+État des conteneurs piloté par le flux Docker GET /events (au lieu d'un polling par cycle).
+
+- Abonnement aux événements conteneur start / die / health_status / oom sur une connexion
+  dédiée au socket Docker (docker_api.UnixHTTPConnection), dans un thread daemon.
+- Table en mémoire {nom: {"running", "health", "exit_code", "oom", "event", "since"}},
+  initialisée par un /containers/json à chaque (re)connexion puis tenue à jour par les événements.
+- Callback on_event(name, action, state) appelé dès réception (alerte en < 1 s sur un die/oom).
+- Reconnexion avec backoff exponentiel; pendant une coupure, live=False et les appelants
+  repassent sur docker_api (active_watcher() renvoie None).
+
+Environment:
+  DOCKER_EVENTS_BACKOFF_MAX (30 s)
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlencode
+
+import docker_api
+
+EVENTS = ["start", "die", "health_status", "oom"]
+BACKOFF_MAX = float(os.environ.get("DOCKER_EVENTS_BACKOFF_MAX", "30"))
+
+
+class ContainerWatcher(threading.Thread):
+    def __init__(self, names=None, on_event=None, client=None):
+        super().__init__(name="docker-events", daemon=True)
+        self.names = set(names) if names else None
+        self.on_event = on_event
+        self.client = client or docker_api.get_client()
+        self.table = {}
+        self.live = False
+        self.events_seen = 0
+        self.reconnects = 0
+        self.last_error = ""
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._conn = None
+
+    # ---------- lecture ----------
+    def _watched(self, name):
+        return self.names is None or name in self.names
+
+    def covers(self, name) -> bool:
+        return self._watched(name)
+
+    def is_running(self, name):
+        with self._lock:
+            st = self.table.get(name)
+            return bool(st and st["running"])
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: dict(st) for name, st in self.table.items()}
+
+    def stats(self) -> dict:
+        return {"live": self.live, "events": self.events_seen, "reconnects": self.reconnects,
+                "last_error": self.last_error}
+
+    # ---------- état ----------
+    def _seed(self):
+        self.client.new_cycle()
+        table = {}
+        for name, c in self.client.containers().items():
+            if not self._watched(name):
+                continue
+            status = c.get("Status") or ""
+            health = None
+            for h in ("healthy", "unhealthy", "starting"):
+                if f"({h}" in status:
+                    health = h
+            table[name] = {"running": c.get("State") == "running", "health": health, "exit_code": None,
+                           "oom": False, "event": "seed", "since": time.time()}
+        with self._lock:
+            self.table = table
+
+    def _apply(self, ev):
+        actor = ev.get("Actor") or {}
+        attrs = actor.get("Attributes") or {}
+        name = attrs.get("name") or ""
+        if not name or not self._watched(name):
+            return
+        action = ev.get("Action") or ev.get("status") or ""
+        ts = ev.get("timeNano", 0) / 1e9 or ev.get("time") or time.time()
+        with self._lock:
+            st = self.table.setdefault(name, {"running": False, "health": None, "exit_code": None,
+                                              "oom": False, "event": "", "since": ts})
+            if action == "start":
+                st.update(running=True, exit_code=None, oom=False, health=None)
+            elif action == "die":
+                code = attrs.get("exitCode")
+                st.update(running=False, exit_code=int(code) if code and code.lstrip("-").isdigit() else None)
+            elif action == "oom":
+                st["oom"] = True
+            elif action.startswith("health_status"):
+                health = action.split(":", 1)[1].strip() if ":" in action else None
+                if health == st["health"]:
+                    return
+                # un healthcheck ne tourne que dans un conteneur démarré
+                st.update(health=health, running=True)
+            st.update(event=action.split(":", 1)[0], since=ts)
+            state = dict(st)
+        self.events_seen += 1
+        if self.on_event:
+            try:
+                self.on_event(name, action, state)
+            except Exception as e:
+                print(f"[WARN] docker_events callback failed: {e}")
+
+    # ---------- flux ----------
+    def _stream(self):
+        params = {"filters": json.dumps({"type": ["container"], "event": EVENTS})}
+        conn = docker_api.UnixHTTPConnection(self.client.socket_path, timeout=self.client.timeout)
+        self._conn = conn
+        try:
+            conn.request("GET", f"/events?{urlencode(params)}", headers={"Host": "docker"})
+            resp = conn.getresponse()
+            if resp.status != 200:
+                raise docker_api.DockerAPIError(f"GET /events: HTTP {resp.status}", resp.status)
+            # flux sans fin: plus de timeout de lecture une fois abonné
+            conn.sock.settimeout(None)
+            # abonné avant l'instantané: aucun événement perdu entre les deux
+            self._seed()
+            self.live = True
+            while not self._stop_event.is_set():
+                line = resp.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if line:
+                    try:
+                        self._apply(json.loads(line))
+                    except ValueError:
+                        continue
+        finally:
+            self.live = False
+            self._conn = None
+            conn.close()
+
+    def run(self):
+        backoff = 0.0
+        while not self._stop_event.is_set():
+            try:
+                self._stream()
+                backoff = 0.0
+            except Exception as e:
+                self.last_error = str(e)
+                backoff = min(BACKOFF_MAX, backoff * 2 if backoff else 1.0)
+            if self._stop_event.is_set():
+                break
+            self.reconnects += 1
+            self._stop_event.wait(backoff)
+
+    def stop(self):
+        self._stop_event.set()
+        conn = self._conn
+        if conn is not None and conn.sock is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+# =========================
+# Watcher partagé (mode daemon de monitor_loop.py)
+# =========================
+_watcher = None
+
+
+def start_watcher(names=None, on_event=None) -> ContainerWatcher:
+    global _watcher
+    if _watcher is None or not _watcher.is_alive():
+        _watcher = ContainerWatcher(names, on_event)
+        _watcher.start()
+    return _watcher
+
+
+def active_watcher():
+    """Watcher connecté au flux d'événements, sinon None (→ polling docker_api)."""
+    w = _watcher
+    return w if w is not None and w.live else None
+
+
+def watcher_stats() -> dict:
+    w = _watcher
+    return w.stats() if w is not None else {"live": False, "events": 0, "reconnects": 0, "last_error": ""}
+
+
+def stop_watcher():
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: http_probe.py
+"""
+Client de sondes HTTP(S) en process (http.client + ssl), à la place des `curl` forkés.
+
+- pool de connexions keep-alive par (schéma, hôte, port, IP forcée): un check /identity
+  local réutilise le socket du cycle précédent au lieu d'un fork + TCP (+ TLS) neufs
+- épinglage hôte → IP façon `curl --resolve`: connexion vers l'IP donnée, SNI, vérification
+  du certificat et en-tête Host restent ceux du domaine (simulation externe)
+- head_then_get(): HEAD puis GET si le HEAD n'a pas donné un code attendu
+- retries bornés (timeouts, resets, 408/429/5xx), backoff 1 s doublé comme curl --retry;
+  un port fermé (ECONNREFUSED), un nom inexistant ou un certificat refusé ne sont pas retentés
+- deadline (time.monotonic()) optionnelle: timeouts ramenés au temps restant, plus de retry
+  une fois dépassée (la sonde rend la main avant le délai de probe_engine)
+- temps séparés par requête: dns_ms, connect_ms, tls_ms, ttfb_ms, total_ms
+  (0 pour dns/connect/tls quand la connexion est réutilisée)
+- un socket keep-alive fermé côté serveur est rejoué aussitôt sur une connexion neuve,
+  sans consommer de retry
+
+Environment:
+  CONNECT_TIMEOUT (3), MAX_TIME (10, par tentative), RETRIES (2) — mêmes variables que les curl,
+  HTTP_POOL_SIZE (2 connexions inactives max par cible), HTTP_IDLE_SEC (30),
+  HTTP_RETRY_DELAY_SEC (1.0)
+"""
+
+import http.client
+import os
+import socket
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+CONNECT_TIMEOUT = float(os.environ.get("CONNECT_TIMEOUT", "3"))
+MAX_TIME = float(os.environ.get("MAX_TIME", "10"))
+RETRIES = int(os.environ.get("RETRIES", "2"))
+POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "2"))
+IDLE_SEC = float(os.environ.get("HTTP_IDLE_SEC", "30"))
+RETRY_DELAY_SEC = float(os.environ.get("HTTP_RETRY_DELAY_SEC", "1.0"))
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+OK_CODES = {"200", "301", "302", "401", "403"}
+READ_LIMIT = 64 * 1024
+USER_AGENT = "rober-monitor/1"
+
+# fermeture d'un keep-alive côté serveur, visible seulement au premier envoi
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, BrokenPipeError,
+                 ConnectionResetError, ConnectionAbortedError)
+
+
+class ProbeError(Exception):
+    def __init__(self, phase, kind, message=""):
+        super().__init__(message or f"{phase} {kind}")
+        self.phase = phase
+        self.kind = kind
+
+
+class _ProbeConnection(http.client.HTTPConnection):
+    """HTTPConnection dont connect() est chronométré par phase et peut viser une IP forcée."""
+
+    def __init__(self, host, port, pin=None, connect_timeout=CONNECT_TIMEOUT, timeout=MAX_TIME,
+                 ssl_context=None):
+        super().__init__(host, port, timeout=timeout)
+        self.pin = pin
+        self.connect_timeout = connect_timeout
+        self.ssl_context = ssl_context
+        self.ip = pin
+        self.timings = {}
+        self.last_used = 0.0
+
+    def connect(self):
+        t0 = time.perf_counter()
+        if self.pin:
+            addrs = [self.pin]
+        else:
+            try:
+                infos = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)
+            except socket.gaierror as e:
+                raise ProbeError("dns", "error", str(e))
+            addrs = list(dict.fromkeys(info[4][0] for info in infos))
+        t1 = time.perf_counter()
+        sock, err = None, None
+        for ip in addrs:
+            try:
+                sock = socket.create_connection((ip, self.port), timeout=self.connect_timeout)
+                self.ip = ip
+                break
+            except ConnectionRefusedError as e:
+                err = ProbeError("connect", "refused", str(e))
+            except socket.timeout:
+                err = ProbeError("connect", "timeout")
+            except OSError as e:
+                err = ProbeError("connect", "error", str(e))
+        if sock is None:
+            raise err or ProbeError("connect", "error", "no address")
+        t2 = time.perf_counter()
+        if self.ssl_context is not None:
+            try:
+                sock.settimeout(self.connect_timeout)
+                sock = self.ssl_context.wrap_socket(sock, server_hostname=self.host)
+            except ssl.SSLCertVerificationError as e:
+                sock.close()
+                raise ProbeError("tls", "cert", e.verify_message or str(e))
+            except (ssl.SSLError, OSError) as e:
+                sock.close()
+                raise ProbeError("tls", "timeout" if isinstance(e, socket.timeout) else "error", str(e))
+        t3 = time.perf_counter()
+        sock.settimeout(self.timeout)
+        self.sock = sock
+        self.timings = {"dns_ms": round((t1 - t0) * 1000, 2), "connect_ms": round((t2 - t1) * 1000, 2),
+                        "tls_ms": round((t3 - t2) * 1000, 2) if self.ssl_context is not None else None}
+
+
+class HTTPProbeClient:
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, max_time=MAX_TIME, retries=RETRIES,
+                 pool_size=POOL_SIZE, idle_sec=IDLE_SEC, retry_delay=RETRY_DELAY_SEC):
+        self.connect_timeout = connect_timeout
+        self.max_time = max_time
+        self.retries = retries
+        self.pool_size = pool_size
+        self.idle_sec = idle_sec
+        self.retry_delay = retry_delay
+        self._idle = {}      # clé -> [connexions keep-alive inactives]
+        self._stats = {}     # "hôte:port" (ou "hôte:port@ip") -> compteurs
+        self._lock = threading.Lock()
+        self._ctx = {}
+
+    # ---------- pool ----------
+    def _context(self, verify):
+        ctx = self._ctx.get(verify)
+        if ctx is None:
+            ctx = ssl.create_default_context()
+            if not verify:
+                ctx.check_hostname = False
+                ctx.verify_mode = ssl.CERT_NONE
+            self._ctx[verify] = ctx
+        return ctx
+
+    def _acquire(self, key, connect_timeout, max_time):
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key) or []
+            while idle:
+                conn = idle.pop()
+                if now - conn.last_used <= self.idle_sec and conn.sock is not None:
+                    conn.timeout = max_time
+                    conn.sock.settimeout(max_time)
+                    return conn, True
+                conn.close()
+        scheme, host, port, pin, verify = key
+        ctx = self._context(verify) if scheme == "https" else None
+        return _ProbeConnection(host, port, pin, connect_timeout, max_time, ctx), False
+
+    def _release(self, key, conn):
+        conn.last_used = time.monotonic()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _stat(self, target) -> dict:
+        return self._stats.setdefault(target, {"requests": 0, "reused": 0, "connects": 0, "errors": 0,
+                                               "retries": 0, "last_code": "", "last_ms": {}})
+
+    # ---------- une tentative ----------
+    def _once(self, key, method, path, headers, connect_timeout, max_time):
+        conn, reused = self._acquire(key, connect_timeout, max_time)
+        t0 = time.perf_counter()
+        try:
+            if conn.sock is None:
+                conn.connect()
+            timings = dict(conn.timings) if not reused else {"dns_ms": 0.0, "connect_ms": 0.0,
+                                                             "tls_ms": 0.0 if conn.ssl_context else None}
+            t1 = time.perf_counter()
+            try:
+                conn.request(method, path, headers=headers)
+                resp = conn.getresponse()
+            except _STALE_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                # keep-alive fermé entre deux cycles: on rejoue sur une connexion neuve
+                return self._once(key, method, path, headers, connect_timeout, max_time)
+            t2 = time.perf_counter()
+            # HEAD: read() vide la réponse (sans corps) et libère la connexion pour le pool
+            body = resp.read() if method == "HEAD" else resp.read(READ_LIMIT)
+            keep = resp.isclosed() and not resp.will_close
+            t3 = time.perf_counter()
+        except ProbeError:
+            conn.close()
+            raise
+        except socket.timeout:
+            conn.close()
+            raise ProbeError("response", "timeout")
+        except (http.client.HTTPException, OSError) as e:
+            conn.close()
+            raise ProbeError("response", "error", str(e) or type(e).__name__)
+        if keep:
+            self._release(key, conn)
+        else:
+            conn.close()
+        timings.update(ttfb_ms=round((t2 - t1) * 1000, 2), total_ms=round((t3 - t0) * 1000, 2))
+        return resp.status, resp.getheaders(), body, timings, reused, conn.ip
+
+    # ---------- API ----------
+    def request(self, method, url, resolve=None, headers=None, retries=None, connect_timeout=None,
+                max_time=None, verify=True, deadline=None) -> dict:
+        """
+        Une requête avec retries. resolve: {hôte: ip} comme `curl --resolve hôte:port:ip`.
+        deadline: instant time.monotonic() au-delà duquel aucune tentative ni attente ne part.
+        Retour: {"url", "method", "status", "code", "error", "phase", "attempts", "reused", "ip",
+                 "headers", "body", "timings"}; code = "200"... ou "<phase>_<type>" (ex: connect_refused).
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        host = parts.hostname or ""
+        port = parts.port or (443 if scheme == "https" else 80)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        pin = (resolve or {}).get(host)
+        key = (scheme, host, port, pin, bool(verify))
+        target = f"{host}:{port}" + (f"@{pin}" if pin else "")
+        hdrs = {"User-Agent": USER_AGENT, "Accept": "*/*"}
+        hdrs.update(headers or {})
+        retries = self.retries if retries is None else retries
+        connect_timeout = connect_timeout or self.connect_timeout
+        max_time = max_time or self.max_time
+
+        result = {"url": url, "method": method, "status": None, "code": "", "error": None, "phase": None,
+                  "attempts": 0, "reused": False, "ip": pin, "headers": {}, "body": b"", "timings": {}}
+        delay = self.retry_delay
+        for attempt in range(retries + 1):
+            if attempt:
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    break
+                time.sleep(delay)
+                delay = min(delay * 2, 10.0)
+            attempt_connect, attempt_max = connect_timeout, max_time
+            if deadline is not None:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    if not attempt:
+                        result.update(code="deadline_exceeded", error="deadline exceeded", phase="deadline")
+                    break
+                attempt_connect, attempt_max = min(connect_timeout, left), min(max_time, left)
+            result["attempts"] = attempt + 1
+            try:
+                status, resp_headers, body, timings, reused, ip = self._once(
+                    key, method, path, hdrs, attempt_connect, attempt_max)
+            except ProbeError as e:
+                result.update(status=None, code=f"{e.phase}_{e.kind}", error=str(e), phase=e.phase)
+                # réponses définitives: port fermé, nom inexistant, certificat refusé
+                if e.kind in ("refused", "cert") or e.phase == "dns":
+                    break
+                continue
+            result.update(status=status, code=str(status), error=None, phase=None, reused=reused, ip=ip,
+                          headers=dict(resp_headers), body=body, timings=timings)
+            if status not in RETRY_STATUS:
+                break
+
+        with self._lock:
+            st = self._stat(target)
+            st["requests"] += 1
+            st["retries"] += max(0, result["attempts"] - 1)
+            st["last_code"] = result["code"]
+            if result["error"]:
+                st["errors"] += 1
+            else:
+                st["reused" if result["reused"] else "connects"] += 1
+                st["last_ms"] = dict(result["timings"])
+        return result
+
+    def head_then_get(self, url, ok_codes=OK_CODES, **kw) -> dict:
+        """HEAD, puis GET si le HEAD n'a pas rendu un code de ok_codes (hôte joignable seulement)."""
+        res = self.request("HEAD", url, **kw)
+        if res["code"] in ok_codes or res["phase"] in ("dns", "connect", "deadline"):
+            return res
+        if kw.get("deadline") is not None and time.monotonic() >= kw["deadline"]:
+            return res
+        return self.request("GET", url, **kw)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {}
+            for target, st in self._stats.items():
+                out[target] = dict(st, last_ms=dict(st["last_ms"]))
+            return out
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle.clear()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HTTPProbeClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HTTPProbeClient()
+        return _client
+
+
+def http_code(url, method="GET", resolve=None, **kw):
+    """Équivalent de `curl -o /dev/null -w %{http_code}`: (rc, code), rc = 0 si une réponse HTTP est arrivée."""
+    res = get_client().request(method, url, resolve=resolve, **kw)
+    return (0 if res["status"] is not None else 1), res["code"]
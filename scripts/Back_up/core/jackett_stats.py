@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: jackett_stats.py
+"""
+Statistiques des indexeurs Jackett: latence (p50/p95/p99), cache, résultats vides,
+catégories non supportées, erreurs — à partir des logs suivis par log_ingest.py.
+
+Entrées exploitées (log.txt de Jackett):
+  "Torznab search in Nyaa.si => Found 86 releases (from cache) [0ms]"
+  "Some of the categories provided are unsupported in The Pirate Bay: 5030"
+  "... Exception (torrentqq): ..." (erreur rattachée à l'indexeur)
+
+Stockage colonnaire compact sous JACKETT_STATS_DIR, un segment par mois (AAAAMM/):
+  ts.u32 (epoch s), ix.u16 (id indexeur, indexers.json), lat.u32 (ms), res.u32, flags.u8
+Fichiers en ajout seul (array.tofile); ts est croissant (les événements plus anciens que
+le dernier écrit sont ignorés: une réingestion ne double rien), une requête fait une
+recherche dichotomique sur ts puis agrège les seules lignes de la fenêtre. Un mois
+(~50k lignes, ~700 Ko) se lit et s'agrège en quelques dizaines de ms.
+
+Plusieurs écrivains (écouteur du daemon monitor_loop, `ingest` en CLI): chaque flush prend
+le verrou fcntl <JACKETT_STATS_DIR>/store.lock, relit la fin du dernier segment (dernier ts
+écrit et lignes de cette seconde-là) et indexers.json, puis n'ajoute que les lignes plus
+récentes; les id d'indexeur sont attribués à ce moment-là, sous le même verrou.
+
+Les percentiles viennent d'histogrammes log2 (8 seaux par octave, ~±5 %) calculés sur
+les recherches non servies par le cache (le cache répond en 0-5 ms et masquerait
+les indexeurs lents).
+
+USAGE
+  python3 jackett_stats.py ingest [--dir /app/config/jackett/Jackett]
+  python3 jackett_stats.py query [--since 30d] [--until 2025-04-03] [--json]
+
+Environment:
+  JACKETT_STATS_DIR (/mnt/data/jackett_stats), JACKETT_STATS_FLUSH_SEC (5),
+  JACKETT_STATS_WINDOW_SEC (3600, fenêtre du probe), JACKETT_SLOW_P95_MS (15000),
+  JACKETT_SLOW_MIN_SEARCHES (5)
+"""
+
+import argparse
+import fcntl
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+STATS_DIR = os.environ.get("JACKETT_STATS_DIR", "/mnt/data/jackett_stats")
+FLUSH_SEC = float(os.environ.get("JACKETT_STATS_FLUSH_SEC", "5"))
+WINDOW_SEC = int(os.environ.get("JACKETT_STATS_WINDOW_SEC", "3600"))
+SLOW_P95_MS = int(os.environ.get("JACKETT_SLOW_P95_MS", "15000"))
+SLOW_MIN_SEARCHES = int(os.environ.get("JACKETT_SLOW_MIN_SEARCHES", "5"))
+
+F_CACHED, F_UNSUPPORTED, F_ERROR = 0x01, 0x02, 0x04
+COLUMNS = (("ts", "I"), ("ix", "H"), ("lat", "I"), ("res", "I"), ("flags", "B"))
+TAIL_ROWS = 256           # lignes relues en fin de segment au flush (doublons de la dernière seconde)
+_UNSUPPORTED_RE = re.compile(r"categories provided are unsupported in (.+?): ")
+_minute_epochs = {}
+
+
+def _epoch(stamp):
+    """"AAAA-MM-JJ HH:MM:SS" (heure locale) → epoch s; strptime une seule fois par minute."""
+    base = _minute_epochs.get(stamp[:16])
+    if base is None:
+        if len(_minute_epochs) > 4096:
+            _minute_epochs.clear()
+        base = _minute_epochs[stamp[:16]] = int(datetime.strptime(stamp[:16], "%Y-%m-%d %H:%M").timestamp())
+    return base + int(stamp[17:19] or 0)
+
+
+# =========================
+# Histogramme de latence (seaux log2, 8 par octave)
+# =========================
+class LatencyHistogram:
+    SUB = 8
+
+    def __init__(self):
+        self.counts = {}
+        self.n = 0
+        self.max = 0
+
+    def add(self, ms):
+        b = 0 if ms <= 0 else int(math.log2(ms + 1) * self.SUB)
+        self.counts[b] = self.counts.get(b, 0) + 1
+        self.n += 1
+        self.max = max(self.max, ms)
+
+    def percentile(self, q):
+        if not self.n:
+            return None
+        rank = q * self.n
+        seen = 0
+        for b in sorted(self.counts):
+            seen += self.counts[b]
+            if seen >= rank:
+                # milieu géométrique du seau, borné par le max observé
+                return min(self.max, round(2 ** ((b + 0.5) / self.SUB) - 1))
+        return self.max
+
+
+# =========================
+# Stockage colonnaire
+# =========================
+class ColumnStore:
+    def __init__(self, root=STATS_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._names = []
+        self._ids = {}
+        self._pending = {}        # segment -> {colonne: array; "ix": noms d'indexeur}
+        self._watermark = 0       # dernier ts accepté (s)
+        self._flushed_at = time.time()
+        self._segment, self._seg_start, self._seg_end = "", 0, 0
+        self.stats = {"appended": 0, "dropped_old": 0, "flushes": 0}
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        self._load_names()
+        self._watermark = self._disk_tail()[0]
+
+    def _read_names(self):
+        try:
+            with open(os.path.join(self.root, "indexers.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _load_names(self):
+        names = self._read_names()
+        self._names, self._ids = names, {n: i for i, n in enumerate(names)}
+
+    @contextmanager
+    def _locked(self):
+        """Verrou inter-processus des écrivains (daemon, CLI ingest)."""
+        with open(os.path.join(self.root, "store.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def segments(self):
+        return sorted(d for d in os.listdir(self.root) if d.isdigit() and len(d) == 6)
+
+    def _read(self, segment):
+        """Colonnes d'un segment; tronque à la plus courte (écriture interrompue)."""
+        seg_dir = os.path.join(self.root, segment)
+        cols = {}
+        for name, code in COLUMNS:
+            a = array(code)
+            path = os.path.join(seg_dir, f"{name}.{code}")
+            try:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                a.frombytes(raw[:len(raw) - len(raw) % a.itemsize])
+            except OSError:
+                pass
+            cols[name] = a
+        rows = min(len(a) for a in cols.values())
+        for a in cols.values():
+            del a[rows:]
+        return cols
+
+    def _rows(self, seg_dir):
+        """Lignes complètes d'un segment: la colonne la plus courte (ts, écrite en dernier)."""
+        sizes = []
+        for name, code in COLUMNS:
+            try:
+                sizes.append(os.path.getsize(os.path.join(seg_dir, f"{name}.{code}")) // array(code).itemsize)
+            except OSError:
+                sizes.append(0)
+        return min(sizes)
+
+    def _disk_tail(self):
+        """(dernier ts écrit, Counter des lignes (indexeur, lat, res, flags) de cette seconde)."""
+        segments = self.segments()
+        if not segments:
+            return 0, Counter()
+        seg_dir = os.path.join(self.root, segments[-1])
+        rows = self._rows(seg_dir)
+        start = max(0, rows - TAIL_ROWS)
+        cols = {}
+        for name, code in COLUMNS:
+            a = array(code)
+            if rows:
+                with open(os.path.join(seg_dir, f"{name}.{code}"), "rb") as f:
+                    f.seek(start * a.itemsize)
+                    a.frombytes(f.read((rows - start) * a.itemsize))
+            cols[name] = a
+        if not rows:
+            return 0, Counter()
+        last = cols["ts"][-1]
+        names = self._names
+        return last, Counter((names[ix] if ix < len(names) else ix, lat, res, fl)
+                             for t, ix, lat, res, fl in zip(cols["ts"], cols["ix"], cols["lat"],
+                                                            cols["res"], cols["flags"]) if t == last)
+
+    def _index_id(self, name):
+        ix = self._ids.get(name)
+        if ix is None:
+            ix = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return ix
+
+    def _save_names(self):
+        tmp = os.path.join(self.root, "indexers.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._names, f)
+        os.replace(tmp, os.path.join(self.root, "indexers.json"))
+
+    def _set_segment(self, ts):
+        month = datetime.fromtimestamp(ts).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        following = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+        self._segment = month.strftime("%Y%m")
+        self._seg_start, self._seg_end = month.timestamp(), following.timestamp()
+
+    def append(self, ts, indexer, latency_ms=0, results=0, flags=0):
+        ts = int(ts)
+        with self._lock:
+            if ts < self._watermark:
+                self.stats["dropped_old"] += 1
+                return False
+            self._watermark = ts
+            if not self._seg_start <= ts < self._seg_end:
+                self._set_segment(ts)
+            segment = self._segment
+            cols = self._pending.setdefault(segment, {name: [] if name == "ix" else array(code)
+                                                      for name, code in COLUMNS})
+            cols["ts"].append(ts)
+            cols["ix"].append(indexer)
+            cols["lat"].append(min(int(latency_ms), 0xFFFFFFFF))
+            cols["res"].append(min(int(results), 0xFFFFFFFF))
+            cols["flags"].append(flags)
+            self.stats["appended"] += 1
+        if time.time() - self._flushed_at >= FLUSH_SEC:
+            self.flush()
+        return True
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.time()
+        if not pending:
+            return
+        with self._locked():
+            # un autre processus a pu écrire depuis: id d'indexeur et dernier ts relus sur disque
+            self._load_names()
+            known = len(self._names)
+            disk_ts, boundary = self._disk_tail()
+            dropped = 0
+            for segment in sorted(pending):
+                cols = pending[segment]
+                keep = []
+                for i, ts in enumerate(cols["ts"]):
+                    if ts == disk_ts:
+                        row = (cols["ix"][i], cols["lat"][i], cols["res"][i], cols["flags"][i])
+                        if boundary[row] > 0:
+                            boundary[row] -= 1
+                            dropped += 1
+                            continue
+                    elif ts < disk_ts:
+                        dropped += 1
+                        continue
+                    keep.append(i)
+                if not keep:
+                    continue
+                seg_dir = os.path.join(self.root, segment)
+                os.makedirs(seg_dir, exist_ok=True)
+                rows = self._rows(seg_dir)
+                # ts en dernier: une ligne n'est visible que si toutes ses colonnes sont écrites
+                for name, code in sorted(COLUMNS, key=lambda c: c[0] == "ts"):
+                    if name == "ix":
+                        out = array(code, (self._index_id(cols["ix"][i]) for i in keep))
+                    else:
+                        out = array(code, (cols[name][i] for i in keep))
+                    with open(os.path.join(seg_dir, f"{name}.{code}"), "ab") as f:
+                        # reste d'une écriture interrompue: réaligné sur les lignes complètes
+                        f.truncate(rows * out.itemsize)
+                        out.tofile(f)
+                self.stats["flushes"] += 1
+            if len(self._names) > known:
+                self._save_names()
+        with self._lock:
+            self.stats["dropped_old"] += dropped
+            self._watermark = max(self._watermark, disk_ts)
+
+    # ---------- alimentation depuis log_ingest ----------
+    def on_record(self, source, rec):
+        """Écouteur log_ingest (source "jackett")."""
+        if source != "jackett":
+            return
+        try:
+            ts = _epoch(rec["ts"])
+        except ValueError:
+            return
+        if "latency_ms" in rec:
+            self.append(ts, rec["indexer"], rec["latency_ms"], rec["results"], F_CACHED if rec["cached"] else 0)
+        elif rec["level"] == "warn":
+            m = _UNSUPPORTED_RE.search(rec["message"])
+            if m:
+                self.append(ts, m.group(1), flags=F_UNSUPPORTED)
+        elif rec["level"] in ("error", "fatal") and rec["component"] != "Jackett":
+            self.append(ts, rec["component"], flags=F_ERROR)
+
+    # ---------- requêtes ----------
+    def query(self, since=None, until=None) -> dict:
+        """{indexeur: {...}} sur [since, until] (epoch s, bornes incluses)."""
+        names = self._read_names()    # ids attribués par un autre processus inclus
+        lo_seg = datetime.fromtimestamp(since).strftime("%Y%m") if since else ""
+        hi_seg = datetime.fromtimestamp(until).strftime("%Y%m") if until else "999999"
+        agg = {}
+        for segment in self.segments():
+            if not lo_seg <= segment <= hi_seg:
+                continue
+            cols = self._read(segment)
+            ts = cols["ts"]
+            lo = bisect_left(ts, since) if since else 0
+            hi = bisect_right(ts, until) if until else len(ts)
+            ix, lat, res, flags = cols["ix"], cols["lat"], cols["res"], cols["flags"]
+            for i in range(lo, hi):
+                a = agg.get(ix[i])
+                if a is None:
+                    a = agg[ix[i]] = {"searches": 0, "cached": 0, "zero": 0, "unsupported": 0, "errors": 0,
+                                      "hist": LatencyHistogram()}
+                f = flags[i]
+                if f & F_UNSUPPORTED:
+                    a["unsupported"] += 1
+                elif f & F_ERROR:
+                    a["errors"] += 1
+                else:
+                    a["searches"] += 1
+                    if res[i] == 0:
+                        a["zero"] += 1
+                    if f & F_CACHED:
+                        a["cached"] += 1
+                    else:
+                        a["hist"].add(lat[i])
+        out = {}
+        for i, a in agg.items():
+            h, n = a["hist"], a["searches"]
+            out[names[i] if i < len(names) else str(i)] = {
+                "searches": n,
+                "live_searches": h.n,
+                "cache_hit_ratio": round(a["cached"] / n, 3) if n else None,
+                "zero_result_rate": round(a["zero"] / n, 3) if n else None,
+                "p50_ms": h.percentile(0.50),
+                "p95_ms": h.percentile(0.95),
+                "p99_ms": h.percentile(0.99),
+                "max_ms": h.max if h.n else None,
+                "unsupported_warnings": a["unsupported"],
+                "errors": a["errors"],
+            }
+        return out
+
+
+def slow_indexers(stats, p95_ms=SLOW_P95_MS, min_searches=SLOW_MIN_SEARCHES):
+    return sorted(name for name, s in stats.items()
+                  if s["live_searches"] >= min_searches and (s["p95_ms"] or 0) >= p95_ms)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ColumnStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ColumnStore()
+        return _store
+
+
+def window_summary(window_sec=WINDOW_SEC) -> dict:
+    """Section "jackett" de run_quick_check: stats de la dernière fenêtre + indexeurs lents."""
+    stats = get_store().query(since=time.time() - window_sec)
+    return {"window_sec": window_sec, "indexers": stats, "slow": slow_indexers(stats)}
+
+
+# =========================
+# CLI
+# =========================
+def _parse_when(value):
+    if not value:
+        return None
+    m = re.fullmatch(r"(\d+)([smhd])", value)
+    if m:
+        return time.time() - int(m.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[m.group(2)]
+    return datetime.fromisoformat(value).timestamp()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Jackett indexer latency / cache analytics")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ing = sub.add_parser("ingest", help="read Jackett logs (only new bytes) into the columnar store")
+    ing.add_argument("--dir", default=os.environ.get("JACKETT_LOG_DIR", "/app/config/jackett/Jackett"))
+    q = sub.add_parser("query", help="per-indexer stats over a time range")
+    q.add_argument("--since", default="30d", help="30d, 12h, or ISO date")
+    q.add_argument("--until", default="")
+    q.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    store = get_store()
+    if args.cmd == "ingest":
+        import log_ingest
+        ingester = log_ingest.LogIngester([log_ingest.jackett_source(args.dir)], state_file=os.path.join(store.root, "ingest_state.json"),
+                                          from_start=True)
+        ingester.add_listener(store.on_record)
+        t0 = time.perf_counter()
+        ingester.scan("jackett")
+        store.flush()
+        ingester.save_state(force=True)
+        st = ingester.stats()
+        print(f"[INFO] {st['records']} records, {st['bytes_read'] / 1e6:.1f} MB in {time.perf_counter() - t0:.2f}s; "
+              f"{store.stats['appended']} events stored, {store.stats['dropped_old']} older than store skipped")
+        return 0
+
+    t0 = time.perf_counter()
+    stats = store.query(_parse_when(args.since), _parse_when(args.until))
+    elapsed = time.perf_counter() - t0
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return 0
+    print(f"{'indexer':<28} {'n':>6} {'live':>6} {'cache':>6} {'zero':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'unsup':>6} {'err':>4}")
+    for name, s in sorted(stats.items(), key=lambda kv: -(kv[1]["p95_ms"] or 0)):
+        pct = lambda v: f"{v * 100:.0f}%" if v is not None else "-"
+        ms = lambda v: str(v) if v is not None else "-"
+        print(f"{name[:28]:<28} {s['searches']:>6} {s['live_searches']:>6} {pct(s['cache_hit_ratio']):>6} "
+              f"{pct(s['zero_result_rate']):>6} {ms(s['p50_ms']):>7} {ms(s['p95_ms']):>7} {ms(s['p99_ms']):>7} "
+              f"{s['unsupported_warnings']:>6} {s['errors']:>4}")
+    slow = slow_indexers(stats)
+    print(f"[INFO] query {elapsed * 1000:.0f} ms; slow (p95 >= {SLOW_P95_MS} ms): {', '.join(slow) or 'none'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
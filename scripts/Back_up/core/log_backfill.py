@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: log_backfill.py
+"""
+Rattrapage de l'historique des logs Radarr / Sonarr (config/*arr/logs), en parallèle.
+
+log_ingest.py ne suit que les nouveaux octets (premier démarrage = fin de fichier);
+ce script traite une fois l'arriéré déjà présent:
+- chaque fichier tourné est une tâche; les tâches (plus gros fichiers d'abord) sont
+  réparties sur un pool de processus (multiprocessing.cpu_count() par défaut)
+- un worker lit le fichier d'un bloc et le parcourt en une passe de regex précompilée
+  (bytes, re.M) sans construire d'entrée par ligne; il renvoie un agrégat partiel que le parent fusionne
+- chaîne "info" (radarr.txt, radarr.N.txt): erreurs et warnings par composant et par heure,
+  lignes datées illisibles (parse_failures)
+- chaîne "debug" (radarr.debug.N.txt): seules les entrées Debug/Trace y sont comptées
+  (les autres dupliquent la chaîne info), dont les "Unable to parse <release>" du Parser
+  par heure, avec les titres les plus fréquents
+
+Résultat JSON dans LOG_BACKFILL_FILE; le débit (Mo/s) est affiché et enregistré.
+--handoff inscrit dans LOG_INGEST_STATE l'offset atteint pour chaque fichier de la chaîne
+info d'une source pas encore suivie: log_ingest reprend exactement là où le rattrapage
+s'est arrêté, sans trou ni double comptage.
+
+USAGE
+  python3 log_backfill.py [--source radarr sonarr] [--workers 4] [--handoff] [--out FILE]
+
+Environment:
+  LOG_BACKFILL_FILE (/mnt/data/log_backfill.json), LOG_BACKFILL_WORKERS (cpu_count),
+  RADARR_LOG_DIR, SONARR_LOG_DIR, LOG_INGEST_STATE (voir log_ingest.py)
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+import log_ingest
+
+BACKFILL_FILE = os.environ.get("LOG_BACKFILL_FILE", "/mnt/data/log_backfill.json")
+WORKERS = int(os.environ.get("LOG_BACKFILL_WORKERS", "0")) or multiprocessing.cpu_count()
+TOP_TITLES = 20
+
+# même format que log_ingest._ARR_RE, appliqué au tampon entier (re.M) en une seule passe;
+# info: groupe niveau vide = ligne datée illisible
+_INFO_RE = re.compile(rb"^(\d{4}-\d{2}-\d{2} \d{2})(?::\d{2}:\d{2}(?:\.\d+)?\|(Trace|Debug|Info|Warn|Error|Fatal)\|([^|\n]*)\|)?", re.M)
+_DEBUG_RE = re.compile(rb"^(\d{4}-\d{2}-\d{2} \d{2}):\d{2}:\d{2}(?:\.\d+)?\|(?:Debug|Trace)\|(?:Parser\|Unable to parse (.*?)\r?$)?", re.M)
+_DATED_RE = re.compile(rb"^\d{4}-\d{2}-\d{2}\b", re.M)
+_COUNTED = {b"Warn": "warnings", b"Error": "errors", b"Fatal": "errors"}
+
+
+def debug_pattern(name):
+    return re.compile(rf"^{name}\.debug(\.\d+)?\.txt$")
+
+
+def plan(sources):
+    """Tâches (source, chemin, chaîne, taille), plus gros fichiers d'abord (meilleur équilibrage du pool)."""
+    tasks = []
+    for src in sources:
+        try:
+            names = os.listdir(src.directory)
+        except OSError as e:
+            print(f"[WARN] {src.name}: {e}")
+            continue
+        debug = debug_pattern(src.name)
+        for name in names:
+            chain = "info" if src.pattern.match(name) else "debug" if debug.match(name) else None
+            if chain:
+                path = os.path.join(src.directory, name)
+                tasks.append((src.name, path, chain, os.path.getsize(path)))
+    return sorted(tasks, key=lambda t: -t[3])
+
+
+# =========================
+# Worker (un fichier → agrégat partiel)
+# =========================
+def scan_file(task):
+    source, path, chain, _ = task
+    part = {"source": source, "path": path, "chain": chain, "bytes": 0, "records": 0, "parse_failures": 0,
+            "errors": {}, "warnings": {}, "unparsed": {}, "titles": {}, "first": "", "last": "", "handoff": None}
+    try:
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            data = f.read()
+    except OSError as e:
+        part["error"] = str(e)
+        return part
+    data = data[:data.rfind(b"\n") + 1]   # ligne en cours d'écriture laissée à log_ingest
+    part["bytes"] = len(data)
+    if chain == "info":
+        for hour, level, component in _INFO_RE.findall(data):
+            if not level:
+                part["parse_failures"] += 1
+                continue
+            part["records"] += 1
+            kind = _COUNTED.get(level)
+            if kind:
+                by_hour = part[kind].setdefault(hour.decode(), {})
+                component = component.decode("utf-8", "replace") or "-"
+                by_hour[component] = by_hour.get(component, 0) + 1
+        part["handoff"] = {"key": f"{st.st_dev}:{st.st_ino}", "offset": len(data),
+                           "head": log_ingest.LogIngester._head(path, st.st_size)}
+    else:
+        titles = Counter()
+        for hour, title in _DEBUG_RE.findall(data):
+            part["records"] += 1
+            if title:
+                hour = hour.decode()
+                part["unparsed"][hour] = part["unparsed"].get(hour, 0) + 1
+                titles[title.decode("utf-8", "replace")] += 1
+        part["titles"] = dict(titles)
+    m = _DATED_RE.search(data)
+    if m:
+        part["first"] = data[m.start():m.start() + 19].decode()
+        last = data.rfind(b"\n", 0, len(data) - 1) + 1
+        while last > 0 and not _DATED_RE.match(data, last):
+            last = data.rfind(b"\n", 0, last - 1) + 1
+        part["last"] = data[last:last + 19].decode()
+    return part
+
+
+# =========================
+# Fusion
+# =========================
+def _merge_hours(dst, src):
+    for hour, value in src.items():
+        if isinstance(value, dict):
+            by = dst.setdefault(hour, {})
+            for k, n in value.items():
+                by[k] = by.get(k, 0) + n
+        else:
+            dst[hour] = dst.get(hour, 0) + value
+
+
+def merge(parts):
+    out = {}
+    titles = {}
+    for p in parts:
+        s = out.setdefault(p["source"], {"files": 0, "bytes": 0, "records": 0, "debug_records": 0, "parse_failures": 0,
+                                         "errors": 0, "warnings": 0, "unparsed_releases": 0, "first": "", "last": "",
+                                         "errors_by_hour": {}, "warnings_by_hour": {}, "unparsed_by_hour": {}})
+        s["files"] += 1
+        s["bytes"] += p["bytes"]
+        s["records" if p["chain"] == "info" else "debug_records"] += p["records"]
+        s["parse_failures"] += p["parse_failures"]
+        _merge_hours(s["errors_by_hour"], p["errors"])
+        _merge_hours(s["warnings_by_hour"], p["warnings"])
+        _merge_hours(s["unparsed_by_hour"], p["unparsed"])
+        if p["first"] and (not s["first"] or p["first"] < s["first"]):
+            s["first"] = p["first"]
+        s["last"] = max(s["last"], p["last"])
+        counter = titles.setdefault(p["source"], Counter())
+        counter.update(p["titles"])
+        if p.get("error"):
+            s.setdefault("read_errors", []).append(f"{p['path']}: {p['error']}")
+    for name, s in out.items():
+        s["errors"] = sum(sum(by.values()) for by in s["errors_by_hour"].values())
+        s["warnings"] = sum(sum(by.values()) for by in s["warnings_by_hour"].values())
+        s["unparsed_releases"] = sum(s["unparsed_by_hour"].values())
+        components = Counter()
+        for by in s["errors_by_hour"].values():
+            components.update(by)
+        s["errors_by_component"] = dict(components.most_common())
+        s["top_unparsed"] = sorted(titles[name].items(), key=lambda kv: (-kv[1], kv[0]))[:TOP_TITLES]
+        for key in ("errors_by_hour", "warnings_by_hour", "unparsed_by_hour"):
+            s[key] = dict(sorted(s[key].items()))
+    return out
+
+
+def run_backfill(sources, workers=WORKERS):
+    """(agrégats par source, parts brutes, métriques de débit)."""
+    tasks = plan(sources)
+    total = sum(t[3] for t in tasks)
+    workers = max(1, min(workers, len(tasks) or 1))
+    t0 = time.perf_counter()
+    if workers == 1:
+        parts = [scan_file(t) for t in tasks]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            parts = list(pool.imap_unordered(scan_file, tasks, chunksize=1))
+    elapsed = time.perf_counter() - t0
+    read = sum(p["bytes"] for p in parts)
+    perf = {"files": len(tasks), "bytes": read, "planned_bytes": total, "workers": workers,
+            "seconds": round(elapsed, 3), "mb_per_sec": round(read / 1e6 / elapsed, 1) if elapsed else None}
+    return merge(parts), parts, perf
+
+
+def handoff(parts, state_file=log_ingest.STATE_FILE):
+    """Offsets atteints → état de log_ingest, pour les seules sources jamais suivies. Retourne ces sources."""
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    files = state.setdefault("files", {})
+    seeded = set(state.get("seeded") or [])
+    added = set()
+    for p in parts:
+        if p["handoff"] and p["source"] not in seeded:
+            h = p["handoff"]
+            files[h["key"]] = {"source": p["source"], "path": p["path"], "offset": h["offset"], "head": h["head"]}
+            added.add(p["source"])
+    if added:
+        state["seeded"] = sorted(seeded | added)
+        tmp = f"{state_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, state_file)
+    return sorted(added)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Parallel backfill of Radarr/Sonarr log history")
+    ap.add_argument("--source", nargs="+", choices=("radarr", "sonarr"), default=["radarr", "sonarr"])
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--out", default=BACKFILL_FILE)
+    ap.add_argument("--handoff", action="store_true", help="seed log_ingest offsets at the end of the backfill")
+    args = ap.parse_args(argv)
+
+    sources = [s for s in log_ingest.default_sources() if s.name in args.source]
+    summary, parts, perf = run_backfill(sources, args.workers)
+    for name, s in summary.items():
+        top = ", ".join(f"{c}={n}" for c, n in list(s["errors_by_component"].items())[:5]) or "-"
+        print(f"[INFO] {name}: {s['files']} files, {s['records']} entries ({s['first']} → {s['last']}), "
+              f"{s['errors']} errors [{top}], {s['warnings']} warnings, "
+              f"{s['unparsed_releases']} unparsed releases, {s['parse_failures']} unreadable lines")
+    print(f"[INFO] {perf['bytes'] / 1e6:.1f} MB in {perf['seconds']:.2f}s with {perf['workers']} workers "
+          f"→ {perf['mb_per_sec']} MB/s")
+
+    if args.out:
+        tmp = f"{args.out}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "performance": perf, "sources": summary},
+                          f, ensure_ascii=False)
+            os.replace(tmp, args.out)
+        except OSError as e:
+            print(f"[WARN] cannot write {args.out}: {e}")
+    if args.handoff:
+        seeded = handoff(parts)
+        print(f"[INFO] log_ingest offsets seeded for: {', '.join(seeded) or 'none (already followed)'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
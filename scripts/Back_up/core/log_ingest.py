@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: log_ingest.py
+"""
+Ingestion en continu des logs Radarr / Sonarr / Jackett (tail piloté par inotify).
+
+- Un thread daemon surveille les dossiers de logs (inotify via ctypes; à défaut,
+  polling toutes les LOG_INGEST_POLL_SEC secondes) et lit uniquement les octets ajoutés.
+- Les fichiers sont suivis par (device, inode) + offset: une rotation (radarr.txt →
+  radarr.0.txt, log.txt → log.txt.AAAAMMJJ.00000.txt) ne fait relire aucun octet, et la
+  fin non lue d'un fichier renommé est bien consommée. Une empreinte des 64 premiers
+  octets détecte un inode réutilisé; un fichier tronqué repart de 0.
+- Offsets persistés dans LOG_INGEST_STATE (écriture atomique, au plus toutes les
+  LOG_INGEST_SAVE_SEC s et à l'arrêt): un redémarrage reprend là où on s'était arrêté.
+  Au tout premier démarrage d'une source, l'existant est ignoré (reprise en fin de
+  fichier) sauf LOG_INGEST_FROM_START=1; l'historique des *arr se rattrape avec
+  log_backfill.py (--handoff y inscrit les offsets atteints).
+- Formats: *arr "2025-04-05 15:45:27.0|Debug|Parser|message" et Jackett
+  "2025-04-03 11:10:42.8581 Info message"; lignes de suite (stack traces) rattachées
+  à l'entrée précédente, lignes datées illisibles comptées en parse_failures.
+- Compteurs glissants (LOG_INGEST_WINDOW_SEC, seaux d'une minute) par source: lignes,
+  erreurs / warnings par composant, parse_failures, latence des recherches Torznab par
+  indexeur (Jackett). Les écouteurs add_listener(fn(source, record)) reçoivent chaque entrée.
+
+Seules les chaînes "info" des *arr sont suivies par défaut (radarr.txt, radarr.N.txt):
+les fichiers *.debug.* dupliquent les mêmes entrées.
+
+Environment:
+  LOG_INGEST (1), LOG_INGEST_STATE (/mnt/data/log_ingest_state.json),
+  LOG_INGEST_WINDOW_SEC (3600), LOG_INGEST_POLL_SEC (5), LOG_INGEST_SAVE_SEC (2),
+  LOG_INGEST_FROM_START (0),
+  RADARR_LOG_DIR (/app/config/radarr/logs), SONARR_LOG_DIR (/app/config/sonarr/logs),
+  JACKETT_LOG_DIR (/app/config/jackett/Jackett)
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import re
+import select
+import struct
+import threading
+import time
+from collections import deque
+
+LOG_INGEST = os.environ.get("LOG_INGEST", "1") == "1"
+STATE_FILE = os.environ.get("LOG_INGEST_STATE", "/mnt/data/log_ingest_state.json")
+WINDOW_SEC = int(os.environ.get("LOG_INGEST_WINDOW_SEC", "3600"))
+POLL_SEC = float(os.environ.get("LOG_INGEST_POLL_SEC", "5"))
+SAVE_SEC = float(os.environ.get("LOG_INGEST_SAVE_SEC", "2"))
+FROM_START = os.environ.get("LOG_INGEST_FROM_START", "0") == "1"
+RESCAN_SEC = 60          # filet de sécurité en mode inotify (événements perdus, overflow)
+READ_CHUNK = 4 * 1024 * 1024
+HEAD_BYTES = 64
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}\b")
+_ARR_RE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?)\|(\w+)\|([^|]*)\|(.*)$")
+_JACKETT_RE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?) (\w+) (.*)$")
+_TORZNAB_RE = re.compile(r"^Torznab search in (.+?)(?: for (.*?))? => Found (\d+) releases( \(from cache\))? \[(\d+)ms\]")
+_INDEXER_EXC_RE = re.compile(r"Exception \(([^)]+)\)")
+_LEVELS = {"trace", "debug", "info", "warn", "error", "fatal"}
+
+
+# =========================
+# Parsers (ligne → entrée)
+# =========================
+def parse_arr(line):
+    m = _ARR_RE.match(line)
+    if not m or m.group(2).lower() not in _LEVELS:
+        return None
+    return {"ts": m.group(1), "level": m.group(2).lower(), "component": m.group(3) or "-", "message": m.group(4)}
+
+
+def parse_jackett(line):
+    m = _JACKETT_RE.match(line)
+    if not m or m.group(2).lower() not in _LEVELS:
+        return None
+    msg = m.group(3)
+    rec = {"ts": m.group(1), "level": m.group(2).lower(), "component": "Jackett", "message": msg}
+    t = _TORZNAB_RE.match(msg)
+    if t:
+        rec.update(component="Torznab", indexer=t.group(1), query=t.group(2) or "", results=int(t.group(3)),
+                   cached=bool(t.group(4)), latency_ms=int(t.group(5)))
+    else:
+        e = _INDEXER_EXC_RE.search(msg)
+        if e:
+            rec["component"] = e.group(1)
+    return rec
+
+
+def arr_order(name):
+    """radarr.txt = actif (le plus récent), radarr.N.txt: N grand = plus ancien."""
+    parts = name.split(".")
+    return (0, -int(parts[-2])) if len(parts) > 2 and parts[-2].isdigit() else (1, 0)
+
+
+def jackett_order(name):
+    """log.txt = actif, log.txt.AAAAMMJJ.NNNNN.txt archivés dans l'ordre des dates."""
+    parts = name.split(".")
+    return (0, parts[2], parts[3]) if len(parts) > 4 else (1, "", "")
+
+
+class Source:
+    def __init__(self, name, directory, pattern, parser, order=None):
+        self.name = name
+        self.directory = directory
+        self.pattern = re.compile(pattern)
+        self.parser = parser
+        self.order = order or (lambda n: n)   # clé de tri: du plus ancien au plus récent
+
+
+def arr_source(name, directory):
+    return Source(name, directory, rf"^{name}(\.\d+)?\.txt$", parse_arr, arr_order)
+
+
+def jackett_source(directory):
+    return Source("jackett", directory, r"^log\.txt(\.\d{8}\.\d+\.txt)?$", parse_jackett, jackett_order)
+
+
+def default_sources():
+    return [
+        arr_source("radarr", os.environ.get("RADARR_LOG_DIR", "/app/config/radarr/logs")),
+        arr_source("sonarr", os.environ.get("SONARR_LOG_DIR", "/app/config/sonarr/logs")),
+        jackett_source(os.environ.get("JACKETT_LOG_DIR", "/app/config/jackett/Jackett")),
+    ]
+
+
+# =========================
+# Compteurs glissants (seaux d'une minute)
+# =========================
+class RollingCounters:
+    def __init__(self, window_sec=WINDOW_SEC):
+        self.window = max(60, int(window_sec))
+        self._buckets = deque()   # (minute, {clé: valeur}, {indexeur: [n, somme_ms, max_ms]})
+        self._lock = threading.Lock()
+
+    def _bucket(self, now):
+        minute = int(now // 60)
+        if not self._buckets or self._buckets[-1][0] != minute:
+            self._buckets.append((minute, {}, {}))
+        while self._buckets and self._buckets[0][0] <= minute - self.window // 60:
+            self._buckets.popleft()
+        return self._buckets[-1]
+
+    def add(self, key, n=1, now=None):
+        with self._lock:
+            counts = self._bucket(now or time.time())[1]
+            counts[key] = counts.get(key, 0) + n
+
+    def latency(self, indexer, ms, now=None):
+        with self._lock:
+            lat = self._bucket(now or time.time())[2].setdefault(indexer, [0, 0, 0])
+            lat[0] += 1
+            lat[1] += ms
+            lat[2] = max(lat[2], ms)
+
+    def snapshot(self, now=None) -> dict:
+        with self._lock:
+            self._bucket(now or time.time())
+            buckets = [(counts.copy(), {k: v[:] for k, v in lat.items()}) for _, counts, lat in self._buckets]
+        out = {"lines": 0, "bytes": 0, "errors": 0, "warnings": 0, "parse_failures": 0,
+               "errors_by_component": {}, "warnings_by_component": {}}
+        lat = {}
+        for counts, latencies in buckets:
+            for key, n in counts.items():
+                if isinstance(key, tuple):
+                    kind, component = key
+                    out[kind] += n
+                    by = out[f"{kind}_by_component"]
+                    by[component] = by.get(component, 0) + n
+                else:
+                    out[key] = out.get(key, 0) + n
+            for indexer, (n, total, worst) in latencies.items():
+                agg = lat.setdefault(indexer, [0, 0, 0])
+                agg[0] += n
+                agg[1] += total
+                agg[2] = max(agg[2], worst)
+        if lat:
+            out["indexers"] = {ix: {"searches": n, "avg_ms": round(total / n, 1), "max_ms": worst}
+                               for ix, (n, total, worst) in lat.items()}
+        return out
+
+
+# =========================
+# inotify (ctypes)
+# =========================
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x02, 0x08, 0x40, 0x80
+IN_CREATE, IN_DELETE, IN_Q_OVERFLOW = 0x100, 0x200, 0x4000
+_EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def read(self, timeout):
+        """[(wd, mask, nom)] ou [] après timeout."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events, off = [], 0
+        while off + _EVENT.size <= len(buf):
+            wd, mask, _, length = _EVENT.unpack_from(buf, off)
+            off += _EVENT.size
+            name = buf[off:off + length].rstrip(b"\0").decode("utf-8", "replace")
+            off += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+# =========================
+# Ingesteur
+# =========================
+class LogIngester(threading.Thread):
+    def __init__(self, sources=None, state_file=STATE_FILE, window_sec=WINDOW_SEC, from_start=FROM_START):
+        super().__init__(name="log-ingest", daemon=True)
+        self.sources = {s.name: s for s in (sources or default_sources())}
+        self.state_file = state_file
+        self.from_start = from_start
+        self.counters = {name: RollingCounters(window_sec) for name in self.sources}
+        self.listeners = []
+        self.mode = ""
+        self.last_error = ""
+        self.totals = {"events": 0, "scans": 0, "reads": 0, "bytes_read": 0, "records": 0,
+                       "rotations": 0, "truncations": 0}
+        self._files = {}       # "dev:ino" -> {"source", "path", "offset", "head"}
+        self._seeded = set()   # sources déjà initialisées (offsets existants)
+        self._open = {}        # source -> dernière entrée (lignes de suite)
+        self._verify = set()   # clés chargées de l'état: empreinte à vérifier au premier scan
+        self._dirty = False
+        self._saved_at = 0.0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._load_state()
+
+    # ---------- état persistant ----------
+    def _load_state(self):
+        if not self.state_file:
+            return
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._files = {k: v for k, v in (data.get("files") or {}).items() if v.get("source") in self.sources}
+        self._seeded = set(data.get("seeded") or []) & set(self.sources)
+        self._verify = set(self._files)
+
+    def save_state(self, force=False):
+        if not self.state_file or not (self._dirty or force):
+            return
+        if not force and time.time() - self._saved_at < SAVE_SEC:
+            return
+        with self._lock:
+            data = {"files": dict(self._files), "seeded": sorted(self._seeded)}
+            self._dirty = False
+        tmp = f"{self.state_file}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.state_file)
+            self._saved_at = time.time()
+        except OSError as e:
+            self.last_error = f"state save failed: {e}"
+
+    # ---------- lecture incrémentale ----------
+    @staticmethod
+    def _head(path, size):
+        if size < HEAD_BYTES:
+            return ""
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read(HEAD_BYTES)).hexdigest()
+
+    def scan(self, source):
+        """Stat des fichiers de la source; lit ce qui dépasse l'offset connu."""
+        src = self.sources[source]
+        self.totals["scans"] += 1
+        try:
+            # du plus ancien au plus récent: la fin non lue d'un fichier renommé passe avant le nouveau
+            names = sorted((n for n in os.listdir(src.directory) if src.pattern.match(n)), key=src.order)
+        except OSError as e:
+            self.last_error = f"{source}: {e}"
+            return
+        seeding = source not in self._seeded
+        seen = set()
+        for name in names:
+            path = os.path.join(src.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            key = f"{st.st_dev}:{st.st_ino}"
+            seen.add(key)
+            self._track(source, key, path, st, start_at_end=seeding and not self.from_start)
+        with self._lock:
+            for key in [k for k, v in self._files.items() if v["source"] == source and k not in seen]:
+                del self._files[key]
+                self._dirty = True
+            if seeding:
+                self._seeded.add(source)
+                self._dirty = True
+
+    def _track(self, source, key, path, st, start_at_end=False):
+        entry = self._files.get(key)
+        if entry is not None and (key in self._verify or st.st_size < entry["offset"]):
+            self._verify.discard(key)
+            if st.st_size < entry["offset"] or (entry.get("head") and self._head(path, st.st_size) != entry["head"]):
+                # inode réutilisé ou fichier tronqué (copytruncate): on repart du début
+                self.totals["truncations"] += 1
+                entry = None
+        if entry is None:
+            entry = {"source": source, "path": path, "offset": st.st_size if start_at_end else 0, "head": ""}
+            with self._lock:
+                self._files[key] = entry
+                self._dirty = True
+        elif entry["path"] != path:
+            self.totals["rotations"] += 1
+            entry["path"] = path
+            self._dirty = True
+        if not entry["head"] and st.st_size >= HEAD_BYTES:
+            entry["head"] = self._head(path, st.st_size)
+            self._dirty = True
+        if st.st_size > entry["offset"]:
+            self._read(source, entry)
+
+    def _read(self, source, entry):
+        try:
+            with open(entry["path"], "rb") as f:
+                f.seek(entry["offset"])
+                while True:
+                    chunk = f.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    end = chunk.rfind(b"\n")
+                    if end < 0:
+                        break  # ligne en cours d'écriture: relue quand elle sera complète
+                    data = chunk[:end + 1]
+                    self._consume(source, data)
+                    entry["offset"] += len(data)
+                    self._dirty = True
+                    self.totals["reads"] += 1
+                    self.totals["bytes_read"] += len(data)
+                    if end + 1 < len(chunk):
+                        f.seek(entry["offset"])
+        except OSError as e:
+            self.last_error = f"{entry['path']}: {e}"
+
+    def _consume(self, source, data):
+        parser = self.sources[source].parser
+        counters = self.counters[source]
+        now = time.time()
+        lines = bytes_ = failures = 0
+        for raw in data.split(b"\n"):
+            if not raw:
+                continue
+            line = raw.decode("utf-8", "replace").rstrip("\r")
+            bytes_ += len(raw) + 1
+            rec = parser(line)
+            if rec is None:
+                if _DATE_RE.match(line) or (source not in self._open and line.strip()):
+                    failures += 1
+                continue  # ligne de suite (stack trace, détail multi-ligne)
+            lines += 1
+            self._open[source] = rec
+            self.totals["records"] += 1
+            if rec["level"] in ("error", "fatal"):
+                counters.add(("errors", rec["component"]), now=now)
+            elif rec["level"] == "warn":
+                counters.add(("warnings", rec["component"]), now=now)
+            if "latency_ms" in rec:
+                counters.latency(rec["indexer"], rec["latency_ms"], now=now)
+            for fn in self.listeners:
+                try:
+                    fn(source, rec)
+                except Exception as e:
+                    self.last_error = f"listener: {e}"
+        counters.add("lines", lines, now=now)
+        counters.add("bytes", bytes_, now=now)
+        if failures:
+            counters.add("parse_failures", failures, now=now)
+
+    # ---------- boucle ----------
+    def run(self):
+        try:
+            notify = _Inotify()
+            wds = {}
+            for name, src in self.sources.items():
+                if os.path.isdir(src.directory):
+                    wds[notify.add_watch(src.directory, IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM
+                                         | IN_MOVED_TO | IN_CREATE | IN_DELETE)] = name
+            self.mode = "inotify"
+        except (OSError, AttributeError) as e:
+            notify, wds = None, {}
+            self.mode = "poll"
+            self.last_error = f"inotify unavailable, polling every {POLL_SEC}s: {e}"
+        try:
+            for name in self.sources:
+                self.scan(name)
+            self.save_state(force=True)
+            last_full = time.time()
+            while not self._stop_event.is_set():
+                if notify is None:
+                    self._stop_event.wait(POLL_SEC)
+                    rescan = set(self.sources)
+                else:
+                    rescan = set()
+                    events = notify.read(1.0)
+                    if events:
+                        time.sleep(0.05)  # regroupe une rafale d'écritures
+                        events += notify.read(0)
+                    for wd, mask, name in events:
+                        self.totals["events"] += 1
+                        source = wds.get(wd)
+                        if mask & IN_Q_OVERFLOW:
+                            rescan.update(self.sources)
+                        elif source and self.sources[source].pattern.match(name):
+                            rescan.add(source)
+                    if time.time() - last_full >= RESCAN_SEC:
+                        rescan.update(self.sources)
+                        last_full = time.time()
+                for name in rescan:
+                    self.scan(name)
+                self.save_state()
+        finally:
+            self.save_state(force=True)
+            if notify is not None:
+                notify.close()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=5)
+
+    # ---------- lecture ----------
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def snapshot(self) -> dict:
+        """Compteurs glissants par source (section "logs" de run_quick_check)."""
+        with self._lock:
+            sources = [v["source"] for v in self._files.values()]
+        return {name: dict(c.snapshot(), files=sources.count(name)) for name, c in self.counters.items()}
+
+    def stats(self) -> dict:
+        return dict(self.totals, mode=self.mode, files=len(self._files), last_error=self.last_error)
+
+
+# =========================
+# Ingesteur partagé (monitor_loop.py)
+# =========================
+_ingester = None
+
+
+def start_ingester(sources=None, listeners=()) -> LogIngester:
+    """listeners branchés avant le premier scan: aucune entrée reprise après redémarrage n'est perdue."""
+    global _ingester
+    if _ingester is None or not _ingester.is_alive():
+        _ingester = LogIngester(sources)
+        for fn in listeners:
+            _ingester.add_listener(fn)
+        _ingester.start()
+    return _ingester
+
+
+def active_ingester():
+    w = _ingester
+    return w if w is not None and w.is_alive() else None
+
+
+def ingester_snapshot() -> dict:
+    w = active_ingester()
+    return w.snapshot() if w is not None else {}
+
+
+def ingester_stats() -> dict:
+    w = _ingester
+    return w.stats() if w is not None else {"mode": "off", "files": 0, "records": 0, "bytes_read": 0}
+
+
+def stop_ingester():
+    global _ingester
+    if _ingester is not None:
+        _ingester.stop()
+        _ingester = None
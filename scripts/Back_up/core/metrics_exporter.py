@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: metrics_exporter.py
+"""
+Exporteur Prometheus (/metrics) embarqué dans monitor_loop.py.
+
+Les scrapes sont servis depuis un instantané en mémoire: aucune sonde, aucune
+lecture disque. monitor_loop met l'instantané à jour après chaque étape:
+- update_entry(data_entry): dernière entrée de run_quick_check (docker_services,
+  network, plex, system, deluge, containers, storage, logs, performance, meta)
+- update_alert_state(state): contenu de alert_state.json
+
+Conversion d'une entrée:
+- nombre / booléen        → gauge rober_<section>_<champ> (booléen = 0/1)
+- chaîne                  → rober_<section>_<champ>_info{value="..."} 1
+- liste de scalaires      → rober_<section>_<champ>_info{value="..."} 1 par élément
+- dict à clés dynamiques  → label (service, mount, container, probe, state, tracker,
+  source, component, indexer)
+- compteurs cumulatifs (COUNTERS) → type counter; octets par tracker cumulés ici
+  (une seule fois par entrée: même timestamp = même échantillon)
+- texte libre (SKIP: erreurs, raisons, noms de torrents) → non exporté
+
+Environment:
+  METRICS_PORT (9105, 0 = désactivé), METRICS_BIND (0.0.0.0)
+"""
+
+import os
+import re
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9105"))
+METRICS_BIND = os.environ.get("METRICS_BIND", "0.0.0.0")
+PREFIX = "rober"
+
+# chemin du dict → nom du label porté par ses clés
+LABELLED = {
+    "docker_services": "service",
+    "storage": "mount",
+    "containers": "container",
+    "performance.probes": "probe",
+    "deluge.telemetry.states": "state",
+    "performance.public_ip.winners": "provider",
+    "performance.public_ip.cached": "namespace",
+    "performance.dns": "resolver",
+    "performance.http": "target",
+    "logs": "source",
+    "logs.errors_by_component": "component",
+    "logs.warnings_by_component": "component",
+    "logs.indexers": "indexer",
+    "jackett.indexers": "indexer",
+}
+# chemins (sans labels) dont la valeur ne fait que croître
+COUNTERS = {
+    "system.internet_io.sent_mb", "system.internet_io.received_mb",
+    "system.disk_io.read_mb", "system.disk_io.write_mb",
+    "containers.io_read_mb", "containers.io_write_mb",
+    "performance.deluge_rpc.connects", "performance.deluge_rpc.connect_failures",
+    "performance.deluge_rpc.reconnects", "performance.deluge_rpc.calls", "performance.deluge_rpc.call_errors",
+    "performance.docker_api.requests", "performance.docker_api.connects", "performance.docker_api.errors",
+    "performance.docker_api.container_list_calls",
+    "performance.docker_events.events", "performance.docker_events.reconnects",
+    "performance.public_ip.lookups", "performance.public_ip.cache_hits", "performance.public_ip.joined",
+    "performance.public_ip.failures", "performance.public_ip.winners",
+    "performance.dns.queries", "performance.dns.errors", "performance.dns.tcp",
+    "performance.http.requests", "performance.http.reused", "performance.http.connects",
+    "performance.http.errors", "performance.http.retries",
+    "performance.log_ingest.events", "performance.log_ingest.scans", "performance.log_ingest.reads",
+    "performance.log_ingest.bytes_read", "performance.log_ingest.records", "performance.log_ingest.rotations",
+    "performance.log_ingest.truncations",
+    "performance.discord.posts", "performance.discord.delivered", "performance.discord.retries",
+    "performance.discord.rate_limited", "performance.discord.dropped", "performance.discord.recovered",
+    "performance.notify.digests", "performance.notify.suppressed",
+}
+# texte libre (messages d'erreur, noms de torrents): une série _info par valeur distincte
+# ferait croître la base sans fin; l'état borné voisin (status, state, code) reste exporté
+SKIP = {
+    "timestamp", "deluge.telemetry.tracker_bytes", "deluge.telemetry.slowest.name",
+    "deluge.activity.reason", "plex.local_detail", "plex.external_detail",
+    "performance.probes.error", "performance.deluge_rpc.last_error", "performance.docker_events.last_error",
+    "performance.dns.last_error", "performance.log_ingest.last_error", "performance.discord.last_error",
+}
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _metric_name(path):
+    return _NAME_RE.sub("_", f"{PREFIX}_{path.replace('.', '_')}").lower()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Builder:
+    def __init__(self):
+        self.types = {}
+        self.samples = {}
+
+    def add(self, name, value, labels=None, kind="gauge"):
+        if isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, (int, float)):
+            return
+        self.types.setdefault(name, kind)
+        lbl = ""
+        if labels:
+            lbl = "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+        self.samples.setdefault(name, []).append((lbl, value))
+
+    def render(self) -> str:
+        # format texte Prometheus: toutes les séries d'une métrique regroupées sous son # TYPE
+        lines = []
+        for name, series in self.samples.items():
+            lines.append(f"# TYPE {name} {self.types[name]}")
+            lines.extend(f"{name}{lbl} {value}" for lbl, value in series)
+        return "\n".join(lines) + "\n"
+
+
+def _walk(b, path, obj, labels, schema_path, keyed=False):
+    if schema_path in SKIP or obj is None:
+        return
+    if isinstance(obj, dict):
+        label = None if keyed else LABELLED.get(schema_path)
+        for key, value in obj.items():
+            if label:
+                _walk(b, path, value, dict(labels, **{label: key}), schema_path, keyed=True)
+            else:
+                _walk(b, f"{path}.{key}", value, labels, f"{schema_path}.{key}")
+        return
+    if isinstance(obj, (list, tuple)):
+        for rank, item in enumerate(obj):
+            if isinstance(item, dict):
+                _walk(b, path, item, dict(labels, rank=rank), schema_path)
+            elif item is not None:
+                b.add(_metric_name(path) + "_info", 1, dict(labels, value=item))
+        return
+    if isinstance(obj, str):
+        b.add(_metric_name(path) + "_info", 1, dict(labels, value=obj))
+        return
+    kind = "counter" if schema_path in COUNTERS else "gauge"
+    name = _metric_name(path) + ("_total" if kind == "counter" else "")
+    b.add(name, obj, labels, kind)
+
+
+class MetricsExporter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry = None
+        self._alert_state = None
+        self._tracker_bytes = {}
+        self._last_ts = None
+        self._updates = 0
+        self._text = "\n"
+        self._server = None
+
+    # ---------- mises à jour (monitor_loop) ----------
+    def update_entry(self, entry):
+        if not isinstance(entry, dict):
+            return
+        moved = ((entry.get("deluge") or {}).get("telemetry") or {}).get("tracker_bytes") or {}
+        ts = entry.get("timestamp")
+        with self._lock:
+            # monitor_loop peut repousser la même entrée (relecture du store): ne pas recompter ses octets
+            if ts is None or ts != self._last_ts:
+                for tracker, n in moved.items():
+                    self._tracker_bytes[tracker] = self._tracker_bytes.get(tracker, 0) + n
+                self._last_ts = ts
+            self._entry = entry
+            self._updates += 1
+            self._text = self._build()
+
+    def update_alert_state(self, state):
+        if not isinstance(state, dict):
+            return
+        with self._lock:
+            self._alert_state = state
+            self._text = self._build()
+
+    # ---------- rendu ----------
+    def _build(self) -> str:
+        b = _Builder()
+        entry = self._entry or {}
+        for section, value in entry.items():
+            _walk(b, section, value, {}, section)
+        for tracker, n in self._tracker_bytes.items():
+            b.add(f"{PREFIX}_deluge_tracker_bytes_total", n, {"tracker": tracker}, "counter")
+        ts = entry.get("timestamp")
+        if ts:
+            try:
+                b.add(f"{PREFIX}_last_sample_timestamp_seconds", datetime.fromisoformat(ts).timestamp())
+            except ValueError:
+                pass
+        for key, value in (self._alert_state or {}).items():
+            if isinstance(value, dict):
+                status = value.get("status")
+                if status is not None:
+                    b.add(f"{PREFIX}_alert_status", 1, {"check": key, "status": status})
+                for field in ("failure_streak", "success_streak"):
+                    b.add(f"{PREFIX}_alert_{field}", value.get(field), {"check": key})
+                if isinstance(value.get("window"), str):  # anneau alert_engine ("01101")
+                    b.add(f"{PREFIX}_alert_window_failures", value["window"].count("1"), {"check": key})
+            elif isinstance(value, str):
+                b.add(f"{PREFIX}_alert_state_info", 1, {"key": key, "value": value})
+            else:
+                b.add(f"{PREFIX}_alert_{_NAME_RE.sub('_', key)}", value)
+        b.add(f"{PREFIX}_exporter_updates_total", self._updates, kind="counter")
+        return b.render()
+
+    def render(self) -> str:
+        with self._lock:
+            return self._text
+
+    # ---------- serveur HTTP ----------
+    def serve(self, port=METRICS_PORT, bind=METRICS_BIND):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((bind, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+_exporter = None
+
+
+def get_exporter() -> MetricsExporter:
+    global _exporter
+    if _exporter is None:
+        _exporter = MetricsExporter()
+    return _exporter
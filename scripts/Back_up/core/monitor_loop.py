@@ -10,6 +10,28 @@ Volumes pertinents dans le conteneur:
 - /mnt/data       (persistant)
 
 Commande lancée: ["python3", "/app/monitor_loop.py"]
+
+Modes (MONITOR_MODE):
+- daemon (défaut): run_quick_check et monitor_repair sont importés une seule fois et
+  appelés en process; modules, clients, config et état restent en mémoire entre cycles.
+- subprocess: isolation complète, un "python3 <script>" par étape (ancien comportement).
+  Utilisé aussi en secours si l'import d'un module échoue.
+
+En mode daemon, un thread suit le flux Docker /events (docker_events.py) pour
+WATCH_CONTAINERS: notification Discord dès qu'un conteneur s'arrête / passe unhealthy,
+et run_quick_check lit l'état des conteneurs dans cette table au lieu d'interroger Docker.
+
+Thread d'ingestion des logs Radarr / Sonarr / Jackett (log_ingest.py, inotify, offsets
+persistés): compteurs glissants publiés dans la section "logs" de l'entrée; les
+recherches Jackett alimentent aussi le stockage colonnaire de jackett_stats.py.
+
+Notifications Discord mises en file (discord_dispatch.py): regroupées, rythmées sur les
+en-têtes X-RateLimit-*, persistées si non livrées; vidées à l'arrêt. Les messages d'une
+même panne (conteneur arrêté, règle d'alerte, vérification Deluge, test Plex) forment un
+incident notify_digest.py: répétitions supprimées, digest périodique "N checks still failing".
+
+Exporteur Prometheus sur :METRICS_PORT/metrics (metrics_exporter.py), servi depuis un
+instantané mis à jour après chaque étape (dernière entrée + alert_state.json).
 """
 
 import os, sys, time, json, signal, subprocess, urllib.request
@@ -44,11 +66,14 @@ LOOP_INTERVAL_SECONDS = int(os.environ.get("LOOP_INTERVAL_SECONDS", "60"))   # d
 STEP_DELAY_SECONDS    = int(os.environ.get("STEP_DELAY_SECONDS", "20"))      # délai entre étapes
 MONITOR_REPAIR        = os.environ.get("MONITOR_REPAIR", "/app/monitor_repair.py")
 QUICK_CHECK           = os.environ.get("QUICK_CHECK", "/app/run_quick_check.py")
-MONITOR_LOG_FILE      = os.environ.get("MONITOR_LOG_FILE", "/mnt/data/system_monitor_log.json")
+MONITOR_LOG_FILE      = os.environ.get("MONITOR_LOG_FILE", os.environ.get("MONITOR_STORE_DIR", "/mnt/data/system_monitor_log.d"))
 ALERT_STATE_FILE      = os.environ.get("ALERT_STATE_FILE", "/mnt/data/alert_state.json")
 DISCORD_WEBHOOK       = os.environ.get("DISCORD_WEBHOOK", "").strip()
 DEBUG                 = os.environ.get("DEBUG", "1") == "1"
+MONITOR_MODE          = os.environ.get("MONITOR_MODE", "daemon").strip().lower()   # daemon | subprocess
 LOG_PATH              = os.environ.get("LOG_PATH", "/mnt/data/monitor_loop.log")
+METRICS_PORT          = int(os.environ.get("METRICS_PORT", "9105"))               # 0 = exporteur désactivé
+WATCH_CONTAINERS      = [c.strip() for c in os.environ.get("WATCH_CONTAINERS", "plex-server,vpn,deluge").split(",") if c.strip()]
 
 RUN = True
 
@@ -77,7 +102,22 @@ for p in ["/app/discord/discord_notify.py",
         except Exception as e:
             print(f"[DEBUG] Failed to import discord_notify from {p}: {e}", flush=True)
 
-def notify(msg: str):
+try:
+    import notify_digest   # incidents + digests, puis file d'envoi groupé discord_dispatch (jamais bloquant)
+except Exception as e:
+    notify_digest = None
+    print(f"[DEBUG] notify_digest unavailable, direct sends: {e}", flush=True)
+
+def notify(msg: str, incident=None, resolved=False):
+    """incident=(composant, clé): répétitions regroupées par notify_digest; resolved=True ferme l'incident."""
+    if notify_digest is not None:
+        if incident and resolved:
+            notify_digest.resolve(*incident, message=msg)
+            return
+        if (notify_digest.report(*incident, message=msg) if incident else notify_digest.send(msg)):
+            return
+    if not msg:
+        return
     if send_discord_message:
         try:
             send_discord_message(msg); return
@@ -136,11 +176,165 @@ def run_cmd(cmd, title=None, cwd=None, extra_env=None):
         notify(f"❌ monitor_loop: {title or 'cmd'} exception: {e}")
         return 1, "", str(e)
 
+# --------- In-process helpers (mode daemon) ----------
+_modules = {}
+_import_failed = set()
+
+def load_module(name, path):
+    """Importe un script une seule fois; None si indisponible (→ repli subprocess)."""
+    if MONITOR_MODE != "daemon" or name in _import_failed:
+        return None
+    mod = _modules.get(name)
+    if mod is not None:
+        return mod
+    try:
+        mod_dir = str(Path(path).resolve().parent)
+        if mod_dir not in sys.path:
+            sys.path.insert(0, mod_dir)
+        spec = importlib.util.spec_from_file_location(name, path)
+        mod = importlib.util.module_from_spec(spec)
+        sys.modules[name] = mod
+        spec.loader.exec_module(mod)  # type: ignore
+    except Exception as e:
+        sys.modules.pop(name, None)
+        _import_failed.add(name)
+        log(f"[WARN] in-process import of {name} failed ({e}); falling back to subprocess.")
+        return None
+    _modules[name] = mod
+    dlog(f"Module {name} loaded in-process from {path}")
+    return mod
+
+def call_in_process(title, fn, *args):
+    dlog(f"CALL {title} (in-process)")
+    try:
+        rc = fn(*args)
+    except SystemExit as e:
+        rc = e.code
+    except Exception as e:
+        log(f"[ERROR] {title} exception: {e}")
+        notify(f"❌ monitor_loop: {title} exception: {e}")
+        return 1
+    return 0 if rc in (None, 0) else rc
+
+def _repair_module():
+    mod = load_module("monitor_repair", MONITOR_REPAIR)
+    if mod is not None:
+        mod.ALERT_STATE_FILE = ALERT_STATE_FILE
+    return mod
+
+# --------- Watcher d'événements Docker (mode daemon) ----------
+def on_container_event(name, action, state):
+    kind = action.split(":", 1)[0]
+    if kind == "die":
+        oom = ", OOM" if state.get("oom") else ""
+        log(f"[EVENT] {name} died (exit={state.get('exit_code')}{oom})")
+        notify(f"🔴 monitor_loop: `{name}` s'est arrêté (exit={state.get('exit_code')}{oom}).", incident=(name, "down"))
+    elif kind == "start":
+        log(f"[EVENT] {name} started")
+        notify(f"🟢 monitor_loop: `{name}` a démarré.", incident=(name, "down"), resolved=True)
+    elif kind == "health_status":
+        log(f"[EVENT] {name} health={state.get('health')}")
+        if state.get("health") == "unhealthy":
+            notify(f"⚠️ monitor_loop: `{name}` est unhealthy.", incident=(name, "unhealthy"))
+        elif state.get("health") == "healthy":
+            notify(None, incident=(name, "unhealthy"), resolved=True)
+    else:
+        dlog(f"[EVENT] {name} {action}")
+
+def start_container_watcher():
+    """Abonnement au flux /events (docker_events.py); partagé avec run_quick_check via sys.modules."""
+    mod = load_module("docker_events", str(Path(QUICK_CHECK).parent / "docker_events.py"))
+    if mod is None:
+        return None
+    mod.start_watcher(WATCH_CONTAINERS, on_container_event)
+    dlog(f"Docker events watcher started for {', '.join(WATCH_CONTAINERS)}")
+    return mod
+
+# --------- Ingestion des logs *arr / Jackett ----------
+_log_ingest = None
+
+def start_log_ingester():
+    """Thread log_ingest.py; actif dans les deux modes (run_quick_check le lit via sys.modules en daemon)."""
+    global _log_ingest
+    try:
+        import log_ingest
+        if not log_ingest.LOG_INGEST:
+            return None
+        listeners = []
+        try:
+            import jackett_stats
+            listeners.append(jackett_stats.get_store().on_record)
+        except Exception as e:
+            log(f"[WARN] jackett stats disabled: {e}")
+        log_ingest.start_ingester(listeners=listeners)
+        _log_ingest = log_ingest
+        dlog(f"Log ingester started (radarr, sonarr, jackett{', jackett_stats' if listeners else ''})")
+    except Exception as e:
+        _log_ingest = None
+        log(f"[WARN] log ingester not started: {e}")
+    return _log_ingest
+
+# --------- Import de l'ancien system_monitor_log.json ----------
+def import_legacy_log():
+    """Import unique (reprenable) de MONITOR_LEGACY_FILE dans le store, avant la première sonde."""
+    if not Path(MONITOR_LOG_FILE).is_dir() and Path(MONITOR_LOG_FILE).exists():
+        return
+    try:
+        import monitor_store
+        t0 = time.time()
+        if monitor_store.migrate_legacy_once(MONITOR_LOG_FILE):
+            log(f"Legacy log imported into {MONITOR_LOG_FILE} in {time.time() - t0:.1f}s")
+    except Exception as e:
+        log(f"[WARN] legacy log import skipped: {e}")
+
+# --------- Exporteur Prometheus (instantané mis à jour après chaque étape) ----------
+_exporter = None
+
+def start_metrics_exporter():
+    """Serveur /metrics (metrics_exporter.py); actif dans les deux modes, monitor_loop étant persistant."""
+    global _exporter
+    try:
+        import metrics_exporter
+        _exporter = metrics_exporter.get_exporter()
+        _exporter.serve(port=METRICS_PORT)
+        log(f"Prometheus exporter listening on :{METRICS_PORT}/metrics")
+    except Exception as e:
+        _exporter = None
+        log(f"[WARN] metrics exporter not started: {e}")
+
+def refresh_metrics_entry():
+    if _exporter is None:
+        return
+    try:
+        import monitor_store
+        if Path(MONITOR_LOG_FILE).is_dir():
+            entry = monitor_store.read_latest(MONITOR_LOG_FILE)
+        else:
+            entry = monitor_store.read_last_entry(MONITOR_LOG_FILE)
+        if isinstance(entry, dict) and "logs" not in entry and _log_ingest is not None:
+            # mode subprocess: run_quick_check n'a pas accès au thread d'ingestion
+            entry = dict(entry, logs=_log_ingest.ingester_snapshot())
+        _exporter.update_entry(entry)
+    except Exception as e:
+        dlog(f"metrics: latest entry unavailable ({e})")
+
+def refresh_metrics_alerts():
+    if _exporter is None:
+        return
+    try:
+        with open(ALERT_STATE_FILE, "r", encoding="utf-8") as f:
+            _exporter.update_alert_state(json.load(f))
+    except Exception as e:
+        dlog(f"metrics: alert state unavailable ({e})")
+
 # --------- Étapes ----------
 def step_quick_check():
     if not Path(QUICK_CHECK).is_file():
         dlog(f"QUICK_CHECK not found at {QUICK_CHECK}; skipping.")
         return True
+    mod = load_module("run_quick_check", QUICK_CHECK)
+    if mod is not None:
+        return call_in_process("run_quick_check", mod.main) == 0
     rc, _, _ = run_cmd(["python3", QUICK_CHECK], title="run_quick_check", cwd="/app")
     return rc == 0
 
@@ -149,6 +343,9 @@ def step_alerts():
         log(f"[ERROR] monitor_repair not found at {MONITOR_REPAIR}")
         notify("❌ monitor_loop: monitor_repair.py introuvable.")
         return False
+    mod = _repair_module()
+    if mod is not None:
+        return call_in_process("alerts", mod.run_alerts_once, MONITOR_LOG_FILE) == 0
     extra_env = {"ALERT_STATE_FILE": ALERT_STATE_FILE}
     rc, _, _ = run_cmd(
         ["python3", MONITOR_REPAIR, "--alerts", "--alerts-from", MONITOR_LOG_FILE],
@@ -163,6 +360,11 @@ def step_repair():
         log(f"[ERROR] monitor_repair not found at {MONITOR_REPAIR}")
         notify("❌ monitor_loop: monitor_repair.py introuvable.")
         return False
+    mod = _repair_module()
+    if mod is not None:
+        if call_in_process("repair-deluge-verify", mod.handle_deluge_verification) != 0:
+            return False
+        return call_in_process("repair-auto-plex", mod.run_auto_plex) == 0
     # 1) Vérification/réparation Deluge si marqué inactive
     rc, _, _ = run_cmd(["python3", MONITOR_REPAIR, "--deluge-verify"],
                        title="repair-deluge-verify",
@@ -179,7 +381,14 @@ def step_repair():
 def main():
     # message de démarrage
     notify("🟢 monitor_loop: started.")
-    log("monitor_loop started.")
+    log(f"monitor_loop started (mode={MONITOR_MODE}).")
+    import_legacy_log()
+    events_mod = start_container_watcher() if WATCH_CONTAINERS else None
+    start_log_ingester()
+    if METRICS_PORT:
+        start_metrics_exporter()
+        refresh_metrics_entry()
+        refresh_metrics_alerts()
 
     while RUN:
         cycle_start = time.time()
@@ -187,6 +396,7 @@ def main():
             # Étape 1: quick check (optionnel)
             dlog("Step: quick_check")
             step_quick_check()
+            refresh_metrics_entry()
             time.sleep(STEP_DELAY_SECONDS)
 
             # Étape 2: alerts
@@ -194,6 +404,7 @@ def main():
             ok_alerts = step_alerts()
             if not ok_alerts:
                 log("[WARN] alerts step returned non-zero.")
+            refresh_metrics_alerts()
 
             time.sleep(STEP_DELAY_SECONDS)
 
@@ -202,6 +413,11 @@ def main():
             ok_repair = step_repair()
             if not ok_repair:
                 log("[WARN] repair step returned non-zero.")
+            refresh_metrics_alerts()
+
+            # digest des incidents encore ouverts (au plus un toutes les NOTIFY_DIGEST_SEC)
+            if notify_digest is not None:
+                notify_digest.tick()
 
         except Exception as e:
             log(f"[ERROR] loop exception: {e}")
@@ -215,6 +431,14 @@ def main():
                 break
             time.sleep(1)
 
+    if events_mod is not None:
+        events_mod.stop_watcher()
+    if _log_ingest is not None:
+        _log_ingest.stop_ingester()
+        if "jackett_stats" in sys.modules:
+            sys.modules["jackett_stats"].get_store().flush()
+    if _exporter is not None:
+        _exporter.shutdown()
     log("monitor_loop stopped.")
     notify("🟡 monitor_loop: stopped.")
 
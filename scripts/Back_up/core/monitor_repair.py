@@ -5,7 +5,8 @@
 Unified alerts + repair orchestrator (single-file edition).
 
 Combines:
-- alerts.py (anti-flap alerts reading /mnt/data/system_monitor_log.json → /mnt/data/alert_state.json)
+- alerts.py (anti-flap alerts reading the monitor store /mnt/data/system_monitor_log.d → /mnt/data/alert_state.json),
+  now evaluated by the rolling-window rules of alert_engine.py
 - repair.py (Deluge verify/repair orchestration, Plex external test cadence + cooldown, Discord notify)
 - plex_online.py (embedded) -- can also call external if present
 - ip_adresse_up.py (embedded) -- can also call external if present (also detects ip_adress_up.py)
@@ -20,29 +21,41 @@ CLI (high level):
 
 Environment (highlights):
   MONITOR_LOG_FILE, ALERT_STATE_FILE
-  LOCAL_FAILS_FOR_ALERT, LOCAL_SUCCESSES_TO_CLEAR, EXTERNAL_FAILS_FOR_ALERT, EXTERNAL_SUCCESSES_TO_CLEAR
+  anti-flap thresholds: see alert_engine.py (LOCAL_FAILS_FOR_ALERT, ALERT_<RULE>_FAILS, ...)
   PLEX_TEST_COOLDOWN, AUTO_PLEX_FORCE
   DELUGE_CONFIG_PATH (/app/config/deluge/core.conf), VPN_CONTAINER, DELUGE_CONTAINER
   CONTAINER (nginx-proxy), PLEX_CONTAINER, DOMAIN, CONF_PATH, LE_PATH, DUCKDNS_DOMAIN, DUCKDNS_TOKEN
-  DISCORD_WEBHOOK (used by embedded scripts if --plex-discord or deluge-ip-up flow runs)
+  DISCORD_WEBHOOK (used by embedded scripts if --plex-discord or deluge-ip-up flow runs);
+  messages are queued and batched by discord_dispatch.py (DISCORD_QUEUE_FILE, DISCORD_COALESCE_SEC, ...)
+  and grouped by incident by notify_digest.py (NOTIFY_DEDUP_WINDOW_SEC, NOTIFY_DIGEST_SEC, ...)
 
 Notes:
 - If external scripts exist, we’ll prefer them. Otherwise we run the embedded implementations below.
 """
 
 import argparse
+import copy
 import json
 import os
 import re
-import shlex
-import shutil
-import socket
 import subprocess
 import sys
 import time
 import urllib.request
 from pathlib import Path
-from datetime import datetime, timezone
+from datetime import datetime
+
+import alert_engine
+import cert_inspector
+import dns_client
+import docker_api
+import http_probe
+import monitor_store
+import nginx_bundle
+import nginx_conf
+import notify_digest
+import public_ip
+from probe_engine import Node, run_result_dag
 
 # =========================
 # Robust .env loading
@@ -128,15 +141,9 @@ load_env_robust()
 BASE_DIR = Path(__file__).resolve().parent
 
 # Alert files/paths
-LOG_FILE = os.environ.get("MONITOR_LOG_FILE", "/mnt/data/system_monitor_log.json")
+LOG_FILE = os.environ.get("MONITOR_LOG_FILE", monitor_store.STORE_DIR)
 ALERT_STATE_FILE = os.environ.get("ALERT_STATE_FILE", "/mnt/data/alert_state.json")
 
-# Anti-flap thresholds (can be overridden via env)
-LOCAL_FAILS_FOR_ALERT = int(os.getenv("LOCAL_FAILS_FOR_ALERT", "3"))
-LOCAL_SUCCESSES_TO_CLEAR = int(os.getenv("LOCAL_SUCCESSES_TO_CLEAR", "2"))
-EXTERNAL_FAILS_FOR_ALERT = int(os.getenv("EXTERNAL_FAILS_FOR_ALERT", "3"))
-EXTERNAL_SUCCESSES_TO_CLEAR = int(os.getenv("EXTERNAL_SUCCESSES_TO_CLEAR", "2"))
-
 # Repair config / cooldown
 CONFIG_PATH = os.environ.get("DELUGE_CONFIG_PATH", os.environ.get("DELUGE_CORE_CONF", "/app/config/deluge/core.conf"))
 PLEX_TEST_COOLDOWN = int(os.environ.get("PLEX_TEST_COOLDOWN", "300"))
@@ -197,14 +204,14 @@ def resolve_deluge_ip_script() -> Path | None:
 # Discord setup (shared simple sender)
 # =========================
 def _simple_discord_send(msg: str):
-    hook = os.environ.get("DISCORD_WEBHOOK", "").strip()
-    if not hook: return
-    try:
-        data = json.dumps({"content": msg[:1900]}).encode("utf-8")
-        req = urllib.request.Request(hook, data=data, headers={"Content-Type": "application/json"})
-        urllib.request.urlopen(req, timeout=8).read()
-    except Exception:
-        pass
+    # mise en file seulement: le thread discord_dispatch regroupe et poste (jamais bloquant ici);
+    # un texte identique déjà envoyé dans la fenêtre de notify_digest n'est que compté
+    notify_digest.send(msg)
+
+def _incident(rule_name: str):
+    # règle alert_engine → incident notify_digest: "deluge_stalled" → ("deluge", "stalled")
+    component, _, key = rule_name.partition("_")
+    return component, key or "alert"
 
 # =========================
 # Alert state helpers
@@ -218,9 +225,21 @@ def _default_alert_state():
         "plex_last_test_ts": 0,
     }
 
+# Cache mémoire (mode daemon): le fichier n'est relu que si un autre process l'a modifié
+_alert_state_cache = {"mtime_ns": None, "data": None}
+
+def _alert_state_mtime():
+    try:
+        return os.stat(ALERT_STATE_FILE).st_mtime_ns
+    except OSError:
+        return None
+
 def load_alert_state():
+    mtime = _alert_state_mtime()
+    if mtime is not None and mtime == _alert_state_cache["mtime_ns"]:
+        return copy.deepcopy(_alert_state_cache["data"])
     try:
-        if os.path.exists(ALERT_STATE_FILE):
+        if mtime is not None:
             with open(ALERT_STATE_FILE, "r") as f:
                 data = json.load(f)
                 if isinstance(data, dict):
@@ -230,6 +249,7 @@ def load_alert_state():
                         else: data.setdefault(k, v)
                     if "plex_external_status" not in data:
                         data["plex_external_status"] = (data.get("plex_external", {}) or {}).get("status", "unknown")
+                    _alert_state_cache.update(mtime_ns=mtime, data=copy.deepcopy(data))
                     return data
     except Exception:
         pass
@@ -239,6 +259,7 @@ def save_alert_state(state):
     try:
         with open(ALERT_STATE_FILE, "w") as f:
             json.dump(state, f)
+        _alert_state_cache.update(mtime_ns=_alert_state_mtime(), data=copy.deepcopy(state))
     except Exception:
         pass
 
@@ -248,40 +269,36 @@ def save_alert_state(state):
 def read_last_entry_universal(path):
     """
     Supporte :
+      - dossier = store segmenté (monitor_store) -> dernière entrée du segment tail
+      - fichier = NDJSON (1 objet JSON par ligne) -> dernière ligne complète, lue depuis la fin
+        (mémoire/temps bornés, offset/inode en cache entre deux appels)
+      - fichier = tableau d'objets -> retourne le dernier (ancien format, lecture complète)
       - fichier = objet unique -> retourne l'objet
-      - fichier = tableau d'objets -> retourne le dernier
-      - fichier = NDJSON (1 objet JSON par ligne) -> retourne la dernière ligne valide
     """
+    p = Path(path)
+    if p.is_dir():
+        return monitor_store.read_latest(p)
+    entry = monitor_store.read_last_entry(p)
+    if entry is not None:
+        return entry
+
+    # Ancien format: lecture complète seulement pour un tableau JSON ou un petit fichier
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            txt = f.read().strip()
+        size = p.stat().st_size
+        with open(p, "rb") as f:
+            head = f.read(64).lstrip()
     except FileNotFoundError:
         return None
-    if not txt:
+    if not head or (not head.startswith(b"[") and size > monitor_store.MAX_RECORD_BYTES):
         return None
-
-    # 1) JSON "normal"
     try:
-        obj = json.loads(txt)
-        if isinstance(obj, list):
-            return obj[-1] if obj else None
-        if isinstance(obj, dict):
-            return obj
-    except json.JSONDecodeError:
-        pass
-
-    # 2) NDJSON (dernière ligne non vide + valide)
-    last = None
-    for ln in txt.splitlines():
-        ln = ln.strip()
-        if not ln:
-            continue
-        last = ln
-    if last:
-        try:
-            return json.loads(last)
-        except Exception:
-            return None
+        obj = json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if isinstance(obj, list):
+        return obj[-1] if obj else None
+    if isinstance(obj, dict):
+        return obj
     return None
 
 # =========================
@@ -293,64 +310,6 @@ def read_latest_data(log_path: str | Path = LOG_FILE):
         print(f"[ERROR] Unable to read data (empty or invalid): {log_path}")
     return data
 
-def check_plex_local(data, state):
-    plex = data.get("plex", {}) or {}
-    local_access = bool(plex.get("local_access", False))
-    connected = bool(plex.get("connected", False))
-    is_up = local_access or connected
-    node = state.setdefault("plex_local", {"status": "unknown", "failure_streak": 0, "success_streak": 0})
-    prev_status = node.get("status", "unknown")
-    if is_up:
-        node["success_streak"] += 1; node["failure_streak"] = 0
-        if prev_status != "online" and node["success_streak"] >= LOCAL_SUCCESSES_TO_CLEAR:
-            node["status"] = "online"; print("[OK] Plex is accessible locally.")
-            if prev_status == "offline": _simple_discord_send("[ALERT - END] Plex local access restored.")
-    else:
-        node["failure_streak"] += 1; node["success_streak"] = 0
-        if prev_status != "offline" and node["failure_streak"] >= EXTERNAL_FAILS_FOR_ALERT:
-            node["status"] = "offline"; print("[ALERT] Plex local access lost.")
-            _simple_discord_send("[ALERT - initial] Plex local access lost (after consecutive failures).")
-    state["plex_local"] = node
-
-def check_plex_external(data, state):
-    plex = data.get("plex", {}) or {}
-    external_access = str(plex.get("external_access", "")).lower()
-    external_detail = str(plex.get("external_detail", ""))
-    is_up = (external_access == "yes")
-    node = state.setdefault("plex_external", {"status": "unknown", "failure_streak": 0, "success_streak": 0})
-    prev_status = node.get("status", "unknown")
-    if is_up:
-        node["success_streak"] += 1; node["failure_streak"] = 0
-        if prev_status != "online" and node["success_streak"] >= EXTERNAL_SUCCESSES_TO_CLEAR:
-            node["status"] = "online"; print("[OK] Plex is accessible externally.")
-            if prev_status == "offline": _simple_discord_send("[ALERT - END] Plex is online from outside.")
-    else:
-        node["failure_streak"] += 1; node["success_streak"] = 0
-        if prev_status != "offline" and node["failure_streak"] >= EXTERNAL_FAILS_FOR_ALERT:
-            node["status"] = "offline"; print("[ALERT] Plex external access lost.")
-            if "via_ip_ok" in external_detail:
-                _simple_discord_send("[ALERT - initial] External DNS resolution appears broken (fallback IP works).")
-            elif external_access == "error":
-                _simple_discord_send(f"[ALERT] Plex external check error: {external_detail}")
-            else:
-                _simple_discord_send("[ALERT - initial] Plex appears offline from outside (after consecutive failures).")
-    state["plex_external"] = node
-    state["plex_external_status"] = node["status"]
-
-def check_deluge(data, state):
-    deluge = data.get("deluge", {}) or {}
-    download_kbps = deluge.get("download_rate_kbps", 0.0)
-    upload_kbps = deluge.get("upload_rate_kbps", 0.0)
-    current_state = "inactive" if download_kbps == 0.0 and upload_kbps == 0.0 else "active"
-    last_state = state.get("deluge_status")
-    if current_state == "inactive" and last_state != "inactive":
-        print("[ALERT] Deluge has become inactive.")
-        _simple_discord_send("[ALERT - initial] Deluge appears inactive: no traffic detected.")
-    elif current_state == "active" and last_state == "inactive":
-        print("[OK] Deluge is active again.")
-        _simple_discord_send("[ALERT - END] Deluge is active again.")
-    state["deluge_status"] = current_state
-
 def run_alerts_once(log_path: str | Path = LOG_FILE):
     print("[MONITOR] Alerts evaluation...")
     data = read_latest_data(log_path)
@@ -358,10 +317,28 @@ def run_alerts_once(log_path: str | Path = LOG_FILE):
         print("[WARN] No data to evaluate.")
         return 1
     state = load_alert_state()
-    check_plex_external(data, state)
-    check_plex_local(data, state)
-    check_deluge(data, state)
-    save_alert_state(state)
+    fresh = "engine" not in state
+    engine = alert_engine.AlertEngine(alert_engine.default_rules(), state)
+    if fresh and os.path.isdir(str(log_path)):
+        # premier passage du moteur: fenêtres reconstruites depuis l'historique récent, sans notifier
+        since = datetime.fromtimestamp(time.time() - alert_engine.WARMUP_SEC).isoformat()
+        latest_ts = data.get("timestamp") or ""
+        n = alert_engine.warm_up(engine, (e for e in monitor_store.get_store(log_path).iter_entries(since)
+                                          if (e.get("timestamp") or "") < latest_ts))
+        print(f"[MONITOR] Alert windows warmed up from {n} past samples.")
+    for event in engine.feed(data):
+        print(event["message"])
+        if event["notify"]:
+            component, key = _incident(event["rule"])
+            if event["kind"] == "fire":
+                notify_digest.report(component, key, event["message"])
+            else:
+                notify_digest.resolve(component, key, event["message"])
+    for rule in engine.rules:
+        if rule.notify and state[rule.name].get("status") == "offline":
+            # panne toujours en cours: l'incident reste ouvert pour les digests
+            notify_digest.report(*_incident(rule.name), notify=False)
+    save_alert_state(engine.sync())
     return 0
 
 # =========================
@@ -372,6 +349,27 @@ def run(cmd, timeout=None):
     p = subprocess.run(cmd, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout or None)
     return p.returncode, (p.stdout or "").strip(), (p.stderr or "").strip()
 
+def docker_exec_in(container, args, timeout=None):
+    # Docker Engine API (docker_api.py) au lieu de `docker exec`; 125 = code du CLI si le daemon est injoignable
+    try:
+        return docker_api.get_client().exec(container, args, timeout=timeout)
+    except docker_api.DockerAPIError as e:
+        return 125, "", str(e)
+
+def docker_restart(container):
+    try:
+        docker_api.get_client().restart(container)
+        return 0, "", ""
+    except docker_api.DockerAPIError as e:
+        return 1, "", str(e)
+
+def docker_container_running(name):
+    try:
+        return docker_api.get_client().is_running(name)
+    except docker_api.DockerAPIError as e:
+        print(f"[WARN] Docker API unavailable: {e}")
+        return False
+
 def run_and_send(cmd, title="Task", cwd: Path | None = None):
     print(f"[RUN] {title}: {' '.join(cmd)} (cwd={cwd or Path.cwd()})")
     try:
@@ -394,9 +392,8 @@ def run_and_send(cmd, title="Task", cwd: Path | None = None):
 # =========================
 def get_vpn_internal_ip():
     print("[INFO] Récupération IP interne VPN (tun0) depuis conteneur 'vpn'…")
-    result = subprocess.run(["docker", "exec", os.environ.get("VPN_CONTAINER","vpn"), "ip", "addr", "show", "tun0"],
-                            capture_output=True, text=True)
-    match = re.search(r"inet (\d+\.\d+\.\d+\.\d+)", result.stdout)
+    _, out, _ = docker_exec_in(os.environ.get("VPN_CONTAINER","vpn"), ["ip", "addr", "show", "tun0"])
+    match = re.search(r"inet (\d+\.\d+\.\d+\.\d+)", out)
     if match:
         ip = match.group(1)
         print(f"[INFO] IP VPN détectée: {ip}")
@@ -415,24 +412,17 @@ def extract_interface_ips_from_config():
     return ips
 
 # -------- Deluge RPC helpers (read/write config) --------
-def _deluge_rpc_client(
-    host="localhost", port=58846,
-    user="localclient",
-    password="e0db9d7d51b2c62b7987031174607aa822f94bc9",
-    try_connect=True,
-):
+def _deluge_session():
+    # Session partagée (deluge_rpc.py): une seule connexion TLS + login réutilisée
     try:
-        from deluge_client import DelugeRPCClient
-        c = DelugeRPCClient(host, port, user, password, False)
-        if try_connect:
-            c.connect()
-        return c
+        import deluge_rpc
+        return deluge_rpc.get_session()
     except Exception as e:
         print(f"[WARN] Deluge RPC client unavailable: {e}")
         return None
 
 def _deluge_get_config_rpc():
-    c = _deluge_rpc_client()
+    c = _deluge_session()
     if not c:
         return None
     try:
@@ -448,7 +438,7 @@ def _deluge_get_config_rpc():
         return None
 
 def _deluge_set_interfaces_rpc(vpn_ip: str) -> bool:
-    c = _deluge_rpc_client()
+    c = _deluge_session()
     if not c:
         return False
     try:
@@ -515,12 +505,8 @@ def embedded_ip_adresse_up(mode_cli=None, always=False, repair=False, force=Fals
     MODE_AUTO_DEFAULT  = os.environ.get("MODE_AUTO", "never").strip().lower()
     def _discord_send(msg): _simple_discord_send(msg)
 
-    def _run(cmd):
-        p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        return p.returncode, (p.stdout or "").strip(), (p.stderr or "").strip()
-
     def _get_vpn_ip():
-        rc, out, err = _run(["docker", "exec", VPN_CONTAINER, "ip", "addr", "show", "dev", "tun0"])
+        rc, out, err = docker_exec_in(VPN_CONTAINER, ["ip", "addr", "show", "dev", "tun0"])
         if rc != 0:
             msg = f"Cannot read tun0 in container '{VPN_CONTAINER}': {err or out}"
             print(f"[FAIL] {msg}"); _discord_send(f"❌ *ip_adresse_up*: {msg}")
@@ -570,7 +556,7 @@ def embedded_ip_adresse_up(mode_cli=None, always=False, repair=False, force=Fals
 
     def _restart_deluge():
         print(f"[ACTION] Restarting '{DELUGE_CONTAINER}'…"); _discord_send(f"🔄 *ip_adresse_up*: redémarrage de `{DELUGE_CONTAINER}`…")
-        rc, out, err = _run(["docker", "restart", DELUGE_CONTAINER])
+        rc, out, err = docker_restart(DELUGE_CONTAINER)
         if rc == 0:
             print("[OK] Deluge restarted."); _discord_send("✅ *ip_adresse_up*: Deluge redémarré."); return True
         msg = f"Deluge restart failed: {err or out}"
@@ -702,14 +688,15 @@ def launch_repair_deluge_ip():
 def handle_deluge_verification():
     state = load_alert_state()
     if state.get("deluge_status") != "inactive":
-        print("[INFO] Deluge non marqué 'inactive' → skip vérification."); return
-    _simple_discord_send("[ALERT] Deluge appears inactive: validating…")
+        print("[INFO] Deluge non marqué 'inactive' (idle ou actif) → skip vérification."); return
+    # même cause que la règle deluge_stalled: répétée à chaque cycle tant que Deluge reste inactif
+    notify_digest.report("deluge", "stalled", "[ALERT] Deluge stalled or off the network: validating…")
     consistent, vpn_ip, _ = verify_interface_consistency()
     if not consistent:
-        _simple_discord_send("[CONFIRMED] IP mismatch: repairing Deluge.")
+        notify_digest.report("deluge", "ip_mismatch", "[CONFIRMED] IP mismatch: repairing Deluge.")
         rc = launch_repair_deluge_ip()
         if rc == 0:
-            _simple_discord_send(f"[DONE] Deluge IP updated to {vpn_ip}")
+            notify_digest.resolve("deluge", "ip_mismatch", f"[DONE] Deluge IP updated to {vpn_ip}")
     else:
         print("[INFO] Deluge IPs cohérentes, pas de réparation nécessaire.")
 
@@ -735,60 +722,33 @@ def embedded_plex_online(repair_mode="never", discord=False):
         DUCKDNS_DOMAIN = DOMAIN.split(".duckdns.org", 1)[0]
     SEND_DISCORD = bool(discord)
 
-    def _discord_send(msg: str):
+    def _discord_send(msg: str, key: str | None = None):
+        # key: incident plex/<key> (notify_digest), répétitions regroupées d'un test à l'autre
         if SEND_DISCORD:
-            _simple_discord_send(msg)
+            if key:
+                notify_digest.report("plex", key, msg)
+            else:
+                _simple_discord_send(msg)
 
-    def require(binname): return shutil.which(binname) is not None
-    def docker_container_running(name):
-        rc, out, _ = run(["docker", "ps", "--format", "{{.Names}}"])
-        return rc == 0 and any(line.strip() == name for line in out.splitlines())
-    def docker_exec(args, timeout=None): return run(["docker", "exec", "-i", CONTAINER] + args, timeout=timeout)
-    def _have_cmd(cmd: str) -> bool: return shutil.which(cmd) is not None
+    def _discord_resolve(msg: str | None, key: str):
+        if SEND_DISCORD:
+            notify_digest.resolve("plex", key, msg)
+
+    def docker_exec(args, timeout=None): return docker_exec_in(CONTAINER, args, timeout=timeout)
+    # conf.d parsé sur le bind mount hôte (nginx_conf.py): tous les proxy_pass, re-parsé si mtime change
+    conf_index = nginx_conf.get_index()
+    # faits nginx-proxy collectés en un seul exec (nginx_bundle.py), exec individuel en repli
+    nginx = nginx_bundle.NginxInspector(CONTAINER, CONF_PATH, LE_PATH, UPSTREAM_FALLBACK_HOST,
+                                        UPSTREAM_FALLBACK_PORT, CURL_TIMEOUT, docker_exec,
+                                        targets=conf_index.upstream_targets() if conf_index else (),
+                                        host_live=os.path.dirname(cert_inspector.find_host_chain(DOMAIN)))
+    # DNS en parallèle sur tous les résolveurs, UDP/TCP en process (dns_client.py, plus de dig)
+    def resolve_a_multi(domain: str, resolvers=None, timeout=1.5, tries=1):
+        return dns_client.resolve_a_multi(domain, resolvers, timeout, tries)
 
-    def _dig_a(domain: str, server: str, timeout=1.5, tries=1):
-        try:
-            rc, out, _ = run(["dig","+short",f"+time={int(timeout)}",f"+tries={int(tries)}","A",domain,f"@{server}"], timeout=timeout+0.5)
-            if rc == 0 and out.strip():
-                ips = [l.strip() for l in out.splitlines() if re.match(r"^\d+\.\d+\.\d+\.\d+$", l.strip())]
-                return ips
-        except Exception:
-            pass
-        return []
+    def get_public_ip(): return public_ip.get_public_ip(timeout=CURL_TIMEOUT)
 
-    def resolve_a_multi(domain: str, resolvers=None, timeout=1.5, tries=1):
-        if resolvers is None: resolvers = ["1.1.1.1","8.8.8.8","9.9.9.9"]
-        answers, logs = set(), []
-        if _have_cmd("dig"):
-            for s in resolvers:
-                ips = _dig_a(domain, s, timeout=timeout, tries=tries)
-                logs.append(f"[DNS] @{s} -> {ips if ips else '∅'}")
-                answers.update(ips)
-        if not answers:
-            try:
-                ai = socket.getaddrinfo(domain, 0, family=socket.AF_INET, type=socket.SOCK_STREAM)
-                ips = sorted({t[4][0] for t in ai})
-                logs.append(f"[DNS] system -> {ips if ips else '∅'}")
-                answers.update(ips)
-            except Exception as e:
-                logs.append(f"[DNS] system -> error: {e}")
-        return answers, logs
-
-    def get_public_ip():
-        for endpoint in (["curl","-sS","-4","https://ifconfig.me"],
-                         ["curl","-sS","-4","https://api.ipify.org"],
-                         ["curl","-sS","-4","https://ipv4.icanhazip.com"]):
-            rc, out, _ = run(endpoint)
-            ip = (out or "").strip()
-            if rc == 0 and ip.count(".") == 3:
-                return ip
-        return ""
-
-    def parse_notafter_to_days(exp_line):
-        exp_norm = re.sub(r"\s{2,}", " ", exp_line)
-        exp_dt = datetime.strptime(exp_norm, "%b %d %H:%M:%S %Y %Z").replace(tzinfo=timezone.utc)
-        now = datetime.now(timezone.utc)
-        return int((exp_dt - now).total_seconds() // 86400), exp_dt
+    certs = cert_inspector.get_inspector()
 
     # Tests
     results = {}
@@ -798,128 +758,192 @@ def embedded_plex_online(repair_mode="never", discord=False):
     def fail(m): print(f"[FAIL] {m}")
     def info(m): print(f"[INFO] {m}")
 
-    header("Preflight")
-    ok_all = True
-    for b in ("docker","curl"):
-        if not require(b):
-            fail(f"Missing required host binary: {b}"); ok_all = False
-    if docker_container_running(CONTAINER): ok(f"Container '{CONTAINER}' is running.")
-    else: fail(f"Container '{CONTAINER}' is NOT running."); ok_all = False
-    if PLEX_CONTAINER:
-        if docker_container_running(PLEX_CONTAINER): ok(f"Plex container '{PLEX_CONTAINER}' is running.")
-        else: warn(f"Plex container '{PLEX_CONTAINER}' not running.")
-    url = f"http://{UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}/identity"
-    rc, out, _ = run(["curl","-sS","-m",str(CURL_TIMEOUT),"-o","/dev/null","-w","%{http_code}",url])
-    if rc == 0 and out.strip() == "200": ok(f"Plex fallback upstream replied 200 on /identity ({UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}).")
-    else: warn(f"Fallback Plex upstream test failed at {url} (code {out or 'n/a'}).")
-    if not ok_all:
-        results["_reason_PREFLIGHT"] = "preflight checks failed (missing binaries or containers down)"
-    results["PREFLIGHT"] = ok_all
-
-    header("Check nginx config presence")
-    rc, _, err = docker_exec(["ls","-l","/etc/nginx/conf.d"])
-    if rc != 0:
-        fail(f"Cannot list conf.d: {err}"); results["CONF_PRESENT"]=False; results["_reason_CONF_PRESENT"]="cannot list /etc/nginx/conf.d)"
-    else:
-        rc2,_,_ = docker_exec(["sh","-lc",f"test -f {shlex.quote(CONF_PATH)}"])
-        if rc2 == 0:
-            ok(f"Found {CONF_PATH} in container."); results["CONF_PRESENT"]=True
+    # Checks déclarés en graphe de dépendances (probe_engine.run_result_dag): les nœuds
+    # indépendants tournent en parallèle, un échec court-circuite ses dépendants
+    def check_preflight(res):
+        header("Preflight")
+        ok_all = True
+        if docker_container_running(CONTAINER): ok(f"Container '{CONTAINER}' is running.")
+        else: fail(f"Container '{CONTAINER}' is NOT running."); ok_all = False
+        if PLEX_CONTAINER:
+            if docker_container_running(PLEX_CONTAINER): ok(f"Plex container '{PLEX_CONTAINER}' is running.")
+            else: warn(f"Plex container '{PLEX_CONTAINER}' not running.")
+        if not ok_all:
+            res["_reason_PREFLIGHT"] = "preflight checks failed (missing binaries or containers down)"
+        res["PREFLIGHT"] = ok_all
+
+    def check_fallback_upstream(res):
+        header("Plex fallback upstream (/identity) from host")
+        url = f"http://{UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}/identity"
+        # sondes HTTP côté host en process (keep-alive, timings), voir http_probe.py
+        rc, out = http_probe.http_code(url, retries=0, max_time=CURL_TIMEOUT)
+        if rc == 0 and out == "200": ok(f"Plex fallback upstream replied 200 on /identity ({UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}).")
+        else: warn(f"Fallback Plex upstream test failed at {url} (code {out or 'n/a'}).")
+        res["UPSTREAM_FALLBACK"] = rc == 0 and out == "200"
+
+    def check_nginx_facts(res):
+        header("Inspect nginx-proxy (single batched exec)")
+        if nginx.collect(): ok(f"Collected nginx-proxy facts in one exec ({nginx.stats['bundle_ms']} ms).")
+        else: warn(f"Batched inspection unavailable, one exec per check: {nginx.error}")
+        res["NGINX_FACTS"] = True
+
+    def check_conf_present(res):
+        header("Check nginx config presence")
+        rc, _, err = nginx.ls_conf_d()
+        if rc != 0:
+            fail(f"Cannot list conf.d: {err}"); res["CONF_PRESENT"]=False; res["_reason_CONF_PRESENT"]="cannot list /etc/nginx/conf.d)"
         else:
-            fail(f"Missing {CONF_PATH} in container."); results["CONF_PRESENT"]=False; results["_reason_CONF_PRESENT"]=f"missing {CONF_PATH} in container"
-
-    header("Check nginx config syntax (nginx -t)")
-    rc, out, err = docker_exec(["nginx","-t"])
-    if rc == 0:
-        ok("nginx -t: syntax OK"); results["NGINX_TEST"]=True
-    else:
-        fail(f"nginx -t error:\n{out}\n{err}"); results["NGINX_TEST"]=False; results["_reason_NGINX_TEST"]="nginx -t error (see logs)"
-
-    header("Extract upstream from plex.conf")
-    rc, out, _ = docker_exec(["sh","-lc", f"awk '/proxy_pass[[:space:]]+http/{{print $2}}' {shlex.quote(CONF_PATH)} | head -n1 | tr -d ';'"])
-    url = out.strip() if rc == 0 else ""
-    if not url:
-        warn(f"No proxy_pass found. Using fallback {UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}")
-        host,port = (UPSTREAM_FALLBACK_HOST, UPSTREAM_FALLBACK_PORT)
-    else:
-        no_scheme = re.sub(r"^https?://", "", url); no_path = no_scheme.split("/",1)[0]
-        if ":" in no_path: host, port = no_path.split(":",1)
-        else: host, port = no_path, "80"
-        ok(f"Detected upstream target: {host}:{port}")
-    results["UPSTREAM_FROM_CONF"]=True
-
-    header("Test Plex upstream (/identity) from inside container")
-    rc, out, _ = docker_exec(["curl","-sS","-m",str(CURL_TIMEOUT),"-o","/dev/null","-w","%{http_code}", f"http://{host}:{port}/identity"])
-    if rc == 0 and out.strip()=="200":
-        ok("Plex upstream replied 200 on /identity."); results["PLEX_UPSTREAM"]=True
-    else:
-        fail(f"Plex upstream test failed (HTTP {out or 'n/a'})."); results["PLEX_UPSTREAM"]=False; results["_reason_PLEX_UPSTREAM"]=f"HTTP {out or 'n/a'} from upstream {host}:{port}/identity"
+            rc2 = nginx.conf_present()
+            if rc2 == 0:
+                ok(f"Found {CONF_PATH} in container."); res["CONF_PRESENT"]=True
+            else:
+                fail(f"Missing {CONF_PATH} in container."); res["CONF_PRESENT"]=False; res["_reason_CONF_PRESENT"]=f"missing {CONF_PATH} in container"
 
-    header("DuckDNS IP vs current public IP")
-    ips, dns_logs = resolve_a_multi(DOMAIN)
-    for line in dns_logs: info(line)
-    if not ips:
-        fail("No A records returned by any resolver."); results["DNS_MATCH"]=False; results["_reason_DNS_MATCH"]="no A records from public resolvers"
-    else:
-        info(f"Resolved {DOMAIN} -> {sorted(ips)}"); results["duckdns_ips"]=sorted(ips)
-        pub_ip = results.get("_pub_ip") or get_public_ip()
+    def check_nginx_test(res):
+        header("Check nginx config syntax (nginx -t)")
+        rc, out, err = nginx.nginx_t()
+        if rc == 0:
+            ok("nginx -t: syntax OK"); res["NGINX_TEST"]=True
+        else:
+            fail(f"nginx -t error:\n{out}\n{err}"); res["NGINX_TEST"]=False; res["_reason_NGINX_TEST"]="nginx -t error (see logs)"
+
+    def check_upstream_from_conf(res):
+        header("Extract upstreams from nginx config")
+        if conf_index is not None and conf_index.upstream_targets():
+            for path, err in conf_index.errors.items(): warn(f"Cannot parse {path}: {err}")
+            for p in conf_index.proxy_passes:
+                where = f"{os.path.basename(p['file'])}:{p['line']}, {p['server_name'] or '-'} location {p['location'] or '-'}"
+                if p["targets"]: ok(f"Detected upstream target: {', '.join(f'{h}:{port}' for h, port in p['targets'])} ({where})")
+                else: warn(f"Unresolvable proxy_pass {p['url']} ({where})")
+            res["_upstreams"]=conf_index.upstream_targets()
+        else:
+            rc, out, _ = nginx.proxy_pass()
+            url = out.strip() if rc == 0 else ""
+            if not url:
+                warn(f"No proxy_pass found. Using fallback {UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}")
+                host,port = (UPSTREAM_FALLBACK_HOST, UPSTREAM_FALLBACK_PORT)
+            else:
+                no_scheme = re.sub(r"^https?://", "", url); no_path = no_scheme.split("/",1)[0]
+                if ":" in no_path: host, port = no_path.split(":",1)
+                else: host, port = no_path, "80"
+                ok(f"Detected upstream target: {host}:{port}")
+            res["_upstreams"]=[(host, port)]
+        res["_upstream"]=res["_upstreams"][0]
+        res["UPSTREAM_FROM_CONF"]=True
+
+    def check_plex_upstream(res):
+        header("Test Plex upstreams (/identity) from inside container")
+        failed = []
+        for (host, port), (rc, out, _) in nginx.identities(res["_upstreams"]).items():
+            if rc == 0 and out.strip()=="200": ok(f"Plex upstream {host}:{port} replied 200 on /identity.")
+            else: fail(f"Plex upstream {host}:{port} test failed (HTTP {out or 'n/a'})."); failed.append(f"HTTP {out or 'n/a'} from upstream {host}:{port}/identity")
+        res["PLEX_UPSTREAM"]=not failed
+        if failed: res["_reason_PLEX_UPSTREAM"]="; ".join(failed)
+
+    def check_public_ip(res):
+        header("Current public IP")
+        pub_ip = get_public_ip()
+        if pub_ip:
+            ok(f"Current public IP: {pub_ip}"); res["_pub_ip"]=pub_ip; res["PUBLIC_IP"]=True
+        else:
+            fail("Unable to fetch current public IP."); res["PUBLIC_IP"]=False; res["_reason_PUBLIC_IP"]="unable to fetch current public IP"
+
+    def check_dns_match(res):
+        header("DuckDNS IP vs current public IP")
+        ips, dns_logs = resolve_a_multi(DOMAIN)
+        for line in dns_logs: info(line)
+        if not ips:
+            fail("No A records returned by any resolver."); res["DNS_MATCH"]=False; res["_reason_DNS_MATCH"]="no A records from public resolvers"
+            return
+        info(f"Resolved {DOMAIN} -> {sorted(ips)}"); res["duckdns_ips"]=sorted(ips)
+        # en parallèle du nœud PUBLIC_IP: public_ip.py (single-flight) ne fait qu'une requête pour les deux
+        pub_ip = res.get("_pub_ip") or get_public_ip()
         if pub_ip:
-            ok(f"Current public IP: {pub_ip}"); results["_pub_ip"]=pub_ip
             match = pub_ip in ips
             if match: ok(f"DuckDNS resolves to current public IP: {pub_ip}")
-            else: fail(f"DuckDNS does not match current public IP ({pub_ip}); resolved={sorted(ips)}"); results["_reason_DNS_MATCH"]=f"resolved={sorted(ips)}, public={pub_ip}"
-            results["DNS_MATCH"]=match; results["_duck_ip"]=sorted(ips)[0] if ips else ""
+            else: fail(f"DuckDNS does not match current public IP ({pub_ip}); resolved={sorted(ips)}"); res["_reason_DNS_MATCH"]=f"resolved={sorted(ips)}, public={pub_ip}"
+            res["DNS_MATCH"]=match; res["_duck_ip"]=sorted(ips)[0] if ips else ""
         else:
-            fail("Unable to fetch current public IP."); results["DNS_MATCH"]=False; results["_reason_DNS_MATCH"]="unable to fetch current public IP"
-
-    header("Check certificate files and expiration")
-    rc1,_,_ = docker_exec(["sh","-lc", f"test -f {shlex.quote(LE_PATH)}/fullchain.pem"])
-    rc2,_,_ = docker_exec(["sh","-lc", f"test -f {shlex.quote(LE_PATH)}/privkey.pem"])
-    if rc1==0 and rc2==0: ok(f"Found cert files under {LE_PATH} (fullchain.pem & privkey.pem).")
-    else:
-        fail(f"Cert files not found at {LE_PATH}."); results["CERT_EXPIRY"]=False; results["_reason_CERT_EXPIRY"]=f"cert files missing at {LE_PATH}"
-    if results.get("CERT_EXPIRY", True) is not False:
-        exp_line = ""
-        has_in = docker_exec(["sh","-lc","command -v openssl >/dev/null 2>&1"])[0] == 0
-        if has_in:
-            rc,out,_ = docker_exec(["sh","-lc", f"openssl x509 -enddate -noout -in {shlex.quote(LE_PATH)}/fullchain.pem | cut -d= -f2"])
-            if rc==0 and out.strip(): exp_line = out.strip()
-        if not exp_line and shutil.which("openssl"):
-            rc,pem,err = docker_exec(["sh","-lc", f"cat {shlex.quote(LE_PATH)}/fullchain.pem"])
-            if rc==0 and pem:
-                p = subprocess.run(["openssl","x509","-enddate","-noout"], input=pem, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                if p.returncode==0 and p.stdout.strip(): exp_line = p.stdout.strip().split("=",1)[-1].strip()
-        if not exp_line and shutil.which("openssl"):
-            rc,out,_ = run(f"echo | openssl s_client -connect {shlex.quote(DOMAIN)}:443 -servername {shlex.quote(DOMAIN)} 2>/dev/null | openssl x509 -noout -enddate")
-            if rc==0 and out.strip().startswith("notAfter="): exp_line = out.strip().split("=",1)[-1].strip()
-        if not exp_line:
-            fail("Could not determine certificate expiration."); results["CERT_EXPIRY"]=False; results["_reason_CERT_EXPIRY"]="cannot determine certificate expiration"
+            fail("Unable to fetch current public IP."); res["DNS_MATCH"]=False; res["_reason_DNS_MATCH"]="unable to fetch current public IP"
+
+    def check_cert_expiry(res):
+        header("Check certificate files and expiration")
+        # indépendant de nginx-proxy: faits du bundle s'il est là, sinon bind mount hôte, sinon exec
+        rc1, rc2 = nginx.cert_files()
+        files_ok = rc1==0 and rc2==0
+        if files_ok: ok(f"Found cert files under {nginx.host_live or LE_PATH} (fullchain.pem & privkey.pem).")
+        else: warn(f"Cert files not found at {LE_PATH}; trying a TLS handshake.")
+        # chaîne parsée en Python (cert_inspector.py, cache mtime/empreinte): fichier du bind
+        # mount Let's Encrypt, sinon PEM remonté par le bundle nginx, sinon handshake TLS (feuille)
+        chain, source = None, ""
+        host_path = cert_inspector.find_host_chain(DOMAIN)
+        if host_path:
+            try: chain, source = certs.chain_from_file(host_path), host_path
+            except (OSError, ValueError, cert_inspector.CertError) as e: warn(f"Cannot read {host_path}: {e}")
+        if chain is None and files_ok:
+            rc,pem,_ = nginx.fullchain_pem()
+            if rc==0 and pem.strip():
+                try: chain, source = certs.chain_from_pem(pem), f"{CONTAINER}:{LE_PATH}/fullchain.pem"
+                except (ValueError, cert_inspector.CertError) as e: warn(f"Cannot parse {LE_PATH}/fullchain.pem: {e}")
+        if chain is None:
+            try: chain, source = certs.chain_from_server(DOMAIN, 443, timeout=CURL_TIMEOUT), f"TLS handshake {DOMAIN}:443"
+            except (OSError, ValueError, cert_inspector.CertError) as e: warn(f"TLS handshake with {DOMAIN}:443 failed: {e}")
+        if chain is None:
+            fail("Could not determine certificate expiration."); res["CERT_EXPIRY"]=False
+            res["_reason_CERT_EXPIRY"]="cannot determine certificate expiration" if files_ok else f"cert files missing at {LE_PATH}"
+            return
+        report = cert_inspector.evaluate(chain, DOMAIN)
+        days_left, exp_dt = report["days_left"], report["not_after"]
+        info(f"Certificate chain from {source}: {report['chain_len']} cert(s), issuer '{report['issuer']}', SAN {', '.join(report['san']) or '-'}")
+        if days_left < 0:
+            fail(f"Certificate EXPIRED {abs(days_left)} days ago (expires: {exp_dt})."); res["CERT_EXPIRY"]=False; res["_reason_CERT_EXPIRY"]=f"certificate expired (notAfter={exp_dt})"
+        elif days_left < WARN_DAYS:
+            warn(f"Certificate will expire in {days_left} days (expires: {exp_dt})."); res["CERT_EXPIRY"]=True
         else:
-            try:
-                days_left, exp_dt = parse_notafter_to_days(exp_line)
-                if days_left < 0:
-                    fail(f"Certificate EXPIRED {abs(days_left)} days ago (expires: {exp_dt})."); results["CERT_EXPIRY"]=False; results["_reason_CERT_EXPIRY"]=f"certificate expired (notAfter={exp_dt})"
-                elif days_left < WARN_DAYS:
-                    warn(f"Certificate will expire in {days_left} days (expires: {exp_dt})."); results["CERT_EXPIRY"]=True
-                else:
-                    ok(f"Certificate valid for {days_left} more days (expires: {exp_dt})."); results["CERT_EXPIRY"]=True
-                results["_cert_days_left"]=days_left
-            except Exception as e:
-                fail(f"Failed to parse cert date '{exp_line}': {e}"); results["CERT_EXPIRY"]=False; results["_reason_CERT_EXPIRY"]="cannot parse certificate expiration"
-
-    if not SIMULATE_EXTERNAL:
-        results["HTTPS_EXTERNAL"]=True
-    else:
-        header("Simulated external HTTPS (curl --resolve to public IP)")
-        pub_ip = results.get("_pub_ip","")
-        if not pub_ip:
-            fail("No public IP available; skipping external simulation."); results["HTTPS_EXTERNAL"]=False; results["_reason_HTTPS_EXTERNAL"]="no public IP available for --resolve test"
+            ok(f"Certificate valid for {days_left} more days (expires: {exp_dt})."); res["CERT_EXPIRY"]=True
+        if 0 <= report["chain_days_left"] < min(days_left, WARN_DAYS):
+            warn(f"An intermediate certificate expires in {report['chain_days_left']} days.")
+        if report["problems"] and res["CERT_EXPIRY"]:
+            for p in report["problems"]: fail(f"Certificate chain: {p}")
+            res["CERT_EXPIRY"]=False; res["_reason_CERT_EXPIRY"]="; ".join(report["problems"])
+        res["_cert_days_left"]=days_left
+
+    def check_https_external(res):
+        if not SIMULATE_EXTERNAL:
+            res["HTTPS_EXTERNAL"]=True
+            return
+        header("Simulated external HTTPS (pinned to public IP, like curl --resolve)")
+        pub_ip = res["_pub_ip"]
+        # code HTTP, ou cause de l'échec (connect_timeout, tls_cert, ...)
+        _, code = http_probe.http_code(f"https://{DOMAIN}/", resolve={DOMAIN: pub_ip}, retries=0, max_time=CURL_TIMEOUT)
+        if code in {"200","301","302","401","403"}:
+            ok(f"HTTPS answered with HTTP {code} at {DOMAIN} (forced to {pub_ip})."); res["HTTPS_EXTERNAL"]=True
         else:
-            rc,out,_ = run(["curl","-sS","-m",str(CURL_TIMEOUT),"-o","/dev/null","-w","%{http_code}","--resolve", f"{DOMAIN}:443:{pub_ip}", f"https://{DOMAIN}/"])
-            code = out.strip() if rc == 0 else ""
-            if code in {"200","301","302","401","403"}:
-                ok(f"HTTPS answered with HTTP {code} at {DOMAIN} (forced to {pub_ip})."); results["HTTPS_EXTERNAL"]=True
-            else:
-                fail(f"No HTTPS answer (code '{code or 'timeout'}')."); results["HTTPS_EXTERNAL"]=False; results["_reason_HTTPS_EXTERNAL"]=f"https://{DOMAIN} no valid HTTP answer via --resolve ({code or 'timeout'})"
+            fail(f"No HTTPS answer (code '{code or 'timeout'}')."); res["HTTPS_EXTERNAL"]=False; res["_reason_HTTPS_EXTERNAL"]=f"https://{DOMAIN} no valid HTTP answer via --resolve ({code or 'timeout'})"
+
+    exec_timeout = CURL_TIMEOUT + 5
+    nodes = [
+        Node("PREFLIGHT", check_preflight, timeout=exec_timeout),
+        Node("UPSTREAM_FALLBACK", check_fallback_upstream, timeout=exec_timeout),
+        Node("NGINX_FACTS", check_nginx_facts, ["PREFLIGHT"], timeout=CURL_TIMEOUT + 20),
+        Node("CONF_PRESENT", check_conf_present, ["NGINX_FACTS"], timeout=exec_timeout),
+        Node("NGINX_TEST", check_nginx_test, ["NGINX_FACTS"], timeout=exec_timeout),
+        Node("UPSTREAM_FROM_CONF", check_upstream_from_conf, ["NGINX_FACTS"], timeout=exec_timeout),
+        Node("PLEX_UPSTREAM", check_plex_upstream, ["UPSTREAM_FROM_CONF"], timeout=exec_timeout),
+        Node("PUBLIC_IP", check_public_ip, timeout=CURL_TIMEOUT + 2),
+        Node("DNS_MATCH", check_dns_match, timeout=CURL_TIMEOUT + 5),
+        Node("CERT_EXPIRY", check_cert_expiry, timeout=3 * CURL_TIMEOUT + 5),
+        Node("HTTPS_EXTERNAL", check_https_external, ["PUBLIC_IP"] if SIMULATE_EXTERNAL else [],
+             timeout=CURL_TIMEOUT + 2),
+    ]
+    t0 = time.time()
+    timings = run_result_dag(nodes, results)
+    info("Checks: " + ", ".join(f"{k}={v['status']} {v['seconds']}s" for k, v in timings.items())
+         + f" (total {time.time() - t0:.1f}s)")
+    info(f"nginx-proxy execs: {nginx.stats['execs']} ({nginx.stats['execs_saved']} facts served by the batched exec)")
+    if conf_index is not None:
+        info(f"nginx conf index: {conf_index.stats['files']} file(s), {conf_index.stats['parsed']} parsed, {len(conf_index.upstream_targets())} upstream(s)")
+    info(f"certificates: {certs.stats['parsed']} parsed, {certs.stats['cache_hits']} from cache, {certs.stats['handshakes']} TLS handshake(s)")
 
     # results aggregation
     def _collect_failures(results):
@@ -930,7 +954,9 @@ def embedded_plex_online(repair_mode="never", discord=False):
                 failures.append(k)
         return failures
 
-    def _results_success(): _discord_send("[Results] Test passed: Plex online.")
+    def _results_success():
+        _discord_resolve(None, "repair")
+        _discord_resolve("[Results] Test passed: Plex online.", "tests")
     def _results_failed_list(failing_keys, results):
         LABELS = {
             "PREFLIGHT":"Preflight","CONF_PRESENT":"Nginx config presence","NGINX_TEST":"Nginx syntax test",
@@ -942,7 +968,7 @@ def embedded_plex_online(repair_mode="never", discord=False):
             label = LABELS.get(k, k)
             reason = results.get(f"_reason_{k}")
             lines.append(f"- {label}: {reason}" if reason else f"- {label}")
-        _discord_send("\n".join(lines))
+        _discord_send("\n".join(lines), key="tests:" + ",".join(failing_keys))
 
     def repair_dns(pub_ip: str) -> bool:
         if not DUCKDNS_DOMAIN or not DUCKDNS_TOKEN:
@@ -965,10 +991,10 @@ def embedded_plex_online(repair_mode="never", discord=False):
     def _announce_availability_for_all(failed_tests, results, mode: str):
         dns_reason = results.get("_reason_DNS_MATCH", "DNS does not match public IP")
         if "DNS_MATCH" in failed_tests or mode == "always":
-            _discord_send(f"[Repair] Repair available: Update DuckDNS IP — reason: {dns_reason}")
+            _discord_send(f"[Repair] Repair available: Update DuckDNS IP — reason: {dns_reason}", key="repair:DNS_MATCH")
         for t in failed_tests:
             if t != "DNS_MATCH":
-                _discord_send(f"[Repair] Repair not available: {t} — no automated fix")
+                _discord_send(f"[Repair] Repair not available: {t} — no automated fix", key=f"repair:{t}")
 
     def _run_repairs(mode: str, failed_tests, results):
         _announce_availability_for_all(failed_tests, results, mode)
@@ -978,13 +1004,13 @@ def embedded_plex_online(repair_mode="never", discord=False):
             if t == "DNS_MATCH":
                 pub = results.get("_pub_ip","") or get_public_ip()
                 if not pub:
-                    _discord_send("[Repair] Fail: Update DuckDNS IP — error: public IP unavailable"); continue
+                    _discord_send("[Repair] Fail: Update DuckDNS IP — error: public IP unavailable", key="repair:DNS_MATCH"); continue
                 _discord_send("[Repair] Launch: Update DuckDNS IP")
                 repaired = repair_dns(pub)
-                if repaired: _discord_send("[Repair] Success: Update DuckDNS IP")
-                else: _discord_send("[Repair] Fail: Update DuckDNS IP — provider rejected or network error")
+                if repaired: _discord_resolve("[Repair] Success: Update DuckDNS IP", "repair:DNS_MATCH")
+                else: _discord_send("[Repair] Fail: Update DuckDNS IP — provider rejected or network error", key="repair:DNS_MATCH")
             else:
-                _discord_send(f"[Repair] Repair not available: {t} — no automated fix")
+                _discord_send(f"[Repair] Repair not available: {t} — no automated fix", key=f"repair:{t}")
 
     failing = _collect_failures(results)
     if not failing and results.get("HTTPS_EXTERNAL", True):
@@ -1053,6 +1079,22 @@ def launch_plex_online_test(repair_mode: str | None = None, discord: bool = Fals
     state = load_alert_state(); state["plex_last_test_ts"] = time.time(); save_alert_state(state)
     return rc
 
+def run_auto_plex():
+    """Mode AUTO: lance le test Plex si alert_state le marque 'offline' (cooldown respecté)."""
+    state = load_alert_state()
+    if state.get("plex_external_status") == "offline":
+        print("[AUTO] Plex est marqué 'offline' → lancement du test Plex")
+        if should_run_plex_online_test(force=AUTO_PLEX_FORCE):
+            env_mode = os.getenv("MODE_AUTO", "").strip().lower()
+            env_discord = os.getenv("PLEX_ONLINE_DISCORD", "0") == "1"
+            launch_plex_online_test(
+                repair_mode=(env_mode if env_mode in ("never","on-fail","always") else None),
+                discord=env_discord,
+            )
+        else:
+            print("[AUTO] Conditions non réunies (cooldown ou état) → test non lancé")
+    return 0
+
 # =========================
 # CLI
 # =========================
@@ -1140,18 +1182,7 @@ def main():
         args.plex_online, args.deluge_ip_up, args.deluge_ip_force
     ])
     if not ran_anything:
-        state = load_alert_state()
-        if state.get("plex_external_status") == "offline":
-            print("[AUTO] Plex est marqué 'offline' → lancement du test Plex")
-            if should_run_plex_online_test(force=AUTO_PLEX_FORCE):
-                env_mode = os.getenv("MODE_AUTO", "").strip().lower()
-                env_discord = os.getenv("PLEX_ONLINE_DISCORD", "0") == "1"
-                launch_plex_online_test(
-                    repair_mode=(env_mode if env_mode in ("never","on-fail","always") else None),
-                    discord=env_discord,
-                )
-            else:
-                print("[AUTO] Conditions non réunies (cooldown ou état) → test non lancé")
+        run_auto_plex()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: monitor_store.py
+"""
+Append-only segmented store for the quick-check samples.
+
+Remplace le tableau JSON unique (/mnt/data/system_monitor_log.json) qui était
+relu puis réécrit en entier à chaque cycle.
+
+Layout (MONITOR_STORE_DIR, défaut /mnt/data/system_monitor_log.d):
+  segment-YYYY-MM-DD.ndjson      1 objet JSON par ligne, segment du jour (tail, fsync à chaque écriture)
+  segment-YYYY-MM-DD.ndjson.gz   segments fermés et compactés
+  index.json                     plages de temps par segment (first_ts, last_ts, count)
+
+Coût d'une écriture: O(1) (append d'une ligne + réécriture d'un index borné par la rétention).
+Lecture de la dernière entrée: index → segment tail → TailReader (seek depuis la fin,
+offset/inode en cache entre deux appels). Benchmark: bench_tail_reader.py.
+
+CLI:
+  python3 monitor_store.py --latest
+  python3 monitor_store.py --migrate /mnt/data/system_monitor_log.json
+  python3 monitor_store.py --maintenance          # rétention + compaction
+  python3 monitor_store.py --rebuild-index
+
+Bascule: au démarrage de monitor_loop (ou via --migrate), si MONITOR_LEGACY_FILE existe
+encore, il est importé une fois puis renommé <fichier>.migrated; plus personne n'y écrit,
+les lecteurs passent par read_latest(). Seuls les jours antérieurs au premier jour déjà
+présent dans le store sont importés; chaque jour est écrit d'un bloc (fichier temporaire
++ os.replace, un fsync) et la progression est notée dans legacy_import.json: un import
+interrompu reprend au jour suivant, et le fichier n'est renommé qu'une fois tout importé.
+
+Environment:
+  MONITOR_STORE_DIR, MONITOR_RETENTION_DAYS (0 = illimité), MONITOR_COMPACT_AFTER_DAYS,
+  MONITOR_MAX_RECORD_BYTES, MONITOR_LEGACY_FILE (/mnt/data/system_monitor_log.json)
+"""
+
+import argparse
+import fcntl
+import gzip
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# =========================
+# Config
+# =========================
+STORE_DIR = os.environ.get("MONITOR_STORE_DIR", "/mnt/data/system_monitor_log.d")
+RETENTION_DAYS = int(os.environ.get("MONITOR_RETENTION_DAYS", "90"))
+COMPACT_AFTER_DAYS = int(os.environ.get("MONITOR_COMPACT_AFTER_DAYS", "2"))
+LEGACY_FILE = os.environ.get("MONITOR_LEGACY_FILE", "/mnt/data/system_monitor_log.json")
+
+INDEX_NAME = "index.json"
+SEGMENT_RE = re.compile(r"^segment-(\d{4}-\d{2}-\d{2})\.ndjson(\.gz)?$")
+TAIL_CHUNK = 64 * 1024
+MAX_RECORD_BYTES = int(os.environ.get("MONITOR_MAX_RECORD_BYTES", str(4 * 1024 * 1024)))
+
+
+def segment_name(day: str, compacted: bool = False) -> str:
+    return f"segment-{day}.ndjson" + (".gz" if compacted else "")
+
+
+def _entry_ts(entry: dict) -> str:
+    ts = entry.get("timestamp")
+    if not ts:
+        ts = datetime.now().isoformat()
+        entry["timestamp"] = ts
+    return ts
+
+
+def _dumps(entry: dict) -> bytes:
+    return (json.dumps(entry, separators=(",", ":"), ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+# =========================
+# Tail reader
+# =========================
+class TailReader:
+    """
+    Dernière ligne complète d'un fichier NDJSON, lue depuis la fin.
+
+    - mémoire bornée: on abandonne au-delà de max_record octets sans \\n
+    - (st_dev, st_ino, taille, offset de fin de la dernière ligne) gardés entre deux appels:
+      fichier inchangé → aucun I/O; fichier qui a grandi → seuls les octets ajoutés sont lus;
+      rotation/troncature (inode ou taille différents) → nouveau seek depuis la fin.
+    - une ligne sans \\n final (écriture en cours/interrompue) est ignorée.
+    """
+
+    def __init__(self, path, chunk: int = TAIL_CHUNK, max_record: int = MAX_RECORD_BYTES):
+        self.path = str(path)
+        self.chunk = chunk
+        self.max_record = max_record
+        self._key = None
+        self._size = 0
+        self._end = 0
+        self._line = None
+
+    def last_line(self) -> bytes | None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._key, self._size, self._end, self._line = None, 0, 0, None
+            return None
+        key = (st.st_dev, st.st_ino)
+        if key == self._key and st.st_size == self._size:
+            return self._line
+        floor = self._end if (key == self._key and st.st_size > self._size) else 0
+        line, end = self._scan(st.st_size, floor)
+        if line is None and floor:
+            line, end = self._line, self._end
+        self._key, self._size, self._line, self._end = key, st.st_size, line, end
+        return line
+
+    def _scan(self, size: int, floor: int):
+        with open(self.path, "rb") as f:
+            pos, buf = size, b""
+            while pos > floor:
+                step = min(self.chunk, pos - floor)
+                pos -= step
+                f.seek(pos)
+                buf = f.read(step) + buf
+                cut = buf.rfind(b"\n")
+                while cut >= 0:
+                    nl = buf.rfind(b"\n", 0, cut)
+                    if nl < 0 and pos > floor:
+                        break  # début de ligne pas encore lu
+                    ln = buf[nl + 1:cut].strip()
+                    if ln:
+                        return ln, pos + cut + 1
+                    cut = nl
+                if len(buf) > self.max_record:
+                    print(f"[WARN] monitor_store: pas de ligne complète dans les {len(buf)} derniers octets de {self.path}")
+                    return None, 0
+        return None, 0
+
+
+_tail_readers = {}
+
+
+def read_last_line(path) -> bytes | None:
+    reader = _tail_readers.get(str(path))
+    if reader is None:
+        reader = _tail_readers[str(path)] = TailReader(path)
+    return reader.last_line()
+
+
+def read_last_entry(path) -> dict | None:
+    """Dernier enregistrement NDJSON valide d'un fichier (None si absent ou invalide)."""
+    line = read_last_line(path)
+    if not line:
+        return None
+    try:
+        obj = json.loads(line)
+    except Exception:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def _read_last_line_gz(path) -> bytes | None:
+    last = None
+    with gzip.open(path, "rb") as f:
+        for ln in f:
+            ln = ln.strip()
+            if ln:
+                last = ln
+    return last
+
+
+# =========================
+# Store
+# =========================
+class MonitorStore:
+    """
+    Store segmenté par jour. Une instance garde le segment tail ouvert en append
+    et l'index en mémoire: en mode daemon l'écriture ne relit rien sur disque.
+    """
+
+    def __init__(self, root: str | Path = STORE_DIR,
+                 retention_days: int = RETENTION_DAYS,
+                 compact_after_days: int = COMPACT_AFTER_DAYS):
+        self.root = Path(root)
+        self.retention_days = retention_days
+        self.compact_after_days = compact_after_days
+        self._tail_day = None
+        self._tail_fd = None
+        self._index = None
+        self._readers = {}
+
+    # ---------- index ----------
+    @property
+    def index_path(self) -> Path:
+        return self.root / INDEX_NAME
+
+    def load_index(self) -> dict:
+        if self._index is not None:
+            return self._index
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and isinstance(data.get("segments"), list):
+                self._index = data
+                return data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[WARN] monitor_store: index illisible ({e}) → reconstruction")
+        return self.rebuild_index()
+
+    def _save_index(self):
+        tmp = self.index_path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, separators=(",", ":"))
+        os.replace(tmp, self.index_path)
+
+    def _segment_meta(self, day: str) -> dict | None:
+        for seg in reversed(self.load_index()["segments"]):
+            if seg["day"] == day:
+                return seg
+        return None
+
+    def rebuild_index(self) -> dict:
+        segments = []
+        if self.root.is_dir():
+            for p in sorted(self.root.iterdir()):
+                m = SEGMENT_RE.match(p.name)
+                if not m:
+                    continue
+                opener = gzip.open if m.group(2) else open
+                first = last = None
+                count = 0
+                try:
+                    with opener(p, "rb") as f:
+                        for ln in f:
+                            ln = ln.strip()
+                            if not ln:
+                                continue
+                            try:
+                                ts = json.loads(ln).get("timestamp")
+                            except Exception:
+                                continue
+                            count += 1
+                            first = first or ts
+                            last = ts or last
+                except Exception as e:
+                    print(f"[WARN] monitor_store: segment illisible {p.name}: {e}")
+                    continue
+                segments.append({"name": p.name, "day": m.group(1), "first_ts": first,
+                                 "last_ts": last, "count": count, "compacted": bool(m.group(2))})
+        self._index = {"version": 1, "segments": segments}
+        if self.root.is_dir():
+            self._save_index()
+        return self._index
+
+    # ---------- write ----------
+    def _open_tail(self, day: str):
+        if self._tail_day == day and self._tail_fd is not None:
+            return self._tail_fd
+        self.close()
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / segment_name(day)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # une écriture interrompue peut laisser une ligne sans \n: on la termine
+        size = os.fstat(fd).st_size
+        if size:
+            with open(path, "rb") as f:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    os.write(fd, b"\n")
+        self._tail_fd, self._tail_day = fd, day
+        if self._segment_meta(day) is None:
+            self.load_index()["segments"].append({"name": path.name, "day": day, "first_ts": None,
+                                                  "last_ts": None, "count": 0, "compacted": False})
+            # un jour antérieur (import legacy) reste à sa place: latest() lit le dernier segment
+            self._index["segments"].sort(key=lambda seg: seg["day"])
+            self.maintenance(today=day)
+        return fd
+
+    def append(self, entry: dict) -> str:
+        ts = _entry_ts(entry)
+        day = ts[:10]
+        fd = self._open_tail(day)
+        data = _dumps(entry)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        meta = self._segment_meta(day)
+        meta["count"] += 1
+        meta["first_ts"] = meta["first_ts"] or ts
+        meta["last_ts"] = ts
+        self._save_index()
+        return ts
+
+    def close(self):
+        if self._tail_fd is not None:
+            try:
+                os.close(self._tail_fd)
+            except OSError:
+                pass
+        self._tail_fd, self._tail_day = None, None
+
+    # ---------- retention / compaction ----------
+    def maintenance(self, today: str | None = None):
+        """Supprime les segments hors rétention et compacte (gzip) les segments fermés."""
+        index = self.load_index()
+        today_dt = datetime.strptime(today, "%Y-%m-%d") if today else datetime.now()
+        keep_from = (today_dt - timedelta(days=self.retention_days)).strftime("%Y-%m-%d") if self.retention_days > 0 else ""
+        compact_before = (today_dt - timedelta(days=self.compact_after_days)).strftime("%Y-%m-%d")
+        kept = []
+        for seg in index["segments"]:
+            path = self.root / seg["name"]
+            if keep_from and seg["day"] < keep_from:
+                try:
+                    path.unlink()
+                    print(f"[INFO] monitor_store: segment expiré supprimé {seg['name']}")
+                except FileNotFoundError:
+                    pass
+                continue
+            if not seg["compacted"] and seg["day"] < compact_before and seg["day"] != self._tail_day:
+                gz = self.root / segment_name(seg["day"], compacted=True)
+                try:
+                    with open(path, "rb") as src, gzip.open(gz, "wb") as dst:
+                        for chunk in iter(lambda: src.read(1 << 20), b""):
+                            dst.write(chunk)
+                    path.unlink()
+                    seg["name"], seg["compacted"] = gz.name, True
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    print(f"[WARN] monitor_store: compaction impossible {seg['name']}: {e}")
+            kept.append(seg)
+        index["segments"] = kept
+        self._save_index()
+
+    # ---------- read ----------
+    def _refresh(self):
+        # une instance lectrice relit l'index (un autre process écrit)
+        if self._tail_fd is None:
+            self._index = None
+
+    def latest(self) -> dict | None:
+        self._refresh()
+        for seg in reversed(self.load_index()["segments"]):
+            path = self.root / seg["name"]
+            try:
+                if seg["compacted"]:
+                    line = _read_last_line_gz(path)
+                else:
+                    reader = self._readers.get(seg["name"])
+                    if reader is None:
+                        reader = self._readers[seg["name"]] = TailReader(path)
+                    line = reader.last_line()
+            except FileNotFoundError:
+                continue
+            if line:
+                try:
+                    return json.loads(line)
+                except Exception:
+                    return None
+        return None
+
+    def iter_entries(self, since: str | None = None, until: str | None = None):
+        """Itère les entrées dans l'ordre; les segments hors [since, until] ne sont pas ouverts."""
+        self._refresh()
+        for seg in self.load_index()["segments"]:
+            if since and seg["last_ts"] and seg["last_ts"] < since:
+                continue
+            if until and seg["first_ts"] and seg["first_ts"] > until:
+                continue
+            opener = gzip.open if seg["compacted"] else open
+            try:
+                with opener(self.root / seg["name"], "rb") as f:
+                    for ln in f:
+                        ln = ln.strip()
+                        if not ln:
+                            continue
+                        try:
+                            entry = json.loads(ln)
+                        except Exception:
+                            continue
+                        ts = entry.get("timestamp") or ""
+                        if since and ts < since:
+                            continue
+                        if until and ts > until:
+                            return
+                        yield entry
+            except FileNotFoundError:
+                continue
+
+    def write_day(self, day: str, entries: list):
+        """Segment complet d'un jour hors tail (import): écrit d'un bloc, remplace l'existant."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        index = self.load_index()
+        for seg in [seg for seg in index["segments"] if seg["day"] == day]:
+            # reste d'un import interrompu (éventuellement compacté entre-temps)
+            if seg["name"] != segment_name(day):
+                (self.root / seg["name"]).unlink(missing_ok=True)
+            index["segments"].remove(seg)
+        path = self.root / segment_name(day)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(b"".join(_dumps(e) for e in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        index["segments"].append({"name": path.name, "day": day, "first_ts": _entry_ts(entries[0]),
+                                  "last_ts": _entry_ts(entries[-1]), "count": len(entries), "compacted": False})
+        index["segments"].sort(key=lambda seg: seg["day"])
+        self._save_index()
+
+    def migrate_legacy(self, legacy_path: str | Path, before_day: str | None = None,
+                       after_day: str | None = None, on_day=None) -> int:
+        """Importe l'ancien tableau JSON, un segment par jour (chargement unique).
+
+        before_day: n'importe que les jours antérieurs (le segment tail déjà écrit reste trié);
+        after_day: jours déjà importés (reprise); on_day(day): appelé après chaque jour écrit.
+        """
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            logs = json.load(f)
+        if isinstance(logs, dict):
+            logs = [logs]
+        days = {}
+        for entry in logs:
+            if isinstance(entry, dict):
+                days.setdefault(_entry_ts(entry)[:10], []).append(entry)
+        n = 0
+        for day in sorted(days):
+            if (before_day and day >= before_day) or (after_day and day <= after_day):
+                continue
+            self.write_day(day, days[day])
+            n += len(days[day])
+            if on_day:
+                on_day(day)
+        return n
+
+
+# =========================
+# Module-level helpers
+# =========================
+_default_store = None
+
+
+def get_store(root: str | Path = STORE_DIR) -> MonitorStore:
+    global _default_store
+    if _default_store is None or _default_store.root != Path(root):
+        if _default_store is not None:
+            _default_store.close()
+        _default_store = MonitorStore(root)
+    return _default_store
+
+
+PROGRESS_NAME = "legacy_import.json"
+
+
+def migrate_legacy_once(root: str | Path = STORE_DIR, legacy_path: str | Path = LEGACY_FILE) -> int:
+    """Import unique (reprenable) de l'ancien tableau puis renommage en <fichier>.migrated."""
+    legacy = Path(legacy_path) if legacy_path else None
+    if legacy is None or not legacy.is_file():
+        return 0
+    store = get_store(root)
+    progress_path = store.root / PROGRESS_NAME
+    try:
+        with open(progress_path, "r", encoding="utf-8") as f:
+            progress = json.load(f)
+        if progress.get("source") != str(legacy):
+            raise ValueError("autre source")
+    except (OSError, ValueError):
+        # borne figée au premier passage: les jours importés ne doivent pas la déplacer
+        days = [seg["day"] for seg in store.load_index()["segments"] if seg["count"]]
+        progress = {"source": str(legacy), "before_day": min(days) if days else None, "done_day": None}
+
+    def save_progress(day=None):
+        progress["done_day"] = day or progress["done_day"]
+        tmp = progress_path.with_name(PROGRESS_NAME + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(progress, f)
+        os.replace(tmp, progress_path)
+
+    try:
+        store.root.mkdir(parents=True, exist_ok=True)
+        save_progress()
+        n = store.migrate_legacy(legacy, before_day=progress["before_day"], after_day=progress["done_day"],
+                                 on_day=save_progress)
+        store.maintenance()
+        os.replace(legacy, legacy.with_name(legacy.name + ".migrated"))
+        progress_path.unlink(missing_ok=True)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] monitor_store: import de {legacy} interrompu ({e}); reprise au prochain démarrage")
+        return 0
+    print(f"[OK] monitor_store: {n} entrées importées depuis {legacy} (renommé en {legacy.name}.migrated)")
+    return n
+
+
+def append_entry(entry: dict, root: str | Path = STORE_DIR) -> str:
+    return get_store(root).append(entry)
+
+
+_reader_stores = {}
+
+
+def read_latest(root: str | Path = STORE_DIR) -> dict | None:
+    store = _reader_stores.get(str(root))
+    if store is None:
+        store = _reader_stores[str(root)] = MonitorStore(root)
+    return store.latest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmented NDJSON store for monitor samples")
+    parser.add_argument("--dir", default=STORE_DIR, help=f"Store directory (default: {STORE_DIR})")
+    parser.add_argument("--latest", action="store_true", help="Print the latest entry")
+    parser.add_argument("--migrate", metavar="LEGACY_JSON", help="Import a legacy system_monitor_log.json array")
+    parser.add_argument("--maintenance", action="store_true", help="Apply retention and compaction")
+    parser.add_argument("--rebuild-index", action="store_true", help="Rebuild index.json from the segments")
+    args = parser.parse_args()
+
+    store = MonitorStore(args.dir)
+    if args.migrate:
+        migrate_legacy_once(args.dir, args.migrate)
+    if args.rebuild_index:
+        idx = store.rebuild_index()
+        print(f"[OK] index reconstruit ({len(idx['segments'])} segments)")
+    if args.maintenance:
+        store.maintenance()
+        print("[OK] rétention/compaction appliquées")
+    if args.latest:
+        print(json.dumps(store.latest(), indent=2, ensure_ascii=False))
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: nginx_bundle.py
+"""
+Inspection du conteneur nginx-proxy en un seul exec (mode "bundle").
+
+Le check Plex online faisait ~9 `docker exec` par run (ls conf.d, test -f CONF_PATH,
+nginx -t, extraction proxy_pass, curl /identity, test -f fullchain/privkey,
+command -v openssl, openssl -enddate), chacun avec son coût de création d'exec.
+Ici un script sh unique est envoyé dans le conteneur et renvoie un rapport JSON
+qui couvre tous ces faits, dont le /identity de chaque upstream (en parallèle).
+Le certificat n'est plus lu par openssl dans le conteneur: le bundle renvoie
+fullchain.pem tel quel, parsé côté monitor par cert_inspector.py.
+
+NginxInspector expose une méthode par fait, avec le même retour que l'exec qu'elle
+remplace ((rc, out, err) ou rc): les checks existants gardent leur logique et leurs
+clés de `results`. Si le bundle échoue (pas de sh, JSON illisible, timeout),
+chaque méthode refait son exec d'origine. Les faits certificat (cert_files,
+fullchain_pem) passent d'abord par le bind mount Let's Encrypt de l'hôte (host_live)
+quand le bundle manque: le check d'expiration ne dépend pas d'un nginx-proxy démarré.
+
+Environment:
+  NGINX_BUNDLE (1; 0 = un exec par fait, comportement historique)
+"""
+
+import json
+import os
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BUNDLE_ENABLED = os.environ.get("NGINX_BUNDLE", "1") == "1"
+
+# $1=CONF_PATH $2=LE_PATH $3/$4=upstream de repli $5=timeout curl $6=upstreams "host:port ..." (index nginx_conf)
+# Les /identity de tous les upstreams partent en arrière-plan et se chevauchent avec les autres faits.
+BUNDLE_SCRIPT = r"""
+conf="$1"; le="$2"; fb_host="$3"; fb_port="$4"; t="$5"; targets="$6"
+js() { sed -e 's/\\/\\\\/g' -e 's/"/\\"/g' -e 's/	/\\t/g' -e 's/\r//g' \
+       | awk 'BEGIN{printf "\""} NR>1{printf "\\n"} {printf "%s", $0} END{printf "\""}'; }
+fact() { printf '"%s":{"rc":%d,"out":%s}' "$1" "$2" "$(printf '%s' "$3" | js)"; }
+
+pp=$(awk '/proxy_pass[[:space:]]+http/{print $2}' "$conf" 2>/dev/null | head -n1 | tr -d ';'); pp_rc=$?
+if [ -z "$targets" ]; then
+  if [ -n "$pp" ]; then
+    hp=${pp#*://}; hp=${hp%%/*}
+    case "$hp" in *:*) targets=$hp ;; *) targets="$hp:80" ;; esac
+  else
+    targets="$fb_host:$fb_port"
+  fi
+fi
+tmp=$(mktemp -d 2>/dev/null) || { tmp="/tmp/nginx-bundle.$$"; mkdir -p "$tmp"; }
+n=0
+for tg in $targets; do
+  n=$((n+1))
+  ( curl -sS -m "$t" -o "/dev/null" -w '%{http_code}' "http://$tg/identity" >"$tmp/$n.out" 2>/dev/null; echo $? >"$tmp/$n.rc" ) &
+done
+ls_out=$(ls -l /etc/nginx/conf.d 2>&1); ls_rc=$?
+test -f "$conf"; conf_rc=$?
+ngx_out=$(nginx -t 2>&1); ngx_rc=$?
+test -f "$le/fullchain.pem"; fc_rc=$?
+test -f "$le/privkey.pem"; pk_rc=$?
+pem_out=$(cat "$le/fullchain.pem" 2>/dev/null); pem_rc=$?
+
+printf '{'
+fact ls_conf_d "$ls_rc" "$ls_out"; printf ','
+fact conf_present "$conf_rc" ""; printf ','
+fact nginx_t "$ngx_rc" "$ngx_out"; printf ','
+fact proxy_pass "$pp_rc" "$pp"; printf ','
+wait
+printf '"identities":{'; n=0
+for tg in $targets; do
+  n=$((n+1)); [ "$n" -gt 1 ] && printf ','
+  rc=$(cat "$tmp/$n.rc" 2>/dev/null); fact "$tg" "${rc:-1}" "$(cat "$tmp/$n.out" 2>/dev/null)"
+done
+printf '},'
+rm -rf "$tmp"
+fact fullchain "$fc_rc" ""; printf ','
+fact privkey "$pk_rc" ""; printf ','
+fact fullchain_pem "$pem_rc" "$pem_out"
+printf '}\n'
+"""
+
+
+class NginxInspector:
+    def __init__(self, container, conf_path, le_path, fallback_host, fallback_port, curl_timeout, exec_fn,
+                 targets=(), host_live=""):
+        """
+        exec_fn(args, timeout=None) -> (rc, out, err): docker exec dans `container`.
+        targets: [(host, port), ...] de l'index nginx_conf; vide → premier proxy_pass (awk) ou repli.
+        host_live: répertoire hôte live/<domaine> (cert_inspector.find_host_chain), "" si absent.
+        """
+        self.container = container
+        self.conf_path = conf_path
+        self.le_path = le_path
+        self.fallback = (str(fallback_host), str(fallback_port))
+        self.curl_timeout = curl_timeout
+        self.exec = exec_fn
+        self.targets = [f"{h}:{p}" for h, p in targets]
+        self.host_live = host_live
+        self.report = None
+        self.error = ""
+        self.stats = {"bundle_ms": None, "execs": 0, "execs_saved": 0}
+
+    # ---------- bundle ----------
+    def collect(self) -> bool:
+        """Un exec, rapport JSON complet. False → les méthodes repassent en exec individuels."""
+        if not BUNDLE_ENABLED:
+            self.error = "disabled (NGINX_BUNDLE=0)"
+            return False
+        t0 = time.perf_counter()
+        rc, out, err = self._exec(["sh", "-c", BUNDLE_SCRIPT, "nginx-bundle", self.conf_path, self.le_path,
+                                   self.fallback[0], self.fallback[1], str(self.curl_timeout),
+                                   " ".join(self.targets)],
+                                  timeout=self.curl_timeout + 15)
+        self.stats["bundle_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        try:
+            report = json.loads(out.strip().splitlines()[-1]) if rc == 0 and out.strip() else None
+        except ValueError:
+            report = None
+        if not isinstance(report, dict):
+            self.error = f"bundle exec failed (rc={rc}): {(err or out or '').strip()[:200]}"
+            return False
+        self.report = report
+        return True
+
+    def _exec(self, args, timeout=None):
+        self.stats["execs"] += 1
+        return self.exec(args, timeout=timeout)
+
+    def _fact(self, key):
+        fact = (self.report or {}).get(key)
+        if isinstance(fact, dict):
+            self.stats["execs_saved"] += 1
+        return fact if isinstance(fact, dict) else None
+
+    # ---------- faits (même retour que l'exec remplacé) ----------
+    def ls_conf_d(self):
+        f = self._fact("ls_conf_d")
+        if f is not None:
+            return f["rc"], f["out"] if f["rc"] == 0 else "", f["out"] if f["rc"] != 0 else ""
+        return self._exec(["ls", "-l", "/etc/nginx/conf.d"])
+
+    def conf_present(self) -> int:
+        f = self._fact("conf_present")
+        if f is not None:
+            return f["rc"]
+        return self._exec(["sh", "-lc", f"test -f {shlex.quote(self.conf_path)}"])[0]
+
+    def nginx_t(self):
+        f = self._fact("nginx_t")
+        if f is not None:
+            return f["rc"], "", f["out"]
+        return self._exec(["nginx", "-t"])
+
+    def proxy_pass(self):
+        f = self._fact("proxy_pass")
+        if f is not None:
+            return f["rc"], f["out"], ""
+        return self._exec(["sh", "-lc", f"awk '/proxy_pass[[:space:]]+http/{{print $2}}' "
+                                        f"{shlex.quote(self.conf_path)} | head -n1 | tr -d ';'"])
+
+    def identity(self, host, port):
+        """Code HTTP de /identity vu depuis le conteneur (le bundle a visé tous les upstreams connus)."""
+        f = ((self.report or {}).get("identities") or {}).get(f"{host}:{port}")
+        if isinstance(f, dict):
+            self.stats["execs_saved"] += 1
+            return f["rc"], f["out"], ""
+        return self._exec(["curl", "-sS", "-m", str(self.curl_timeout), "-o", "/dev/null", "-w", "%{http_code}",
+                           f"http://{host}:{port}/identity"])
+
+    def identities(self, targets):
+        """{(host, port): (rc, out, err)} — hors bundle, les execs curl partent en parallèle."""
+        targets = list(dict.fromkeys(targets))
+        if len(targets) <= 1:
+            return {t: self.identity(*t) for t in targets}
+        with ThreadPoolExecutor(max_workers=min(8, len(targets))) as pool:
+            return dict(zip(targets, pool.map(lambda t: self.identity(*t), targets)))
+
+    def cert_files(self):
+        """(rc fullchain.pem, rc privkey.pem)"""
+        fc, pk = self._fact("fullchain"), self._fact("privkey")
+        if fc is not None and pk is not None:
+            return fc["rc"], pk["rc"]
+        if self.host_live:
+            return tuple(0 if os.path.isfile(os.path.join(self.host_live, name)) else 1
+                         for name in ("fullchain.pem", "privkey.pem"))
+        le = shlex.quote(self.le_path)
+        return (self._exec(["sh", "-lc", f"test -f {le}/fullchain.pem"])[0],
+                self._exec(["sh", "-lc", f"test -f {le}/privkey.pem"])[0])
+
+    def fullchain_pem(self):
+        """Contenu PEM de fullchain.pem (chaîne complète, parsée par cert_inspector)."""
+        f = self._fact("fullchain_pem")
+        if f is not None:
+            return f["rc"], f["out"], ""
+        if self.host_live:
+            try:
+                with open(os.path.join(self.host_live, "fullchain.pem"), "r", encoding="utf-8") as fh:
+                    return 0, fh.read(), ""
+            except OSError as e:
+                return 1, "", str(e)
+        return self._exec(["cat", f"{self.le_path}/fullchain.pem"])
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: nginx_conf.py
+"""
+Parser de configuration nginx et index des upstreams (conf.d lu sur le bind mount hôte).
+
+Remplace l'extraction `awk '/proxy_pass/…' | head -n1` exécutée dans le conteneur,
+qui ne voyait que le premier proxy_pass de plex.conf:
+- tokenizer nginx (commentaires, guillemets, blocs) → arbre de directives
+- index: blocs server (server_name, listen, ssl_certificate/_key), locations et
+  *tous* les proxy_pass, résolus en (host, port) — y compris via les blocs `upstream`
+- un fichier n'est re-parsé que si (mtime, taille) change
+- replace_upstream(): réécrit la cible d'un proxy_pass à sa position exacte
+  (remplace le `sed` des scripts de réparation), écriture atomique
+
+Les chemins des fichiers sont ceux de l'hôte; container_path() fait la correspondance
+avec /etc/nginx/conf.d dans nginx-proxy.
+
+Environment:
+  NGINX_CONF_HOST_DIR (config/nginx/Plexconf du dépôt, monté sur /etc/nginx/conf.d)
+"""
+
+import os
+import threading
+
+CONTAINER_CONF_DIR = "/etc/nginx/conf.d"
+_REPO_CONF = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                          "..", "..", "..", "config", "nginx", "Plexconf"))
+CONF_HOST_DIR = os.environ.get("NGINX_CONF_HOST_DIR", _REPO_CONF)
+_DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+
+class ConfError(Exception):
+    pass
+
+
+# =========================
+# Tokenizer / parser
+# =========================
+def _tokens(text):
+    """(valeur, ligne, début, fin) — début/fin couvrent le token brut (guillemets compris)."""
+    i, line, n = 0, 1, len(text)
+    while i < n:
+        c = text[i]
+        if c == "\n":
+            line += 1
+            i += 1
+        elif c.isspace():
+            i += 1
+        elif c == "#":
+            while i < n and text[i] != "\n":
+                i += 1
+        elif c in "{};":
+            yield c, line, i, i + 1
+            i += 1
+        elif c in "\"'":
+            start, i = i, i + 1
+            buf = []
+            while i < n and text[i] != c:
+                if text[i] == "\\" and i + 1 < n:
+                    i += 1
+                if text[i] == "\n":
+                    line += 1
+                buf.append(text[i])
+                i += 1
+            if i >= n:
+                raise ConfError(f"line {line}: unterminated string")
+            i += 1
+            yield "".join(buf), line, start, i
+        else:
+            start = i
+            while i < n and not text[i].isspace() and text[i] not in "{};":
+                i += 1
+            yield text[start:i], line, start, i
+
+
+def parse(text):
+    """Liste de directives {"name", "args", "spans", "line", "block"} (block=None pour une directive simple)."""
+    root = []
+    stack = [root]
+    current = None
+    for value, line, start, end in _tokens(text):
+        if value == ";" or value == "{":
+            if current is None:
+                raise ConfError(f"line {line}: unexpected '{value}'")
+            stack[-1].append(current)
+            if value == "{":
+                current["block"] = []
+                stack.append(current["block"])
+            current = None
+        elif value == "}":
+            if current is not None or len(stack) == 1:
+                raise ConfError(f"line {line}: unexpected '}}'")
+            stack.pop()
+        elif current is None:
+            current = {"name": value, "args": [], "spans": [], "line": line, "block": None}
+        else:
+            current["args"].append(value)
+            current["spans"].append((start, end))
+    if current is not None or len(stack) != 1:
+        raise ConfError("unexpected end of file")
+    return root
+
+
+def split_target(url):
+    """proxy_pass → (scheme, host, port) ; host vide si non résolvable (variable, socket unix)."""
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        scheme, rest = "http", url
+    hostport = rest.split("/", 1)[0]
+    if not hostport or "$" in hostport or scheme not in _DEFAULT_PORTS or hostport.startswith("unix:"):
+        return scheme, "", ""
+    if hostport.startswith("["):  # IPv6 littérale
+        host, _, port = hostport[1:].partition("]")
+        port = port.lstrip(":")
+    elif hostport.count(":") == 1:
+        host, port = hostport.split(":", 1)
+    else:
+        host, port = hostport, ""
+    return scheme, host, port or _DEFAULT_PORTS[scheme]
+
+
+def _index_file(path, text):
+    """Blocs server, proxy_pass (non résolus) et blocs upstream d'un fichier."""
+    servers, passes, upstreams = [], [], {}
+
+    def walk(directives, server, location):
+        for d in directives:
+            name, args = d["name"], d["args"]
+            if name == "server" and d["block"] is not None and server is None:
+                srv = {"file": path, "line": d["line"], "server_names": [], "listen": [],
+                       "ssl_certificate": "", "ssl_certificate_key": "", "locations": []}
+                servers.append(srv)
+                walk(d["block"], srv, None)
+            elif name == "upstream" and d["block"] is not None and args:
+                upstreams[args[0]] = [sd["args"][0] for sd in d["block"] if sd["name"] == "server" and sd["args"]]
+            elif name == "location" and d["block"] is not None:
+                loc = " ".join(args)
+                if server is not None:
+                    server["locations"].append(loc)
+                walk(d["block"], server, loc)
+            elif d["block"] is not None:
+                walk(d["block"], server, location)
+            elif server is not None and name == "server_name":
+                server["server_names"].extend(args)
+            elif server is not None and name == "listen" and args:
+                server["listen"].append(" ".join(args))
+            elif server is not None and name in ("ssl_certificate", "ssl_certificate_key") and args:
+                server[name] = args[0]
+            elif name == "proxy_pass" and args:
+                passes.append({"file": path, "line": d["line"], "url": args[0], "span": d["spans"][0],
+                               "server": server, "location": location or ""})
+
+    walk(parse(text), None, None)
+    for p in passes:  # server_name peut suivre les locations dans le bloc
+        server = p.pop("server")
+        p["server_name"] = server["server_names"][0] if server and server["server_names"] else ""
+    return servers, passes, upstreams
+
+
+# =========================
+# Index incrémental
+# =========================
+class ConfIndex:
+    def __init__(self, conf_dir=CONF_HOST_DIR, suffix=".conf"):
+        self.conf_dir = conf_dir
+        self.suffix = suffix
+        self._files = {}   # chemin -> (mtime_ns, taille, (servers, passes, upstreams))
+        self.errors = {}   # chemin -> message d'erreur de parsing
+        self.stats = {"files": 0, "parsed": 0, "cache_hits": 0}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Re-parse uniquement les fichiers ajoutés/modifiés; retourne self."""
+        with self._lock:
+            seen = set()
+            with os.scandir(self.conf_dir) as it:
+                entries = sorted((e for e in it if e.name.endswith(self.suffix) and e.is_file()), key=lambda e: e.name)
+            for entry in entries:
+                st = entry.stat()
+                seen.add(entry.path)
+                cached = self._files.get(entry.path)
+                if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                    self.stats["cache_hits"] += 1
+                    continue
+                try:
+                    with open(entry.path, "r", encoding="utf-8", errors="replace") as f:
+                        parsed = _index_file(entry.path, f.read())
+                    self.errors.pop(entry.path, None)
+                except (OSError, ConfError) as e:
+                    parsed = ([], [], {})
+                    self.errors[entry.path] = str(e)
+                self._files[entry.path] = (st.st_mtime_ns, st.st_size, parsed)
+                self.stats["parsed"] += 1
+            for path in set(self._files) - seen:
+                del self._files[path]
+                self.errors.pop(path, None)
+            self.stats["files"] = len(self._files)
+        return self
+
+    def _parts(self):
+        return [self._files[p][2] for p in sorted(self._files)]
+
+    @property
+    def servers(self):
+        return [s for servers, _, _ in self._parts() for s in servers]
+
+    @property
+    def upstream_blocks(self):
+        blocks = {}
+        for _, _, upstreams in self._parts():
+            blocks.update(upstreams)
+        return blocks
+
+    @property
+    def proxy_passes(self):
+        """Chaque proxy_pass avec ses cibles résolues: "targets" = [(host, port), ...]."""
+        blocks = self.upstream_blocks
+        out = []
+        for _, passes, _ in self._parts():
+            for p in passes:
+                scheme, host, port = split_target(p["url"])
+                if host in blocks:
+                    targets = [split_target(f"{scheme}://{srv}")[1:] for srv in blocks[host]]
+                else:
+                    targets = [(host, port)] if host else []
+                out.append(dict(p, scheme=scheme, targets=[t for t in targets if t[0]]))
+        return out
+
+    def upstream_targets(self):
+        """(host, port) uniques, dans l'ordre des fichiers."""
+        seen = []
+        for p in self.proxy_passes:
+            for t in p["targets"]:
+                if t not in seen:
+                    seen.append(t)
+        return seen
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(conf_dir=None):
+    """Index partagé pour conf_dir (défaut NGINX_CONF_HOST_DIR), rafraîchi; None si le dossier est absent."""
+    conf_dir = conf_dir or CONF_HOST_DIR
+    if not os.path.isdir(conf_dir):
+        return None
+    with _indexes_lock:
+        index = _indexes.setdefault(conf_dir, ConfIndex(conf_dir))
+    try:
+        return index.refresh()
+    except OSError as e:
+        print(f"[WARN] nginx conf index unavailable ({conf_dir}): {e}")
+        return None
+
+
+def container_path(host_path, conf_dir=None):
+    return f"{CONTAINER_CONF_DIR}/{os.path.relpath(host_path, conf_dir or CONF_HOST_DIR)}"
+
+
+def rewrite_upstream(path, text, old, new):
+    """Texte de `path` avec la cible host:port `old` remplacée par `new` dans chaque proxy_pass: (texte, nombre)."""
+    old_host, _, old_port = old.rpartition(":")
+    _, passes, _ = _index_file(path, text)
+    edits = []
+    for p in passes:
+        scheme, host, port = split_target(p["url"])
+        if (host, port) != (old_host, old_port):
+            continue
+        prefix = f"{scheme}://" if "://" in p["url"] else ""
+        rest = p["url"][len(prefix):]
+        path_part = rest[len(rest.split("/", 1)[0]):]
+        edits.append((p["span"], f"{prefix}{new}{path_part}"))
+    for (start, end), value in sorted(edits, reverse=True):
+        text = text[:start] + value + text[end:]
+    return text, len(edits)
+
+
+def replace_upstream(path, old, new):
+    """
+    Remplace la cible host:port `old` par `new` dans chaque proxy_pass de `path`.
+    Seul le token concerné est réécrit (commentaires et mise en forme conservés). Retourne le nombre de remplacements.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    text, count = rewrite_upstream(path, text, old, new)
+    if count:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp, path)
+    return count
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: notify_digest.py
+"""
+Regroupement des notifications Discord par incident, devant discord_dispatch.py.
+
+Pendant une panne, monitor_loop, run_alerts_once, handle_deluge_verification et
+plex_online signalent la même cause à chaque cycle. Ici chaque message d'échec porte
+une empreinte d'incident (composant + clé):
+- report(component, key, msg): ouvre ou rafraîchit l'incident; le premier message part,
+  les répétitions dans NOTIFY_DEDUP_WINDOW_SEC sont comptées mais pas envoyées; passé la
+  fenêtre sans digest entre-temps, le message repart avec "(still failing for 42 min, 17 repeats suppressed)"
+- resolve(component, key=None, msg=None): ferme l'incident (key=None: tout le composant,
+  "tests" couvre aussi "tests:..."); msg part avec la durée de l'incident
+- send(msg): autres messages; les textes identiques (chiffres ignorés: IP, exit code...)
+  ne repartent pas avant la fin de la fenêtre
+- tick(): au plus un digest toutes les NOTIFY_DIGEST_SEC, dès qu'un incident dure depuis
+  plus longtemps: "⏳ 3 checks still failing for 14 min" + une ligne par incident
+  (et le nombre de messages répétés supprimés), qui compte comme rappel de chacun;
+  les incidents non signalés depuis NOTIFY_STALE_SEC sont fermés sans message.
+  Appelé par monitor_loop à chaque cycle et à chaque report()/send().
+
+Etat partagé entre processus (mode subprocess de monitor_loop: un monitor_repair par
+cycle) dans NOTIFY_DIGEST_FILE, lu/écrit sous verrou fcntl; en mémoire si le fichier
+est inaccessible. NOTIFY_DIGEST=0: tout part tel quel (ancien comportement).
+
+Environment:
+  NOTIFY_DIGEST (1), NOTIFY_DIGEST_FILE (/mnt/data/notify_digest.json),
+  NOTIFY_DEDUP_WINDOW_SEC (1800), NOTIFY_DIGEST_SEC (900), NOTIFY_STALE_SEC (1800)
+"""
+
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import discord_dispatch
+
+NOTIFY_DIGEST = os.environ.get("NOTIFY_DIGEST", "1") == "1"
+DIGEST_FILE = os.environ.get("NOTIFY_DIGEST_FILE", "/mnt/data/notify_digest.json")
+DEDUP_WINDOW_SEC = int(os.environ.get("NOTIFY_DEDUP_WINDOW_SEC", "1800"))
+DIGEST_SEC = int(os.environ.get("NOTIFY_DIGEST_SEC", "900"))
+STALE_SEC = int(os.environ.get("NOTIFY_STALE_SEC", "1800"))
+DIGEST_LINES = 15
+
+_lock = threading.Lock()
+_memory = {}          # repli si DIGEST_FILE est inaccessible
+_warned = False
+_DIGITS_RE = re.compile(r"\d+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(text) -> str:
+    """Empreinte d'un message libre: casse, chiffres et espaces ignorés."""
+    return _SPACE_RE.sub(" ", _DIGITS_RE.sub("#", str(text).lower())).strip()[:200]
+
+
+def _duration(sec) -> str:
+    sec = max(0, int(sec))
+    if sec < 60:
+        return f"{sec} s"
+    if sec < 3600:
+        return f"{sec // 60} min"
+    return f"{sec // 3600} h {sec % 3600 // 60:02d}"
+
+
+def _headline(text, width=150) -> str:
+    line = str(text).strip().splitlines()[0] if str(text).strip() else ""
+    return line if len(line) <= width else line[:width - 1] + "…"
+
+
+# =========================
+# Etat (fichier partagé sous verrou)
+# =========================
+def _blank():
+    return {"incidents": {}, "repeats": {}, "last_digest": 0, "digests": 0, "suppressed_total": 0}
+
+
+@contextmanager
+def _state(path=None):
+    global _warned
+    path = path or DIGEST_FILE
+    with _lock:
+        try:
+            lock = open(f"{path}.lock", "a")
+        except OSError as e:
+            if not _warned:
+                print(f"[WARN] notify digest state kept in memory: {e}")
+                _warned = True
+            state = _memory.setdefault(path, _blank())
+            yield state
+            return
+        with lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                if not isinstance(state, dict):
+                    state = _blank()
+            except (OSError, ValueError):
+                state = _blank()
+            for key, value in _blank().items():
+                state.setdefault(key, value)
+            yield state
+            tmp = f"{path}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(state, f, ensure_ascii=False)
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"[WARN] notify digest state not saved: {e}")
+
+
+def _key(component, key) -> str:
+    return f"{component}/{key}"
+
+
+def _matches(incident, component, key) -> bool:
+    if incident["component"] != component:
+        return False
+    return key is None or incident["key"] == key or incident["key"].startswith(f"{key}:")
+
+
+# =========================
+# API
+# =========================
+def report(component, key, message=None, notify=True, now=None) -> bool:
+    """Signale un échec (incident component/key). notify=False: garde l'incident ouvert sans rien envoyer."""
+    now = now or time.time()
+    if not NOTIFY_DIGEST:
+        return discord_dispatch.send(message) if (notify and message) else False
+    with _state() as state:
+        inc = state["incidents"].get(_key(component, key))
+        out = None
+        if inc is not None and now - inc["last_ts"] > STALE_SEC:
+            inc = None    # périmé sans avoir été purgé: nouvel incident
+        if inc is None:
+            inc = state["incidents"][_key(component, key)] = {
+                "component": component, "key": key, "message": message or f"{component} {key}",
+                "first_ts": now, "last_ts": now, "last_sent": 0, "count": 0, "suppressed": 0}
+            if notify and message:
+                out = message
+        elif notify and message:
+            if now - inc["last_sent"] >= DEDUP_WINDOW_SEC:
+                out = f"{message} (still failing for {_duration(now - inc['first_ts'])}" + \
+                      (f", {inc['suppressed']} repeats suppressed)" if inc["suppressed"] else ")")
+            else:
+                inc["suppressed"] += 1
+                state["suppressed_total"] += 1
+        inc["last_ts"] = now
+        inc["count"] += 1
+        if message:
+            inc["message"] = message
+        if out:
+            inc["last_sent"] = now
+        digest = _tick(state, now)
+    sent = discord_dispatch.send(out) if out else True
+    if digest:
+        discord_dispatch.send(digest)
+    return sent
+
+
+def resolve(component, key=None, message=None, now=None) -> bool:
+    """Ferme les incidents du composant (ou de la clé); envoie message avec la durée s'il y en avait un ouvert."""
+    now = now or time.time()
+    if not NOTIFY_DIGEST:
+        return discord_dispatch.send(message) if message else False
+    with _state() as state:
+        closed = [k for k, inc in state["incidents"].items() if _matches(inc, component, key)]
+        first = min((state["incidents"][k]["first_ts"] for k in closed), default=None)
+        suppressed = sum(state["incidents"][k]["suppressed"] for k in closed)
+        for k in closed:
+            del state["incidents"][k]
+    if not message:
+        return bool(closed)
+    if first is not None:
+        message += f" (after {_duration(now - first)}" + (f", {suppressed} repeats suppressed)" if suppressed else ")")
+    return discord_dispatch.send(message)
+
+
+def send(message, now=None) -> bool:
+    """Message hors incident: les textes identiques dans la fenêtre sont comptés, pas renvoyés."""
+    now = now or time.time()
+    if not NOTIFY_DIGEST or not str(message or "").strip():
+        return discord_dispatch.send(message)
+    fp = fingerprint(message)
+    with _state() as state:
+        rep = state["repeats"].get(fp)
+        out = None
+        if rep is None or now - rep["last_sent"] >= DEDUP_WINDOW_SEC:
+            out = message
+            if rep and rep["suppressed"]:
+                out += f" (repeated {rep['suppressed']}× in the last {_duration(now - rep['last_sent'])})"
+            state["repeats"][fp] = {"text": _headline(message), "last_sent": now, "suppressed": 0}
+        else:
+            rep["suppressed"] += 1
+            state["suppressed_total"] += 1
+        digest = _tick(state, now)
+    sent = discord_dispatch.send(out) if out else True
+    if digest:
+        discord_dispatch.send(digest)
+    return sent
+
+
+def tick(now=None) -> bool:
+    """Digest si dû (monitor_loop, une fois par cycle). True si un digest est parti."""
+    if not NOTIFY_DIGEST:
+        return False
+    now = now or time.time()
+    with _state() as state:
+        digest = _tick(state, now)
+    if digest:
+        discord_dispatch.send(digest)
+    return bool(digest)
+
+
+def stats() -> dict:
+    if not NOTIFY_DIGEST:
+        return {}
+    with _state() as state:
+        return {"open_incidents": len(state["incidents"]), "digests": state["digests"],
+                "suppressed": state["suppressed_total"]}
+
+
+# =========================
+# Digest
+# =========================
+def _tick(state, now):
+    """Ferme les incidents périmés, purge les répétitions et retourne le texte du digest s'il est dû."""
+    for k in [k for k, inc in state["incidents"].items() if now - inc["last_ts"] > STALE_SEC]:
+        del state["incidents"][k]
+    for fp in [fp for fp, rep in state["repeats"].items()
+               if now - rep["last_sent"] > DEDUP_WINDOW_SEC and not rep["suppressed"]]:
+        del state["repeats"][fp]
+    if now - state["last_digest"] < DIGEST_SEC:
+        return None
+    incidents = sorted(state["incidents"].values(), key=lambda i: i["first_ts"])
+    repeated = sorted((r for r in state["repeats"].values() if r["suppressed"]), key=lambda r: -r["suppressed"])
+    if not (incidents and now - incidents[0]["first_ts"] >= DIGEST_SEC) and \
+            not any(now - r["last_sent"] >= DIGEST_SEC for r in repeated):
+        return None
+    lines = []
+    if incidents:
+        n = len(incidents)
+        lines.append(f"⏳ {n} check{'s' if n > 1 else ''} still failing for {_duration(now - incidents[0]['first_ts'])}")
+        for inc in incidents[:DIGEST_LINES]:
+            n_rep = inc["suppressed"]
+            extra = f", {n_rep} repeat{'s' if n_rep > 1 else ''}" if n_rep else ""
+            lines.append(f"- {inc['component']}/{inc['key']}: {_headline(inc['message'])} "
+                         f"— {_duration(now - inc['first_ts'])}{extra}")
+        for inc in incidents:
+            inc["last_sent"] = now    # le digest tient lieu de rappel: pas de renvoi individuel en plus
+        if n > DIGEST_LINES:
+            lines.append(f"- … +{n - DIGEST_LINES} more")
+    if repeated:
+        total = sum(r["suppressed"] for r in repeated)
+        lines.append(f"(+ {total} repeated notification{'s' if total > 1 else ''} suppressed: "
+                     + "; ".join(f"{r['text']} ×{r['suppressed']}" for r in repeated[:3])
+                     + ("; …" if len(repeated) > 3 else "") + ")")
+        for rep in repeated:
+            rep["suppressed"] = 0
+            rep["last_sent"] = now
+    state["last_digest"] = now
+    state["digests"] += 1
+    return "\n".join(lines)
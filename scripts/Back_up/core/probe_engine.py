@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: probe_engine.py
+"""
+Exécution concurrente des sondes de collecte (run_quick_check.py).
+
+Chaque sonde est indépendante, tourne dans un pool de threads borné et possède
+sa propre échéance: le temps d'un cycle devient celui de la sonde la plus lente
+au lieu de la somme de toutes. Une sonde en retard ou en erreur retourne sa
+valeur par défaut; son statut et sa durée sont remontés pour la section
+"performance" de l'entrée.
+
+Une sonde qui dépasse son échéance n'est pas tuée (thread Python): les sondes
+qui lancent des sous-processus doivent passer leur propre timeout.
+
+run_dag() / run_result_dag(): même exécution pour des checks liés par des
+dépendances (check Plex online): un nœud part dès que ses dépendances ont
+réussi, un échec ou un timeout court-circuite tous ses dépendants; la durée
+totale est celle de la plus longue chaîne.
+
+Environment:
+  PROBE_WORKERS (défaut 16), PROBE_TIMEOUT_SEC (échéance par défaut, 20 s)
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+PROBE_WORKERS = int(os.environ.get("PROBE_WORKERS", "16"))
+PROBE_TIMEOUT_SEC = float(os.environ.get("PROBE_TIMEOUT_SEC", "20"))
+
+
+class Probe:
+    __slots__ = ("name", "fn", "timeout", "default")
+
+    def __init__(self, name, fn, timeout=None, default=None):
+        self.name = name
+        self.fn = fn
+        self.timeout = PROBE_TIMEOUT_SEC if timeout is None else float(timeout)
+        self.default = default
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    try:
+        return True, fn(), time.perf_counter() - t0
+    except Exception as e:
+        return False, e, time.perf_counter() - t0
+
+
+def run_probes(probes, max_workers=None):
+    """
+    Lance toutes les sondes en parallèle.
+    Retour: (results {name: valeur}, timings {name: {"seconds", "status"[, "error"]}})
+    status ∈ ok | error | timeout
+    """
+    results, timings = {}, {}
+    if not probes:
+        return results, timings
+    workers = max(1, min(max_workers or PROBE_WORKERS, len(probes)))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="probe")
+    start = time.perf_counter()
+    pending = {}
+    for p in probes:
+        pending[pool.submit(_timed, p.fn)] = (p, start + p.timeout)
+    try:
+        while pending:
+            now = time.perf_counter()
+            next_deadline = min(deadline for _, deadline in pending.values())
+            done, _ = wait(list(pending), timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+            for fut in done:
+                p, _ = pending.pop(fut)
+                ok, value, seconds = fut.result()
+                if ok:
+                    results[p.name] = value
+                    timings[p.name] = {"seconds": round(seconds, 3), "status": "ok"}
+                else:
+                    results[p.name] = p.default
+                    timings[p.name] = {"seconds": round(seconds, 3), "status": "error", "error": str(value)[:200]}
+            now = time.perf_counter()
+            for fut, (p, deadline) in list(pending.items()):
+                if now >= deadline:
+                    pending.pop(fut)
+                    fut.cancel()
+                    results[p.name] = p.default
+                    timings[p.name] = {"seconds": round(now - start, 3), "status": "timeout"}
+                    print(f"[WARN] probe '{p.name}' exceeded its {p.timeout:g}s deadline")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results, timings
+
+
+# =========================
+# Graphe de dépendances
+# =========================
+class Node:
+    __slots__ = ("name", "fn", "deps", "timeout", "default")
+
+    def __init__(self, name, fn, deps=(), timeout=None, default=None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout = PROBE_TIMEOUT_SEC if timeout is None else float(timeout)
+        self.default = default
+
+
+def run_dag(nodes, max_workers=None, passed=None, on_done=None):
+    """
+    Lance chaque nœud dès que toutes ses dépendances ont réussi.
+    passed(name, value) -> bool décide de la réussite (défaut: bool(value));
+    on_done(node, timing, value) est appelé dans le thread d'orchestration, avant le
+    lancement des dépendants (ils voient donc ce qu'il a publié).
+    Retour: (results, timings) comme run_probes();
+    status ∈ ok | failed | error | timeout | skipped (+ "blocked_by" pour skipped)
+    """
+    passed = passed or (lambda name, value: bool(value))
+    names = {n.name for n in nodes}
+    for n in nodes:
+        unknown = [d for d in n.deps if d not in names]
+        if unknown:
+            raise ValueError(f"node '{n.name}' depends on unknown node(s) {unknown}")
+    results, timings, status = {}, {}, {}
+    if not nodes:
+        return results, timings
+    workers = max(1, min(max_workers or PROBE_WORKERS, len(nodes)))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dag")
+    waiting = list(nodes)
+    pending = {}
+
+    def finish(n, value, timing):
+        results[n.name] = value
+        timings[n.name] = timing
+        status[n.name] = timing["status"]
+        if on_done:
+            on_done(n, timing, value)
+
+    def schedule():
+        progressed = True
+        while progressed:
+            progressed = False
+            for n in list(waiting):
+                if any(d not in status for d in n.deps):
+                    continue
+                waiting.remove(n)
+                progressed = True
+                blocked = [d for d in n.deps if status[d] != "ok"]
+                if blocked:
+                    finish(n, n.default, {"seconds": 0.0, "status": "skipped", "blocked_by": blocked[0]})
+                else:
+                    pending[pool.submit(_timed, n.fn)] = (n, time.perf_counter() + n.timeout, time.perf_counter())
+
+    try:
+        schedule()
+        while pending:
+            now = time.perf_counter()
+            next_deadline = min(deadline for _, deadline, _ in pending.values())
+            done, _ = wait(list(pending), timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+            for fut in done:
+                n, _, _ = pending.pop(fut)
+                ok, value, seconds = fut.result()
+                if not ok:
+                    finish(n, n.default, {"seconds": round(seconds, 3), "status": "error", "error": str(value)[:200]})
+                else:
+                    finish(n, value, {"seconds": round(seconds, 3),
+                                      "status": "ok" if passed(n.name, value) else "failed"})
+            now = time.perf_counter()
+            for fut, (n, deadline, started) in list(pending.items()):
+                if now >= deadline:
+                    pending.pop(fut)
+                    fut.cancel()
+                    print(f"[WARN] node '{n.name}' exceeded its {n.timeout:g}s deadline")
+                    finish(n, n.default, {"seconds": round(now - started, 3), "status": "timeout"})
+            schedule()
+        # cycle: nœuds jamais prêts
+        for n in waiting:
+            finish(n, n.default, {"seconds": 0.0, "status": "skipped",
+                                  "blocked_by": next(d for d in n.deps if d not in status)})
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results, timings
+
+
+class _NodeOutput:
+    """stdout par thread: la sortie d'un nœud est imprimée d'un bloc à sa fin (pas d'entrelacement)."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buf = getattr(self.local, "buf", None)
+        if buf is None:
+            return self.stream.write(text)
+        buf.append(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def run_result_dag(nodes, results, max_workers=None):
+    """
+    run_dag() pour les checks au style plex_online: fn(res) remplit un dict de résultats.
+    - chaque nœud reçoit une copie de `results` (sorties de ses dépendances incluses)
+    - les clés qu'il écrit sont fusionnées dans `results` à sa fin; il réussit si res[nom] is True
+    - skipped / timeout / error → results[nom] = False et results["_reason_<nom>"]
+      (raison de la dépendance en échec si elle en a une)
+    Retour: timings de run_dag().
+    """
+    out = _NodeOutput(sys.stdout)
+
+    def wrap(fn):
+        def call():
+            base = dict(results)
+            res = dict(base)
+            out.local.buf = []
+            try:
+                fn(res)
+            finally:
+                text, out.local.buf = "".join(out.local.buf), None
+                if text:
+                    out.stream.write(text)
+                    out.stream.flush()
+            # seulement ce que le nœud a écrit: pas d'écrasement des sorties publiées entre-temps
+            return {k: v for k, v in res.items() if k not in base or base[k] is not v}
+        return call
+
+    def on_done(node, timing, res):
+        name = node.name
+        if timing["status"] in ("ok", "failed"):
+            results.update(res)
+            return
+        results[name] = False
+        if timing["status"] == "skipped":
+            dep = timing["blocked_by"]
+            results[f"_reason_{name}"] = results.get(f"_reason_{dep}") or f"not run: {dep} failed"
+        elif timing["status"] == "timeout":
+            results[f"_reason_{name}"] = f"timed out after {node.timeout:g}s"
+        else:
+            results[f"_reason_{name}"] = f"error: {timing.get('error', '')}"
+
+    wrapped = [Node(n.name, wrap(n.fn), n.deps, n.timeout, n.default) for n in nodes]
+    previous, sys.stdout = sys.stdout, out
+    try:
+        _, timings = run_dag(wrapped, max_workers, passed=lambda name, res: res.get(name) is True,
+                             on_done=on_done)
+    finally:
+        sys.stdout = previous
+    return timings
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: public_ip.py
+"""
+Résolution de l'IP publique, partagée par run_quick_check.py, monitor_repair.py et plex_online.py.
+
+- cache TTL en mémoire par espace réseau: "host" (machine) et "netns:<conteneur>"
+  (ex: vpn; deluge est en network_mode service:vpn → même clé, une seule requête pour les deux)
+- single-flight: les appels concurrents pour un même espace attendent la requête en cours
+- requêtes "hedged": le premier fournisseur part tout de suite, les suivants après
+  PUBLIC_IP_HEDGE_MS s'il n'a pas encore répondu; la première IPv4 valide gagne
+- côté host: urllib en process; côté conteneur: curl via docker_api.exec (Engine API)
+- cache "host" persisté dans PUBLIC_IP_CACHE_FILE (utile en mode subprocess)
+
+Environment:
+  PUBLIC_IP_PROVIDERS (ipify, ifconfig.me, icanhazip), PUBLIC_IP_CACHE_TTL_SEC (600),
+  PUBLIC_IP_NETNS_TTL_SEC (50, ≈ un cycle: l'IP VPN doit rester fraîche),
+  PUBLIC_IP_HEDGE_MS (300), PUBLIC_IP_CACHE_FILE (/mnt/data/public_ip_cache.json)
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+PROVIDERS = [u.strip() for u in os.environ.get(
+    "PUBLIC_IP_PROVIDERS", "https://api.ipify.org,https://ifconfig.me/ip,https://ipv4.icanhazip.com"
+).split(",") if u.strip()]
+CACHE_TTL_SEC = int(os.environ.get("PUBLIC_IP_CACHE_TTL_SEC", "600"))
+NETNS_TTL_SEC = int(os.environ.get("PUBLIC_IP_NETNS_TTL_SEC", "50"))
+HEDGE_MS = int(os.environ.get("PUBLIC_IP_HEDGE_MS", "300"))
+CACHE_FILE = os.environ.get("PUBLIC_IP_CACHE_FILE", "/mnt/data/public_ip_cache.json")
+HOST = "host"
+
+
+def valid_ipv4(text) -> str:
+    ip = (text or "").strip()
+    if ip.count(".") != 3:
+        return ""
+    try:
+        socket.inet_aton(ip)
+    except OSError:
+        return ""
+    return ip
+
+
+def _fetch_host(url, timeout):
+    req = urllib.request.Request(url, headers={"User-Agent": "curl/8", "Accept": "text/plain"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.read(64).decode("ascii", "ignore")
+
+
+def _fetch_container(container, url, timeout):
+    import docker_api
+    rc, out, _ = docker_api.get_client().exec(
+        container, ["curl", "-sS", "-4", "--max-time", str(int(max(1, timeout))), url], timeout=timeout + 2)
+    return out if rc == 0 else ""
+
+
+class PublicIPResolver:
+    def __init__(self, providers=None, ttl=CACHE_TTL_SEC, netns_ttl=NETNS_TTL_SEC, hedge_ms=HEDGE_MS,
+                 cache_file=CACHE_FILE):
+        self.providers = list(providers or PROVIDERS)
+        self.ttl = ttl
+        self.netns_ttl = netns_ttl
+        self.hedge = hedge_ms / 1000.0
+        self.cache_file = cache_file
+        self._cache = {}        # namespace -> (ip, epoch)
+        self._inflight = {}     # namespace -> threading.Event
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="public-ip")
+        self._stats = {"lookups": 0, "cache_hits": 0, "joined": 0, "failures": 0, "winners": {}}
+        self._load_file()
+
+    # ---------- cache ----------
+    def _load_file(self):
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, "r") as f:
+                d = json.load(f)
+        except Exception:
+            return
+        if "ip" in d:  # ancien format de run_quick_check: {"ip", "ts"}
+            d = {HOST: {"ip": d.get("ip"), "ts": d.get("ts", 0)}}
+        for ns, v in d.items():
+            if isinstance(v, dict) and valid_ipv4(v.get("ip")):
+                self._cache[ns] = (v["ip"], float(v.get("ts", 0)))
+
+    def _save_file(self):
+        if not self.cache_file:
+            return
+        try:
+            tmp = self.cache_file + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({ns: {"ip": ip, "ts": int(ts)} for ns, (ip, ts) in self._cache.items()}, f)
+            os.replace(tmp, self.cache_file)
+        except OSError:
+            pass
+
+    def _cached(self, ns):
+        hit = self._cache.get(ns)
+        ttl = self.ttl if ns == HOST else self.netns_ttl
+        if hit and time.time() - hit[1] <= ttl:
+            return hit[0]
+        return ""
+
+    # ---------- espace réseau d'un conteneur ----------
+    def namespace_of(self, container) -> str:
+        """Clé de cache: "host" (network_mode host), sinon netns du conteneur propriétaire."""
+        try:
+            import docker_api
+            table = docker_api.get_client().containers()
+        except Exception:
+            return f"netns:{container}"
+        summary = table.get(container) or {}
+        mode = (summary.get("HostConfig") or {}).get("NetworkMode", "")
+        if mode == "host":
+            return HOST
+        if mode.startswith("container:"):
+            target = mode.split(":", 1)[1]
+            for name, c in table.items():
+                if c.get("Id", "").startswith(target) or name == target:
+                    return f"netns:{name}"
+        return f"netns:{container}"
+
+    # ---------- requêtes hedged ----------
+    def _hedged(self, fetch, timeout):
+        deadline = time.monotonic() + timeout
+        pending = {}
+        queue = list(self.providers)
+        while queue or pending:
+            if queue:
+                url = queue.pop(0)
+                pending[self._pool.submit(fetch, url, timeout)] = url
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            done, _ = wait(list(pending), timeout=min(left, self.hedge) if queue else left,
+                           return_when=FIRST_COMPLETED)
+            for fut in done:
+                url = pending.pop(fut)
+                try:
+                    ip = valid_ipv4(fut.result())
+                except Exception:
+                    ip = ""
+                if ip:
+                    for other in pending:
+                        other.cancel()
+                    return ip, url
+        return "", None
+
+    def _resolve(self, ns, fetch, timeout, force):
+        # compteurs et cache sous self._lock: les threads de sondes appellent en parallèle
+        with self._lock:
+            if not force:
+                ip = self._cached(ns)
+                if ip:
+                    self._stats["cache_hits"] += 1
+                    return ip
+            event = self._inflight.get(ns)
+            leader = event is None
+            if leader:
+                event = self._inflight[ns] = threading.Event()
+                self._stats["lookups"] += 1
+            else:
+                self._stats["joined"] += 1
+        if not leader:
+            event.wait(timeout + 1)
+            return self._cached(ns)
+        try:
+            ip, url = self._hedged(fetch, timeout)
+            with self._lock:
+                if ip:
+                    self._cache[ns] = (ip, time.time())
+                    winners = self._stats["winners"]
+                    winners[url] = winners.get(url, 0) + 1
+                    self._save_file()
+                else:
+                    self._stats["failures"] += 1
+            return ip
+        finally:
+            with self._lock:
+                self._inflight.pop(ns, None)
+            event.set()
+
+    # ---------- API ----------
+    def get(self, timeout=5, force=False) -> str:
+        """IP publique de la machine ("" si aucun fournisseur ne répond)."""
+        return self._resolve(HOST, _fetch_host, timeout, force)
+
+    def get_for_container(self, container, timeout=5, force=False) -> str:
+        """IP publique vue depuis l'espace réseau d'un conteneur (ex: vpn, deluge)."""
+        ns = self.namespace_of(container)
+        if ns == HOST:
+            return self.get(timeout, force)
+        owner = ns.split(":", 1)[1]
+        return self._resolve(ns, lambda url, t: _fetch_container(owner, url, t), timeout, force)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, winners=dict(self._stats["winners"]),
+                        cached={ns: ip for ns, (ip, _) in self._cache.items()})
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> PublicIPResolver:
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = PublicIPResolver()
+        return _resolver
+
+
+def get_public_ip(timeout=5, force=False) -> str:
+    return get_resolver().get(timeout, force)
+
+
+def get_container_public_ip(container, timeout=5, force=False) -> str:
+    return get_resolver().get_for_container(container, timeout, force)
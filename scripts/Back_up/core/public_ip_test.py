@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File name: public_ip_test.py
+"""
+Tests de public_ip.py contre des fournisseurs HTTP locaux (ThreadingHTTPServer sur
+127.0.0.1): pas d'accès Internet. Chaque chemin imite un fournisseur: /fast répond
+tout de suite, /slow après un délai, /bad renvoie autre chose qu'une IPv4, /down en 500.
+
+Couvre: requêtes hedged (le fournisseur lent est doublé), réponses invalides ignorées,
+échec quand aucun fournisseur ne répond, cache TTL, single-flight, fichier de cache
+(dont l'ancien format {"ip", "ts"}), espace réseau d'un conteneur (network_mode).
+
+USAGE
+  python3 public_ip_test.py        (ou python3 -m pytest public_ip_test.py)
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import public_ip
+
+SLOW_SEC = 0.6
+
+
+class Provider(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        srv = self.server
+        with srv.lock:
+            srv.hits[self.path] = srv.hits.get(self.path, 0) + 1
+        if self.path == "/down":
+            self.send_error(500)
+            return
+        if self.path == "/slow":
+            time.sleep(SLOW_SEC)
+            body = b"203.0.113.9\n"
+        elif self.path == "/bad":
+            body = b"<html>rate limited</html>"
+        else:
+            time.sleep(srv.fast_delay)
+            body = b"198.51.100.7\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PublicIPTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), Provider)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.hits = {}
+        self.server.fast_delay = 0.0
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmp.name, "public_ip_cache.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _resolver(self, *paths, **kw):
+        kw.setdefault("hedge_ms", 100)
+        kw.setdefault("cache_file", self.cache_file)
+        return public_ip.PublicIPResolver([self.base + p for p in paths], **kw)
+
+    def test_hedged_request_beats_slow_provider(self):
+        r = self._resolver("/slow", "/fast")
+        t0 = time.monotonic()
+        self.assertEqual(r.get(timeout=3), "198.51.100.7")
+        self.assertLess(time.monotonic() - t0, SLOW_SEC)
+        self.assertEqual(r.stats()["winners"], {self.base + "/fast": 1})
+
+    def test_invalid_and_failing_providers_skipped(self):
+        r = self._resolver("/bad", "/down", "/fast", hedge_ms=10)
+        self.assertEqual(r.get(timeout=3), "198.51.100.7")
+
+    def test_all_providers_fail(self):
+        r = self._resolver("/bad", "/down", hedge_ms=10)
+        self.assertEqual(r.get(timeout=2), "")
+        st = r.stats()
+        self.assertEqual((st["lookups"], st["failures"]), (1, 1))
+        self.assertNotIn(public_ip.HOST, st["cached"])
+
+    def test_cache_ttl_and_force(self):
+        r = self._resolver("/fast")
+        r.get()
+        r.get()
+        self.assertEqual(self.server.hits["/fast"], 1)
+        self.assertEqual(r.stats()["cache_hits"], 1)
+        r.get(force=True)
+        self.assertEqual(self.server.hits["/fast"], 2)
+        with mock.patch.object(public_ip.time, "time", return_value=time.time() + r.ttl + 1):
+            r.get()
+        self.assertEqual(self.server.hits["/fast"], 3)
+
+    def test_single_flight(self):
+        self.server.fast_delay = 0.3
+        r = self._resolver("/fast")
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(r.get(timeout=3))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ["198.51.100.7"] * 5)
+        self.assertEqual(self.server.hits["/fast"], 1)
+        self.assertEqual(r.stats()["joined"], 4)
+
+    def test_cache_file_shared_between_processes(self):
+        self._resolver("/fast").get()
+        with open(self.cache_file) as f:
+            self.assertEqual(json.load(f)[public_ip.HOST]["ip"], "198.51.100.7")
+        # mode subprocess: un nouveau resolver reprend l'IP sans requête
+        self.assertEqual(self._resolver("/down").get(), "198.51.100.7")
+        self.assertEqual(self.server.hits.get("/down", 0), 0)
+
+    def test_legacy_cache_file(self):
+        with open(self.cache_file, "w") as f:
+            json.dump({"ip": "192.0.2.1", "ts": time.time()}, f)
+        self.assertEqual(self._resolver("/down").get(), "192.0.2.1")
+
+    def test_namespace_of_container(self):
+        table = {
+            "vpn": {"Id": "abc123", "HostConfig": {"NetworkMode": "bridge"}},
+            "deluge": {"Id": "def456", "HostConfig": {"NetworkMode": "container:abc123"}},
+            "plex": {"Id": "ghi789", "HostConfig": {"NetworkMode": "host"}},
+        }
+        client = mock.Mock()
+        client.containers.return_value = table
+        r = self._resolver("/fast")
+        with mock.patch("docker_api.get_client", return_value=client):
+            self.assertEqual(r.namespace_of("vpn"), "netns:vpn")
+            self.assertEqual(r.namespace_of("deluge"), "netns:vpn")
+            self.assertEqual(r.namespace_of("plex"), public_ip.HOST)
+            # network_mode host: même cache et mêmes fournisseurs que la machine
+            self.assertEqual(r.get_for_container("plex"), "198.51.100.7")
+        self.assertEqual(self.server.hits["/fast"], 1)
+
+    def test_valid_ipv4(self):
+        self.assertEqual(public_ip.valid_ipv4(" 10.0.0.1\n"), "10.0.0.1")
+        for text in ("", "10.0.0", "::1", "999.1.1.1", "<html>", None):
+            self.assertEqual(public_ip.valid_ipv4(text), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
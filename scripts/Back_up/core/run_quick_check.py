@@ -3,7 +3,6 @@
 # File name : run_quick_check.py
 
 import os
-import subprocess
 import logging
 import time
 import psutil
@@ -13,14 +12,26 @@ from plexapi.server import PlexServer
 import importlib.util
 import json
 from datetime import datetime
-from deluge_client import DelugeRPCClient
 import re
-import socket
 import multiprocessing
+from functools import partial
+import monitor_store
+import deluge_rpc
+import deluge_telemetry
+import docker_api
+import docker_events
+import cgroup_sampler
+import public_ip
+import discord_dispatch
+import dns_client
+import http_probe
+import log_ingest
+import jackett_stats
+import notify_digest
+from probe_engine import Probe, run_probes
 
 # ========= CONFIG DE BASE =========
 core_count = multiprocessing.cpu_count()
-start_time = time.time()
 mode = "debug"
 
 print("[DEBUG - run_quick_check.py - INIT - 1] Script initiated")
@@ -38,6 +49,7 @@ else:
 CONNECT_TIMEOUT = int(os.getenv("CONNECT_TIMEOUT", "3"))
 MAX_TIME = int(os.getenv("MAX_TIME", "10"))
 RETRIES = int(os.getenv("RETRIES", "2"))
+LOOP_INTERVAL_SECONDS = int(os.getenv("LOOP_INTERVAL_SECONDS", "60"))
 
 SPEEDTEST_ENABLED = os.getenv("SPEEDTEST_ENABLED", "1") == "1"
 SPEEDTEST_COOLDOWN_SEC = int(os.getenv("SPEEDTEST_COOLDOWN_SEC", "7200"))  # 2h
@@ -45,10 +57,10 @@ SPEEDTEST_STATE_FILE = "/mnt/data/speedtest_state.json"
 
 # ========= CONFIG DELUGE RPC =========
 deluge_config = {
-    "host": "localhost",
-    "port": 58846,
-    "username": "localclient",
-    "password": "e0db9d7d51b2c62b7987031174607aa822f94bc9",
+    "host": deluge_rpc.DELUGE_HOST,
+    "port": deluge_rpc.DELUGE_PORT,
+    "username": deluge_rpc.DELUGE_USER,
+    "password": deluge_rpc.DELUGE_PASSWORD,
 }
 
 # ========= LOGGING FICHIER =========
@@ -60,21 +72,9 @@ logging.basicConfig(
 
 
 def append_json_log(entry):
-    LOG_FILE = "/mnt/data/system_monitor_log.json"
+    # Store segmenté NDJSON (append O(1), voir monitor_store.py)
     entry["timestamp"] = datetime.now().isoformat()
-    if not os.path.exists(LOG_FILE):
-        with open(LOG_FILE, "w") as f:
-            json.dump([entry], f, indent=2)
-    else:
-        with open(LOG_FILE, "r+") as f:
-            try:
-                logs = json.load(f)
-            except json.JSONDecodeError:
-                logs = []
-            logs.append(entry)
-            f.seek(0)
-            json.dump(logs, f, indent=2)
-            f.truncate()
+    monitor_store.append_entry(entry)
 
 
 # ========= DISCORD (OPTIONNEL) =========
@@ -116,107 +116,12 @@ def _extract_host(domain_url: str) -> str:
     return re.sub(r"^https?://", "", domain_url).split("/", 1)[0]
 
 
-# ---------- Helpers cURL (retries/timeouts unifiés) ----------
-def curl_http_code(args) -> (int, str):
-    cmd = [
-        "curl",
-        "-sS",
-        "--retry",
-        str(RETRIES),
-        "--retry-all-errors",
-        "--connect-timeout",
-        str(CONNECT_TIMEOUT),
-        "-m",
-        str(MAX_TIME),
-        "-o",
-        "/dev/null",
-        "-w",
-        "%{http_code}",
-    ] + args
-    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    code = (p.stdout or "").strip()
-    return p.returncode, code if code else f"retcode_{p.returncode}"
-
-
-def curl_http_head(url: str) -> (int, str):
-    cmd = [
-        "curl",
-        "-sS",
-        "-I",
-        "--retry",
-        str(RETRIES),
-        "--retry-all-errors",
-        "--connect-timeout",
-        str(CONNECT_TIMEOUT),
-        "-m",
-        str(MAX_TIME),
-        "-o",
-        "/dev/null",
-        "-w",
-        "%{http_code}",
-        url,
-    ]
-    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    code = (p.stdout or "").strip()
-    return p.returncode, code if code else f"retcode_{p.returncode}"
-
-
-# ---------- Test TCP bas niveau ----------
-def tcp_port_open(host: str, port: int, timeout=2.5) -> bool:
-    try:
-        with socket.create_connection((host, port), timeout=timeout):
-            return True
-    except Exception:
-        return False
-
-
-# ---------- IP publique avec cache ----------
-IP_CACHE_FILE = "/mnt/data/public_ip_cache.json"
-IP_CACHE_TTL_SEC = int(os.getenv("PUBLIC_IP_CACHE_TTL_SEC", "600"))  # 10 min
-
-
-def _write_ip_cache(ip: str):
-    try:
-        with open(IP_CACHE_FILE, "w") as f:
-            json.dump({"ip": ip, "ts": int(time.time())}, f)
-    except Exception:
-        pass
-
-
-def _read_ip_cache():
-    try:
-        with open(IP_CACHE_FILE, "r") as f:
-            d = json.load(f)
-        if int(time.time()) - int(d.get("ts", 0)) <= IP_CACHE_TTL_SEC and d.get("ip"):
-            return d["ip"]
-    except Exception:
-        pass
-    return ""
+# ---------- IP publique (cache TTL partagé, single-flight, voir public_ip.py) ----------
+IP_CACHE_TTL_SEC = public_ip.CACHE_TTL_SEC
 
 
 def get_public_ip(timeout=5) -> str:
-    ip = _read_ip_cache()
-    if ip:
-        return ip
-    for url in [
-        "https://api.ipify.org",
-        "https://ifconfig.me",
-        "https://icanhazip.com",
-    ]:
-        try:
-            rc = subprocess.run(
-                ["curl", "-sS", "-4", "--max-time", str(timeout), url],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-            )
-            cand = (rc.stdout or "").strip()
-            socket.inet_aton(cand)
-            _write_ip_cache(cand)
-            return cand
-        except Exception:
-            continue
-    return ""
+    return public_ip.get_public_ip(timeout=timeout)
 
 
 # ========= TESTS PLEX =========
@@ -237,9 +142,11 @@ def _url_host_port_from_plex_url(plex_url: str):
     return hostport, 32400
 
 
-def test_local_plex_identity(plex_url: str):
+def test_local_plex_identity(plex_url: str, deadline=None):
     """
-    Local : TCP (host:port) -> HEAD /identity -> (fallback) GET /identity
+    Local : HEAD /identity -> (fallback) GET /identity, sur une connexion keep-alive réutilisée
+    (échec DNS/TCP -> tcp_closed_host:port, comme l'ancien test de port)
+    deadline: échéance time.monotonic() transmise à http_probe (plus de retry au-delà)
     """
     if not plex_url:
         return False, "no_plex_url"
@@ -247,34 +154,33 @@ def test_local_plex_identity(plex_url: str):
     if not host:
         return False, "no_host_in_url"
 
-    if not tcp_port_open(host, port, timeout=min(2.5, CONNECT_TIMEOUT)):
-        return False, f"tcp_closed_{host}:{port}"
-
     identity_url = plex_url.rstrip("/") + "/identity"
-    rc_h, code_h = curl_http_head(identity_url)
-    if rc_h == 0 and code_h in ALLOWED_OK:
-        return True, f"HEAD_{code_h}"
-
-    rc, code = curl_http_code([identity_url])
-    ok = rc == 0 and code in ALLOWED_OK
-    return ok, code
+    res = http_probe.get_client().head_then_get(
+        identity_url, ok_codes=ALLOWED_OK, connect_timeout=min(2.5, CONNECT_TIMEOUT), deadline=deadline
+    )
+    if res["phase"] in ("dns", "connect"):
+        return False, f"tcp_closed_{host}:{port}"
+    if res["method"] == "HEAD" and res["code"] in ALLOWED_OK:
+        return True, f"HEAD_{res['code']}"
+    return res["code"] in ALLOWED_OK, res["code"]
 
 
 def resolve_a_records(host: str):
+    # résolveurs publics en parallèle (dns_client.py), repli sur le résolveur système
     try:
-        return list(
-            {ai[4][0] for ai in socket.getaddrinfo(host, None, family=socket.AF_INET)}
-        )
+        answers, _ = dns_client.resolve_a_multi(host)
+        return sorted(answers)
     except Exception:
         return []
 
 
-def test_external_plex(domain_env: str):
+def test_external_plex(domain_env: str, deadline=None):
     """
     Définition "accessible en ligne":
     - Le DNS du domaine DOIT contenir l'IP publique courante
     - ET un HEAD via DNS sur https://<domaine>/identity doit retourner un code OK (200/301/302/401/403)
     Sinon -> "no" avec un détail expliquant la cause.
+    deadline: échéance time.monotonic() de la sonde (IP publique et HEAD bornés au temps restant)
     """
     if not domain_env:
         return ("error", "no_domain_configured")
@@ -283,7 +189,8 @@ def test_external_plex(domain_env: str):
     host = _extract_host(domain_url)
     identity_url = f"https://{host}/identity"
 
-    pub_ip = get_public_ip(timeout=min(5, MAX_TIME))
+    left = MAX_TIME if deadline is None else deadline - time.monotonic()
+    pub_ip = get_public_ip(timeout=max(0.5, min(5, MAX_TIME, left)))
     if not pub_ip:
         return ("no", "no_public_ip")
 
@@ -295,8 +202,8 @@ def test_external_plex(domain_env: str):
         return ("no", f"dns_mismatch (resolved={a_records}; public_ip={pub_ip})")
 
     try:
-        rc, code = curl_http_head(identity_url)
-        if rc == 0 and code in ALLOWED_OK:
+        code = http_probe.get_client().request("HEAD", identity_url, deadline=deadline)["code"]
+        if code in ALLOWED_OK:
             return ("yes", f"HEAD_{code}")
         else:
             return ("no", f"dns_ok_but_http_fail ({code})")
@@ -306,24 +213,17 @@ def test_external_plex(domain_env: str):
 
 # ========= OUTILS DOCKER/IP =========
 def get_deluge_ip():
+    docker = docker_api.get_client()
     try:
-        result = subprocess.run(
-            ["docker", "exec", "deluge", "ip", "addr", "show", "tun0"],
-            capture_output=True,
-            text=True,
-        )
-        match = re.search(r"inet (\d+\.\d+\.\d+\.\d+)", result.stdout)
+        _, out, _ = docker.exec("deluge", ["ip", "addr", "show", "tun0"])
+        match = re.search(r"inet (\d+\.\d+\.\d+\.\d+)", out)
         if match:
             return match.group(1)
     except Exception:
         pass
     try:
-        result = subprocess.run(
-            ["docker", "exec", "deluge", "hostname", "-i"],
-            capture_output=True,
-            text=True,
-        )
-        ip = result.stdout.strip().split()[0]
+        _, out, _ = docker.exec("deluge", ["hostname", "-i"])
+        ip = out.split()[0]
         return ip
     except Exception as e:
         raise RuntimeError(f"Could not detect IP inside deluge container: {e}")
@@ -331,12 +231,8 @@ def get_deluge_ip():
 
 def get_vpn_ip():
     try:
-        result = subprocess.run(
-            ["docker", "exec", "vpn", "ip", "addr", "show", "tun0"],
-            capture_output=True,
-            text=True,
-        )
-        match = re.search(r"inet (\d+\.\d+\.\d+\.\d+)", result.stdout)
+        _, out, _ = docker_api.get_client().exec("vpn", ["ip", "addr", "show", "tun0"])
+        match = re.search(r"inet (\d+\.\d+\.\d+\.\d+)", out)
         if match:
             return match.group(1)
     except Exception:
@@ -344,7 +240,12 @@ def get_vpn_ip():
     raise RuntimeError("Could not detect VPN IP on tun0 inside container")
 
 
+_telemetry = None
+_session = None     # session du dernier get_deluge_stats(), pour performance.deluge_rpc
+
+
 def get_deluge_stats():
+    global _telemetry, _session
     stats = {
         "num_downloading": 0,
         "num_seeding": 0,
@@ -352,99 +253,39 @@ def get_deluge_stats():
         "upload_rate": 0.0,
         "num_peers": 0,
     }
+    # Session RPC partagée (connexion conservée entre cycles, voir deluge_rpc.py)
+    session = _session = deluge_rpc.get_session(
+        deluge_config["host"],
+        deluge_config["port"],
+        deluge_config["username"],
+        deluge_config["password"],
+    )
     try:
-        client = DelugeRPCClient(
-            deluge_config["host"],
-            deluge_config["port"],
-            deluge_config["username"],
-            deluge_config["password"],
-            False,
-        )
-        try:
-            client.connect()
-        except Exception as conn_err:
-            print(f"[ERROR - Deluge] RPC connection FAILED: {conn_err}")
-            return None
-        torrents = client.call("core.get_torrents_status", {}, ["state"])
-        for t in torrents.values():
-            state = t[b"state"]
-            if state == b"Downloading":
-                stats["num_downloading"] += 1
-            elif state == b"Seeding":
-                stats["num_seeding"] += 1
-        session_stats = client.call(
+        # Table par torrent alimentée en delta (diff=True), voir deluge_telemetry.py
+        if _telemetry is None or _telemetry.session is not session:
+            _telemetry = deluge_telemetry.TorrentTelemetry(session)
+        telemetry = _telemetry.poll()
+        stats["num_downloading"] = telemetry["states"].get("Downloading", 0)
+        stats["num_seeding"] = telemetry["states"].get("Seeding", 0)
+        stats["telemetry"] = telemetry
+        session_stats = session.call(
             "core.get_session_status", ["download_rate", "upload_rate", "num_peers"]
         )
         stats["download_rate"] = round(session_stats[b"download_rate"] / 1024, 2)
         stats["upload_rate"] = round(session_stats[b"upload_rate"] / 1024, 2)
         stats["num_peers"] = session_stats[b"num_peers"]
+        # idle / healthy / stalled / broken-network (un débit nul sans file d'attente n'est pas une panne)
+        stats["activity"] = deluge_telemetry.classify(telemetry, stats["download_rate"], stats["num_peers"])
         return stats
+    except deluge_rpc.DelugeUnavailable as conn_err:
+        print(f"[ERROR - Deluge] RPC connection FAILED: {conn_err}")
+        return None
     except Exception as e:
         print(f"[DEBUG - Deluge] RPC error: {e}")
         return None
 
 
-# ========= COLLECTE =========
-plex_msg_lines = []
-
-# 1) Docker
-critical_services = ["plex-server", "vpn", "deluge"]
-for service in critical_services:
-    status = subprocess.run(
-        ["docker", "inspect", "-f", "{{.State.Running}}", service],
-        capture_output=True,
-        text=True,
-    )
-    state = status.stdout.strip()
-    plex_msg_lines.append(
-        f"[SERVICE] {service} is {'running' if state == 'true' else 'NOT running'}"
-    )
-
-# 2) VPN/Deluge IPs
-try:
-    vpn_ip_pub = (
-        subprocess.check_output(
-            ["docker", "exec", "vpn", "curl", "-s", "https://api.ipify.org"]
-        )
-        .decode()
-        .strip()
-    )
-    deluge_ip_pub = (
-        subprocess.check_output(
-            ["docker", "exec", "deluge", "curl", "-s", "https://api.ipify.org"]
-        )
-        .decode()
-        .strip()
-    )
-    vpn_ip_int = (
-        subprocess.check_output(["docker", "exec", "vpn", "hostname", "-i"])
-        .decode()
-        .strip()
-        .split()[0]
-    )
-    deluge_ip_int = (
-        subprocess.check_output(["docker", "exec", "deluge", "hostname", "-i"])
-        .decode()
-        .strip()
-        .split()[0]
-    )
-except Exception as e:
-    plex_msg_lines.append(f"[NETWORK] Failed to retrieve VPN/Deluge IPs: {e}")
-
-# 3) Internet access Deluge
-try:
-    internet_check = subprocess.run(
-        ["docker", "exec", "deluge", "ping", "-c", "1", "8.8.8.8"],
-        stdout=subprocess.DEVNULL,
-    )
-except Exception:
-    internet_check = None
-
-# 4) Speedtest (rempli en fin si conditions OK)
-download_speed = 0.0
-upload_speed = 0.0
-
-
+# ========= SPEEDTEST (cooldown) =========
 def _can_run_speedtest_now() -> bool:
     try:
         with open(SPEEDTEST_STATE_FILE, "r") as f:
@@ -465,194 +306,283 @@ def _mark_speedtest_ran():
         pass
 
 
-# 5) Plex tests
+# ========= SONDES (exécutées en parallèle, voir probe_engine.py) =========
 PLEX_URL = os.getenv("PLEX_SERVER")
 PLEX_TOKEN = os.getenv("PLEX_TOKEN")
 EXTERNAL_PLEX_URL = os.getenv("DOMAIN")
+TRANSCODE_PATH = "/app/Transcode"
+critical_services = ["plex-server", "vpn", "deluge"]
+custom_mounts = ["/", "/mnt/media", "/mnt/media/extra"]
 
-session_count = 0
-users_connected = set()
-transcode_count = 0
-plex_connected = False
+# HEAD puis GET, chacun avec ses retries (http_probe), borné à la moitié de l'intervalle de
+# monitor_loop: une sonde en retard ne chevauche pas le cycle suivant (threads empilés en daemon).
+# La sonde reçoit la même échéance (moins 1 s) et arrête elle-même ses retries.
+HTTP_PROBE_TIMEOUT = min(2 * (RETRIES + 1) * MAX_TIME + CONNECT_TIMEOUT,
+                         max(CONNECT_TIMEOUT + 2, LOOP_INTERVAL_SECONDS / 2))
 
-try:
+
+# Docker Engine API (socket Unix, connexions keep-alive), voir docker_api.py
+def _docker_exec_output(container, cmd) -> str:
+    rc, out, err = docker_api.get_client().exec(container, cmd, timeout=MAX_TIME)
+    if rc != 0:
+        raise RuntimeError(f"docker exec {container} {cmd[0]} failed (rc={rc}): {err[:200]}")
+    return out
+
+
+def probe_docker_running(service) -> bool:
+    # En mode daemon, la table tenue par le flux /events suffit (aucun appel Docker)
+    watcher = docker_events.active_watcher()
+    if watcher is not None and watcher.covers(service):
+        return watcher.is_running(service)
+    # /containers/json n'est appelé qu'une fois par cycle (cache partagé entre sondes)
+    return docker_api.get_client().is_running(service)
+
+
+def probe_container_public_ip(container) -> str:
+    # vpn et deluge partagent le même netns: une seule requête (hedged) pour les deux
+    return public_ip.get_container_public_ip(container, timeout=MAX_TIME)
+
+
+def probe_container_internal_ip(container) -> str:
+    return _docker_exec_output(container, ["hostname", "-i"]).split()[0]
+
+
+def probe_deluge_internet() -> bool:
+    rc, _, _ = docker_api.get_client().exec("deluge", ["ping", "-c", "1", "8.8.8.8"], timeout=MAX_TIME)
+    return rc == 0
+
+
+def probe_plex_sessions():
     plex = PlexServer(PLEX_URL, PLEX_TOKEN)
-    plex_connected = True
     sessions = plex.sessions()
-    session_count = len(sessions)
+    users_connected = set()
+    transcode_count = 0
     for session in sessions:
-        user = session.user.title
-        users_connected.add(user)
+        users_connected.add(session.user.title)
         if (
             hasattr(session, "transcodeSession")
             and session.transcodeSession is not None
         ):
             transcode_count += 1
-except Exception as e:
-    print(f"[DEBUG - run_quick_check.py - PLEX - ERROR] Plex session fetch failed: {e}")
-
-local_ok, local_code = test_local_plex_identity(PLEX_URL)
-external_accessible, external_detail = test_external_plex(EXTERNAL_PLEX_URL)
-
-# 6) Docker stats Plex
-try:
-    docker_stats_output = (
-        subprocess.check_output(
-            [
-                "docker",
-                "stats",
-                "--no-stream",
-                "--format",
-                "{{.CPUPerc}} {{.MemPerc}}",
-                "plex-server",
-            ]
-        )
-        .decode()
-        .strip()
-    )
-    cpu_str, mem_str = docker_stats_output.split()
-    cpu = float(cpu_str.strip("%"))
-    mem = float(mem_str.strip("%"))
-except Exception:
-    cpu = mem = 0.0
+    return {
+        "session_count": len(sessions),
+        "unique_clients": len(users_connected),
+        "transcode_count": transcode_count,
+    }
 
-# 7) Transcode folder
-TRANSCODE_PATH = "/app/Transcode"
-try:
-    if os.path.exists(TRANSCODE_PATH):
-        usage = shutil.disk_usage(TRANSCODE_PATH)
-        free_gb = usage.free / (1024**3)
-    else:
-        free_gb = None
-except Exception:
-    free_gb = None
-
-# 8) Stats système
-cpu_total = psutil.cpu_percent(interval=1)
-ram_total = psutil.virtual_memory().percent
-net_io = psutil.net_io_counters()
-disk_io = psutil.disk_io_counters()
-try:
-    temps = psutil.sensors_temperatures()
-    cpu_temp = (
-        temps["coretemp"][0].current
-        if "coretemp" in temps and temps["coretemp"]
-        else "N/A"
-    )
-except Exception:
-    cpu_temp = "N/A"
 
-# 9) Storage
-custom_mounts = ["/", "/mnt/media", "/mnt/media/extra"]
-disk_status = {}
-for mount in custom_mounts:
-    try:
-        usage = shutil.disk_usage(mount)
-        disk_status[mount] = {
-            "total_gb": round(usage.total / (1024**3)),
-            "used_pct": round((usage.used / usage.total) * 100),
-        }
-    except Exception:
-        pass
+def probe_container_resources() -> dict:
+    """CPU/RAM/IO par conteneur lancé, lus dans cgroup v2 (voir cgroup_sampler.py)."""
+    docker = docker_api.get_client()
+    running = {name: c["Id"] for name, c in docker.containers().items() if c.get("State") == "running"}
+    resources = cgroup_sampler.get_sampler().sample(running)
+    # cgroup v2 non monté (ou cgroup v1): repli sur l'API stats pour Plex uniquement
+    if "plex-server" in running and "plex-server" not in resources:
+        st = docker.stats("plex-server")
+        resources["plex-server"] = {"cpu_percent": st["cpu_percent"], "mem_percent": st["mem_percent"],
+                                    "source": "docker_api"}
+    return resources
 
-# 10) Deluge stats
-deluge_stats = get_deluge_stats()
 
-# 11) Speedtest en FIN de script (limité et avec cooldown)
-should_try_speedtest = (
-    SPEEDTEST_ENABLED
-    and _can_run_speedtest_now()
-    and (local_ok or plex_connected)  # éviter de stresser si Plex KO localement
-)
-if should_try_speedtest:
-    try:
-        import speedtest
+def probe_cpu_total() -> float:
+    return psutil.cpu_percent(interval=1)
+
+
+def build_probes():
+    # échéance des sondes HTTP, 1 s avant le délai de probe_engine: elles rendent leur propre résultat
+    http_deadline = time.monotonic() + HTTP_PROBE_TIMEOUT - 1
+    probes = [
+        Probe(f"docker_{service}", partial(probe_docker_running, service), MAX_TIME, False)
+        for service in critical_services
+    ]
+    probes += [
+        Probe("vpn_ip_pub", partial(probe_container_public_ip, "vpn"), MAX_TIME),
+        Probe("deluge_ip_pub", partial(probe_container_public_ip, "deluge"), MAX_TIME),
+        Probe("vpn_ip_int", partial(probe_container_internal_ip, "vpn"), MAX_TIME),
+        Probe("deluge_ip_int", partial(probe_container_internal_ip, "deluge"), MAX_TIME),
+        Probe("internet_access", probe_deluge_internet, MAX_TIME, False),
+        Probe("plex_sessions", probe_plex_sessions, HTTP_PROBE_TIMEOUT),
+        Probe("plex_local", partial(test_local_plex_identity, PLEX_URL, deadline=http_deadline),
+              HTTP_PROBE_TIMEOUT, (False, "probe_timeout")),
+        Probe("plex_external", partial(test_external_plex, EXTERNAL_PLEX_URL, deadline=http_deadline),
+              HTTP_PROBE_TIMEOUT, ("error", "probe_timeout")),
+        Probe("containers", probe_container_resources, MAX_TIME, {}),
+        Probe("cpu_total", probe_cpu_total, MAX_TIME, 0.0),
+        Probe("deluge", get_deluge_stats, MAX_TIME),
+        Probe("jackett", jackett_stats.window_summary, MAX_TIME, {}),
+    ]
+    return probes
+
 
-        st = speedtest.Speedtest()
-        download_speed = st.download() / 1e6
-        # Upload moins fréquent pour réduire l'impact
-        if int(time.time()) % 3 == 0:
-            upload_speed = st.upload() / 1e6
+# ========= COLLECTE =========
+def collect():
+    cycle_start = time.time()
+    docker_api.get_client().new_cycle()
+    results, probe_timings = run_probes(build_probes())
+    for name, t in probe_timings.items():
+        if t["status"] != "ok":
+            logging.warning(f"[PROBE] {name}: {t['status']} {t.get('error', '')}")
+
+    # Transcode folder
+    try:
+        if os.path.exists(TRANSCODE_PATH):
+            usage = shutil.disk_usage(TRANSCODE_PATH)
+            free_gb = usage.free / (1024**3)
         else:
-            upload_speed = 0.0
-        _mark_speedtest_ran()
+            free_gb = None
+    except Exception:
+        free_gb = None
+
+    # Stats système (instantanées; cpu_percent(interval=1) tourne dans une sonde)
+    ram_total = psutil.virtual_memory().percent
+    net_io = psutil.net_io_counters()
+    disk_io = psutil.disk_io_counters()
+    try:
+        temps = psutil.sensors_temperatures()
+        cpu_temp = (
+            temps["coretemp"][0].current
+            if "coretemp" in temps and temps["coretemp"]
+            else "N/A"
+        )
     except Exception:
-        download_speed = upload_speed = 0.0
-
-# 12) JSON final
-data_entry = {
-    "docker_services": {
-        service: subprocess.run(
-            ["docker", "inspect", "-f", "{{.State.Running}}", service],
-            capture_output=True,
-            text=True,
-        ).stdout.strip()
-        == "true"
-        for service in ["plex-server", "vpn", "deluge"]
-    },
-    "network": {
-        "vpn_ip": [
-            ip for ip in [locals().get("vpn_ip_pub"), locals().get("vpn_ip_int")] if ip
-        ],
-        "deluge_ip": [
-            ip
-            for ip in [locals().get("deluge_ip_pub"), locals().get("deluge_ip_int")]
-            if ip
-        ],
-        "internet_access": (
-            (internet_check.returncode == 0) if internet_check else False
-        ),
-        "speedtest": {
-            "download_mbps": round(download_speed, 2),
-            "upload_mbps": round(upload_speed, 2),
+        cpu_temp = "N/A"
+
+    # Storage
+    disk_status = {}
+    for mount in custom_mounts:
+        try:
+            usage = shutil.disk_usage(mount)
+            disk_status[mount] = {
+                "total_gb": round(usage.total / (1024**3)),
+                "used_pct": round((usage.used / usage.total) * 100),
+            }
+        except Exception:
+            pass
+
+    plex_sessions = results["plex_sessions"]
+    plex_connected = plex_sessions is not None
+    plex_sessions = plex_sessions or {}
+    local_ok, local_code = results["plex_local"]
+    external_accessible, external_detail = results["plex_external"]
+    containers = results["containers"] or {}
+    plex_res = containers.get("plex-server") or {}
+    cpu = plex_res.get("cpu_percent") or 0.0
+    mem = plex_res.get("mem_percent") or 0.0
+    deluge_stats = results["deluge"]
+
+    # Speedtest en FIN de cycle (limité et avec cooldown)
+    download_speed = 0.0
+    upload_speed = 0.0
+    should_try_speedtest = (
+        SPEEDTEST_ENABLED
+        and _can_run_speedtest_now()
+        and (local_ok or plex_connected)  # éviter de stresser si Plex KO localement
+    )
+    if should_try_speedtest:
+        t0 = time.perf_counter()
+        try:
+            import speedtest
+
+            st = speedtest.Speedtest()
+            download_speed = st.download() / 1e6
+            # Upload moins fréquent pour réduire l'impact
+            if int(time.time()) % 3 == 0:
+                upload_speed = st.upload() / 1e6
+            else:
+                upload_speed = 0.0
+            _mark_speedtest_ran()
+            probe_timings["speedtest"] = {"seconds": round(time.perf_counter() - t0, 3), "status": "ok"}
+        except Exception as e:
+            download_speed = upload_speed = 0.0
+            probe_timings["speedtest"] = {"seconds": round(time.perf_counter() - t0, 3),
+                                          "status": "error", "error": str(e)[:200]}
+
+    # JSON final
+    return {
+        "docker_services": {
+            service: bool(results[f"docker_{service}"]) for service in critical_services
         },
-    },
-    "plex": {
-        "connected": plex_connected,
-        "active_sessions": session_count,
-        "unique_clients": len(users_connected),
-        "transcoding_sessions": transcode_count,
-        "cpu_usage": round(cpu, 2),
-        "ram_usage": round(mem, 2),
-        "transcode_folder_found": (free_gb is not None),
-        "local_access": bool(local_ok),
-        "local_detail": str(local_code),
-        "external_access": str(external_accessible),  # "yes" / "no" / "error"
-        "external_detail": str(external_detail),
-    },
-    "system": {
-        "cpu_total": round(cpu_total, 2),
-        "ram_total": round(ram_total, 2),
-        "cpu_temp_c": round(cpu_temp, 2) if isinstance(cpu_temp, (int, float)) else 0.0,
-        "internet_io": {
-            "sent_mb": round(net_io.bytes_sent / (1024**2), 2),
-            "received_mb": round(net_io.bytes_recv / (1024**2), 2),
+        "network": {
+            "vpn_ip": [ip for ip in [results["vpn_ip_pub"], results["vpn_ip_int"]] if ip],
+            "deluge_ip": [
+                ip for ip in [results["deluge_ip_pub"], results["deluge_ip_int"]] if ip
+            ],
+            "internet_access": bool(results["internet_access"]),
+            "speedtest": {
+                "download_mbps": round(download_speed, 2),
+                "upload_mbps": round(upload_speed, 2),
+            },
         },
-        "disk_io": {
-            "read_mb": round(disk_io.read_bytes / (1024**2), 2),
-            "write_mb": round(disk_io.write_bytes / (1024**2), 2),
+        "plex": {
+            "connected": plex_connected,
+            "active_sessions": plex_sessions.get("session_count", 0),
+            "unique_clients": plex_sessions.get("unique_clients", 0),
+            "transcoding_sessions": plex_sessions.get("transcode_count", 0),
+            "cpu_usage": round(cpu, 2),
+            "ram_usage": round(mem, 2),
+            "transcode_folder_found": (free_gb is not None),
+            "local_access": bool(local_ok),
+            "local_detail": str(local_code),
+            "external_access": str(external_accessible),  # "yes" / "no" / "error"
+            "external_detail": str(external_detail),
         },
-    },
-    "deluge": {
-        "num_downloading": deluge_stats["num_downloading"] if deluge_stats else 0,
-        "num_seeding": deluge_stats["num_seeding"] if deluge_stats else 0,
-        "download_rate_kbps": deluge_stats["download_rate"] if deluge_stats else 0.0,
-        "upload_rate_kbps": deluge_stats["upload_rate"] if deluge_stats else 0.0,
-        "num_peers": deluge_stats["num_peers"] if deluge_stats else 0,
-    },
-    "storage": disk_status,
-    "performance": {"runtime_seconds": round(time.time() - start_time, 2)},
-    "meta": {
-        "retries": RETRIES,
-        "connect_timeout": CONNECT_TIMEOUT,
-        "max_time": MAX_TIME,
-        "speedtest_enabled": SPEEDTEST_ENABLED,
-        "speedtest_cooldown_sec": SPEEDTEST_COOLDOWN_SEC,
-        "public_ip_cache_ttl_sec": IP_CACHE_TTL_SEC,
-    },
-}
+        "system": {
+            "cpu_total": round(results["cpu_total"], 2),
+            "ram_total": round(ram_total, 2),
+            "cpu_temp_c": round(cpu_temp, 2) if isinstance(cpu_temp, (int, float)) else 0.0,
+            "internet_io": {
+                "sent_mb": round(net_io.bytes_sent / (1024**2), 2),
+                "received_mb": round(net_io.bytes_recv / (1024**2), 2),
+            },
+            "disk_io": {
+                "read_mb": round(disk_io.read_bytes / (1024**2), 2),
+                "write_mb": round(disk_io.write_bytes / (1024**2), 2),
+            },
+        },
+        "deluge": {
+            "num_downloading": deluge_stats["num_downloading"] if deluge_stats else 0,
+            "num_seeding": deluge_stats["num_seeding"] if deluge_stats else 0,
+            "download_rate_kbps": deluge_stats["download_rate"] if deluge_stats else 0.0,
+            "upload_rate_kbps": deluge_stats["upload_rate"] if deluge_stats else 0.0,
+            "num_peers": deluge_stats["num_peers"] if deluge_stats else 0,
+            "telemetry": deluge_stats.get("telemetry", {}) if deluge_stats else {},
+            "activity": deluge_stats.get("activity", {}) if deluge_stats else {"state": "unknown", "reason": "rpc unavailable"},
+        },
+        "containers": containers,
+        "storage": disk_status,
+        "logs": log_ingest.ingester_snapshot(),
+        "jackett": results["jackett"],
+        "performance": {
+            "runtime_seconds": round(time.time() - cycle_start, 2),
+            "probes": probe_timings,
+            "deluge_rpc": _session.stats() if _session is not None else {},
+            "docker_api": docker_api.get_client().api_stats(),
+            "docker_events": docker_events.watcher_stats(),
+            "public_ip": public_ip.get_resolver().stats(),
+            "dns": dns_client.get_client().stats(),
+            "http": http_probe.get_client().stats(),
+            "log_ingest": log_ingest.ingester_stats(),
+            "discord": discord_dispatch.dispatcher_stats(),
+            "notify": notify_digest.stats(),
+        },
+        "meta": {
+            "retries": RETRIES,
+            "connect_timeout": CONNECT_TIMEOUT,
+            "max_time": MAX_TIME,
+            "speedtest_enabled": SPEEDTEST_ENABLED,
+            "speedtest_cooldown_sec": SPEEDTEST_COOLDOWN_SEC,
+            "public_ip_cache_ttl_sec": IP_CACHE_TTL_SEC,
+        },
+    }
+
+
+def main():
+    data_entry = collect()
+    try:
+        append_json_log(data_entry)
+    except Exception as e:
+        logging.error(f"[JSON LOGGING] Failed to append JSON log: {e}")
+
 
-try:
-    append_json_log(data_entry)
-except Exception as e:
-    logging.error(f"[JSON LOGGING] Failed to append JSON log: {e}")
+if __name__ == "__main__":
+    main()
@@ -21,7 +21,6 @@ import discord
 from discord.ext import commands
 import os
 from dotenv import load_dotenv
-import json
 import sys
 import os
 
@@ -33,6 +32,23 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from addmedia.add_request_handler import handle_add_request
 from adduser.plex_invite import invite_user
+import importlib.util
+
+# Store des échantillons (core/monitor_store.py, monté dans /app/core)
+monitor_store = None
+for store_path in [
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "core", "monitor_store.py")),
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "monitor_store.py")),
+]:
+    if os.path.isfile(store_path):
+        try:
+            spec = importlib.util.spec_from_file_location("monitor_store", store_path)
+            monitor_store = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(monitor_store)
+            break
+        except Exception as e:
+            monitor_store = None
+            print(f"[DEBUG] Failed to import monitor_store: {e}")
 
 # Mode: "normal" or "debug"
 mode = "debug"
@@ -94,82 +110,84 @@ async def get_last_data(ctx):
             )
         return
 
-    log_file = "/mnt/data/system_monitor_log.json"
+    log_dir = os.getenv("MONITOR_STORE_DIR", "/mnt/data/system_monitor_log.d")
 
     try:
-        with open(log_file, "r") as f:
-            logs = json.load(f)
-            last_entry = logs[-1]
-            timestamp = last_entry.get("timestamp", "N/A")
-
-            # System
-            cpu = last_entry["system"]["cpu_total"]
-            ram = last_entry["system"]["ram_total"]
-            temp = last_entry["system"].get("cpu_temp_c", "N/A")
-
-            # Network
-            dl = last_entry["network"]["speedtest"]["download_mbps"]
-            ul = last_entry["network"]["speedtest"]["upload_mbps"]
-
-            # Plex
-            plex = last_entry["plex"]
-            plex_sessions = plex["active_sessions"]
-            plex_transcoding = plex["transcoding_sessions"]
-            plex_cpu = plex["cpu_usage"]
-            plex_local_acess = plex["local_access"]
-            plex_external_acess = plex["external_access"]
-
-            # Deluge
-            deluge = last_entry["deluge"]
-            deluge_dl = deluge["download_rate_kbps"]
-            deluge_ul = deluge["upload_rate_kbps"]
-            deluge_downloading = deluge["num_downloading"]
-            deluge_seeding = deluge["num_seeding"]
-
-            # Storage
-            storage = last_entry["storage"]
-            storage_lines = ""
-            for mount, stats in storage.items():
-                size = stats["total_gb"]
-                used_pct = (
-                    stats["used_pct"]
-                    if "used_pct" in stats
-                    else round((stats["used_gb"] / stats["total_gb"]) * 100, 1)
-                )
-                label = (
-                    f"{mount} → {size:.2f} Go"
-                    if size < 1024
-                    else f"{mount} → {size/1024:.2f} To"
-                )
-                storage_lines += f"\n • {label}, utilisé à {used_pct}%"
-
-            # Docker services
-            docker = last_entry["docker_services"]
-            docker_status = " | ".join(
-                [f"{'✅' if state else '❌'} {name}" for name, state in docker.items()]
+        if monitor_store is None:
+            raise RuntimeError("monitor_store.py introuvable")
+        last_entry = monitor_store.read_latest(log_dir)
+        if last_entry is None:
+            raise RuntimeError(f"aucune entrée dans {log_dir}")
+        timestamp = last_entry.get("timestamp", "N/A")
+
+        # System
+        cpu = last_entry["system"]["cpu_total"]
+        ram = last_entry["system"]["ram_total"]
+        temp = last_entry["system"].get("cpu_temp_c", "N/A")
+
+        # Network
+        dl = last_entry["network"]["speedtest"]["download_mbps"]
+        ul = last_entry["network"]["speedtest"]["upload_mbps"]
+
+        # Plex
+        plex = last_entry["plex"]
+        plex_sessions = plex["active_sessions"]
+        plex_transcoding = plex["transcoding_sessions"]
+        plex_cpu = plex["cpu_usage"]
+        plex_local_acess = plex["local_access"]
+        plex_external_acess = plex["external_access"]
+
+        # Deluge
+        deluge = last_entry["deluge"]
+        deluge_dl = deluge["download_rate_kbps"]
+        deluge_ul = deluge["upload_rate_kbps"]
+        deluge_downloading = deluge["num_downloading"]
+        deluge_seeding = deluge["num_seeding"]
+
+        # Storage
+        storage = last_entry["storage"]
+        storage_lines = ""
+        for mount, stats in storage.items():
+            size = stats["total_gb"]
+            used_pct = (
+                stats["used_pct"]
+                if "used_pct" in stats
+                else round((stats["used_gb"] / stats["total_gb"]) * 100, 1)
             )
-
-            # IP match
-            vpn_ips = last_entry["network"].get("vpn_ip", [])
-            deluge_ips = last_entry["network"].get("deluge_ip", [])
-            ip_match = any(ip in vpn_ips for ip in deluge_ips)
-            common_ip = next((ip for ip in deluge_ips if ip in vpn_ips), "N/A")
-
-            summary = (
-                f"**Dernière entrée du système** (`{timestamp}`)\n"
-                f"🖥️ CPU: {cpu}% | 🧠 RAM: {ram}% | 🌡️ Température CPU: {temp}°C\n"
-                f"🌐 DL: {dl} Mbps | UL: {ul} Mbps\n"
-                f"🎞️ Plex sessions: {plex_sessions}\n"
-                f"🎞️ Plex transcoding: {plex_transcoding} | Plex CPU: {plex_cpu}%\n"
-                f"🖳 Plex is locally accessible: {plex_local_acess} | 📡 Plex is exernally accessible: {plex_external_acess}\n"
-                f"🐌 Deluge - Downloading: {deluge_downloading} | Seeding: {deluge_seeding}\n"
-                f"\t⬇️ DL: {deluge_dl:.2f} KB/s | ⬆️ UL: {deluge_ul:.2f} KB/s\n"
-                f"💾 Stockage :{storage_lines}\n"
-                f"🐳 Docker: {docker_status}\n"
-                f"🔁 Deluge IP = VPN IP ? {'✅' if ip_match else '❌'} ({common_ip})"
+            label = (
+                f"{mount} → {size:.2f} Go"
+                if size < 1024
+                else f"{mount} → {size/1024:.2f} To"
             )
+            storage_lines += f"\n • {label}, utilisé à {used_pct}%"
+
+        # Docker services
+        docker = last_entry["docker_services"]
+        docker_status = " | ".join(
+            [f"{'✅' if state else '❌'} {name}" for name, state in docker.items()]
+        )
+
+        # IP match
+        vpn_ips = last_entry["network"].get("vpn_ip", [])
+        deluge_ips = last_entry["network"].get("deluge_ip", [])
+        ip_match = any(ip in vpn_ips for ip in deluge_ips)
+        common_ip = next((ip for ip in deluge_ips if ip in vpn_ips), "N/A")
+
+        summary = (
+            f"**Dernière entrée du système** (`{timestamp}`)\n"
+            f"🖥️ CPU: {cpu}% | 🧠 RAM: {ram}% | 🌡️ Température CPU: {temp}°C\n"
+            f"🌐 DL: {dl} Mbps | UL: {ul} Mbps\n"
+            f"🎞️ Plex sessions: {plex_sessions}\n"
+            f"🎞️ Plex transcoding: {plex_transcoding} | Plex CPU: {plex_cpu}%\n"
+            f"🖳 Plex is locally accessible: {plex_local_acess} | 📡 Plex is exernally accessible: {plex_external_acess}\n"
+            f"🐌 Deluge - Downloading: {deluge_downloading} | Seeding: {deluge_seeding}\n"
+            f"\t⬇️ DL: {deluge_dl:.2f} KB/s | ⬆️ UL: {deluge_ul:.2f} KB/s\n"
+            f"💾 Stockage :{storage_lines}\n"
+            f"🐳 Docker: {docker_status}\n"
+            f"🔁 Deluge IP = VPN IP ? {'✅' if ip_match else '❌'} ({common_ip})"
+        )
 
-            await ctx.send(summary)
+        await ctx.send(summary)
 
     except Exception as e:
         await ctx.send(f"Erreur lecture log: {e}")
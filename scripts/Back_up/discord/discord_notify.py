@@ -7,14 +7,19 @@ Inputs:
 - Message string passed to send_discord_message()
 
 Outputs:
-- Sends POST request to Discord Webhook
+- Queues the message on core/discord_dispatch.py when available (batched, rate-limit
+  aware, persisted background sender; returns immediately), through core/notify_digest.py:
+  the same text repeated within NOTIFY_DEDUP_WINDOW_SEC is counted, not re-sent
+- Otherwise sends POST request to Discord Webhook directly
 - Optionally prints debug messages if mode == "debug"
 
 Triggered Files/Services:
 - Called by monitoring and diagnostic scripts to report status or errors.
 """
 
+import importlib
 import os
+import sys
 import requests
 from dotenv import load_dotenv
 import time
@@ -41,6 +46,23 @@ else:
 # Retrieve webhook URL
 discord_webhook = os.getenv("DISCORD_WEBHOOK")
 
+
+def _load_core_module(name):
+    here = os.path.dirname(os.path.abspath(__file__))
+    for d in (os.path.abspath(os.path.join(here, "..", "core")), "/app"):
+        if os.path.isfile(os.path.join(d, f"{name}.py")):
+            if d not in sys.path:
+                sys.path.insert(0, d)
+            try:
+                return importlib.import_module(name)
+            except Exception:
+                return None
+    return None
+
+
+notify_digest = _load_core_module("notify_digest")
+
+
 def send_discord_message(content):
     """
     Sends a message to the configured Discord webhook.
@@ -51,6 +73,11 @@ def send_discord_message(content):
             print("[DEBUG - discord_notify.py] DISCORD_WEBHOOK not set.")
         return
 
+    if notify_digest is not None and notify_digest.send(content):
+        if mode == "debug":
+            print("[DEBUG - discord_notify.py] Message queued on discord_dispatch.")
+        return
+
     try:
         response = requests.post(discord_webhook, json={"content": content})
         if mode == "debug":
@@ -17,13 +17,12 @@ Triggered Files/Services:
 """
 
 import os
-import subprocess
 import logging
 import ssl
 import socket
+import importlib.util
 import requests
 from dotenv import load_dotenv
-from deluge_client import DelugeRPCClient
 from plexapi.server import PlexServer
 
 # Mode toggle: set to "debug" to enable verbose outputs
@@ -50,13 +49,30 @@ domain = os.getenv("DOMAIN")  # e.g., https://yourdomain.duckdns.org
 
 logging.getLogger("deluge_client.client").setLevel(logging.WARNING)
 
+def _load_core_module(name):
+    for path in [
+        os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "core", f"{name}.py")),
+        os.path.abspath(os.path.join(os.path.dirname(__file__), "..", f"{name}.py")),
+    ]:
+        if os.path.isfile(path):
+            try:
+                spec = importlib.util.spec_from_file_location(name, path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                return module
+            except Exception as e:
+                logging.error(f"Failed to import {name}: {e}")
+    return None
+
+# Session RPC Deluge partagée (core/deluge_rpc.py) et client Docker Engine API (core/docker_api.py)
+deluge_rpc = _load_core_module("deluge_rpc")
+docker_api = _load_core_module("docker_api")
+
 def check_docker(container):
     try:
         if mode == "debug":
             print(f"[DEBUG - Health_monit.py] Checking Docker container: {container}")
-        out = subprocess.run(["docker", "inspect", "-f", "{{.State.Running}}", container],
-                             capture_output=True, text=True)
-        result = out.stdout.strip() == "true"
+        result = docker_api.get_client().is_running(container)
         if mode == "debug":
             print(f"[DEBUG - Health_monit.py] Docker {container} running: {result}")
         return result
@@ -125,8 +141,10 @@ def check_deluge():
     try:
         if mode == "debug":
             print("[DEBUG - Health_monit.py] Checking Deluge RPC access")
-        client = DelugeRPCClient("localhost", 58846, "localclient", deluge_password, False)
-        client.connect()
+        if deluge_rpc is None:
+            raise RuntimeError("deluge_rpc.py not found")
+        session = deluge_rpc.get_session("localhost", 58846, "localclient", deluge_password)
+        session.call("daemon.info")
         return True
     except Exception as e:
         logging.error(f"Deluge check failed: {e}")
@@ -136,9 +154,8 @@ def check_nginx():
     try:
         if mode == "debug":
             print("[DEBUG - Health_monit.py] Checking NGINX configuration")
-        result = subprocess.run(["docker", "exec", "nginx-proxy", "nginx", "-t"],
-                                capture_output=True, text=True)
-        output = result.stdout + result.stderr
+        _, out, err = docker_api.get_client().exec("nginx-proxy", ["nginx", "-t"])
+        output = out + err
         ok = "syntax is ok" in output.lower()
         if mode == "debug":
             print(f"[DEBUG - Health_monit.py] NGINX syntax check: {ok}")
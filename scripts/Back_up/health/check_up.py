@@ -1,8 +1,15 @@
 import os
 import subprocess
-import json
+import sys
 from dotenv import load_dotenv
 
+# Store des échantillons (core/monitor_store.py, monté dans /app)
+for core_dir in (os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "core")), "/app"):
+    if os.path.isfile(os.path.join(core_dir, "monitor_store.py")):
+        sys.path.insert(0, core_dir)
+        break
+import monitor_store
+
 # Charger les variables d'environnement
 if not load_dotenv("/app/.env"):
     load_dotenv("../.env")
@@ -13,13 +20,11 @@ root_path = os.getenv("ROOT")
 if not root_path:
     raise ValueError("La variable d'environnement ROOT n'est pas définie dans le fichier .env")
 
-# Lire le fichier de log
-log_file = "/mnt/data/system_monitor_log.json"
-
-with open(log_file, "r") as f:
-    logs = json.load(f)
-
-last_entry = logs[-1]
+# Dernier échantillon du store segmenté (l'ancien tableau JSON n'est plus écrit)
+store_dir = os.getenv("MONITOR_STORE_DIR", "/mnt/data/system_monitor_log.d")
+last_entry = monitor_store.read_latest(store_dir)
+if last_entry is None:
+    raise SystemExit(f"[ERROR] Aucun échantillon dans {store_dir}")
 
 vpn_ips = last_entry["network"].get("vpn_ip", [])
 deluge_ips = last_entry["network"].get("deluge_ip", [])
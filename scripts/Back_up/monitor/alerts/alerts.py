@@ -4,9 +4,12 @@
 
 import json
 import os
+import sys
+import importlib
 import importlib.util
 
-LOG_FILE = "/mnt/data/system_monitor_log.json"
+# store segmenté (core/monitor_store.py); l'ancien tableau JSON n'est plus écrit
+LOG_FILE = os.getenv("MONITOR_STORE_DIR", "/mnt/data/system_monitor_log.d")
 ALERT_STATE_FILE = "/mnt/data/alert_state.json"
 
 # ====== PARAMÈTRES (anti-flap) ======
@@ -33,6 +36,24 @@ for discord_path in discord_paths:
             pass
 
 
+# ====== MOTEUR D'ALERTES (core/alert_engine.py, fenêtres glissantes) ======
+def _load_core_module(name):
+    here = os.path.dirname(os.path.abspath(__file__))
+    for d in (os.path.join(here, "core"), os.path.abspath(os.path.join(here, "..", "..", "core")), "/app"):
+        if os.path.isfile(os.path.join(d, f"{name}.py")):
+            if d not in sys.path:
+                sys.path.insert(0, d)
+            try:
+                return importlib.import_module(name)
+            except Exception:
+                return None
+    return None
+
+
+alert_engine = _load_core_module("alert_engine")
+monitor_store = _load_core_module("monitor_store")
+
+
 # ====== STATE HELPERS ======
 def load_alert_state():
     # état par défaut complet
@@ -64,11 +85,9 @@ def save_alert_state(state):
 
 def read_latest_data():
     try:
-        with open(LOG_FILE, "r") as f:
-            logs = json.load(f)
-            if not logs:
-                return None
-            return logs[-1]
+        if monitor_store is None:
+            raise RuntimeError("monitor_store.py introuvable")
+        return monitor_store.read_latest(LOG_FILE)
     except Exception as e:
         print(f"[ERROR] Unable to read data: {e}")
         return None
@@ -169,9 +188,18 @@ def main():
         return
 
     state = load_alert_state()
-    check_plex_external(data, state)
-    check_plex_local(data, state)
-    check_deluge(data, state)
+    if alert_engine is not None:
+        engine = alert_engine.AlertEngine(alert_engine.default_rules(), state)
+        for event in engine.feed(data):
+            print(event["message"])
+            if send_discord_message and event["notify"]:
+                send_discord_message(event["message"])
+        state = engine.sync()
+    else:
+        # repli historique: dernière entrée + compteurs de série
+        check_plex_external(data, state)
+        check_plex_local(data, state)
+        check_deluge(data, state)
     save_alert_state(state)
 
 
@@ -30,6 +30,7 @@ ENV (defaults you can override)
 """
 
 import argparse
+import importlib
 import json
 import os
 import re
@@ -59,6 +60,29 @@ SIMULATE_EXTERNAL = os.environ.get("SIMULATE_EXTERNAL", "1") == "1"
 WARN_DAYS = int(os.environ.get("WARN_DAYS", "15"))
 # --------------------------------------------------------------- #
 
+# --- Modules partagés de core/ (public_ip, dns_client, ...) si présents; sinon implémentation locale ---
+def _load_core_module(name):
+    here = os.path.dirname(os.path.abspath(__file__))
+    for d in (os.path.join(here, "core"), os.path.abspath(os.path.join(here, "..", "..", "core")), "/app"):
+        if os.path.isfile(os.path.join(d, f"{name}.py")):
+            if d not in sys.path:
+                sys.path.insert(0, d)
+            try:
+                return importlib.import_module(name)
+            except Exception:
+                return None
+    return None
+
+
+public_ip = _load_core_module("public_ip")
+dns_client = _load_core_module("dns_client")
+http_probe = _load_core_module("http_probe")
+probe_engine = _load_core_module("probe_engine")
+nginx_bundle = _load_core_module("nginx_bundle")
+cert_inspector = _load_core_module("cert_inspector")
+nginx_conf = _load_core_module("nginx_conf")
+docker_api = _load_core_module("docker_api")
+
 # Ordered list for reporting/repairs
 TESTS = [
     "PREFLIGHT",
@@ -100,10 +124,32 @@ def run(cmd, timeout=None):
     return p.returncode, (p.stdout or "").strip(), (p.stderr or "").strip()
 
 def docker_exec(args, timeout=None):
-    """docker exec into the nginx container."""
+    """docker exec into the nginx container (Docker Engine API, CLI only without core/)."""
+    if docker_api is not None:
+        # 125 = code du CLI quand le daemon est injoignable
+        try:
+            return docker_api.get_client().exec(CONTAINER, args, timeout=timeout)
+        except docker_api.DockerAPIError as e:
+            return 125, "", str(e)
     return run(["docker", "exec", "-i", CONTAINER] + args, timeout=timeout)
 
+# conf.d parsé sur le bind mount hôte (core/nginx_conf.py): tous les proxy_pass, pas seulement le premier
+CONF_INDEX = nginx_conf.get_index() if nginx_conf is not None else None
+# faits nginx-proxy en un seul exec (core/nginx_bundle.py); sans core/: un exec par fait
+NGINX = nginx_bundle.NginxInspector(CONTAINER, CONF_PATH, LE_PATH, UPSTREAM_FALLBACK_HOST, UPSTREAM_FALLBACK_PORT,
+                                    CURL_TIMEOUT, docker_exec,
+                                    targets=CONF_INDEX.upstream_targets() if CONF_INDEX else (),
+                                    host_live=os.path.dirname(cert_inspector.find_host_chain(DOMAIN))
+                                    if cert_inspector else "") \
+    if nginx_bundle is not None else None
+
 def docker_container_running(name):
+    if docker_api is not None:
+        try:
+            return docker_api.get_client().is_running(name)
+        except docker_api.DockerAPIError as e:
+            warn(f"Docker API unavailable: {e}")
+            return False
     rc, out, _ = run(["docker", "ps", "--format", "{{.Names}}"])
     return rc == 0 and any(line.strip() == name for line in out.splitlines())
 
@@ -132,6 +178,8 @@ def resolve_a_multi(domain: str, resolvers=None, timeout=1.5, tries=1):
     Résout les A-records IPv4 via plusieurs résolveurs publics (+fallback système).
     Retourne (answers_set, details_log)
     """
+    if dns_client is not None:
+        return dns_client.resolve_a_multi(domain, resolvers, timeout, tries)
     if resolvers is None:
         resolvers = ["1.1.1.1", "8.8.8.8", "9.9.9.9"]
 
@@ -158,6 +206,8 @@ def resolve_a_multi(domain: str, resolvers=None, timeout=1.5, tries=1):
 
 def get_public_ip():
     """Get current public IPv4 with fallbacks."""
+    if public_ip is not None:
+        return public_ip.get_public_ip(timeout=CURL_TIMEOUT)
     for endpoint in (
         ["curl","-sS","-4","https://ifconfig.me"],
         ["curl","-sS","-4","https://api.ipify.org"],
@@ -169,11 +219,23 @@ def get_public_ip():
             return ip
     return ""
 
+def http_code(url, resolve_ip=None):
+    """(rc, code HTTP) d'un GET; épinglé sur resolve_ip comme `curl --resolve` si fourni."""
+    resolve = {DOMAIN: resolve_ip} if resolve_ip else None
+    if http_probe is not None:
+        return http_probe.http_code(url, resolve=resolve, retries=0, max_time=CURL_TIMEOUT)
+    cmd = ["curl","-sS","-m",str(CURL_TIMEOUT),"-o","/dev/null","-w","%{http_code}"]
+    if resolve_ip:
+        cmd += ["--resolve", f"{DOMAIN}:443:{resolve_ip}"]
+    rc, out, _ = run(cmd + [url])
+    return rc, out.strip()
+
 # --------------------------- tests --------------------------- #
 def test_preflight(results):
     header("Preflight")
     ok_all = True
-    for b in ("docker", "curl"):
+    # binaires hôte requis seulement pour les modules core/ absents
+    for b in [b for b, mod in (("docker", docker_api), ("curl", http_probe)) if mod is None]:
         if not require(b):
             fail(f"Missing required host binary: {b}")
             ok_all = False
@@ -190,26 +252,31 @@ def test_preflight(results):
         else:
             warn(f"Plex container '{PLEX_CONTAINER}' not running.")
 
-    # Quick upstream probe to your fallback (local Plex)
-    url = f"http://{UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}/identity"
-    rc, out, _ = run(["curl","-sS","-m",str(CURL_TIMEOUT),"-o","/dev/null","-w","%{http_code}", url])
-    if rc == 0 and out.strip() == "200":
-        ok(f"Plex fallback upstream replied 200 on /identity ({UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}).")
-    else:
-        warn(f"Fallback Plex upstream test failed at {url} (code {out or 'n/a'}).")
-
     results["PREFLIGHT"] = ok_all
     return ok_all
 
+def test_nginx_facts(results):
+    if NGINX is not None:
+        header("Inspect nginx-proxy (single batched exec)")
+        if NGINX.collect():
+            ok(f"Collected nginx-proxy facts in one exec ({NGINX.stats['bundle_ms']} ms).")
+        else:
+            warn(f"Batched inspection unavailable, one exec per check: {NGINX.error}")
+    results["NGINX_FACTS"] = True
+    return True
+
 def test_conf_present(results):
     header("Check nginx config presence")
-    rc, _, err = docker_exec(["ls","-l","/etc/nginx/conf.d"])
+    rc, _, err = NGINX.ls_conf_d() if NGINX else docker_exec(["ls","-l","/etc/nginx/conf.d"])
     if rc != 0:
         fail(f"Cannot list conf.d: {err}")
         results["CONF_PRESENT"] = False
         return False
 
-    rc, _, _ = docker_exec(["sh","-lc", f"test -f {shlex.quote(CONF_PATH)}"])
+    if NGINX:
+        rc = NGINX.conf_present()
+    else:
+        rc, _, _ = docker_exec(["sh","-lc", f"test -f {shlex.quote(CONF_PATH)}"])
     if rc == 0:
         ok(f"Found {CONF_PATH} in container.")
         results["CONF_PRESENT"] = True
@@ -221,7 +288,7 @@ def test_conf_present(results):
 
 def test_nginx_t(results):
     header("Check nginx config syntax (nginx -t)")
-    rc, out, err = docker_exec(["nginx","-t"])
+    rc, out, err = NGINX.nginx_t() if NGINX else docker_exec(["nginx","-t"])
     if rc == 0:
         ok("nginx -t: syntax OK")
         results["NGINX_TEST"] = True
@@ -230,16 +297,30 @@ def test_nginx_t(results):
     results["NGINX_TEST"] = False
     return False
 
-def extract_upstream():
-    header("Extract upstream from plex.conf")
-    rc, out, _ = docker_exec([
-        "sh","-lc",
-        f"awk '/proxy_pass[[:space:]]+http/{{print $2}}' {shlex.quote(CONF_PATH)} | head -n1 | tr -d ';'"
-    ])
+def extract_upstreams():
+    header("Extract upstreams from nginx config")
+    if CONF_INDEX is not None and CONF_INDEX.upstream_targets():
+        for path, err in CONF_INDEX.errors.items():
+            warn(f"Cannot parse {path}: {err}")
+        for p in CONF_INDEX.proxy_passes:
+            where = f"{os.path.basename(p['file'])}:{p['line']}, {p['server_name'] or '-'} location {p['location'] or '-'}"
+            if p["targets"]:
+                ok(f"Detected upstream target: {', '.join(f'{h}:{port}' for h, port in p['targets'])} ({where})")
+            else:
+                warn(f"Unresolvable proxy_pass {p['url']} ({where})")
+        return CONF_INDEX.upstream_targets()
+
+    if NGINX:
+        rc, out, _ = NGINX.proxy_pass()
+    else:
+        rc, out, _ = docker_exec([
+            "sh","-lc",
+            f"awk '/proxy_pass[[:space:]]+http/{{print $2}}' {shlex.quote(CONF_PATH)} | head -n1 | tr -d ';'"
+        ])
     url = out.strip() if rc == 0 else ""
     if not url:
         warn(f"No proxy_pass found. Using fallback {UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}")
-        return (UPSTREAM_FALLBACK_HOST, UPSTREAM_FALLBACK_PORT)
+        return [(UPSTREAM_FALLBACK_HOST, UPSTREAM_FALLBACK_PORT)]
 
     no_scheme = re.sub(r"^https?://", "", url)
     no_path = no_scheme.split("/", 1)[0]
@@ -248,21 +329,26 @@ def extract_upstream():
     else:
         host, port = no_path, "80"
     ok(f"Detected upstream target: {host}:{port}")
-    return (host, port)
-
-def test_upstream(results, host, port):
-    header("Test Plex upstream (/identity) from inside container")
-    rc, out, _ = docker_exec([
-        "curl","-sS","-m",str(CURL_TIMEOUT),"-o","/dev/null","-w","%{http_code}",
-        f"http://{host}:{port}/identity"
-    ])
-    if rc == 0 and out.strip() == "200":
-        ok("Plex upstream replied 200 on /identity.")
-        results["PLEX_UPSTREAM"] = True
-        return True
-    fail(f"Plex upstream test failed (HTTP {out or 'n/a'}).")
-    results["PLEX_UPSTREAM"] = False
-    return False
+    return [(host, port)]
+
+def test_upstreams(results, targets):
+    header("Test Plex upstreams (/identity) from inside container")
+    if NGINX:
+        replies = NGINX.identities(targets)
+    else:
+        replies = {(host, port): docker_exec([
+            "curl","-sS","-m",str(CURL_TIMEOUT),"-o","/dev/null","-w","%{http_code}",
+            f"http://{host}:{port}/identity"
+        ]) for host, port in targets}
+    ok_all = True
+    for (host, port), (rc, out, _) in replies.items():
+        if rc == 0 and out.strip() == "200":
+            ok(f"Plex upstream {host}:{port} replied 200 on /identity.")
+        else:
+            fail(f"Plex upstream {host}:{port} test failed (HTTP {out or 'n/a'}).")
+            ok_all = False
+    results["PLEX_UPSTREAM"] = ok_all
+    return ok_all
 
 def test_dns_match(results):
     header("DuckDNS IP vs current public IP")
@@ -306,30 +392,39 @@ def parse_notafter_to_days(exp_line):
     now = datetime.now(timezone.utc)
     return int((exp_dt - now).total_seconds() // 86400), exp_dt
 
-def test_cert_expiry(results):
-    header("Check certificate files and expiration")
-    # Files present?
-    rc1, _, _ = docker_exec(["sh","-lc", f"test -f {shlex.quote(LE_PATH)}/fullchain.pem"])
-    rc2, _, _ = docker_exec(["sh","-lc", f"test -f {shlex.quote(LE_PATH)}/privkey.pem"])
-    if rc1 == 0 and rc2 == 0:
-        ok(f"Found cert files under {LE_PATH} (fullchain.pem & privkey.pem).")
-    else:
-        warn(f"Cert files not found at {LE_PATH}.")
-        results["CERT_EXPIRY"] = False
-        return False
-
-    # Try 1) in-container openssl, 2) host openssl via PEM, 3) remote s_client
-    exp_line = ""
-    has_in = (docker_exec(["sh","-lc","command -v openssl >/dev/null 2>&1"])[0] == 0)
-    if has_in:
+def read_cert_chain(container_pem=True):
+    """Chaîne parsée en Python (cert_inspector): bind mount hôte, PEM du conteneur, puis handshake TLS."""
+    certs = cert_inspector.get_inspector()
+    host_path = cert_inspector.find_host_chain(DOMAIN)
+    if host_path:
+        try:
+            return certs.chain_from_file(host_path), host_path
+        except (OSError, ValueError, cert_inspector.CertError) as e:
+            warn(f"Cannot read {host_path}: {e}")
+    rc, pem, _ = (NGINX.fullchain_pem() if NGINX else docker_exec(["cat", f"{LE_PATH}/fullchain.pem"])) \
+        if container_pem else (1, "", "")
+    if rc == 0 and pem.strip():
+        try:
+            return certs.chain_from_pem(pem), f"{CONTAINER}:{LE_PATH}/fullchain.pem"
+        except (ValueError, cert_inspector.CertError) as e:
+            warn(f"Cannot parse {LE_PATH}/fullchain.pem: {e}")
+    try:
+        return certs.chain_from_server(DOMAIN, 443, timeout=CURL_TIMEOUT), f"TLS handshake {DOMAIN}:443"
+    except (OSError, ValueError, cert_inspector.CertError) as e:
+        warn(f"TLS handshake with {DOMAIN}:443 failed: {e}")
+    return None, ""
+
+def read_cert_enddate():
+    """Sans core/: 1) openssl dans le conteneur, 2) openssl hôte sur le PEM, 3) s_client distant."""
+    if docker_exec(["sh","-lc","command -v openssl >/dev/null 2>&1"])[0] == 0:
         rc, out, _ = docker_exec([
             "sh","-lc",
             f"openssl x509 -enddate -noout -in {shlex.quote(LE_PATH)}/fullchain.pem | cut -d= -f2"
         ])
         if rc == 0 and out.strip():
-            exp_line = out.strip()
+            return out.strip()
 
-    if not exp_line and shutil.which("openssl"):
+    if shutil.which("openssl"):
         rc, pem, _ = docker_exec(["sh","-lc", f"cat {shlex.quote(LE_PATH)}/fullchain.pem"])
         if rc == 0 and pem:
             p = subprocess.run(
@@ -337,27 +432,56 @@ def test_cert_expiry(results):
                 input=pem, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
             )
             if p.returncode == 0 and p.stdout.strip():
-                exp_line = p.stdout.strip().split("=", 1)[-1].strip()
+                return p.stdout.strip().split("=", 1)[-1].strip()
 
-    if not exp_line and shutil.which("openssl"):
         rc, out, _ = run(
             f'echo | openssl s_client -connect {shlex.quote(DOMAIN)}:443 '
             f'-servername {shlex.quote(DOMAIN)} 2>/dev/null | openssl x509 -noout -enddate'
         )
         if rc == 0 and out.strip().startswith("notAfter="):
-            exp_line = out.strip().split("=", 1)[-1].strip()
-
-    if not exp_line:
-        warn("Could not determine certificate expiration.")
-        results["CERT_EXPIRY"] = False
-        return False
+            return out.strip().split("=", 1)[-1].strip()
+    return ""
 
-    try:
-        days_left, exp_dt = parse_notafter_to_days(exp_line)
-    except Exception as e:
-        warn(f"Failed to parse cert date '{exp_line}': {e}")
-        results["CERT_EXPIRY"] = False
-        return False
+def test_cert_expiry(results):
+    header("Check certificate files and expiration")
+    # Files present? (bundle, sinon bind mount hôte, sinon exec: nginx-proxy peut être arrêté)
+    if NGINX:
+        rc1, rc2 = NGINX.cert_files()
+    else:
+        rc1, _, _ = docker_exec(["sh","-lc", f"test -f {shlex.quote(LE_PATH)}/fullchain.pem"])
+        rc2, _, _ = docker_exec(["sh","-lc", f"test -f {shlex.quote(LE_PATH)}/privkey.pem"])
+    files_ok = rc1 == 0 and rc2 == 0
+    if files_ok:
+        ok(f"Found cert files under {NGINX.host_live if NGINX and NGINX.host_live else LE_PATH} "
+           f"(fullchain.pem & privkey.pem).")
+    else:
+        warn(f"Cert files not found at {LE_PATH}; trying a TLS handshake.")
+
+    problems = []
+    if cert_inspector:
+        chain, source = read_cert_chain(container_pem=files_ok)
+        if chain is None:
+            warn("Could not determine certificate expiration.")
+            results["CERT_EXPIRY"] = False
+            return False
+        report = cert_inspector.evaluate(chain, DOMAIN)
+        days_left, exp_dt, problems = report["days_left"], report["not_after"], report["problems"]
+        info(f"Certificate chain from {source}: {report['chain_len']} cert(s), issuer '{report['issuer']}', "
+             f"SAN {', '.join(report['san']) or '-'}")
+        if 0 <= report["chain_days_left"] < min(days_left, WARN_DAYS):
+            warn(f"An intermediate certificate expires in {report['chain_days_left']} days.")
+    else:
+        exp_line = read_cert_enddate()
+        if not exp_line:
+            warn("Could not determine certificate expiration.")
+            results["CERT_EXPIRY"] = False
+            return False
+        try:
+            days_left, exp_dt = parse_notafter_to_days(exp_line)
+        except Exception as e:
+            warn(f"Failed to parse cert date '{exp_line}': {e}")
+            results["CERT_EXPIRY"] = False
+            return False
 
     if days_left < 0:
         fail(f"Certificate EXPIRED {abs(days_left)} days ago (expires: {exp_dt}).")
@@ -369,6 +493,11 @@ def test_cert_expiry(results):
         ok(f"Certificate valid for {days_left} more days (expires: {exp_dt}).")
         ok_result = True
 
+    if problems and ok_result:
+        for p in problems:
+            fail(f"Certificate chain: {p}")
+        ok_result = False
+
     results["CERT_EXPIRY"] = ok_result
     results["_cert_days_left"] = days_left
     return ok_result
@@ -377,19 +506,15 @@ def test_https_external(results):
     if not SIMULATE_EXTERNAL:
         results["HTTPS_EXTERNAL"] = True
         return True
-    header("Simulated external HTTPS (curl --resolve to public IP)")
+    header("Simulated external HTTPS (pinned to public IP, like curl --resolve)")
     pub_ip = results.get("_pub_ip", "")
     if not pub_ip:
         warn("No public IP available; skipping external simulation.")
         results["HTTPS_EXTERNAL"] = False
         return False
 
-    rc, out, _ = run([
-        "curl","-sS","-m",str(CURL_TIMEOUT),"-o","/dev/null","-w","%{http_code}",
-        "--resolve", f"{DOMAIN}:443:{pub_ip}",
-        f"https://{DOMAIN}/"
-    ])
-    code = out.strip() if rc == 0 else ""
+    rc, out = http_code(f"https://{DOMAIN}/", resolve_ip=pub_ip)
+    code = out if rc == 0 else ""
     if code in {"200","301","302","401","403"}:
         ok(f"HTTPS answered with HTTP {code} at {DOMAIN} (forced to {pub_ip}).")
         results["HTTPS_EXTERNAL"] = True
@@ -399,6 +524,74 @@ def test_https_external(results):
     results["HTTPS_EXTERNAL"] = False
     return False
 
+def test_fallback_upstream(results):
+    header("Plex fallback upstream (/identity) from host")
+    url = f"http://{UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}/identity"
+    rc, out = http_code(url)
+    if rc == 0 and out == "200":
+        ok(f"Plex fallback upstream replied 200 on /identity ({UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}).")
+    else:
+        warn(f"Fallback Plex upstream test failed at {url} (code {out or 'n/a'}).")
+    results["UPSTREAM_FALLBACK"] = rc == 0 and out == "200"
+    return results["UPSTREAM_FALLBACK"]
+
+def test_upstream_from_conf(results):
+    results["_upstreams"] = extract_upstreams()
+    results["_upstream"] = results["_upstreams"][0]
+    results["UPSTREAM_FROM_CONF"] = True
+    return True
+
+def test_plex_upstream(results):
+    return test_upstreams(results, results["_upstreams"])
+
+def test_public_ip(results):
+    header("Current public IP")
+    pub_ip = get_public_ip()
+    if pub_ip:
+        ok(f"Current public IP: {pub_ip}")
+        results["_pub_ip"] = pub_ip
+        results["PUBLIC_IP"] = True
+        return True
+    fail("Unable to fetch current public IP.")
+    results["PUBLIC_IP"] = False
+    results["_reason_PUBLIC_IP"] = "unable to fetch current public IP"
+    return False
+
+def _check_graph():
+    """(nom, check, dépendances, timeout s). DNS et CERT indépendants de nginx-proxy; ordre topologique."""
+    exec_timeout = CURL_TIMEOUT + 5
+    return [
+        ("PREFLIGHT", test_preflight, [], exec_timeout),
+        ("UPSTREAM_FALLBACK", test_fallback_upstream, [], exec_timeout),
+        ("NGINX_FACTS", test_nginx_facts, ["PREFLIGHT"], CURL_TIMEOUT + 20),
+        ("CONF_PRESENT", test_conf_present, ["NGINX_FACTS"], exec_timeout),
+        ("NGINX_TEST", test_nginx_t, ["NGINX_FACTS"], exec_timeout),
+        ("UPSTREAM_FROM_CONF", test_upstream_from_conf, ["NGINX_FACTS"], exec_timeout),
+        ("PLEX_UPSTREAM", test_plex_upstream, ["UPSTREAM_FROM_CONF"], exec_timeout),
+        ("PUBLIC_IP", test_public_ip, [], CURL_TIMEOUT + 2),
+        ("DNS_MATCH", test_dns_match, [], CURL_TIMEOUT + 5),
+        ("CERT_EXPIRY", test_cert_expiry, [], 3 * CURL_TIMEOUT + 5),
+        ("HTTPS_EXTERNAL", test_https_external, ["PUBLIC_IP"] if SIMULATE_EXTERNAL else [], CURL_TIMEOUT + 2),
+    ]
+
+def run_checks(results):
+    """
+    Graphe via core/probe_engine.py si présent: nœuds indépendants en parallèle, timeout par nœud,
+    dépendants court-circuités sur échec. Sinon: même graphe en séquence.
+    """
+    graph = _check_graph()
+    if probe_engine is not None:
+        nodes = [probe_engine.Node(name, fn, deps, timeout) for name, fn, deps, timeout in graph]
+        return probe_engine.run_result_dag(nodes, results)
+    for name, fn, deps, _ in graph:
+        blocked = [d for d in deps if results.get(d) is not True]
+        if blocked:
+            results[name] = False
+            results[f"_reason_{name}"] = results.get(f"_reason_{blocked[0]}") or f"not run: {blocked[0]} failed"
+        else:
+            fn(results)
+    return None
+
 # --------------------------- CLI / repair glue --------------------------- #
 def _parse_args():
     p = argparse.ArgumentParser(description="Plex + Nginx health checks")
@@ -463,16 +656,8 @@ def main():
 
     results = {}
 
-    # Run checks (ordre important: DNS avant HTTPS, car HTTPS peut “tolérer” un DNS en décalage)
-    test_preflight(results)
-    test_conf_present(results)
-    test_nginx_t(results)
-    host, port = extract_upstream()
-    results["UPSTREAM_FROM_CONF"] = True
-    test_upstream(results, host, port)
-    test_dns_match(results)
-    test_cert_expiry(results)
-    test_https_external(results)
+    # Checks en graphe de dépendances (HTTPS attend l'IP publique, DNS/CERT indépendants)
+    run_checks(results)
 
     # Décision finale (DNS mismatch toléré si HTTPS ok)
     failing, overall_ok = _compute_failures(results)
@@ -23,7 +23,6 @@ Triggered Files/Services:
 import subprocess
 import logging
 from dotenv import load_dotenv
-from deluge_client import DelugeRPCClient
 from plexapi.server import PlexServer
 import psutil
 import speedtest
@@ -50,6 +49,20 @@ try:
 except Exception as e:
     print(f"[DEBUG] Import send_discord_message: FAILED → {e}")
 
+# Session RPC Deluge partagée (core/deluge_rpc.py): connexion, backoff et stats communs au monitor
+try:
+    from core import deluge_rpc
+except Exception as e:
+    deluge_rpc = None
+    print(f"[DEBUG] Import core.deluge_rpc: FAILED → {e}")
+
+# Client Docker Engine API (socket Unix, voir core/docker_api.py); CLI docker en repli sans core/
+try:
+    from core import docker_api
+except Exception as e:
+    docker_api = None
+    print(f"[DEBUG] Import core.docker_api: FAILED → {e}")
+
 # Mode: "normal" or "debug"
 mode = "normal"
 
@@ -82,12 +95,12 @@ def check_docker_running(container):
     if mode == "debug":
         print(f"[DEBUG - Health.py] Checking container: {container}")
     try:
-        result = subprocess.run(
-            ["docker", "inspect", "-f", "{{.State.Running}}", container],
-            capture_output=True,
-            text=True,
-        )
-        status = result.stdout.strip() == "true"
+        if docker_api is not None:
+            status = docker_api.get_client().is_running(container)
+        else:
+            out = subprocess.run(["docker", "inspect", "-f", "{{.State.Running}}", container],
+                                 capture_output=True, text=True, timeout=10).stdout
+            status = out.strip() == "true"
         if mode == "debug":
             print(f"[DEBUG - Health.py] {container} status: {'OK' if status else 'NOT RUNNING'}")
         return status
@@ -100,15 +113,15 @@ def get_deluge_stats():
     if mode == "debug":
         print("[DEBUG - Health.py] Checking Deluge status")
     try:
-        client = DelugeRPCClient(
+        if deluge_rpc is None:
+            raise RuntimeError("core/deluge_rpc.py not found")
+        session = deluge_rpc.get_session(
             deluge_config["host"],
             deluge_config["port"],
             deluge_config["username"],
             deluge_config["password"],
-            False
         )
-        client.connect()
-        torrents = client.call("core.get_torrents_status", {}, ["state"])
+        torrents = session.call("core.get_torrents_status", {}, ["state"])
         downloading = sum(1 for t in torrents.values() if t[b"state"] == b"Downloading")
         seeding = sum(1 for t in torrents.values() if t[b"state"] == b"Seeding")
         if mode == "debug":
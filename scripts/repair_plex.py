@@ -22,9 +22,27 @@ REPAIRS MAPPING
 ENV
   CONTAINER, DOMAIN, CONF_PATH, LE_PATH, UPSTREAM_FALLBACK_HOST, UPSTREAM_FALLBACK_PORT
   DUCKDNS_TOKEN, DUCKDNS_SUBDOMAIN  (for DNS updates)
+  NGINX_CONF_HOST_DIR (host copy of /etc/nginx/conf.d, see core/nginx_conf.py; used by --force-fallback)
 """
 
-import os, shlex, subprocess, sys
+import importlib, os, shlex, subprocess, sys
+
+# --- core/nginx_conf.py (parser + réécriture ciblée des proxy_pass) ---
+def _load_core_module(name):
+    here = os.path.dirname(os.path.abspath(__file__))
+    for d in (os.path.join(here, "core"), os.path.join(here, "Back_up", "core"), "/app"):
+        if os.path.isfile(os.path.join(d, f"{name}.py")):
+            if d not in sys.path:
+                sys.path.insert(0, d)
+            try:
+                return importlib.import_module(name)
+            except Exception:
+                return None
+    return None
+
+nginx_conf = _load_core_module("nginx_conf")
+# --- core/docker_api.py (Docker Engine API sur le socket; CLI docker seulement sans core/) ---
+docker_api = _load_core_module("docker_api")
 
 CONTAINER = os.environ.get("CONTAINER","nginx-proxy")
 DOMAIN = os.environ.get("DOMAIN","plex-robert.duckdns.org")
@@ -53,7 +71,13 @@ def run(cmd):
     p = subprocess.run(cmd, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     return p.returncode, (p.stdout or "").strip(), (p.stderr or "").strip()
 
-def docker_exec(args):
+def docker_exec(args, timeout=None):
+    if docker_api is not None:
+        # 125 = code du CLI quand le daemon est injoignable
+        try:
+            return docker_api.get_client().exec(CONTAINER, args, timeout=timeout)
+        except docker_api.DockerAPIError as e:
+            return 125, "", str(e)
     return run(["docker","exec","-i",CONTAINER]+args)
 
 def nginx_reload():
@@ -132,18 +156,75 @@ def repair_plex_upstream():
     info(" 3) If using container name, ensure DNS/links/networks are correct")
     info(" 4) If needed, use --force-fallback to rewrite proxy_pass to UPSTREAM_FALLBACK_*")
     if FORCE_FALLBACK:
-        if APPLY:
-            cmd = f"sed -i -E 's#proxy_pass\\s+http[^;]+;#proxy_pass http://{UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}/;#' {shlex.quote(CONF_PATH)}"
-            rc,_,err = docker_exec(["sh","-lc", cmd])
-            if rc==0:
-                ok("Rewrote proxy_pass to fallback upstream.")
-                rc2,_,_ = docker_exec(["nginx","-t"])
-                if rc2==0: nginx_reload()
-                else: fail("nginx -t failed after rewrite.")
-            else:
-                fail(f"sed rewrite failed: {err}")
-        else:
-            info("DRY-RUN: would rewrite proxy_pass to fallback and reload nginx.")
+        rewrite_upstream_to_fallback()
+
+def rewrite_upstream_to_fallback():
+    """proxy_pass de CONF_PATH → UPSTREAM_FALLBACK_* via nginx_conf (token exact, pas de sed), restauré si nginx -t échoue."""
+    index = nginx_conf.get_index() if nginx_conf is not None else None
+    if index is None:
+        fail("nginx conf.d not readable on the host (core/nginx_conf.py, NGINX_CONF_HOST_DIR): no rewrite.")
+        return
+    host_conf = os.path.join(index.conf_dir, os.path.relpath(CONF_PATH, nginx_conf.CONTAINER_CONF_DIR))
+    new = f"{UPSTREAM_FALLBACK_HOST}:{UPSTREAM_FALLBACK_PORT}"
+    olds, skipped = [], []
+    for p in index.proxy_passes:
+        if p["file"] != host_conf:
+            continue
+        _, host, port = nginx_conf.split_target(p["url"])
+        if not host:
+            skipped.append(f"line {p['line']}: {p['url']}")
+        elif f"{host}:{port}" != new and f"{host}:{port}" not in olds:
+            olds.append(f"{host}:{port}")
+    for item in skipped:
+        warn(f"proxy_pass left untouched (variable/unix socket) — {item}")
+    if not olds:
+        ok(f"No proxy_pass in {host_conf} to rewrite (already {new}).")
+        return
+    if not APPLY:
+        info(f"DRY-RUN: would rewrite proxy_pass {', '.join(olds)} -> {new} in {host_conf} and reload nginx.")
+        return
+    try:
+        with open(host_conf, "r", encoding="utf-8") as f:
+            backup = f.read()
+    except OSError as e:
+        fail(f"Cannot read {host_conf}: {e}")
+        return
+    text, count = backup, 0
+    for old in olds:
+        text, n = nginx_conf.rewrite_upstream(host_conf, text, old, new)
+        count += n
+    if not write_conf(host_conf, text):
+        fail(f"Could not rewrite proxy_pass in {host_conf} (host or container): nothing changed.")
+        return
+    ok(f"Rewrote {count} proxy_pass to fallback upstream {new}.")
+    rc2,out2,err2 = docker_exec(["nginx","-t"])
+    if rc2==0:
+        nginx_reload()
+        return
+    fail(f"nginx -t failed after rewrite, restoring {host_conf}:\n{out2}\n{err2}")
+    if not write_conf(host_conf, backup):
+        fail(f"Restore of {host_conf} failed: fix {CONF_PATH} by hand before the next nginx reload.")
+
+def write_conf(host_conf, text):
+    """
+    Écriture atomique (tmp + os.replace, comme nginx_conf.replace_upstream) du fichier hôte.
+    conf.d monté :ro dans le service monitor (EROFS/EACCES) → même écriture faite dans le conteneur nginx.
+    """
+    try:
+        tmp = f"{host_conf}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.chmod(tmp, os.stat(host_conf).st_mode & 0o7777)
+        os.replace(tmp, host_conf)
+        return True
+    except OSError as e:
+        warn(f"Cannot write {host_conf} on the host ({e}); writing {CONF_PATH} in container '{CONTAINER}'.")
+    # contenu passé en argument (pas de stdin via l'API Docker), mv = rename atomique dans conf.d
+    rc,_,err = docker_exec(["sh","-c",'printf "%s" "$1" > "$2.tmp" && mv -f "$2.tmp" "$2"',
+                            "write_conf", text, CONF_PATH])
+    if rc != 0:
+        fail(f"Cannot write {CONF_PATH} in container '{CONTAINER}': {err or f'rc={rc}'}")
+    return rc == 0
 
 def repair_dns_match():
     header("Repair: DNS_MATCH")
@@ -169,9 +250,9 @@ def repair_cert_expiry():
         rc,out,_ = docker_exec(["sh","-lc",". /etc/os-release 2>/dev/null; echo ${ID:-unknown}"])
         distro = (out or "unknown").strip()
         if distro == "alpine":
-            rc,_,err = docker_exec(["sh","-lc","apk add --no-cache openssl || true"])
+            rc,_,err = docker_exec(["sh","-lc","apk add --no-cache openssl || true"], timeout=300)
         else:
-            rc,_,err = docker_exec(["sh","-lc","apt-get update && apt-get install -y openssl || true"])
+            rc,_,err = docker_exec(["sh","-lc","apt-get update && apt-get install -y openssl || true"], timeout=300)
         if rc==0: ok("Ensured openssl present in container (best-effort).")
         else:     warn(f"Could not install openssl: {err}")
         nginx_reload()